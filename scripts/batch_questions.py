@@ -0,0 +1,151 @@
+"""
+Script de processamento de perguntas em lote
+Executa uma lista de perguntas sobre a frota (ex: relatório noturno) pelo
+AgentOrchestrator e grava os resultados em JSONL, com os gráficos em arquivos.
+
+Uso:
+    python scripts/batch_questions.py perguntas.txt --output resultados.jsonl --charts-dir graficos
+"""
+
+import argparse
+import json
+import logging
+import sys
+import os
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv
+
+from src.core.agent_orchestrator import AgentOrchestrator, DEFAULT_BATCH_CONCURRENCY
+from src.core.data_loader import load_csv_data
+
+
+def load_questions(filepath: str) -> list:
+    """
+    Carrega as perguntas de um arquivo de texto (uma por linha) ou JSONL.
+
+    No formato JSONL cada linha deve ser um objeto com o campo "question".
+    Linhas vazias e iniciadas por "#" são ignoradas.
+
+    Args:
+        filepath: Caminho do arquivo de perguntas
+
+    Returns:
+        Lista de perguntas
+    """
+    questions = []
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if filepath.endswith(".jsonl"):
+                questions.append(json.loads(line)["question"])
+            else:
+                questions.append(line)
+    return questions
+
+
+def create_handler(provider: str):
+    """
+    Cria o handler LLM do provedor escolhido.
+
+    Args:
+        provider: "ollama" ou "openai"
+
+    Returns:
+        Handler LLM configurado
+    """
+    if provider == "openai":
+        from src.core.openai_handler import create_openai_handler
+
+        return create_openai_handler()
+
+    from src.core.llm_handler import create_llm_handler
+
+    return create_llm_handler(os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"))
+
+
+def save_chart(chart, charts_dir: str, index: int) -> str:
+    """
+    Salva um gráfico Plotly em arquivo (PNG se o kaleido estiver instalado, senão HTML).
+
+    Args:
+        chart: Figura Plotly
+        charts_dir: Diretório de saída
+        index: Índice da pergunta (usado no nome do arquivo)
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    os.makedirs(charts_dir, exist_ok=True)
+    base_path = os.path.join(charts_dir, f"pergunta_{index:04d}")
+    try:
+        chart.write_image(f"{base_path}.png")
+        return f"{base_path}.png"
+    except Exception:
+        chart.write_html(f"{base_path}.html", include_plotlyjs="cdn")
+        return f"{base_path}.html"
+
+
+def main():
+    """Executa o processamento em lote a partir dos argumentos de linha de comando."""
+    parser = argparse.ArgumentParser(description="Processa perguntas sobre a frota em lote")
+    parser.add_argument("questions_file", help="Arquivo de perguntas (.txt, uma por linha, ou .jsonl)")
+    parser.add_argument("--data", default=None, help="CSV de dados (padrão: dados/dados_veiculos_300.csv)")
+    parser.add_argument("--provider", choices=["ollama", "openai"], default="ollama", help="Provedor LLM")
+    parser.add_argument("--model", default=None, help="Modelo LLM")
+    parser.add_argument("--temperature", type=float, default=None, help="Temperatura de geração")
+    parser.add_argument(
+        "--concurrency", type=int, default=DEFAULT_BATCH_CONCURRENCY, help="Consultas simultâneas"
+    )
+    parser.add_argument("--rpm", type=int, default=None, help="Limite de consultas por minuto")
+    parser.add_argument("--output", default="resultados_lote.jsonl", help="Arquivo JSONL de saída")
+    parser.add_argument("--charts-dir", default=None, help="Diretório para salvar os gráficos")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    questions = load_questions(args.questions_file)
+    if not questions:
+        print(" Nenhuma pergunta encontrada")
+        return 1
+
+    df = load_csv_data(args.data)
+    if df is None:
+        print(" Não foi possível carregar os dados")
+        return 1
+
+    orchestrator = AgentOrchestrator(create_handler(args.provider))
+    results = orchestrator.process_batch(
+        questions,
+        df=df,
+        model=args.model,
+        temperature=args.temperature,
+        concurrency=args.concurrency,
+        output_path=args.output,
+        requests_per_minute=args.rpm,
+    )
+
+    charts_saved = 0
+    if args.charts_dir:
+        for result in results:
+            if result["chart"] is not None:
+                save_chart(result["chart"], args.charts_dir, result["index"])
+                charts_saved += 1
+
+    failed = sum(1 for result in results if result["error"])
+    print("=" * 60)
+    print(f" {len(results)} perguntas processadas ({failed} com erro)")
+    print(f" Resultados: {args.output}")
+    if args.charts_dir:
+        print(f" Gráficos salvos: {charts_saved} em {args.charts_dir}")
+    print("=" * 60)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
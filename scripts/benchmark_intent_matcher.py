@@ -0,0 +1,137 @@
+"""
+Microbenchmark da detecção de intenções por palavras-chave
+
+Compara, por mensagem, as varreduras de substring que cada ponto do fluxo fazia
+separadamente (app, pré-filtro do orquestrador, detect_chart_request,
+extract_columns e detect_aggregation) com uma passada do intent_matcher, com e
+sem cache, para entradas curtas e longas.
+
+Uso:
+    python scripts/benchmark_intent_matcher.py --repeat 200
+"""
+
+import argparse
+import random
+import sys
+import os
+import time
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core import intent_matcher
+from src.core.intent_matcher import match_intents
+
+# Tamanhos de entrada (palavras): pergunta curta, parágrafo e resposta longa colada
+INPUT_SIZES = [10, 100, 1000, 5000]
+
+SAMPLE_WORDS = (
+    "o custo médio de manutenção por cidade da frota no último trimestre foi maior que o "
+    "esperado e precisamos entender quais veículos da marca ford tiveram mais alertas "
+    "mostre também a quilometragem mensal e o consumo de combustível em um gráfico"
+).split()
+
+
+def legacy_scan(text: str) -> dict:
+    """
+    Reproduz as varreduras separadas feitas antes do intent_matcher em uma mensagem.
+
+    Args:
+        text: Mensagem do usuário
+
+    Returns:
+        Intenções detectadas (mesmas chaves principais de match_intents)
+    """
+    lower = text.lower()
+    stripped = lower.strip()
+
+    # app.process_user_message: cumprimento e pergunta sobre dados
+    greeting = any(g in stripped for g in intent_matcher.GREETINGS) and len(text.split()) <= 5
+    data_question = any(k in stripped for k in intent_matcher.DATA_KEYWORDS) and not greeting
+
+    def chart_request() -> bool:
+        has_explicit = any(k in lower for k in intent_matcher.CHART_REQUEST_KEYWORDS)
+        has_action = False
+        for action in intent_matcher.ACTION_KEYWORDS:
+            for viz in intent_matcher.VISUALIZATION_KEYWORDS:
+                if action in lower and viz in lower:
+                    has_action = True
+                    break
+            if has_action:
+                break
+        return has_explicit or has_action
+
+    def columns() -> list:
+        found = []
+        for term, col in sorted(intent_matcher.COLUMN_TERMS.items(), key=lambda x: len(x[0]), reverse=True):
+            if term in lower and col not in found:
+                found.append(col)
+        for col in intent_matcher.KNOWN_COLUMNS:
+            if col not in found and any(p in lower for p in (col, col.replace("_", " "), col.replace("_", ""))):
+                found.append(col)
+        return found
+
+    # Pré-filtro do orquestrador + detect_chart_request (tipo e colunas)
+    explicit = any(k in lower for k in intent_matcher.EXPLICIT_CHART_KEYWORDS)
+    requested = chart_request()
+    chart_type = None
+    if requested:
+        for name, keywords in intent_matcher.CHART_TYPE_KEYWORDS.items():
+            if any(k in lower for k in keywords):
+                chart_type = name
+                break
+    # Orquestrador (_is_greeting) e motor de agregações (detect_aggregation, extract_columns)
+    any(g in stripped for g in intent_matcher.GREETINGS)
+    aggregation = next(
+        (name for name, keywords in intent_matcher.AGGREGATION_KEYWORDS.items() if any(k in lower for k in keywords)),
+        None,
+    )
+    return {
+        "chart_request": requested,
+        "explicit_chart_keyword": explicit,
+        "chart_type": chart_type,
+        "columns": columns(),
+        "aggregation": aggregation,
+        "greeting": greeting,
+        "data_question": data_question,
+    }
+
+
+def time_call(fn, text: str, repeat: int) -> float:
+    """Retorna o tempo médio (microssegundos) de fn(text)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def match_uncached(text: str) -> dict:
+    """match_intents sem aproveitar o cache (custo da primeira análise do texto)."""
+    intent_matcher._cache.clear()
+    return match_intents(text)
+
+
+def main():
+    """Função principal do benchmark."""
+    parser = argparse.ArgumentParser(description="Microbenchmark do intent_matcher")
+    parser.add_argument("--repeat", type=int, default=200, help="Repetições por medição (padrão: 200)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente das entradas sintéticas")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    print(f"{'palavras':>9} {'caracteres':>11} {'varreduras':>12} {'matcher':>10} {'com cache':>10} {'ganho':>7}")
+    for size in INPUT_SIZES:
+        text = " ".join(random.choice(SAMPLE_WORDS) for _ in range(size))
+        repeat = max(1, args.repeat // max(1, size // 100))
+
+        legacy_us = time_call(legacy_scan, text, repeat)
+        matcher_us = time_call(match_uncached, text, repeat)
+        cached_us = time_call(match_intents, text, repeat)
+        print(
+            f"{size:>9} {len(text):>11} {legacy_us:>10.1f}us {matcher_us:>8.1f}us "
+            f"{cached_us:>8.1f}us {legacy_us / matcher_us:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Servidor LLM local simulado (Ollama e OpenAI) para benchmarks e testes de carga
+
+Implementa os endpoints usados pelo projeto, sem modelo real:
+- Ollama: GET /api/tags, GET /api/ps, GET /api/version, POST /api/chat e
+  POST /api/generate (streaming em NDJSON)
+- OpenAI: GET /v1/models e POST /v1/chat/completions (streaming em SSE)
+- GET /mock/stats: contadores de requisições, erros e streamings cancelados
+
+Tempo até o primeiro token, tokens por segundo, injeção de erros e respostas fixas
+(ou eco da última mensagem) são configuráveis. Pedidos com JSON schema (format do
+Ollama, response_format da OpenAI) recebem um objeto válido montado a partir do schema.
+
+Os serviços apontam para o servidor só por configuração (.env):
+    OLLAMA_BASE_URL=http://localhost:8765
+    OPENAI_BASE_URL=http://localhost:8765/v1
+
+Uso:
+    python scripts/mock_llm_server.py --port 8765 --ttft 0.3 --tokens-per-second 40
+    python scripts/mock_llm_server.py --mode canned --response "Resposta fixa" --error-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.context_window import estimate_message_tokens
+
+DEFAULT_PORT = 8765
+
+DEFAULT_CONFIG = {
+    "ttft_seconds": 0.2,  # Tempo até o primeiro token
+    "tokens_per_second": 50.0,  # Velocidade de geração (0 = sem espera)
+    "mode": "echo",  # "echo" (repete a última mensagem) ou "canned" (resposta fixa)
+    "response": "Esta é uma resposta simulada do servidor local.",
+    "error_rate": 0.0,  # Fração das requisições de chat que falham
+    "error_status": 500,  # Status HTTP dos erros injetados (429 inclui Retry-After)
+    "models": ["llama3.2:3b", "llama2", "gpt-4o-mini", "gpt-4o"],
+    # Valores fixos nas respostas com JSON schema (ex: {"should_generate_chart": True})
+    "schema_overrides": {},
+}
+
+_TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def split_tokens(text: str) -> List[str]:
+    """
+    Divide o texto em "tokens" (palavras com o espaço seguinte).
+
+    Args:
+        text: Texto da resposta
+
+    Returns:
+        Lista de trechos que concatenados reproduzem o texto
+    """
+    return _TOKEN_PATTERN.findall(text) or [text]
+
+
+def sample_from_schema(schema: Dict[str, Any]) -> Any:
+    """
+    Monta um valor mínimo válido para um JSON schema (enum, tipos simples, objetos).
+
+    Args:
+        schema: JSON schema
+
+    Returns:
+        Valor que satisfaz o schema
+    """
+    if "enum" in schema:
+        return next((value for value in schema["enum"] if value is not None), schema["enum"][0])
+    schema_type = schema.get("type", "object")
+    if isinstance(schema_type, list):
+        schema_type = next((t for t in schema_type if t != "null"), "null")
+    if schema_type == "object":
+        return {name: sample_from_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return []
+    return {"string": "", "integer": 0, "number": 0, "boolean": False, "null": None}.get(schema_type)
+
+
+class MockState:
+    """Configuração e contadores do servidor (compartilhados entre as threads)"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.lock = threading.Lock()
+        self.random = random.Random(self.config.get("seed"))
+        self.stats = {"requests": 0, "chat_requests": 0, "errors_injected": 0, "streams_cancelled": 0}
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.config["error_rate"]
+
+    def response_text(self, messages: List[Dict[str, Any]], schema: Optional[Dict[str, Any]]) -> str:
+        """Texto da resposta: objeto do schema, eco da última mensagem ou resposta fixa."""
+        if schema:
+            value = sample_from_schema(schema)
+            if isinstance(value, dict):
+                value.update({
+                    key: override for key, override in self.config["schema_overrides"].items()
+                    if key in value
+                })
+            return json.dumps(value, ensure_ascii=False)
+        if self.config["mode"] == "echo":
+            last_user = next(
+                (str(msg.get("content") or "") for msg in reversed(messages) if msg.get("role") == "user"),
+                "",
+            )
+            return f"Eco: {last_user}" if last_user else self.config["response"]
+        return self.config["response"]
+
+
+class MockLLMRequestHandler(BaseHTTPRequestHandler):
+    """Atende os endpoints simulados do Ollama e da OpenAI"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "MockLLM/1.0"
+
+    @property
+    def state(self) -> MockState:
+        return self.server.mock_state
+
+    def log_message(self, format, *args):
+        """Silencia o log de acesso padrão."""
+
+    # ------------------------------------------------------------------ envio
+
+    def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _inject_error(self) -> bool:
+        """Responde com erro (conforme error_rate) e retorna True se falhou."""
+        if not self.state.should_fail():
+            return False
+        self.state.count("errors_injected")
+        status = int(self.state.config["error_status"])
+        headers = {"Retry-After": "1"} if status == 429 else None
+        self._send_json(status, {"error": {"message": "Erro simulado pelo servidor local", "code": status}}, headers)
+        return True
+
+    def _token_delay(self, index: int):
+        """Espera do token: TTFT antes do primeiro, 1/tokens_per_second nos demais."""
+        if index == 0:
+            time.sleep(self.state.config["ttft_seconds"])
+        elif self.state.config["tokens_per_second"]:
+            time.sleep(1.0 / self.state.config["tokens_per_second"])
+
+    # ------------------------------------------------------------------ rotas
+
+    def do_GET(self):
+        self.state.count("requests")
+        models = self.state.config["models"]
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name, "model": name, "size": 0} for name in models]})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": []})
+        elif self.path == "/api/version":
+            self._send_json(200, {"version": "0.0.0-mock"})
+        elif self.path == "/v1/models":
+            self._send_json(200, {
+                "object": "list",
+                "data": [{"id": name, "object": "model", "created": 0, "owned_by": "mock"} for name in models],
+            })
+        elif self.path == "/mock/stats":
+            with self.state.lock:
+                self._send_json(200, dict(self.state.stats))
+        else:
+            self._send_json(404, {"error": f"Endpoint não encontrado: {self.path}"})
+
+    def do_POST(self):
+        self.state.count("requests")
+        try:
+            body = self._read_body()
+        except (ValueError, UnicodeDecodeError):
+            self._send_json(400, {"error": "JSON inválido"})
+            return
+
+        if self.path in ("/api/chat", "/api/generate"):
+            self._handle_ollama(body, chat=self.path == "/api/chat")
+        elif self.path == "/v1/chat/completions":
+            self._handle_openai(body)
+        else:
+            self._send_json(404, {"error": f"Endpoint não encontrado: {self.path}"})
+
+    def _generation(self, messages: List[Dict[str, Any]], schema: Optional[Dict[str, Any]], max_tokens: Optional[int]):
+        """Texto, tokens e contagem do prompt de uma requisição de chat."""
+        self.state.count("chat_requests")
+        tokens = split_tokens(self.state.response_text(messages, schema))
+        if max_tokens and max_tokens > 0:
+            tokens = tokens[:max_tokens]
+        return tokens, estimate_message_tokens(messages, "ollama")
+
+    def _handle_ollama(self, body: Dict[str, Any], chat: bool):
+        if self._inject_error():
+            return
+        messages = body.get("messages") or [{"role": "user", "content": body.get("prompt", "")}]
+        schema = body.get("format") if isinstance(body.get("format"), dict) else None
+        options = body.get("options") or {}
+        tokens, prompt_tokens = self._generation(messages, schema, options.get("num_predict"))
+        model = body.get("model", "")
+        start = time.perf_counter()
+
+        def message(content: str, done: bool) -> Dict[str, Any]:
+            payload = {
+                "model": model,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "done": done,
+            }
+            if chat:
+                payload["message"] = {"role": "assistant", "content": content}
+            else:
+                payload["response"] = content
+            if done:
+                elapsed_ns = int((time.perf_counter() - start) * 1e9)
+                payload.update({
+                    "done_reason": "stop",
+                    "total_duration": elapsed_ns,
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(self.state.config["ttft_seconds"] * 1e9),
+                    "eval_count": len(tokens),
+                    "eval_duration": elapsed_ns,
+                })
+            return payload
+
+        if body.get("stream", True) is False:
+            for index in range(len(tokens)):
+                self._token_delay(index)
+            self._send_json(200, message("".join(tokens), True))
+            return
+
+        self._start_stream("application/x-ndjson")
+        try:
+            for index, token in enumerate(tokens):
+                self._token_delay(index)
+                self._write_chunk((json.dumps(message(token, False), ensure_ascii=False) + "\n").encode("utf-8"))
+            self._write_chunk((json.dumps(message("", True)) + "\n").encode("utf-8"))
+            self._end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente encerrou o streaming: a geração é interrompida como no servidor real
+            self.state.count("streams_cancelled")
+            self.close_connection = True
+
+    def _handle_openai(self, body: Dict[str, Any]):
+        if self._inject_error():
+            return
+        response_format = body.get("response_format") or {}
+        schema = (response_format.get("json_schema") or {}).get("schema")
+        messages = body.get("messages") or []
+        tokens, prompt_tokens = self._generation(
+            messages, schema, body.get("max_completion_tokens") or body.get("max_tokens")
+        )
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        model = body.get("model", "")
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+
+        if not body.get("stream"):
+            for index in range(len(tokens)):
+                self._token_delay(index)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        def event(choices: List[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": choices,
+                **(extra or {}),
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        self._start_stream("text/event-stream")
+        try:
+            for index, token in enumerate(tokens):
+                self._token_delay(index)
+                delta = {"content": token, **({"role": "assistant"} if index == 0 else {})}
+                self._write_chunk(event([{"index": 0, "delta": delta, "finish_reason": None}]))
+            self._write_chunk(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                self._write_chunk(event([], {"usage": usage}))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._end_stream()
+        except (BrokenPipeError, ConnectionResetError):
+            self.state.count("streams_cancelled")
+            self.close_connection = True
+
+
+def create_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT, config: Optional[Dict[str, Any]] = None):
+    """
+    Cria o servidor simulado (ainda não iniciado).
+
+    Args:
+        host: Endereço de escuta
+        port: Porta (0 = porta livre escolhida pelo sistema)
+        config: Sobrescreve valores de DEFAULT_CONFIG
+
+    Returns:
+        ThreadingHTTPServer com o estado em server.mock_state
+    """
+    server = ThreadingHTTPServer((host, port), MockLLMRequestHandler)
+    server.daemon_threads = True
+    server.mock_state = MockState(config)
+    return server
+
+
+def start_in_background(config: Optional[Dict[str, Any]] = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Inicia o servidor em uma thread (uso em testes e benchmarks).
+
+    Args:
+        config: Sobrescreve valores de DEFAULT_CONFIG
+        host: Endereço de escuta
+        port: Porta (0 = porta livre)
+
+    Returns:
+        Tupla (servidor, URL base); encerre com server.shutdown()
+    """
+    server = create_server(host, port, config)
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    """Função principal do servidor."""
+    parser = argparse.ArgumentParser(description="Servidor LLM local simulado (Ollama e OpenAI)")
+    parser.add_argument("--host", default="127.0.0.1", help="Endereço de escuta (padrão: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Porta (padrão: {DEFAULT_PORT})")
+    parser.add_argument("--ttft", type=float, default=DEFAULT_CONFIG["ttft_seconds"],
+                        help="Tempo até o primeiro token, em segundos")
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_CONFIG["tokens_per_second"],
+                        help="Velocidade de geração (0 = sem espera)")
+    parser.add_argument("--mode", choices=["echo", "canned"], default=DEFAULT_CONFIG["mode"],
+                        help="echo: repete a última mensagem; canned: resposta fixa")
+    parser.add_argument("--response", default=DEFAULT_CONFIG["response"], help="Resposta fixa (modo canned)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das requisições que falham (0-1)")
+    parser.add_argument("--error-status", type=int, default=500, help="Status HTTP dos erros (ex: 429, 500, 503)")
+    parser.add_argument("--models", default=",".join(DEFAULT_CONFIG["models"]),
+                        help="Modelos anunciados, separados por vírgula")
+    parser.add_argument("--seed", type=int, default=None, help="Semente da injeção de erros")
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, {
+        "ttft_seconds": args.ttft,
+        "tokens_per_second": args.tokens_per_second,
+        "mode": args.mode,
+        "response": args.response,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "models": [name.strip() for name in args.models.split(",") if name.strip()],
+        "seed": args.seed,
+    })
+    url = f"http://{args.host}:{server.server_address[1]}"
+    print(f"Servidor simulado em {url}")
+    print(f"  OLLAMA_BASE_URL={url}")
+    print(f"  OPENAI_BASE_URL={url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServidor encerrado")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -83,14 +83,32 @@ try:
         load_history,
         list_history_sessions,
         auto_save_history,
+        save_usage,
+        load_usage,
+    )
+    from src.core.data_loader import (
+        load_csv_data,
+        get_data_info,
+        get_data_summary,
+        get_intelligent_data_context,
+        get_versioned_data_context,
     )
-    from src.core.data_loader import load_csv_data, get_data_info, get_data_summary, get_intelligent_data_context
     from src.core.chart_generator import (
         generate_chart_from_request,
         display_chart,
         PLOTLY_AVAILABLE,
     )
     from src.core.agent_orchestrator import AgentOrchestrator
+    from src.core.intent_matcher import match_intents
+    from src.core.aggregate_engine import answer_aggregate_question
+    from src.core.ollama_residency import get_residency_manager, STATUS_LABELS
+    from src.core.ollama_pool import parse_endpoints
+    from src.core.hedged_handler import HedgedLLMHandler
+    from src.core.context_window import fit_messages
+    from src.core.history_compactor import compact_history
+    from src.core.tracing import span, start_span, get_trace, build_waterfall
+    from src.core.metrics import start_metrics_server
+    from src.core.usage_tracker import get_usage_tracker, usage_scope
 
     LLM_AVAILABLE = True
     OPENAI_AVAILABLE = True
@@ -123,6 +141,12 @@ except ImportError as e:
     def get_intelligent_data_context(df):
         return "Dados não disponíveis."
 
+    def get_versioned_data_context(df):
+        return "Dados não disponíveis."
+
+    class HedgedLLMHandler:
+        """Fallback quando o handler composto não está disponível"""
+
     def generate_chart_from_request(df, chart_type, **kwargs):
         return None
 
@@ -148,6 +172,51 @@ except ImportError as e:
     def generate_theme_css(theme):
         return ""
 
+    class _NoopSpan:
+        """Fallback quando o módulo de tracing não está disponível"""
+        trace_id = None
+
+        def set_attribute(self, key, value):
+            pass
+
+        def set_attributes(self, **attributes):
+            pass
+
+        def context(self):
+            return {}
+
+        def end(self, error=None):
+            pass
+
+    def start_span(name, attributes=None, parent=None):
+        return _NoopSpan()
+
+    def span(name, **attributes):
+        from contextlib import nullcontext
+        return nullcontext(_NoopSpan())
+
+    def get_trace(trace_id):
+        return []
+
+    def start_metrics_server(host=None, port=None):
+        return None
+
+    def get_usage_tracker():
+        return None
+
+    def usage_scope(session_id=None, prompt=None):
+        from contextlib import nullcontext
+        return nullcontext()
+
+    def save_usage(session_id, usage):
+        return None
+
+    def load_usage(session_id):
+        return None
+
+    def build_waterfall(spans):
+        return []
+
 
 # ============================================================================
 # CONSTANTES E CONFIGURAÇÕES
@@ -402,6 +471,37 @@ def process_audio_file(audio_file, transcription_method):
         raise Exception(f"Erro ao transcrever áudio: {error_msg}")
 
 
+def get_conversation_history():
+    """
+    Retorna o histórico anterior à pergunta atual para envio ao modelo.
+    
+    Em sessões longas, os turnos antigos são substituídos por uma memória resumida
+    (salva por sessão e reutilizada até acumularem mais turnos).
+    
+    Returns:
+        Lista de mensagens (cópias, sem alterar o histórico da sessão)
+    """
+    history = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in st.session_state.messages[:-1]
+    ]
+    if not HISTORY_AVAILABLE:
+        return history
+    
+    try:
+        with span("history.compact", messages=len(history)):
+            return compact_history(
+                history,
+                st.session_state.llm_handler,
+                session_id="current",
+                provider=st.session_state.llm_provider,
+                model=st.session_state.selected_model,
+            )
+    except Exception as e:
+        logger.warning(f"Erro ao compactar histórico: {str(e)}")
+        return history
+
+
 def process_user_message(user_input):
     """
     Processa uma mensagem do usuário: valida, adiciona ao histórico, gera resposta e salva.
@@ -430,6 +530,17 @@ def process_user_message(user_input):
     
     logger.info(f"Mensagem do usuário recebida: {len(user_input)} caracteres")
     
+    # Span raiz da pergunta (cascata exibida no painel de depuração da sidebar)
+    request_span = start_span(
+        "process_user_message",
+        attributes={
+            "provider": st.session_state.llm_provider,
+            "model": st.session_state.selected_model,
+            "orchestrator": bool(st.session_state.use_agent_orchestrator),
+            "question_chars": len(user_input),
+        },
+    )
+    
     # Adicionar mensagem do usuário no histórico
     st.session_state.messages.append({"role": "user", "content": user_input})
     
@@ -465,23 +576,8 @@ def process_user_message(user_input):
             logger.info("Usando orquestrador de agentes (dois agentes especialistas)")
             
             # Verificar se a pergunta é sobre dados antes de preparar contexto
-            user_input_lower = user_input.lower().strip()
-            
-            # Palavras-chave que indicam que o usuário está perguntando sobre dados
-            data_keywords = [
-                'dados', 'veículo', 'veiculo', 'frota', 'gráfico', 'grafico', 'chart',
-                'análise', 'analise', 'estatística', 'estatistica', 'status',
-                'cidade', 'consumo', 'custo', 'alerta', 'quilometragem', 'km',
-                'marca', 'modelo', 'ano', 'velocidade', 'manutenção', 'manutencao',
-                'visualização', 'visualizacao', 'plot', 'mostre', 'exiba', 'crie', 'gere'
-            ]
-            
-            # Verificar se é um cumprimento simples
-            greetings = ['bom dia', 'boa tarde', 'boa noite', 'olá', 'ola', 'oi', 'hey', 'e aí', 'e ai']
-            is_greeting = any(greeting in user_input_lower for greeting in greetings) and len(user_input.split()) <= 5
-            
-            # Só preparar contexto de dados se o usuário perguntar sobre dados
-            is_data_question = any(keyword in user_input_lower for keyword in data_keywords) and not is_greeting
+            # (cumprimentos simples não recebem contexto de dados)
+            is_data_question = match_intents(user_input)["data_question"]
             
             # Preparar contexto dos dados APENAS se for pergunta sobre dados
             data_context = None
@@ -490,35 +586,53 @@ def process_user_message(user_input):
             if is_data_question and st.session_state.veiculos_df is not None:
                 df = st.session_state.veiculos_df
                 
-                # Gerar contexto inteligente e rico dos dados
-                if DATA_AVAILABLE:
-                    try:
-                        intelligent_context = get_intelligent_data_context(df)
-                        data_context = intelligent_context
-                    except Exception as e:
-                        logger.warning(f"Erro ao gerar contexto inteligente: {e}")
+                # Gerar contexto inteligente e rico dos dados (versionado e reutilizado entre turnos)
+                with span("context.build", rows=len(df)):
+                    if DATA_AVAILABLE:
+                        try:
+                            intelligent_context = get_versioned_data_context(df)
+                            data_context = intelligent_context
+                        except Exception as e:
+                            logger.warning(f"Erro ao gerar contexto inteligente: {e}")
+                            data_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
+                    else:
                         data_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
-                else:
-                    data_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
             else:
                 logger.info(f"Pergunta não é sobre dados ou é cumprimento. Não enviando contexto de dados.")
             
-            # Adicionar delay mínimo para parecer mais humanizado
             import time
-            min_delay = 1.5
-            time.sleep(min_delay)
             
             # Processar com orquestrador de agentes
-            result = st.session_state.agent_orchestrator.process_user_query(
-                user_input=user_input,
-                data_context=data_context,
-                df=df,
-                model=st.session_state.selected_model,
-                temperature=st.session_state.temperature,
-            )
+            with usage_scope("current", user_input):
+                result = st.session_state.agent_orchestrator.process_user_query(
+                    user_input=user_input,
+                    data_context=data_context,
+                    df=df,
+                    model=st.session_state.selected_model,
+                    temperature=st.session_state.temperature,
+                    execution_mode=st.session_state.agent_execution_mode,
+                    # Montado só se a pergunta não for respondida localmente
+                    history=get_conversation_history,
+                )
             
             full_response = result.get("text_response", "")
             
+            timings = result.get("timings") or {}
+            # Respostas locais (sem LLM) não recebem o delay de humanização
+            local_hit = timings.get("mode") == "local"
+            if not local_hit:
+                min_delay = 1.5
+                with span("ui.delay", seconds=min_delay):
+                    time.sleep(min_delay)
+            if timings:
+                logger.info(
+                    f"Latência do orquestrador ({timings.get('mode')}): "
+                    f"total={timings.get('total_seconds', 0):.2f}s, "
+                    f"análise={timings.get('analysis_seconds', 0):.2f}s, "
+                    f"gráficos={timings.get('chart_decision_seconds', 0):.2f}s, "
+                    f"uso de tokens={timings.get('usage')}"
+                )
+            
             # Validar resposta do orquestrador
             if not full_response or (isinstance(full_response, str) and len(full_response.strip()) == 0):
                 full_response = "Desculpe, não consegui gerar uma resposta. Por favor, tente novamente."
@@ -534,8 +648,10 @@ def process_user_message(user_input):
             logger.info(f"Orquestrador processou: resposta={len(full_response)} caracteres, gráfico={'sim' if chart_to_display else 'não'}")
             
             # Adicionar delay adicional baseado no tamanho da resposta
-            additional_delay = min(2.0, max(0.5, len(full_response) / 500))
-            time.sleep(additional_delay)
+            if not local_hit:
+                additional_delay = min(2.0, max(0.5, len(full_response) / 500))
+                with span("ui.delay", seconds=additional_delay):
+                    time.sleep(additional_delay)
             
         else:
             # ============================================================
@@ -543,34 +659,41 @@ def process_user_message(user_input):
             # ============================================================
             logger.info("Usando modo tradicional (um único agente)")
             
-            # Preparar contexto dos dados se disponível
-            messages_to_send = st.session_state.messages.copy()
+            import time
             
-            # Adicionar contexto inteligente dos dados quando disponível
-            if st.session_state.veiculos_df is not None:
-                df = st.session_state.veiculos_df
-                
-                # Gerar contexto inteligente e rico dos dados
-                if DATA_AVAILABLE:
-                    try:
-                        intelligent_context = get_intelligent_data_context(df)
-                    except Exception as e:
-                        logger.warning(f"Erro ao gerar contexto inteligente: {e}")
-                        intelligent_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
-                else:
-                    intelligent_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
+            # Perguntas de agregação simples são respondidas localmente, sem LLM
+            local_result = None
+            if DATA_AVAILABLE and st.session_state.veiculos_df is not None:
+                with span("local_answer") as local_span:
+                    local_result = answer_aggregate_question(user_input, st.session_state.veiculos_df)
+                    local_span.set_attribute("hit", bool(local_result))
+            
+            # Mensagens (e histórico, cuja compactação chama o LLM) só quando o LLM é usado
+            if not local_result:
+                # Montar mensagens com prefixo estável entre turnos (reuso de cache de prompt):
+                # system prompt → contexto versionado dos dados → histórico → pergunta
+                messages_to_send = [
+                    {"role": "system", "content": st.session_state.llm_handler.get_system_prompt()}
+                ]
+            
+                # Adicionar contexto inteligente dos dados quando disponível
+                if st.session_state.veiculos_df is not None:
+                    df = st.session_state.veiculos_df
                 
-                # Adicionar contexto na primeira mensagem ou se for uma nova pergunta sobre dados
-                is_data_question = any(word in user_input.lower() for word in [
-                    'dados', 'veículo', 'veiculo', 'frota', 'gráfico', 'grafico', 
-                    'análise', 'analise', 'estatística', 'estatistica', 'status',
-                    'cidade', 'consumo', 'custo', 'alerta', 'quilometragem', 'km'
-                ])
+                    # Gerar contexto inteligente e rico dos dados (mesmo texto enquanto o dataset não muda)
+                    with span("context.build", rows=len(df)):
+                        if DATA_AVAILABLE:
+                            try:
+                                intelligent_context = get_versioned_data_context(df)
+                            except Exception as e:
+                                logger.warning(f"Erro ao gerar contexto inteligente: {e}")
+                                intelligent_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
+                        else:
+                            intelligent_context = f"Total: {len(df)} veículos | Colunas: {', '.join(df.columns.tolist())}"
                 
-                if len(messages_to_send) == 1 or is_data_question:
-                    data_context = f"""📊 CONTEXTO COMPLETO DOS DADOS DISPONÍVEIS:
-
-{intelligent_context}
+                    messages_to_send.append({
+                        "role": "system",
+                        "content": f"""{intelligent_context}
 
 🚨 INSTRUÇÕES CRÍTICAS:
 - Este é um sistema web que gera gráficos AUTOMATICAMENTE
@@ -579,39 +702,66 @@ def process_user_message(user_input):
 - O gráfico já aparece automaticamente na tela quando solicitado
 - Use os dados acima para fornecer análises precisas e detalhadas
 - Seja específico com números, percentuais e comparações
-- Identifique padrões, tendências e anomalias nos dados
-
-Pergunta do usuário: {user_input}"""
-                    
-                    if len(messages_to_send) == 1:
-                        messages_to_send[0] = {"role": "user", "content": data_context}
-                    else:
-                        # Adicionar contexto antes da última mensagem
-                        messages_to_send[-1]["content"] = data_context
+- Identifique padrões, tendências e anomalias nos dados""",
+                    })
+            
+                # Histórico (compactado em sessões longas)
+                messages_to_send.extend(get_conversation_history())
+                messages_to_send.append({"role": "user", "content": user_input})
             
-            # SEMPRE verificar se é pedido de gráfico e reforçar a instrução
-            user_input_lower = user_input.lower()
-            if any(palavra in user_input_lower for palavra in ['gráfico', 'grafico', 'chart', 'visualização', 'visualizacao', 'plot']):
-                # Modificar a última mensagem do usuário para incluir a instrução
-                ultima_msg = messages_to_send[-1]["content"]
-                messages_to_send[-1]["content"] = f"""🚨 IMPORTANTE: O sistema JÁ gera o gráfico automaticamente. NÃO forneça código. Apenas analise os dados.
+                # SEMPRE verificar se é pedido de gráfico e reforçar a instrução
+                user_input_lower = user_input.lower()
+                if any(palavra in user_input_lower for palavra in ['gráfico', 'grafico', 'chart', 'visualização', 'visualizacao', 'plot']):
+                    # Modificar a última mensagem do usuário para incluir a instrução
+                    ultima_msg = messages_to_send[-1]["content"]
+                    messages_to_send[-1]["content"] = f"""🚨 IMPORTANTE: O sistema JÁ gera o gráfico automaticamente. NÃO forneça código. Apenas analise os dados.
 
     {ultima_msg}
 
     Responda APENAS com análise dos dados (números, percentuais, insights). O gráfico aparece sozinho."""
             
-            # Adicionar delay mínimo para parecer mais humanizado (1-2 segundos)
-            import time
-            min_delay = 1.5  # Delay mínimo em segundos
-            time.sleep(min_delay)
+                # Manter system prompt, contexto dos dados e turnos recentes dentro do orçamento de tokens
+                with span("context.fit") as fit_span:
+                    messages_to_send, window_info = fit_messages(
+                        messages_to_send,
+                        provider=st.session_state.llm_provider,
+                        model=st.session_state.selected_model,
+                    )
+                    fit_span.set_attributes(
+                        estimated_tokens=window_info["estimated_tokens"],
+                        dropped_messages=window_info["dropped_messages"],
+                    )
+                logger.info(
+                    f"Prompt: ~{window_info['estimated_tokens']}/{window_info['budget']} tokens, "
+                    f"{window_info['dropped_messages']} mensagens antigas omitidas"
+                )
             
-            # Gerar resposta
-            response = st.session_state.llm_handler.generate_response(
-                messages=messages_to_send,
-                model=st.session_state.selected_model,
-                temperature=st.session_state.temperature,
-                stream=False,
-            )
+            # Adicionar delay mínimo para parecer mais humanizado (apenas quando o LLM é usado)
+            if not local_result:
+                min_delay = 1.5  # Delay mínimo em segundos
+                with span("ui.delay", seconds=min_delay):
+                    time.sleep(min_delay)
+            
+            if local_result:
+                response = local_result["text_response"]
+            else:
+                # Gerar resposta
+                with span("llm.generate", model=st.session_state.selected_model) as llm_span, \
+                        usage_scope("current", user_input):
+                    response = st.session_state.llm_handler.generate_response(
+                        messages=messages_to_send,
+                        model=st.session_state.selected_model,
+                        temperature=st.session_state.temperature,
+                        stream=False,
+                    )
+                    usage = getattr(st.session_state.llm_handler, "last_usage", None)
+                    if usage:
+                        logger.info(f"Uso de tokens: {usage}")
+                        llm_span.set_attributes(
+                            prompt_tokens=usage.get("prompt_tokens"),
+                            completion_tokens=usage.get("completion_tokens"),
+                            cached_tokens=usage.get("cached_tokens"),
+                        )
             
             full_response = response
             
@@ -624,8 +774,10 @@ Pergunta do usuário: {user_input}"""
             
             # Adicionar delay adicional baseado no tamanho da resposta (simular processamento)
             # Delay adicional: 0.5-2 segundos baseado no tamanho
-            additional_delay = min(2.0, max(0.5, len(full_response) / 500))
-            time.sleep(additional_delay)
+            if not local_result:
+                additional_delay = min(2.0, max(0.5, len(full_response) / 500))
+                with span("ui.delay", seconds=additional_delay):
+                    time.sleep(additional_delay)
         
         # Limpar indicador de pensando
         thinking_placeholder.empty()
@@ -663,10 +815,21 @@ Pergunta do usuário: {user_input}"""
     
     # Salvar histórico automaticamente
     if HISTORY_AVAILABLE:
-        try:
-            auto_save_history(st.session_state.messages, "current")
-        except Exception as e:
-            logger.warning(f"Erro ao salvar histórico: {e}")
+        with span("history.save", messages=len(st.session_state.messages)):
+            try:
+                auto_save_history(st.session_state.messages, "current")
+                # Uso de tokens da sessão salvo ao lado do histórico
+                usage_tracker = get_usage_tracker()
+                if usage_tracker is not None:
+                    save_usage("current", usage_tracker.get_summary("current"))
+            except Exception as e:
+                logger.warning(f"Erro ao salvar histórico: {e}")
+    
+    # A renderização acontece na próxima execução do script e continua a mesma árvore
+    request_span.set_attribute("response_chars", len(response_content))
+    request_span.end()
+    st.session_state.last_trace_id = request_span.trace_id
+    st.session_state.pending_render_span = request_span.context()
     
     # Recarregar para atualizar a interface (já com is_thinking = False)
     st.rerun()
@@ -693,17 +856,56 @@ def initialize_session_state():
         "transcription_method": os.getenv("TRANSCRIPTION_METHOD", default_transcription),  # OpenAI como padrão
         "use_agent_orchestrator": True,  # Usar orquestrador de agentes por padrão
         "agent_orchestrator": None,  # Será inicializado quando o handler estiver pronto
+        # "sequential" ou "concurrent" (Agente de Gráficos em paralelo com a análise)
+        "agent_execution_mode": os.getenv("AGENT_EXECUTION_MODE", "sequential"),
+        # Agente de Análise consulta os dados via ferramentas (por provedor)
+        "agent_tool_mode": {
+            "openai": os.getenv("AGENT_TOOL_MODE_OPENAI", "false").lower() == "true",
+            "ollama": os.getenv("AGENT_TOOL_MODE_OLLAMA", "false").lower() == "true",
+        },
+        # Hedge/failover para o outro provedor quando o primário demora ou falha
+        "llm_hedging": os.getenv("LLM_HEDGING", "false").lower() == "true",
+        "hedge_policy": os.getenv("LLM_HEDGE_POLICY", "balanced"),
     }
     
     for key, value in defaults.items():
         if key not in st.session_state:
             st.session_state[key] = value
     
+    # Uso de tokens salvo junto ao histórico (restaurado uma vez por processo)
+    usage_tracker = get_usage_tracker()
+    if HISTORY_AVAILABLE and usage_tracker is not None and not usage_tracker.has_session("current"):
+        usage_tracker.restore_session("current", load_usage("current"))
+    
     # SEMPRE forçar OpenAI como método de transcrição padrão
     # Isso garante que mesmo se houver valor antigo, será atualizado
     st.session_state["transcription_method"] = "openai"
 
 
+def wrap_with_hedging(primary):
+    """
+    Envolve o handler do provedor selecionado com o outro provedor (hedge/failover).
+    
+    Args:
+        primary: Handler do provedor selecionado
+        
+    Returns:
+        HedgedLLMHandler ou o próprio handler se o hedge estiver desativado/indisponível
+    """
+    if not (st.session_state.llm_hedging and LLM_AVAILABLE and OPENAI_AVAILABLE):
+        return primary
+    try:
+        if st.session_state.llm_provider == "openai":
+            secondary = create_llm_handler(st.session_state.ollama_url, timeout=OLLAMA_TIMEOUT)
+        else:
+            secondary = create_openai_handler(timeout=OLLAMA_TIMEOUT)
+        logger.info(f"Hedge ativo: {primary.provider} -> {secondary.provider}")
+        return HedgedLLMHandler(primary, secondary, policy=st.session_state.hedge_policy)
+    except Exception as e:
+        logger.warning(f"Hedge entre provedores indisponível: {str(e)}")
+        return primary
+
+
 def initialize_llm_handler():
     """Inicializa o handler LLM baseado no provedor selecionado."""
     if st.session_state.llm_handler is not None:
@@ -712,7 +914,9 @@ def initialize_llm_handler():
             AGENT_ORCHESTRATOR_AVAILABLE and 
             st.session_state.agent_orchestrator is None):
             try:
-                st.session_state.agent_orchestrator = AgentOrchestrator(st.session_state.llm_handler)
+                st.session_state.agent_orchestrator = AgentOrchestrator(
+                    st.session_state.llm_handler, tool_mode=st.session_state.agent_tool_mode
+                )
                 logger.info("AgentOrchestrator inicializado")
             except Exception as e:
                 logger.warning(f"Erro ao inicializar AgentOrchestrator: {str(e)}")
@@ -730,12 +934,15 @@ def initialize_llm_handler():
         
         # Verificar conexão silenciosamente na inicialização
         if st.session_state.llm_handler:
+            st.session_state.llm_handler = wrap_with_hedging(st.session_state.llm_handler)
             st.session_state.llm_handler.is_configured()
             
             # Inicializar orquestrador se habilitado
             if (st.session_state.use_agent_orchestrator and AGENT_ORCHESTRATOR_AVAILABLE):
                 try:
-                    st.session_state.agent_orchestrator = AgentOrchestrator(st.session_state.llm_handler)
+                    st.session_state.agent_orchestrator = AgentOrchestrator(
+                        st.session_state.llm_handler, tool_mode=st.session_state.agent_tool_mode
+                    )
                     logger.info("AgentOrchestrator inicializado")
                 except Exception as e:
                     logger.warning(f"Erro ao inicializar AgentOrchestrator: {str(e)}")
@@ -747,6 +954,139 @@ def initialize_llm_handler():
         logger.warning(f"Erro ao inicializar handler LLM: {str(e)}")
 
 
+def ensure_model_residency():
+    """
+    Mantém o modelo padrão e o selecionado carregados no Ollama.
+    
+    Dispara o pré-carregamento em segundo plano (apenas para modelos ainda não
+    carregados) e inicia o monitor que descarrega modelos ociosos sob pressão de memória.
+    """
+    if st.session_state.llm_provider != "ollama" or not LLM_AVAILABLE:
+        return
+    
+    try:
+        from src.config.model_config import RESIDENCY_CONFIG
+        
+        models = [OLLAMA_DEFAULT_MODEL, st.session_state.selected_model]
+        # Com vários servidores, o modelo fica carregado em todos (o pool prefere os que já o têm)
+        for endpoint in parse_endpoints(st.session_state.ollama_url):
+            manager = get_residency_manager(endpoint, timeout=OLLAMA_TIMEOUT)
+            manager.set_protected_models(models)
+            if RESIDENCY_CONFIG.get("preload_on_start", True):
+                manager.ensure_loaded(models)
+            manager.start_monitor()
+    except Exception as e:
+        logger.warning(f"Erro no gerenciador de residência de modelos: {str(e)}")
+
+
+def render_trace_panel(spans):
+    """
+    Exibe a cascata de spans da última pergunta (painel de depuração da sidebar).
+    
+    Args:
+        spans: Spans da árvore da pergunta (tracing.get_trace)
+    """
+    rows = build_waterfall(spans)
+    if not rows:
+        return
+    
+    import html
+    total_ms = max(row["offset_ms"] + row["duration_ms"] for row in rows) or 1.0
+    
+    with st.expander("🐞 Depuração: Última Pergunta", expanded=False):
+        st.caption(f"Duração total: {total_ms / 1000:.2f}s · {len(rows)} spans")
+        lines = []
+        for row in rows:
+            left = row["offset_ms"] / total_ms * 100
+            width = max(row["duration_ms"] / total_ms * 100, 0.5)
+            color = "#dc3545" if row["status"] == "error" else "#667eea"
+            details = html.escape(", ".join(f"{key}={value}" for key, value in row["attributes"].items()))
+            lines.append(
+                f'<div title="{details}" style="font-size: 0.75rem; margin: 2px 0;">'
+                f'<div style="padding-left: {row["depth"] * 10}px;">{html.escape(row["name"])} '
+                f'<span style="opacity: 0.7;">{row["duration_ms"]:.0f} ms</span></div>'
+                f'<div style="position: relative; height: 6px; background: rgba(128,128,128,0.15);">'
+                f'<div style="position: absolute; left: {left:.2f}%; width: {width:.2f}%; height: 6px; '
+                f'background: {color};"></div></div></div>'
+            )
+        st.markdown("".join(lines), unsafe_allow_html=True)
+        st.json([dict(span=row["name"], **row["attributes"]) for row in rows], expanded=False)
+
+
+def render_usage_panel(summary):
+    """
+    Exibe o uso de tokens da sessão: prompt x resposta, prefill x decode e prompts mais caros.
+    
+    Args:
+        summary: Resumo do UsageTracker (get_summary)
+    """
+    totals = (summary or {}).get("totals")
+    if not totals or not totals["calls"]:
+        return
+    
+    import pandas as pd
+    
+    def speed(value):
+        return f"{value:.0f}" if value else "—"
+    
+    def group_table(groups, label):
+        return pd.DataFrame([
+            {
+                label: name,
+                "Chamadas": stats["calls"],
+                "Prompt": stats["prompt_tokens"],
+                "Resposta": stats["completion_tokens"],
+                "Cache": stats["cached_tokens"],
+                "Prefill tok/s": speed(stats["prefill_tokens_per_second"]),
+                "Decode tok/s": speed(stats["decode_tokens_per_second"]),
+                "Média (s)": round(stats["mean_ms"] / 1000, 2),
+                "US$": round(stats["cost_usd"], 4),
+            }
+            for name, stats in groups.items()
+        ])
+    
+    with st.expander("📊 Uso de Tokens da Sessão", expanded=False):
+        prompt_share = totals["prompt_tokens"] / (totals["total_tokens"] or 1) * 100
+        st.caption(
+            f"{totals['calls']} chamadas · {totals['total_tokens']:,} tokens "
+            f"({totals['prompt_tokens']:,} prompt, {totals['completion_tokens']:,} resposta, "
+            f"{totals['cached_tokens']:,} do cache) · US$ {totals['cost_usd']:.4f}"
+        )
+        st.markdown(
+            f'<div title="Prompt {prompt_share:.0f}% · Resposta {100 - prompt_share:.0f}%" '
+            f'style="display: flex; height: 8px; margin-bottom: 0.5rem;">'
+            f'<div style="width: {prompt_share:.1f}%; background: #667eea;"></div>'
+            f'<div style="flex: 1; background: #28a745;"></div></div>',
+            unsafe_allow_html=True,
+        )
+        st.caption(
+            f"Prefill: {speed(totals['prefill_tokens_per_second'])} tok/s · "
+            f"Decode: {speed(totals['decode_tokens_per_second'])} tok/s"
+        )
+        st.markdown("**Por modelo**")
+        st.dataframe(group_table(summary["by_model"], "Modelo"), hide_index=True, use_container_width=True)
+        st.markdown("**Por agente**")
+        st.dataframe(group_table(summary["by_agent"], "Agente"), hide_index=True, use_container_width=True)
+        if summary["expensive_prompts"]:
+            st.markdown("**Prompts mais caros**")
+            st.dataframe(
+                pd.DataFrame([
+                    {
+                        "Prompt": entry["prompt"],
+                        "Agente": entry["agent"],
+                        "Modelo": entry["model"],
+                        "Tokens": entry["total_tokens"],
+                        "Prompt tok": entry["prompt_tokens"],
+                        "Resposta tok": entry["completion_tokens"],
+                        "US$": round(entry["cost_usd"], 4),
+                    }
+                    for entry in summary["expensive_prompts"]
+                ]),
+                hide_index=True,
+                use_container_width=True,
+            )
+
+
 def render_chart_if_requested():
     """
     Detecta se o usuário solicitou um gráfico e renderiza se apropriado.
@@ -759,6 +1099,7 @@ def render_chart_if_requested():
     try:
         from src.core.chart_analyzer import create_smart_chart, detect_chart_request
         from src.core.chart_generator import create_bar_chart, display_chart
+        from src.core.intent_matcher import match_intents
         
         # Verificar se há um gráfico gerado pelo orquestrador
         if hasattr(st.session_state, 'last_generated_chart') and st.session_state.last_generated_chart:
@@ -769,7 +1110,8 @@ def render_chart_if_requested():
             import hashlib
             import time
             chart_key = hashlib.md5(f"{time.time()}_{len(st.session_state.messages)}".encode()).hexdigest()[:8]
-            display_chart(chart, key=f"orchestrator_chart_{chart_key}")
+            with span("ui.chart", source="orchestrator"):
+                display_chart(chart, key=f"orchestrator_chart_{chart_key}")
             
             # Limpar gráfico do session_state após exibir
             st.session_state.last_generated_chart = None
@@ -808,12 +1150,7 @@ def render_chart_if_requested():
             return
         
         # Verificação adicional: garantir que há palavras-chave explícitas
-        user_input_lower = last_user_message.lower()
-        explicit_keywords = [
-            'gráfico', 'grafico', 'chart', 'visualização', 'visualizacao',
-            'plot', 'mostre', 'exiba', 'crie', 'gere'
-        ]
-        has_explicit_request = any(keyword in user_input_lower for keyword in explicit_keywords)
+        has_explicit_request = match_intents(last_user_message)["explicit_chart_keyword"]
         
         if not has_explicit_request:
             logger.info("Solicitação de gráfico detectada, mas sem palavras-chave explícitas. Não gerando gráfico.")
@@ -1336,6 +1673,15 @@ except ImportError:
 # Inicialização do session_state
 initialize_session_state()
 
+# Endpoint /metrics (Prometheus), compartilhado por todas as sessões do processo
+@st.cache_resource(show_spinner=False)
+def start_metrics_endpoint():
+    """Inicia o endpoint /metrics uma única vez por processo (não a cada rerun)."""
+    return start_metrics_server()
+
+
+start_metrics_endpoint()
+
 # Carregar dados de veículos
 if "veiculos_df" not in st.session_state:
     if DATA_AVAILABLE:
@@ -1364,6 +1710,9 @@ OLLAMA_TIMEOUT = int(
 # Auto-inicialização do handler baseado no provedor
 initialize_llm_handler()
 
+# Pré-carregar modelos do Ollama para a primeira resposta não pagar o tempo de carga
+ensure_model_residency()
+
 # ========== SIDEBAR ESQUERDA - CHAT ==========
 with st.sidebar:
     # Header com gradiente roxo
@@ -1548,7 +1897,7 @@ with st.sidebar:
             ollama_url = st.text_input(
                 "URL do servidor Ollama",
                 value=st.session_state.ollama_url,
-                help="URL padrão: http://localhost:11434",
+                help="URL padrão: http://localhost:11434. Vários servidores: separe as URLs por vírgula",
             )
 
             if ollama_url != st.session_state.ollama_url:
@@ -1586,6 +1935,20 @@ with st.sidebar:
                     )
                 if status.get("models"):
                     st.caption(f"Modelos: {', '.join(status['models'])}")
+                for role, stats in (status.get("hedging") or {}).items():
+                    if role == "hedge":
+                        continue
+                    st.caption(
+                        f"{'🥇' if role == 'primary' else '🥈'} {stats['provider']} | "
+                        f"1º token p50: {stats['ttft_p50']:.2f}s, p95: {stats['ttft_p95']:.2f}s | "
+                        f"vitórias: {stats['wins']}/{stats['requests']}"
+                    )
+                for endpoint in status.get("endpoints", []):
+                    st.caption(
+                        f"{'🟢' if endpoint['healthy'] else '🔴'} {endpoint['url']} | "
+                        f"em andamento: {endpoint['in_flight']} | requisições: {endpoint['requests']} | "
+                        f"p50: {endpoint['p50_latency']:.2f}s | p95: {endpoint['p95_latency']:.2f}s"
+                    )
             else:
                 st.error(status["message"])
                 if status.get("error"):
@@ -1695,6 +2058,53 @@ with st.sidebar:
                 st.session_state.previous_model = new_model_input
                 st.rerun()  # Atualizar status do sistema
 
+        # Modo de execução dos agentes especialistas
+        concurrent_agents = st.checkbox(
+            "⚡ Agentes em paralelo",
+            value=st.session_state.agent_execution_mode == "concurrent",
+            help="Inicia o Agente de Gráficos em paralelo com o Agente de Análise para reduzir a latência",
+        )
+        st.session_state.agent_execution_mode = "concurrent" if concurrent_agents else "sequential"
+
+        # Modo ferramentas do Agente de Análise (configurado por provedor)
+        provider = st.session_state.llm_provider
+        tool_mode = st.checkbox(
+            "🧰 Consultar dados via ferramentas",
+            value=st.session_state.agent_tool_mode.get(provider, False),
+            help="O Agente de Análise chama ferramentas (filtro, agregação, top-k, busca por id) "
+                 "em vez de receber o contexto completo dos dados. No Ollama requer um modelo com suporte a tools",
+        )
+        if tool_mode != st.session_state.agent_tool_mode.get(provider, False):
+            st.session_state.agent_tool_mode[provider] = tool_mode
+            if st.session_state.agent_orchestrator is not None:
+                st.session_state.agent_orchestrator.set_tool_mode(provider, tool_mode)
+
+        # Hedge/failover entre Ollama e OpenAI
+        llm_hedging = st.checkbox(
+            "🔀 Hedge entre provedores",
+            value=st.session_state.llm_hedging,
+            help="Se o provedor selecionado demorar para começar a responder (ou falhar), "
+                 "envia a pergunta também ao outro provedor e usa a resposta que chegar primeiro",
+        )
+        if llm_hedging != st.session_state.llm_hedging:
+            st.session_state.llm_hedging = llm_hedging
+            st.session_state.llm_handler = None
+            st.rerun()
+        if st.session_state.llm_hedging:
+            hedge_policies = ["cost", "balanced", "latency"]
+            st.session_state.hedge_policy = st.selectbox(
+                "Política de hedge",
+                hedge_policies,
+                index=hedge_policies.index(st.session_state.hedge_policy)
+                if st.session_state.hedge_policy in hedge_policies else 1,
+                format_func=lambda p: {"cost": "Custo (só failover)", "balanced": "Equilibrada (p95)",
+                                       "latency": "Latência (p50)"}[p],
+                help="Quando acionar o provedor secundário: custo = apenas em erro; "
+                     "equilibrada = após o p95 do primeiro token; latência = após o p50",
+            )
+            if isinstance(st.session_state.llm_handler, HedgedLLMHandler):
+                st.session_state.llm_handler.policy = st.session_state.hedge_policy
+
         # Controle de temperatura
         st.session_state.temperature = st.slider(
             "Criatividade (temperature)",
@@ -1819,6 +2229,34 @@ with st.sidebar:
         num_messages = len(st.session_state.messages)
         current_model = st.session_state.selected_model
 
+        # Prontidão do modelo selecionado (Ollama): evita latência de carga na primeira resposta
+        model_ready_label = "—"
+        if st.session_state.llm_provider == "ollama" and LLM_AVAILABLE:
+            residency = get_residency_manager(
+                (parse_endpoints(st.session_state.ollama_url) or ["http://localhost:11434"])[0],
+                timeout=OLLAMA_TIMEOUT,
+            )
+            model_status = residency.get_model_status(current_model)
+            model_ready_label = STATUS_LABELS.get(model_status, model_status)
+
+        # Tokens de prompt servidos do cache do provedor (prefixo estável entre turnos)
+        cached_tokens_label = "—"
+        if st.session_state.agent_orchestrator is not None:
+            cache_stats = st.session_state.agent_orchestrator.get_prompt_cache_stats()
+            if cache_stats["prompt_tokens"]:
+                cached_tokens_label = (
+                    f"{cache_stats['cached_tokens']}/{cache_stats['prompt_tokens']} "
+                    f"({cache_stats['cache_hit_rate']:.0%})"
+                )
+
+        # Requisições idênticas simultâneas atendidas por uma única chamada (todas as sessões)
+        coalesced_label = "—"
+        if st.session_state.agent_orchestrator is not None:
+            coalescing = st.session_state.agent_orchestrator.get_coalescing_stats()
+            coalesced_total = coalescing["orchestrator"]["coalesced"] + coalescing["llm"]["coalesced"]
+            if coalescing["orchestrator"]["calls"]:
+                coalesced_label = f"{coalesced_total}"
+
         st.markdown(
             f"""
             <div class="status-container">
@@ -1858,11 +2296,49 @@ with st.sidebar:
                         {current_model}
                     </span>
                 </div>
+                <div class="status-item">
+                    <span class="status-label">Modelo Pronto</span>
+                    <span class="status-value" style="color: #667eea;">
+                        {model_ready_label}
+                    </span>
+                </div>
+                <div class="status-item">
+                    <span class="status-label">Tokens em Cache</span>
+                    <span class="status-value" style="color: #667eea;">
+                        {cached_tokens_label}
+                    </span>
+                </div>
+                <div class="status-item">
+                    <span class="status-label">Requisições Agrupadas</span>
+                    <span class="status-value" style="color: #667eea;">
+                        {coalesced_label}
+                    </span>
+                </div>
             </div>
             """,
             unsafe_allow_html=True,
         )
 
+        # Modelo, latência e custo por agente (perfis AGENT_PROFILES)
+        if st.session_state.agent_orchestrator is not None:
+            agent_stats = st.session_state.agent_orchestrator.get_agent_stats()
+            agent_lines = [
+                f"{agent}: {', '.join(stats['models'])} · {stats['calls']} chamadas · "
+                f"{stats['mean_seconds']:.2f}s média · US$ {stats['cost_usd']:.4f}"
+                for agent, stats in agent_stats.items()
+                if stats["calls"]
+            ]
+            if agent_lines:
+                st.caption("🧭 Agentes — " + " | ".join(agent_lines))
+
+    # Tokens por modelo e agente, velocidades de prefill/decode e prompts mais caros
+    usage_tracker = get_usage_tracker()
+    if usage_tracker is not None:
+        render_usage_panel(usage_tracker.get_summary("current"))
+
+    # Preenchido ao fim da execução, depois da renderização da resposta
+    trace_panel = st.empty()
+
     # Histórico completo (colapsável) - movido para a sidebar
     if len(st.session_state.messages) > 2:
         st.markdown("---")
@@ -1890,6 +2366,12 @@ if st.session_state.is_thinking:
 # Área principal para exibir conteúdo/dashboards
 main_area = st.container()
 
+# Renderização da resposta: continua a árvore de spans da pergunta processada na execução anterior
+render_span = None
+if st.session_state.get("pending_render_span"):
+    render_span = start_span("ui.render", parent=st.session_state.pending_render_span)
+    st.session_state.pending_render_span = None
+
 with main_area:
     if not st.session_state.messages:
         # Estado vazio - mostrar ícone e mensagem
@@ -2060,6 +2542,13 @@ with main_area:
         
         # Código de cleanup removido - não precisamos mais pois não usamos efeito de digitação
 
+    if render_span is not None:
+        render_span.end()
+    
+    # Painel de depuração: cascata de spans da última pergunta desta sessão
+    with trace_panel.container():
+        render_trace_panel(get_trace(st.session_state.get("last_trace_id")))
+
     # Prompt e gravador sempre no centro, abaixo da tela
     st.markdown("<br><br>", unsafe_allow_html=True)  # Espaço antes do prompt
 
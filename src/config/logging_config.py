@@ -18,6 +18,41 @@ LOG_FILE = LOG_DIR / "app.log"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
+# Spans de tempo por pergunta (ver src/core/tracing.py).
+# Sobrescrito no .env por TRACING_ENABLED, TRACE_FILE_ENABLED, TRACE_FILE e TRACE_FORMAT
+TRACING_CONFIG = {
+    "enabled": True,
+    "file_enabled": False,  # Gravação em arquivo é opt-in (TRACE_FILE_ENABLED=true)
+    "file": str(LOG_DIR / "traces.jsonl"),
+    "format": "jsonl",  # "jsonl" (um span por linha) ou "otlp" (um ExportTraceServiceRequest por linha)
+    "service_name": "omnilink-ai",
+    "max_spans_per_trace": 500,  # Spans além do limite são descartados (ex: muitas rodadas de ferramentas)
+}
+
+# Endpoint local /metrics no formato do Prometheus (ver src/core/metrics.py).
+# Sobrescrito no .env por METRICS_ENABLED, METRICS_HOST e METRICS_PORT
+METRICS_CONFIG = {
+    "enabled": True,
+    "host": "127.0.0.1",  # Apenas local; usar 0.0.0.0 para coleta a partir de outra máquina
+    "port": 9464,
+}
+
+# Contabilização de tokens e velocidade de geração por sessão, modelo e agente
+# (ver src/core/usage_tracker.py). Sobrescrito no .env por USAGE_TRACKING_ENABLED
+USAGE_TRACKING_CONFIG = {
+    "enabled": True,
+    "max_expensive_prompts": 10,  # Prompts mais caros mantidos por sessão
+    "prompt_preview_chars": 160,  # Trecho do prompt guardado para identificação
+}
+
+# Gravação/reprodução das chamadas de chat ao LLM (ver src/core/llm_cassette.py).
+# Sobrescrito no .env por LLM_CASSETTE_MODE, LLM_CASSETTE_FILE e LLM_CASSETTE_TIMING_SCALE
+LLM_CASSETTE_CONFIG = {
+    "mode": "off",  # "off", "record" (grava as chamadas reais) ou "replay" (serve do arquivo)
+    "file": "data/cassettes/llm_cassette.jsonl",
+    "timing_scale": 1.0,  # Replay: 1.0 = tempo original, 0.5 = duas vezes mais rápido, 0 = sem espera
+}
+
 
 def setup_logging(
     level: str = "INFO",
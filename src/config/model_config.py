@@ -110,6 +110,25 @@ MODEL_RULES = {
     # Para chat, o timeout é automaticamente dobrado (240s)
 }
 
+# ============================================================================
+# RESIDÊNCIA DE MODELOS NA MEMÓRIA (Ollama)
+# ============================================================================
+
+RESIDENCY_CONFIG = {
+    # Tempo que o modelo permanece carregado após a última requisição (formato do Ollama:
+    # "30m", "1h", -1 = para sempre). Pode ser sobrescrito por OLLAMA_KEEP_ALIVE no .env
+    "keep_alive": "30m",
+    # Pré-carregar o modelo padrão e o selecionado ao iniciar o app
+    "preload_on_start": True,
+    # Intervalo de consulta a /api/ps (modelos carregados)
+    "poll_interval_seconds": 30,
+    # Pressão de memória: máximo de modelos carregados e de memória de vídeo (None = sem limite)
+    "max_loaded_models": 2,
+    "max_vram_gb": None,
+    # Apenas modelos sem uso há pelo menos este tempo podem ser descarregados
+    "idle_unload_seconds": 600,
+}
+
 # ============================================================================
 # CONFIGURAÇÕES DE COMPORTAMENTO
 # ============================================================================
@@ -219,6 +238,24 @@ VALIDATION_RULES = {
     "allowed_languages": ["pt-BR", "en-US", "es-ES"],
 }
 
+# ============================================================================
+# COMPACTAÇÃO DO HISTÓRICO (sessões longas)
+# ============================================================================
+
+COMPACTION_CONFIG = {
+    # Modelo usado para resumir turnos antigos (None = usa o modelo selecionado)
+    # Pode ser sobrescrito por OLLAMA_SUMMARY_MODEL no .env
+    "summary_model": None,
+    # Compactar quando o histórico passar deste número de mensagens
+    "threshold_messages": 16,
+    # Mensagens recentes sempre enviadas na íntegra
+    "keep_recent_messages": 6,
+    # O resumo só é refeito quando acumulam mais este número de mensagens
+    "step_messages": 6,
+    # Tamanho máximo do resumo (palavras)
+    "summary_max_words": 200,
+}
+
 # ============================================================================
 # CONFIGURAÇÕES AVANÇADAS
 # ============================================================================
@@ -238,6 +275,87 @@ ADVANCED_CONFIG = {
     "stream_chunk_size": 50,  # Tokens por chunk no streaming
 }
 
+# Pool de servidores Ollama (OLLAMA_BASE_URL com várias URLs separadas por vírgula)
+POOL_CONFIG = {
+    "probe_interval_seconds": 15,  # Intervalo da verificação de /api/tags e /api/ps
+    "probe_timeout_seconds": 3,  # Timeout de cada verificação
+    "eject_seconds": 30,  # Tempo fora do pool após falha antes de nova tentativa
+    "max_consecutive_failures": 3,  # Erros seguidos (não de conexão) que removem o servidor
+    "latency_window": 100,  # Latências mantidas por servidor para estatísticas
+}
+
+# Cache do status de conexão e da lista de modelos (ver health_monitor.py)
+HEALTH_CONFIG = {
+    "refresh_interval_seconds": 30,  # Verificação em segundo plano
+    "ttl_seconds": 120,  # Validade do status "conectado" sem nova verificação
+    "disconnected_ttl_seconds": 5,  # Validade do status "desconectado" (detecta a volta rápido)
+}
+
+# Hedge/failover entre provedores (ver hedged_handler.py)
+# O secundário é acionado quando o primeiro token do primário demora mais que o limite
+HEDGING_CONFIG = {
+    "enabled": False,  # Sobrescrito por LLM_HEDGING=true no .env
+    "default_policy": "balanced",
+    # Modelo usado no provedor secundário (os nomes de modelo diferem entre provedores)
+    "secondary_models": {"openai": "gpt-4o-mini", "ollama": DEFAULT_MODEL},
+    "policies": {
+        # Só troca de provedor em caso de erro (sem custo extra)
+        "cost": {"hedge": False, "failover": True},
+        # Hedge quando o primário passa do seu p95 de tempo até o primeiro token
+        "balanced": {"hedge": True, "failover": True, "ttft_percentile": 0.95, "min_hedge_seconds": 8.0},
+        # Hedge já a partir do p50 (mais requisições duplicadas, menor latência)
+        "latency": {"hedge": True, "failover": True, "ttft_percentile": 0.50, "min_hedge_seconds": 2.0},
+    },
+    "initial_hedge_seconds": 15.0,  # Limite usado até haver amostras suficientes
+    "min_samples": 5,  # Amostras de latência do primário para usar o percentil
+    "latency_window": 100,  # Latências mantidas por provedor
+}
+
+# Modelo e parâmetros por agente do AgentOrchestrator.
+# model=None usa o modelo selecionado pelo usuário. Se o modelo do perfil não estiver
+# instalado ou falhar, o agente usa fallback_model (None = modelo selecionado)
+AGENT_PROFILES = {
+    # Resposta textual: modelo grande escolhido na interface
+    # (num_predict limita a resposta e, com ele, o num_ctx reservado; ver CONTEXT_SIZING_CONFIG)
+    "analysis": {"model": None, "fallback_model": None, "temperature": None, "params": {"num_predict": 1024}},
+    # Decisão de gráfico: só emite um JSON curto
+    "chart": {
+        "model": "llama3.2:3b",
+        "fallback_model": None,
+        "temperature": 0.3,
+        "params": {"num_predict": 200},
+        "structured_output": True,  # JSON schema + streaming encerrado quando o objeto fecha
+    },
+    # Cumprimentos simples (sem contexto de dados)
+    "greeting": {"model": "llama3.2:3b", "fallback_model": None, "temperature": 0.7, "params": {"num_predict": 200}},
+}
+
+# Tamanho da janela de contexto (num_ctx) por requisição (ver context_window.choose_num_ctx).
+# O prompt é medido e somado à resposta máxima (num_predict); o total é arredondado para
+# cima até o próximo bucket. Poucos buckets = poucas recargas do modelo no Ollama
+# (o modelo é recarregado quando num_ctx muda)
+CONTEXT_SIZING_CONFIG = {
+    "enabled": True,
+    "buckets": [2048, 4096, 8192, 16384, 32768],
+    "safety_margin_tokens": 128,  # Folga para o template de chat do modelo
+    # Resposta reservada quando num_predict é -1 (ilimitado)
+    "default_response_tokens": MODEL_RULES["max_response_length"],
+}
+
+# Custo por 1M de tokens (USD) para estatísticas por agente; servidor local não tem custo por token
+MODEL_PRICING = {}
+
+# Limitador de taxa (ver rate_limiter.py), um por servidor Ollama (base_url).
+# Servidor local: sem limites por minuto; a pausa em 429/503 (fila cheia) continua ativa
+RATE_LIMIT_CONFIG = {
+    "requests_per_minute": None,
+    "tokens_per_minute": None,
+    "max_wait_seconds": 120,  # Espera máxima na fila antes de falhar
+    "default_retry_after": 1.0,  # Pausa após 429/503 sem cabeçalho retry-after (segundos)
+    "max_rate_limit_retries": 3,  # Tentativas após 429/503 antes de falhar
+    "default_completion_tokens": 500,  # Estimativa da resposta quando num_predict não é informado
+}
+
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
@@ -285,6 +403,7 @@ def get_model_parameters(temperature: float = None, **kwargs) -> dict:
     - top_p: Nucleus sampling (0.0-1.0)
     - top_k: Top-k sampling (número inteiro)
     - num_predict: Máximo de tokens a gerar (-1 = ilimitado)
+    - num_ctx: Tamanho da janela de contexto (definido por requisição pelo handler se omitido)
     - repeat_penalty: Penalidade por repetição (1.0+)
     - seed: Seed para reprodutibilidade (-1 = aleatório)
 
@@ -315,6 +434,9 @@ def get_model_parameters(temperature: float = None, **kwargs) -> dict:
     elif "use_defaults" not in kwargs or kwargs.get("use_defaults"):
         params["num_predict"] = DEFAULT_NUM_PREDICT
 
+    if "num_ctx" in kwargs:
+        params["num_ctx"] = kwargs["num_ctx"]
+
     if "repeat_penalty" in kwargs:
         params["repeat_penalty"] = kwargs["repeat_penalty"]
 
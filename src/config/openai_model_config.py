@@ -246,6 +246,24 @@ VALIDATION_RULES = {
     "presence_penalty_range": (-2.0, 2.0),
 }
 
+# ============================================================================
+# COMPACTAÇÃO DO HISTÓRICO (sessões longas)
+# ============================================================================
+
+COMPACTION_CONFIG = {
+    # Modelo usado para resumir turnos antigos (modelo pequeno e rápido)
+    # Pode ser sobrescrito por OPENAI_SUMMARY_MODEL no .env
+    "summary_model": "gpt-4o-mini",
+    # Compactar quando o histórico passar deste número de mensagens
+    "threshold_messages": 16,
+    # Mensagens recentes sempre enviadas na íntegra
+    "keep_recent_messages": 6,
+    # O resumo só é refeito quando acumulam mais este número de mensagens
+    "step_messages": 6,
+    # Tamanho máximo do resumo (palavras)
+    "summary_max_words": 200,
+}
+
 # ============================================================================
 # CONFIGURAÇÕES AVANÇADAS
 # ============================================================================
@@ -278,6 +296,34 @@ ADVANCED_CONFIG = {
     "check_code_syntax": True,  # Validar sintaxe de código gerado
 }
 
+# Limitador de taxa compartilhado (token buckets por minuto, ver rate_limiter.py)
+RATE_LIMIT_CONFIG = {
+    "requests_per_minute": ADVANCED_CONFIG["requests_per_minute"] if ADVANCED_CONFIG["respect_rate_limits"] else None,
+    "tokens_per_minute": 200000 if ADVANCED_CONFIG["respect_rate_limits"] else None,  # Ajustar conforme tier
+    "max_wait_seconds": 120,  # Espera máxima na fila antes de falhar
+    "default_retry_after": 2.0,  # Pausa após 429 sem cabeçalho retry-after (segundos)
+    "max_rate_limit_retries": 5,  # Tentativas após 429 antes de falhar
+    "default_completion_tokens": 500,  # Estimativa da resposta quando max_tokens não é informado
+}
+
+# Modelo e parâmetros por agente do AgentOrchestrator.
+# model=None usa o modelo selecionado pelo usuário. Se o modelo do perfil não estiver
+# disponível ou falhar, o agente usa fallback_model (None = modelo selecionado)
+AGENT_PROFILES = {
+    # Resposta textual: modelo grande escolhido na interface
+    "analysis": {"model": None, "fallback_model": None, "temperature": None, "params": {}},
+    # Decisão de gráfico: só emite um JSON curto
+    "chart": {
+        "model": "gpt-4o-mini",
+        "fallback_model": None,
+        "temperature": 0.3,
+        "params": {"max_tokens": 200},
+        "structured_output": True,  # JSON schema + streaming encerrado quando o objeto fecha
+    },
+    # Cumprimentos simples (sem contexto de dados)
+    "greeting": {"model": "gpt-4o-mini", "fallback_model": None, "temperature": 0.7, "params": {"max_tokens": 200}},
+}
+
 # ============================================================================
 # CONFIGURAÇÕES POR MODELO
 # ============================================================================
@@ -327,6 +373,17 @@ MODEL_SPECIFIC_CONFIG = {
     },
 }
 
+# Custo por 1M de tokens (USD), usado nas estatísticas de custo por agente
+MODEL_PRICING = {
+    "gpt-4.1": {"input": 2.00, "output": 8.00},
+    "gpt-4o": {"input": 2.50, "output": 10.00},
+    "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+    "gpt-4-turbo": {"input": 10.00, "output": 30.00},
+    "gpt-4": {"input": 30.00, "output": 60.00},
+    "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
+    "gpt-3.5-turbo-16k": {"input": 3.00, "output": 4.00},
+}
+
 # ============================================================================
 # FUNÇÕES AUXILIARES
 # ============================================================================
@@ -4,14 +4,59 @@ Orquestrador de Agentes Especialistas
 Este módulo coordena dois agentes especialistas trabalhando em conjunto:
 1. Agente de Análise: Responsável por entender perguntas e gerar respostas textuais
 2. Agente de Gráficos: Responsável por gerar gráficos baseado na resposta do primeiro agente
+
+Os agentes podem rodar em sequência (padrão) ou em paralelo, com o Agente de Gráficos
+decidindo de forma especulativa a partir da pergunta, das colunas e do texto parcial da análise.
 """
 
+import json
 import logging
-from typing import Optional, Dict, Any, List
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
+from typing import Callable, Optional, Dict, Any, List, Tuple, Union
 import pandas as pd
 
+from src.core.single_flight import get_single_flight, make_request_key
+from src.core.structured_output import read_json_stream
+from src.core.column_index import get_column_index
+from src.core.intent_matcher import EXPLICIT_CHART_KEYWORDS, match_intents  # noqa: F401 (reexportado)
+from src.core.tracing import span, set_attributes, bind_context
+from src.core.metrics import BATCH_QUEUE_DEPTH, agent_scope
+from src.core.usage_tracker import is_error_response
+
 logger = logging.getLogger(__name__)
 
+# Modos de execução suportados pelo orquestrador
+EXECUTION_MODES = ("sequential", "concurrent")
+
+# Número de amostras de latência mantidas por modo
+LATENCY_HISTORY_SIZE = 200
+
+# Modo ferramentas (tool calling) do Agente de Análise por provedor.
+# Desativado por padrão: no Ollama exige um modelo com suporte a ferramentas
+DEFAULT_TOOL_MODE = {"openai": False, "ollama": False}
+
+# Rodadas máximas de chamadas de ferramentas por resposta
+MAX_TOOL_ROUNDS = 5
+
+# Mensagens anteriores da conversa enviadas ao Agente de Análise
+MAX_HISTORY_MESSAGES = 10
+
+# Consultas simultâneas padrão no processamento em lote
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# Perfis de modelo por agente (AGENT_PROFILES dos arquivos de configuração)
+AGENT_NAMES = ("analysis", "chart", "greeting")
+
+# Tipos de gráfico aceitos no schema da decisão do Agente de Gráficos
+CHART_TYPES = ["bar", "pie", "line", "scatter", "histogram", "box", "heatmap", "area", "violin"]
+
+# Decisão negativa já definida no objeto parcial: o restante não é necessário
+_NO_CHART_PATTERN = re.compile(r'"should_generate_chart"\s*:\s*false')
+
 
 # ============================================================================
 # PROMPTS ESPECIALIZADOS PARA CADA AGENTE
@@ -174,24 +219,97 @@ Se o usuário NÃO solicitou gráfico explicitamente:
 # CLASSE ORQUESTRADOR
 # ============================================================================
 
+def _prepend_chunk(first_chunk: Any, iterator):
+    """Gerador com um chunk já lido seguido do restante do streaming (repassa o close())."""
+    try:
+        yield first_chunk
+        yield from iterator
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+
 class AgentOrchestrator:
     """
     Orquestrador que coordena dois agentes especialistas:
     1. Agente de Análise: Gera respostas textuais
     2. Agente de Gráficos: Determina qual gráfico gerar baseado na resposta
+
+    Suporta dois modos de execução:
+    - "sequential": Agente de Gráficos roda após o Agente de Análise (padrão)
+    - "concurrent": Agente de Gráficos roda em paralelo (especulativo) e a
+      decisão é reconciliada com a resposta final da análise
     """
     
-    def __init__(self, llm_handler):
+    def __init__(
+        self,
+        llm_handler,
+        execution_mode: str = "sequential",
+        speculative_wait_seconds: float = 1.0,
+        local_answer_min_confidence: Optional[float] = None,
+        tool_mode: Optional[Dict[str, bool]] = None,
+        agent_profiles: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
         """
         Inicializa o orquestrador com um handler LLM.
         
         Args:
             llm_handler: Handler LLM (Ollama ou OpenAI) para usar com os agentes
+            execution_mode: "sequential" ou "concurrent"
+            speculative_wait_seconds: Tempo máximo (modo concorrente) aguardando texto
+                parcial da análise antes de iniciar o Agente de Gráficos
+            local_answer_min_confidence: Confiança mínima para responder perguntas de
+                agregação localmente, sem LLM (None usa o padrão do aggregate_engine)
+            tool_mode: Ativa o modo ferramentas por provedor, ex: {"openai": True}.
+                Provedores ausentes usam DEFAULT_TOOL_MODE
+            agent_profiles: Sobrescreve perfis de modelo por agente, ex:
+                {"chart": {"model": None}} (usa AGENT_PROFILES do provedor se None)
         """
+        if execution_mode not in EXECUTION_MODES:
+            logger.warning(f"Modo de execução inválido '{execution_mode}', usando 'sequential'")
+            execution_mode = "sequential"
+        
         self.llm_handler = llm_handler
         self.analysis_agent_prompt = ANALYSIS_AGENT_PROMPT
         self.chart_agent_prompt = CHART_AGENT_PROMPT
-        logger.info("AgentOrchestrator inicializado")
+        self.execution_mode = execution_mode
+        self.speculative_wait_seconds = max(0.0, speculative_wait_seconds)
+        # Protege os contadores abaixo, atualizados pelas threads do modo concorrente e do lote
+        self._agent_stats_lock = threading.Lock()
+        # Latências ponta a ponta (segundos) por modo de execução
+        self.latency_stats = {
+            mode: deque(maxlen=LATENCY_HISTORY_SIZE) for mode in EXECUTION_MODES + ("local",)
+        }
+        self.speculative_stats = {"total": 0, "cancelled": 0}
+        # Pré-filtro local que evita a chamada ao Agente de Gráficos
+        self.chart_gate_stats = {"evaluated": 0, "skipped": 0}
+        # Perguntas de agregação respondidas sem LLM
+        self.local_answer_min_confidence = local_answer_min_confidence
+        self.local_answer_stats = {"answered": 0}
+        # Agente de Análise consultando os dados via ferramentas em vez do contexto completo
+        self.tool_mode = dict(DEFAULT_TOOL_MODE)
+        self.tool_mode.update(tool_mode or {})
+        self.tool_stats = {"calls": 0, "fallbacks": 0}
+        # Tokens de prompt reportados pelo provedor (inclui tokens servidos do cache)
+        self.prompt_cache_stats = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0}
+        # Modelo, latência e custo por agente
+        self.agent_profiles = agent_profiles or {}
+        self.agent_stats = {
+            agent: {
+                "calls": 0,
+                "fallbacks": 0,
+                "seconds": deque(maxlen=LATENCY_HISTORY_SIZE),
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost_usd": 0.0,
+                "models": {},
+            }
+            for agent in AGENT_NAMES
+        }
+        self.chart_decision_stats = {"decisions": 0, "early_stops": 0, "chunks": 0, "parse_seconds": 0.0}
+        self._agent_call_state = threading.local()
+        logger.info(f"AgentOrchestrator inicializado (modo={execution_mode})")
     
     def process_user_query(
         self,
@@ -200,9 +318,17 @@ class AgentOrchestrator:
         df: Optional[pd.DataFrame] = None,
         model: Optional[str] = None,
         temperature: Optional[float] = None,
+        execution_mode: Optional[str] = None,
+        history: Union[List[Dict[str, str]], Callable[[], List[Dict[str, str]]], None] = None,
     ) -> Dict[str, Any]:
         """
-        Processa uma consulta do usuário usando dois agentes em sequência.
+        Processa uma consulta do usuário usando os dois agentes.
+        
+        Perguntas de agregação simples são respondidas localmente antes de qualquer
+        outro passo (o histórico nem chega a ser montado). Consultas idênticas em
+        andamento (mesma pergunta normalizada, modelo, parâmetros, histórico e versão
+        dos dados) são agrupadas: apenas a primeira executa os agentes e as demais
+        recebem uma cópia do mesmo resultado.
         
         Args:
             user_input: Pergunta do usuário
@@ -210,96 +336,895 @@ class AgentOrchestrator:
             df: DataFrame com os dados (opcional, para geração de gráficos)
             model: Modelo LLM a usar
             temperature: Temperatura para geração
+            execution_mode: Sobrescreve o modo de execução configurado ("sequential" ou "concurrent")
+            history: Mensagens anteriores da conversa (sem a pergunta atual) ou função
+                que as retorna, chamada só quando o LLM for usado (ex: compactação do
+                histórico, que também chama o LLM)
             
         Returns:
             Dicionário com:
             - "text_response": Resposta textual do Agente de Análise
             - "chart_config": Configuração do gráfico do Agente de Gráficos (ou None)
             - "chart": Objeto do gráfico gerado (ou None)
+            - "timings": Latências medidas (segundos), modo usado e uso de tokens por agente
+              ("coalesced": True quando o resultado veio de uma consulta idêntica)
         """
+        data_version = None
+        if df is not None:
+            from src.core.data_loader import get_data_version
+            data_version = get_data_version(df)
+        elif data_context:
+            data_version = make_request_key(data_context=data_context)
+        
+        executed = []
+        
+        with span(
+            "orchestrator.query",
+            provider=getattr(self.llm_handler, "provider", None),
+            model=model,
+            data_version=data_version,
+            question_chars=len(user_input),
+        ) as query_span:
+            local_result = self._answer_locally(user_input, df)
+            if local_result:
+                query_span.set_attributes(mode="local", coalesced=False)
+                return local_result
+            
+            # O histórico só é montado quando o LLM vai ser usado
+            if callable(history):
+                history = history()
+            
+            key = make_request_key(
+                provider=getattr(self.llm_handler, "provider", None),
+                base_url=getattr(self.llm_handler, "base_url", None),
+                question=" ".join(user_input.lower().split()),
+                model=model,
+                temperature=temperature,
+                mode=execution_mode or self.execution_mode,
+                tool_mode=self.is_tool_mode_enabled(),
+                history=self._select_history(history),
+                data_version=data_version,
+            )
+            
+            def run_query():
+                executed.append(True)
+                return self._process_user_query(
+                    user_input, data_context, df, model, temperature, execution_mode, history
+                )
+            
+            result = get_single_flight("orchestrator").do(key, run_query)
+            query_span.set_attributes(mode=result.get("timings", {}).get("mode"), coalesced=not executed)
+        if executed:
+            return result
+        
+        # Participante agrupado: cópia própria das métricas
+        logger.info("Consulta idêntica já em andamento: resultado compartilhado")
+        result = dict(result)
+        result["timings"] = dict(result.get("timings", {}), coalesced=True)
+        return result
+    
+    def _process_user_query(
+        self,
+        user_input: str,
+        data_context: Optional[str] = None,
+        df: Optional[pd.DataFrame] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        execution_mode: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> Dict[str, Any]:
+        """Executa os agentes para uma consulta (ver process_user_query)."""
+        mode = execution_mode or self.execution_mode
+        if mode not in EXECUTION_MODES:
+            mode = "sequential"
+        
+        start_time = time.perf_counter()
+        timings: Dict[str, Any] = {"mode": mode, "usage": {}}
+        
         try:
-            logger.info(f"Processando consulta do usuário: {user_input[:100]}...")
+            logger.info(f"Processando consulta do usuário ({mode}): {user_input[:100]}...")
+            
+            if not self._needs_chart_agent(user_input):
+                # Sem pedido de visualização: apenas o Agente de Análise é chamado
+                timings["chart_gate_skipped"] = True
+                set_attributes(chart_gate_skipped=True)
+                phase_start = time.perf_counter()
+                with span("agent.analysis"):
+                    text_response = self._run_analysis_agent(
+                        user_input, data_context, model, temperature, df=df, history=history
+                    )
+                    timings["analysis_seconds"] = time.perf_counter() - phase_start
+                    self._capture_usage("analysis", timings)
+                chart_decision = None
+            elif mode == "concurrent":
+                text_response, chart_decision = self._run_agents_concurrently(
+                    user_input, data_context, df, model, temperature, timings, history
+                )
+            else:
+                text_response, chart_decision = self._run_agents_sequentially(
+                    user_input, data_context, df, model, temperature, timings, history
+                )
             
             # ============================================================
-            # FASE 1: Agente de Análise - Gerar resposta textual
+            # FASE 3: Processar decisão e gerar gráfico se necessário
             # ============================================================
-            logger.info("Fase 1: Agente de Análise gerando resposta...")
+            chart = None
             
-            # Preparar mensagens para o Agente de Análise
-            analysis_messages = [
-                {"role": "system", "content": self.analysis_agent_prompt}
-            ]
+            if chart_decision is None:
+                chart_config = {
+                    "should_generate_chart": False,
+                    "reasoning": "Pré-filtro local: nenhuma solicitação de visualização na pergunta",
+                    "skipped_by_gate": True,
+                }
+            else:
+                # Tentar extrair JSON da resposta
+                parse_start = time.perf_counter()
+                with span("chart.parse", structured=isinstance(chart_decision, dict)) as parse_span:
+                    chart_config = self._parse_chart_decision(chart_decision, user_input, df)
+                    parse_span.set_attribute("should_generate_chart", bool(chart_config.get("should_generate_chart")))
+                timings["chart_parse_seconds"] = time.perf_counter() - parse_start
             
-            # Verificar se é um cumprimento simples
-            user_input_lower = user_input.lower().strip()
-            greetings = ['bom dia', 'boa tarde', 'boa noite', 'olá', 'ola', 'oi', 'hey', 'e aí', 'e ai']
-            is_greeting = any(greeting in user_input_lower for greeting in greetings) and len(user_input.split()) <= 5
+            # No modo concorrente a decisão foi tomada sem a resposta final da análise
+            if mode == "concurrent" and chart_decision is not None:
+                chart_config = self._reconcile_speculative_chart(chart_config, text_response, df)
             
-            # Adicionar contexto dos dados APENAS se disponível E se o usuário perguntou sobre dados
-            if data_context and not is_greeting:
-                # Usuário perguntou sobre dados - enviar contexto
-                analysis_messages.append({
-                    "role": "user",
-                    "content": f"""CONTEXTO DOS DADOS DISPONÍVEIS:
-
-{data_context}
-
-PERGUNTA DO USUÁRIO:
-{user_input}
-
-IMPORTANTE: Analise os dados acima e forneça uma resposta APENAS sobre o que foi perguntado. NÃO mencione código ou gráficos - apenas análise textual."""
-                })
-            elif is_greeting:
-                # Cumprimento simples - resposta amigável sem contexto
-                analysis_messages.append({
-                    "role": "user",
-                    "content": f"{user_input}\n\n(Nota: Esta é uma saudação simples. Responda de forma amigável e ofereça ajuda. NÃO mencione dados, análises ou gráficos.)"
-                })
-            else:
-                # Pergunta geral sem contexto de dados - responder diretamente
-                analysis_messages.append({
-                    "role": "user",
-                    "content": f"{user_input}\n\n(Nota: Responda APENAS o que foi perguntado. NÃO mencione dados, análises ou gráficos a menos que o usuário tenha perguntado especificamente sobre isso.)"
-                })
-            
-            # Gerar resposta do Agente de Análise
-            text_response = self.llm_handler.generate_response(
-                messages=analysis_messages,
+            if chart_config and chart_config.get("should_generate_chart") and df is not None:
+                logger.info(f"Gerando gráfico do tipo: {chart_config.get('chart_type')}")
+                chart_start = time.perf_counter()
+                with span("chart.render", chart_type=chart_config.get("chart_type"), rows=len(df)) as render_span:
+                    chart = self._generate_chart_from_config(df, chart_config)
+                    render_span.set_attribute("rendered", chart is not None)
+                timings["chart_render_seconds"] = time.perf_counter() - chart_start
+            
+            timings["total_seconds"] = self._record_latency(mode, start_time)
+            logger.info(f"Consulta processada em {timings['total_seconds']:.2f}s (modo={mode})")
+            
+            return {
+                "text_response": text_response,
+                "chart_config": chart_config,
+                "chart": chart,
+                "timings": timings,
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro ao processar consulta: {str(e)}", exc_info=True)
+            timings["total_seconds"] = time.perf_counter() - start_time
+            return {
+                "text_response": f"Erro ao processar consulta: {str(e)}",
+                "chart_config": None,
+                "chart": None,
+                "timings": timings,
+            }
+    
+    def process_batch(
+        self,
+        questions: List[str],
+        data_context: Optional[str] = None,
+        df: Optional[pd.DataFrame] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        output_path: Optional[str] = None,
+        requests_per_minute: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Processa uma lista de perguntas independentes (relatórios em lote).
+        
+        O dataset e o contexto dos dados são preparados uma única vez e compartilhados
+        por todas as consultas, executadas em um pool limitado de threads. Os limites
+        do provedor são aplicados a cada chamada pelo limitador de taxa compartilhado
+        (rate_limiter); requests_per_minute espaça adicionalmente o início das consultas.
+        
+        Args:
+            questions: Perguntas a processar (cada uma sem histórico)
+            data_context: Contexto dos dados (gerado a partir de df se None)
+            df: DataFrame com os dados
+            model: Modelo LLM a usar
+            temperature: Temperatura para geração
+            concurrency: Número máximo de consultas simultâneas
+            output_path: Arquivo JSONL onde cada resultado é gravado ao terminar (opcional)
+            requests_per_minute: Limite de consultas iniciadas por minuto (opcional)
+            
+        Returns:
+            Lista de resultados na ordem das perguntas, cada um com "index", "question",
+            "text_response", "chart_config", "chart", "timings" e "error"
+        """
+        if not questions:
+            return []
+        
+        if data_context is None and df is not None:
+            from src.core.data_loader import get_versioned_data_context
+            data_context = get_versioned_data_context(df)
+        
+        concurrency = max(1, min(int(concurrency), len(questions)))
+        min_interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        
+        pacing_lock = threading.Lock()
+        write_lock = threading.Lock()
+        next_start = [time.monotonic()]
+        
+        def wait_for_slot():
+            # Reserva o próximo horário de início permitido pelo limite de requisições
+            with pacing_lock:
+                now = time.monotonic()
+                start_at = max(now, next_start[0])
+                next_start[0] = start_at + min_interval
+            if start_at > now:
+                time.sleep(start_at - now)
+        
+        def run_question(index: int, question: str) -> Dict[str, Any]:
+            BATCH_QUEUE_DEPTH.labels().dec()
+            if min_interval:
+                wait_for_slot()
+            result = self.process_user_query(
+                question,
+                data_context=data_context,
+                df=df,
                 model=model,
                 temperature=temperature,
-                stream=False,
             )
+            text_response = result.get("text_response")
+            error = text_response if is_error_response(text_response) else None
+            return {
+                "index": index,
+                "question": question,
+                "text_response": result.get("text_response"),
+                "chart_config": result.get("chart_config"),
+                "chart": result.get("chart"),
+                "timings": result.get("timings", {}),
+                "error": error,
+            }
+        
+        logger.info(
+            f"Processando lote de {len(questions)} perguntas "
+            f"(concorrência={concurrency}, limite={requests_per_minute or 'sem limite'}/min)"
+        )
+        batch_start = time.perf_counter()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+        output_file = open(output_path, "w", encoding="utf-8") if output_path else None
+        
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+                # Perguntas aguardando uma thread livre (decrementado ao iniciar)
+                BATCH_QUEUE_DEPTH.labels().inc(len(questions))
+                futures = {
+                    executor.submit(run_question, index, question): index
+                    for index, question in enumerate(questions)
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"Erro na pergunta {index} do lote: {str(e)}")
+                        result = {
+                            "index": index,
+                            "question": questions[index],
+                            "text_response": None,
+                            "chart_config": None,
+                            "chart": None,
+                            "timings": {},
+                            "error": str(e),
+                        }
+                    results[index] = result
+                    if output_file:
+                        record = {k: v for k, v in result.items() if k != "chart"}
+                        with write_lock:
+                            output_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                            output_file.flush()
+        finally:
+            if output_file:
+                output_file.close()
+        
+        elapsed = time.perf_counter() - batch_start
+        failed = sum(1 for result in results if result["error"])
+        logger.info(
+            f"Lote concluído em {elapsed:.2f}s: {len(questions) - failed} ok, {failed} com erro "
+            f"({len(questions) / elapsed if elapsed else 0:.2f} perguntas/s)"
+        )
+        return results
+    
+    def _answer_locally(
+        self,
+        user_input: str,
+        df: Optional[pd.DataFrame],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Responde perguntas de agregação simples localmente, sem LLM.
+        
+        Args:
+            user_input: Pergunta do usuário
+            df: DataFrame com os dados (None desativa a resposta local)
+            
+        Returns:
+            Resultado no formato de process_user_query (timings["mode"] == "local")
+            ou None se o LLM deve ser usado
+        """
+        start_time = time.perf_counter()
+        with span("local_answer") as local_span:
+            local_result = self._try_local_answer(user_input, df)
+            local_span.set_attribute("hit", bool(local_result))
+        if not local_result:
+            return None
+        return {
+            "text_response": local_result["text_response"],
+            "chart_config": {
+                "should_generate_chart": False,
+                "reasoning": "Pergunta de agregação respondida localmente",
+            },
+            "chart": None,
+            "timings": {"mode": "local", "usage": {}, "total_seconds": self._record_latency("local", start_time)},
+            "local_query": local_result["query"],
+        }
+    
+    def _try_local_answer(
+        self,
+        user_input: str,
+        df: Optional[pd.DataFrame],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Tenta responder a pergunta com o motor local de agregações.
+        
+        Args:
+            user_input: Pergunta do usuário
+            df: DataFrame com os dados (None desativa a resposta local)
+            
+        Returns:
+            Resultado de answer_aggregate_question ou None se o LLM deve ser usado
+        """
+        if df is None:
+            return None
+        
+        from src.core.aggregate_engine import answer_aggregate_question, DEFAULT_MIN_CONFIDENCE
+        
+        min_confidence = self.local_answer_min_confidence
+        if min_confidence is None:
+            min_confidence = DEFAULT_MIN_CONFIDENCE
+        
+        local_result = answer_aggregate_question(user_input, df, min_confidence=min_confidence)
+        if local_result:
+            self._increment_stat(self.local_answer_stats, "answered")
+        return local_result
+    
+    def _needs_chart_agent(self, user_input: str) -> bool:
+        """
+        Pré-filtro determinístico: verifica se a pergunta pode pedir um gráfico.
+        
+        Usa o pedido de gráfico e as palavras-chave explícitas detectados pelo
+        intent_matcher. Quando nenhum dos dois indica visualização, o Agente de
+        Gráficos concluiria should_generate_chart=False, então a segunda chamada
+        ao LLM é evitada.
+        
+        Args:
+            user_input: Pergunta do usuário
+            
+        Returns:
+            True se o Agente de Gráficos deve ser consultado
+        """
+        self._increment_stat(self.chart_gate_stats, "evaluated")
+        intents = match_intents(user_input)
+        needs_chart = intents["chart_request"] or intents["explicit_chart_keyword"]
+        
+        if not needs_chart:
+            self._increment_stat(self.chart_gate_stats, "skipped")
+            stats = self.get_chart_gate_stats()
+            logger.info(
+                f"Pré-filtro de gráficos: Agente de Gráficos dispensado "
+                f"({stats['skipped']}/{stats['evaluated']} consultas)"
+            )
+        return needs_chart
+    
+    def get_chart_gate_stats(self) -> Dict[str, Any]:
+        """
+        Retorna quantas vezes o pré-filtro dispensou o Agente de Gráficos.
+        
+        Returns:
+            Dicionário com "evaluated", "skipped" e "skip_rate"
+        """
+        with self._agent_stats_lock:
+            stats = dict(self.chart_gate_stats)
+        stats["skip_rate"] = stats["skipped"] / stats["evaluated"] if stats["evaluated"] else 0.0
+        return stats
+    
+    def _run_agents_sequentially(
+        self,
+        user_input: str,
+        data_context: Optional[str],
+        df: Optional[pd.DataFrame],
+        model: Optional[str],
+        temperature: Optional[float],
+        timings: Dict[str, Any],
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> Tuple[str, str]:
+        """
+        Executa o Agente de Análise e depois o Agente de Gráficos.
+        
+        Returns:
+            Tupla (resposta textual, decisão bruta do Agente de Gráficos)
+        """
+        # ============================================================
+        # FASE 1: Agente de Análise - Gerar resposta textual
+        # ============================================================
+        logger.info("Fase 1: Agente de Análise gerando resposta...")
+        phase_start = time.perf_counter()
+        with span("agent.analysis"):
+            text_response = self._run_analysis_agent(
+                user_input, data_context, model, temperature, df=df, history=history
+            )
+            timings["analysis_seconds"] = time.perf_counter() - phase_start
+            self._capture_usage("analysis", timings)
+        
+        # ============================================================
+        # FASE 2: Agente de Gráficos - Determinar gráfico apropriado
+        # ============================================================
+        logger.info("Fase 2: Agente de Gráficos analisando resposta...")
+        phase_start = time.perf_counter()
+        with span("agent.chart"):
+            chart_decision = self._run_chart_agent(user_input, text_response, df, model)
+            timings["chart_decision_seconds"] = time.perf_counter() - phase_start
+            self._capture_usage("chart", timings)
+        
+        return text_response, chart_decision
+    
+    def _run_agents_concurrently(
+        self,
+        user_input: str,
+        data_context: Optional[str],
+        df: Optional[pd.DataFrame],
+        model: Optional[str],
+        temperature: Optional[float],
+        timings: Dict[str, Any],
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> Tuple[str, str]:
+        """
+        Executa o Agente de Análise e o Agente de Gráficos em paralelo.
+        
+        A análise roda em streaming e acumula o texto parcial. O Agente de Gráficos
+        inicia assim que a análise termina ou após speculative_wait_seconds, usando
+        a pergunta, as colunas do df e o texto parcial disponível naquele momento.
+        
+        Returns:
+            Tupla (resposta textual completa, decisão bruta do Agente de Gráficos)
+        """
+        partial_chunks: List[str] = []
+        analysis_start = time.perf_counter()
+        
+        def analysis_task() -> str:
+            try:
+                with span("agent.analysis", streaming=True):
+                    text = self._run_analysis_agent(
+                        user_input, data_context, model, temperature,
+                        partial_chunks=partial_chunks, df=df, history=history,
+                    )
+                    self._capture_usage("analysis", timings)
+                return text
+            finally:
+                timings["analysis_seconds"] = time.perf_counter() - analysis_start
+        
+        def chart_task(partial_text: str, is_partial: bool) -> str:
+            chart_start = time.perf_counter()
+            try:
+                with span("agent.chart", speculative=is_partial, analysis_chars=len(partial_text)):
+                    decision = self._run_chart_agent(user_input, partial_text, df, model, is_partial=is_partial)
+                    self._capture_usage("chart", timings)
+                return decision
+            finally:
+                timings["chart_decision_seconds"] = time.perf_counter() - chart_start
+        
+        # Spans das threads do executor ficam sob o span da consulta (bind_context)
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent") as executor:
+            analysis_future = executor.submit(bind_context(analysis_task))
+            
+            # Aguardar a análise apenas pela janela especulativa
+            done, _ = wait([analysis_future], timeout=self.speculative_wait_seconds)
+            if done:
+                partial_text = analysis_future.result()
+                is_partial = False
+            else:
+                partial_text = "".join(partial_chunks)
+                is_partial = True
+            
+            logger.info(
+                f"Agente de Gráficos iniciado em paralelo "
+                f"(texto da análise: {len(partial_text)} caracteres, parcial={is_partial})"
+            )
+            self._increment_stat(self.speculative_stats, "total")
+            chart_future = executor.submit(bind_context(chart_task), partial_text, is_partial)
             
-            logger.info(f"Agente de Análise gerou resposta: {len(text_response)} caracteres")
+            text_response = analysis_future.result()
+            chart_decision = chart_future.result()
+        
+        timings["used_partial_analysis"] = is_partial
+        timings["partial_analysis_chars"] = len(partial_text)
+        return text_response, chart_decision
+    
+    def _run_analysis_agent(
+        self,
+        user_input: str,
+        data_context: Optional[str],
+        model: Optional[str],
+        temperature: Optional[float],
+        partial_chunks: Optional[List[str]] = None,
+        df: Optional[pd.DataFrame] = None,
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> str:
+        """
+        Executa o Agente de Análise.
+        
+        Args:
+            user_input: Pergunta do usuário
+            data_context: Contexto dos dados (opcional)
+            model: Modelo LLM a usar
+            temperature: Temperatura para geração
+            partial_chunks: Se fornecido, a resposta é gerada em streaming e cada
+                trecho é acrescentado a esta lista assim que chega
+            df: DataFrame com os dados (usado pelo modo ferramentas)
+            history: Mensagens anteriores da conversa
             
-            # ============================================================
-            # FASE 2: Agente de Gráficos - Determinar gráfico apropriado
-            # ============================================================
-            logger.info("Fase 2: Agente de Gráficos analisando resposta...")
-            
-            # Preparar mensagens para o Agente de Gráficos
-            chart_messages = [
-                {"role": "system", "content": self.chart_agent_prompt}
-            ]
-            
-            # Adicionar informações sobre dados disponíveis
-            columns_info = ""
-            if df is not None:
-                columns_info = f"""
-COLUNAS DISPONÍVEIS NO DATASET:
-- Categóricas: {', '.join(df.select_dtypes(include=['object']).columns.tolist())}
-- Numéricas: {', '.join(df.select_dtypes(include=['int64', 'float64']).columns.tolist())}
-"""
+        Returns:
+            Resposta textual completa
+        """
+        # Perguntas sobre dados usam ferramentas quando o provedor está em modo ferramentas
+        if data_context and df is not None and self.is_tool_mode_enabled():
+            text_response = self._run_analysis_agent_with_tools(user_input, df, model, temperature, history)
+            if text_response is not None:
+                if partial_chunks is not None:
+                    partial_chunks.append(text_response)
+                return text_response
+        
+        analysis_messages = self._build_analysis_messages(user_input, data_context, history)
+        agent = "greeting" if self._is_greeting(user_input) else "analysis"
+        
+        if partial_chunks is None:
+            text_response = self._call_agent(agent, analysis_messages, model, temperature)
+        else:
+            response = self._call_agent(agent, analysis_messages, model, temperature, stream=True)
+            if isinstance(response, str):
+                # Handler retornou erro (ou não suporta streaming)
+                partial_chunks.append(response)
+            else:
+                for chunk in response:
+                    partial_chunks.append(chunk)
+            text_response = "".join(partial_chunks)
+        
+        logger.info(f"Agente de Análise gerou resposta: {len(text_response)} caracteres")
+        return text_response
+    
+    def set_tool_mode(self, provider: str, enabled: bool):
+        """
+        Ativa ou desativa o modo ferramentas para um provedor.
+        
+        Args:
+            provider: "openai" ou "ollama"
+            enabled: True para o Agente de Análise consultar os dados via ferramentas
+        """
+        self.tool_mode[provider] = bool(enabled)
+        logger.info(f"Modo ferramentas {'ativado' if enabled else 'desativado'} para {provider}")
+    
+    def is_tool_mode_enabled(self) -> bool:
+        """
+        Verifica se o modo ferramentas está ativo para o provedor do handler atual.
+        
+        Returns:
+            True se o handler suporta ferramentas e o modo está ativo para seu provedor
+        """
+        provider = getattr(self.llm_handler, "provider", None)
+        return bool(
+            self.tool_mode.get(provider)
+            and hasattr(self.llm_handler, "generate_with_tools")
+        )
+    
+    def _run_analysis_agent_with_tools(
+        self,
+        user_input: str,
+        df: pd.DataFrame,
+        model: Optional[str],
+        temperature: Optional[float],
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> Optional[str]:
+        """
+        Executa o Agente de Análise com ferramentas de dados.
+        
+        O prompt leva apenas o esquema do dataset; os números vêm das ferramentas
+        executadas sobre o DataFrame carregado.
+        
+        Args:
+            user_input: Pergunta do usuário
+            df: DataFrame com os dados
+            model: Modelo LLM a usar
+            temperature: Temperatura para geração
+            history: Mensagens anteriores da conversa
             
-            chart_messages.append({
+        Returns:
+            Resposta textual ou None se o modo ferramentas falhar (usa o contexto completo)
+        """
+        from src.core.data_tools import (
+            DATA_TOOLS,
+            TOOL_MODE_PROMPT,
+            create_tool_executor,
+            get_tool_schema_context,
+        )
+        
+        messages = [
+            {"role": "system", "content": f"{self.analysis_agent_prompt}\n\n{TOOL_MODE_PROMPT}"},
+            {"role": "system", "content": f"ESQUEMA DOS DADOS:\n{get_tool_schema_context(df)}"},
+        ]
+        messages.extend(self._select_history(history))
+        messages.append({"role": "user", "content": f"PERGUNTA DO USUÁRIO:\n{user_input}"})
+        
+        profile = self._resolve_agent_profile("analysis", model, temperature)
+        self._start_agent_call("analysis", profile["model"])
+        try:
+            self._increment_stat(self.tool_stats, "calls")
+            with agent_scope("analysis"):
+                text_response = self.llm_handler.generate_with_tools(
+                    messages=messages,
+                    tools=DATA_TOOLS,
+                    tool_executor=create_tool_executor(df),
+                    model=profile["model"],
+                    temperature=profile["temperature"],
+                    max_rounds=MAX_TOOL_ROUNDS,
+                )
+            logger.info(f"Agente de Análise (ferramentas) gerou resposta: {len(text_response)} caracteres")
+            return text_response
+        except Exception as e:
+            self._increment_stat(self.tool_stats, "fallbacks")
+            logger.warning(f"Modo ferramentas falhou, usando contexto completo: {str(e)}")
+            return None
+    
+    def _build_analysis_messages(
+        self,
+        user_input: str,
+        data_context: Optional[str],
+        history: Optional[List[Dict[str, str]]] = None,
+    ) -> List[Dict[str, str]]:
+        """
+        Monta as mensagens enviadas ao Agente de Análise.
+        
+        A ordem é fixa para que o prefixo seja idêntico entre turnos enquanto o
+        dataset não muda (reuso de KV cache / prompt caching do provedor):
+        system prompt → contexto versionado dos dados → histórico → pergunta.
+        
+        Args:
+            user_input: Pergunta do usuário
+            data_context: Contexto dos dados (opcional)
+            history: Mensagens anteriores da conversa (opcional)
+            
+        Returns:
+            Lista de mensagens no formato da API de chat
+        """
+        analysis_messages = [
+            {"role": "system", "content": self.analysis_agent_prompt}
+        ]
+        
+        # Verificar se é um cumprimento simples
+        is_greeting = self._is_greeting(user_input)
+        
+        # Adicionar contexto dos dados APENAS se disponível E se o usuário perguntou sobre dados
+        has_data_context = bool(data_context) and not is_greeting
+        if has_data_context:
+            analysis_messages.append({"role": "system", "content": data_context})
+        
+        analysis_messages.extend(self._select_history(history))
+        
+        if has_data_context:
+            # Usuário perguntou sobre dados - contexto já enviado acima
+            analysis_messages.append({
                 "role": "user",
-                "content": f"""PERGUNTA ORIGINAL DO USUÁRIO (USE PARA VERIFICAR SE HÁ SOLICITAÇÃO EXPLÍCITA DE GRÁFICO):
+                "content": f"""PERGUNTA DO USUÁRIO:
 {user_input}
 
-RESPOSTA DO AGENTE DE ANÁLISE (USE ESTA PARA EXTRAIR INFORMAÇÕES SOBRE COLUNAS E DADOS):
-{text_response}
+IMPORTANTE: Analise os dados do contexto e forneça uma resposta APENAS sobre o que foi perguntado. NÃO mencione código ou gráficos - apenas análise textual."""
+            })
+        elif is_greeting:
+            # Cumprimento simples - resposta amigável sem contexto
+            analysis_messages.append({
+                "role": "user",
+                "content": f"{user_input}\n\n(Nota: Esta é uma saudação simples. Responda de forma amigável e ofereça ajuda. NÃO mencione dados, análises ou gráficos.)"
+            })
+        else:
+            # Pergunta geral sem contexto de dados - responder diretamente
+            analysis_messages.append({
+                "role": "user",
+                "content": f"{user_input}\n\n(Nota: Responda APENAS o que foi perguntado. NÃO mencione dados, análises ou gráficos a menos que o usuário tenha perguntado especificamente sobre isso.)"
+            })
+        
+        return analysis_messages
+    
+    @staticmethod
+    def _is_greeting(user_input: str) -> bool:
+        """
+        Verifica se a pergunta é um cumprimento simples (sem pergunta sobre dados).
+        
+        Args:
+            user_input: Pergunta do usuário
+            
+        Returns:
+            True para mensagens curtas com um cumprimento
+        """
+        return match_intents(user_input)["greeting"]
+    
+    @staticmethod
+    def _select_history(history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
+        """
+        Seleciona as mensagens de histórico enviadas ao Agente de Análise.
+        
+        Args:
+            history: Mensagens anteriores da conversa
+            
+        Returns:
+            Memória resumida inicial (se houver) e as últimas MAX_HISTORY_MESSAGES
+            mensagens de usuário/assistente (cópias)
+        """
+        if not history:
+            return []
+        memory = []
+        for msg in history:
+            if msg.get("role") != "system":
+                break
+            memory.append({"role": "system", "content": msg["content"]})
+        selected = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in history
+            if msg.get("role") in ("user", "assistant") and isinstance(msg.get("content"), str)
+        ]
+        return memory + selected[-MAX_HISTORY_MESSAGES:]
+    
+    def _run_chart_agent(
+        self,
+        user_input: str,
+        text_response: str,
+        df: Optional[pd.DataFrame],
+        model: Optional[str],
+        is_partial: bool = False,
+    ) -> Union[str, Dict[str, Any]]:
+        """
+        Executa o Agente de Gráficos.
+        
+        A decisão é pedida como saída estruturada (JSON schema) e lida em streaming:
+        a geração é encerrada assim que o objeto JSON fecha, ou logo após
+        "should_generate_chart": false.
+        
+        Args:
+            user_input: Pergunta original do usuário
+            text_response: Resposta (completa ou parcial) do Agente de Análise
+            df: DataFrame com os dados (para listar colunas)
+            model: Modelo LLM a usar
+            is_partial: True se text_response pode estar incompleta (modo concorrente)
+            
+        Returns:
+            Decisão já lida (dicionário) ou texto bruto com JSON (handler sem streaming
+            ou mensagem de erro)
+        """
+        chart_messages = self._build_chart_messages(user_input, text_response, df, is_partial)
+        
+        # Gerar decisão do Agente de Gráficos (perfil com modelo pequeno e temperatura baixa)
+        response = self._call_agent(
+            "chart", chart_messages, model, temperature=0.3, stream=True,
+            response_format=self._build_chart_schema(df),
+        )
+        if isinstance(response, str):
+            logger.info(f"Agente de Gráficos retornou decisão: {response[:200]}...")
+            return response
+        
+        result = read_json_stream(response, stop_when=_NO_CHART_PATTERN.search)
+        call = getattr(self._agent_call_state, "call", None)
+        if call is not None:
+            call["chunks"] = result["chunks"]
+        with self._agent_stats_lock:
+            self.chart_decision_stats["decisions"] += 1
+            self.chart_decision_stats["chunks"] += result["chunks"]
+            self.chart_decision_stats["parse_seconds"] += result["parse_seconds"]
+            if result["stopped_early"]:
+                self.chart_decision_stats["early_stops"] += 1
+        set_attributes(chunks=result["chunks"], stopped_early=result["stopped_early"])
+        
+        if result["stopped_by_condition"]:
+            logger.info(f"Agente de Gráficos: sem gráfico (streaming encerrado após {result['chunks']} chunks)")
+            return {"should_generate_chart": False, "reasoning": "Agente de Gráficos: gráfico não solicitado"}
+        if result["object"] is not None:
+            logger.info(f"Agente de Gráficos retornou decisão estruturada ({result['chunks']} chunks)")
+            return result["object"]
+        
+        # Sem objeto JSON completo: o texto segue para a extração tolerante
+        logger.info(f"Agente de Gráficos retornou decisão: {result['text'][:200]}...")
+        return result["text"]
+    
+    @staticmethod
+    def _build_chart_schema(df: Optional[pd.DataFrame]) -> Dict[str, Any]:
+        """
+        Monta o JSON schema da decisão do Agente de Gráficos.
+        
+        As colunas ficam restritas às do DataFrame. O campo "reasoning" do prompt
+        fica de fora para reduzir os tokens gerados.
+        
+        Args:
+            df: DataFrame com os dados (None aceita qualquer nome de coluna)
+            
+        Returns:
+            Dicionário {"name": ..., "schema": ...} aceito pelos handlers como response_format
+        """
+        column = {"type": ["string", "null"]}
+        if df is not None:
+            column["enum"] = [str(col) for col in df.columns] + [None]
+        properties = {
+            "should_generate_chart": {"type": "boolean"},
+            "chart_type": {"type": ["string", "null"], "enum": CHART_TYPES + [None]},
+            "x_column": column,
+            "y_column": column,
+            "category_column": column,
+            "title": {"type": ["string", "null"]},
+        }
+        return {
+            "name": "chart_decision",
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False,
+            },
+        }
+    
+    def get_chart_decision_stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas das decisões lidas em streaming pelo Agente de Gráficos.
+        
+        Returns:
+            Dicionário com "decisions", "early_stops", "chunks", "parse_seconds" e
+            "mean_chunks" (chunks por decisão, aproximação dos tokens gerados)
+        """
+        with self._agent_stats_lock:
+            stats = dict(self.chart_decision_stats)
+        stats["mean_chunks"] = stats["chunks"] / stats["decisions"] if stats["decisions"] else 0.0
+        return stats
+    
+    def _build_chart_messages(
+        self,
+        user_input: str,
+        text_response: str,
+        df: Optional[pd.DataFrame],
+        is_partial: bool = False,
+    ) -> List[Dict[str, str]]:
+        """
+        Monta as mensagens enviadas ao Agente de Gráficos.
+        
+        Args:
+            user_input: Pergunta original do usuário
+            text_response: Resposta (completa ou parcial) do Agente de Análise
+            df: DataFrame com os dados (para listar colunas)
+            is_partial: True se text_response pode estar incompleta
+            
+        Returns:
+            Lista de mensagens no formato da API de chat
+        """
+        chart_messages = [
+            {"role": "system", "content": self.chart_agent_prompt}
+        ]
+        
+        # Colunas disponíveis logo após o system prompt: prefixo estável entre turnos
+        if df is not None:
+            chart_messages.append({
+                "role": "system",
+                "content": f"""COLUNAS DISPONÍVEIS NO DATASET:
+- Categóricas: {', '.join(df.select_dtypes(include=['object']).columns.tolist())}
+- Numéricas: {', '.join(df.select_dtypes(include=['int64', 'float64']).columns.tolist())}""",
+            })
+        
+        if is_partial:
+            response_header = (
+                "RESPOSTA PARCIAL DO AGENTE DE ANÁLISE (AINDA EM GERAÇÃO - PODE ESTAR INCOMPLETA OU VAZIA; "
+                "SE NECESSÁRIO, BASEIE-SE NA PERGUNTA E NAS COLUNAS DISPONÍVEIS):"
+            )
+        else:
+            response_header = "RESPOSTA DO AGENTE DE ANÁLISE (USE ESTA PARA EXTRAIR INFORMAÇÕES SOBRE COLUNAS E DADOS):"
+        
+        chart_messages.append({
+            "role": "user",
+            "content": f"""PERGUNTA ORIGINAL DO USUÁRIO (USE PARA VERIFICAR SE HÁ SOLICITAÇÃO EXPLÍCITA DE GRÁFICO):
+{user_input}
 
-{columns_info}
+{response_header}
+{text_response}
 
 INSTRUÇÕES CRÍTICAS:
 1. PRIMEIRO: Verifique na pergunta original se o usuário EXPLICITAMENTE solicitou um gráfico/visualização.
@@ -330,48 +1255,386 @@ Se a resposta menciona "distribuição de veículos por status":
 → title: "Distribuição de Veículos por Status"
 
 Retorne APENAS um JSON válido com a configuração. NÃO adicione texto antes ou depois do JSON."""
-            })
-            
-            # Gerar decisão do Agente de Gráficos
-            chart_decision = self.llm_handler.generate_response(
-                messages=chart_messages,
-                model=model,
-                temperature=0.3,  # Temperatura mais baixa para decisões mais consistentes
-                stream=False,
-            )
-            
-            logger.info(f"Agente de Gráficos retornou decisão: {chart_decision[:200]}...")
-            
-            # ============================================================
-            # FASE 3: Processar decisão e gerar gráfico se necessário
-            # ============================================================
-            chart_config = None
-            chart = None
+        })
+        
+        return chart_messages
+    
+    def _reconcile_speculative_chart(
+        self,
+        chart_config: Optional[Dict[str, Any]],
+        text_response: str,
+        df: Optional[pd.DataFrame] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reconcilia a decisão especulativa do Agente de Gráficos com a resposta final da análise.
+        
+        O gráfico é cancelado se a análise falhou ou se ela trata de colunas
+        diferentes das escolhidas para o gráfico.
+        
+        Args:
+            chart_config: Configuração extraída da decisão especulativa
+            text_response: Resposta final do Agente de Análise
+            df: DataFrame com os dados (colunas procuradas pelo índice do schema)
             
-            # Tentar extrair JSON da resposta
-            chart_config = self._parse_chart_decision(chart_decision, user_input, df)
+        Returns:
+            Configuração reconciliada (com should_generate_chart=False se cancelado)
+        """
+        if not chart_config or not chart_config.get("should_generate_chart"):
+            return chart_config
+        
+        reason = None
+        stripped = (text_response or "").strip()
+        if not stripped or is_error_response(stripped):
+            reason = "Resposta final da análise indica erro"
+        else:
+            from src.core.chart_analyzer import extract_columns
             
-            if chart_config and chart_config.get("should_generate_chart") and df is not None:
-                logger.info(f"Gerando gráfico do tipo: {chart_config.get('chart_type')}")
-                chart = self._generate_chart_from_config(df, chart_config)
+            chart_columns = {
+                chart_config.get(key)
+                for key in ("x_column", "y_column", "category_column")
+                if chart_config.get(key)
+            }
+            chart_columns.update(chart_config.get("columns") or [])
+            analysis_columns = set(
+                extract_columns(stripped, columns=df.columns if df is not None else None)
+            )
             
+            if chart_columns and analysis_columns and not (chart_columns & analysis_columns):
+                reason = (
+                    f"Análise final trata de {sorted(analysis_columns)}, "
+                    f"mas o gráfico especulativo usa {sorted(chart_columns)}"
+                )
+        
+        if reason:
+            self._increment_stat(self.speculative_stats, "cancelled")
+            logger.info(f"Gráfico especulativo cancelado: {reason}")
             return {
-                "text_response": text_response,
-                "chart_config": chart_config,
-                "chart": chart,
+                "should_generate_chart": False,
+                "reasoning": f"Gráfico especulativo cancelado: {reason}",
+                "cancelled_config": chart_config,
             }
+        
+        return chart_config
+    
+    def _capture_usage(self, agent: str, timings: Dict[str, Any]):
+        """
+        Registra o uso de tokens reportado pelo provedor na última chamada desta thread.
+        
+        Args:
+            agent: "analysis" ou "chart"
+            timings: Dicionário de métricas da consulta (recebe timings["usage"][agent])
+        """
+        usage = getattr(self.llm_handler, "last_usage", None)
+        call = getattr(self._agent_call_state, "call", None)
+        if call is not None:
+            self._agent_call_state.call = None
+            timings.setdefault("models", {})[agent] = call["model"]
+            self._record_agent_call(call, usage if isinstance(usage, dict) else None)
+        if not isinstance(usage, dict):
+            return
+        set_attributes(
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            cached_tokens=usage.get("cached_tokens"),
+        )
+        timings.setdefault("usage", {})[agent] = usage
+        with self._agent_stats_lock:
+            self.prompt_cache_stats["calls"] += 1
+            self.prompt_cache_stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            self.prompt_cache_stats["cached_tokens"] += usage.get("cached_tokens") or 0
+        if usage.get("cached_tokens"):
+            logger.info(
+                f"Agente {agent}: {usage['cached_tokens']} de {usage.get('prompt_tokens', 0)} "
+                f"tokens do prompt servidos do cache"
+            )
+    
+    # ------------------------------------------------------------------
+    # Perfis de modelo por agente
+    # ------------------------------------------------------------------
+    
+    def _get_agent_config(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, float]]]:
+        """Retorna (AGENT_PROFILES, MODEL_PRICING) do provedor do handler atual."""
+        if getattr(self.llm_handler, "provider", None) == "openai":
+            from src.config.openai_model_config import AGENT_PROFILES, MODEL_PRICING
+        else:
+            from src.config.model_config import AGENT_PROFILES, MODEL_PRICING
+        return AGENT_PROFILES, MODEL_PRICING
+    
+    def _resolve_agent_profile(
+        self,
+        agent: str,
+        model: Optional[str],
+        temperature: Optional[float],
+    ) -> Dict[str, Any]:
+        """
+        Resolve o modelo e os parâmetros usados por um agente.
+        
+        Args:
+            agent: "analysis", "chart" ou "greeting"
+            model: Modelo selecionado pelo usuário
+            temperature: Temperatura selecionada pelo usuário
             
+        Returns:
+            Dicionário com "model", "fallback_model" (None se não houver),
+            "temperature", "params" (parâmetros extras do modelo) e "structured_output"
+        """
+        profiles, _ = self._get_agent_config()
+        profile = dict(profiles.get(agent) or {})
+        profile.update(self.agent_profiles.get(agent) or {})
+        
+        profile_model = profile.get("model") or model
+        fallback_model = profile.get("fallback_model") or model
+        if profile_model != fallback_model and not self._is_model_available(profile_model):
+            logger.info(f"Modelo '{profile_model}' do agente {agent} indisponível, usando '{fallback_model}'")
+            self._increment_agent_stat(agent, "fallbacks")
+            profile_model = fallback_model
+        
+        return {
+            "model": profile_model,
+            "fallback_model": fallback_model if fallback_model != profile_model else None,
+            "temperature": profile["temperature"] if profile.get("temperature") is not None else temperature,
+            "params": dict(profile.get("params") or {}),
+            "structured_output": bool(profile.get("structured_output")),
+        }
+    
+    def _is_model_available(self, model: str) -> bool:
+        """
+        Verifica se o modelo está na lista de modelos do handler (servida do cache de saúde).
+        
+        Lista vazia ou indisponível conta como disponível: a falha é tratada pelo fallback.
+        """
+        list_models = getattr(self.llm_handler, "list_available_models", None)
+        if list_models is None:
+            return True
+        try:
+            available = list_models()
+        except Exception:
+            return True
+        if not isinstance(available, (list, tuple, set)) or not available:
+            return True
+        return model in available or f"{model}:latest" in available
+    
+    def _call_agent(
+        self,
+        agent: str,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        temperature: Optional[float],
+        stream: bool = False,
+        response_format: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Chama o LLM com o perfil do agente, repetindo com o modelo de fallback em caso de erro.
+        
+        Args:
+            agent: "analysis", "chart" ou "greeting"
+            messages: Mensagens do agente
+            model: Modelo selecionado pelo usuário
+            temperature: Temperatura selecionada pelo usuário
+            stream: Se True, a resposta pode ser um iterador de chunks
+            response_format: Schema da saída estruturada (usado se o perfil tiver
+                structured_output=True)
+            
+        Returns:
+            Resposta do handler (texto, mensagem de erro ou iterador)
+        """
+        profile = self._resolve_agent_profile(agent, model, temperature)
+        if response_format and profile["structured_output"]:
+            profile["params"]["response_format"] = response_format
+        try:
+            response = self._generate_agent_response(agent, messages, profile["model"], profile, stream)
+            error = response if is_error_response(response) else None
         except Exception as e:
-            logger.error(f"Erro ao processar consulta: {str(e)}", exc_info=True)
-            return {
-                "text_response": f"Erro ao processar consulta: {str(e)}",
-                "chart_config": None,
-                "chart": None,
+            if not profile["fallback_model"]:
+                raise
+            response, error = None, f"Erro: {str(e)}"
+        
+        if profile["fallback_model"] and error is not None:
+            logger.warning(
+                f"Agente {agent} falhou com '{profile['model']}', repetindo com '{profile['fallback_model']}': "
+                f"{error[:100]}"
+            )
+            self._increment_agent_stat(agent, "fallbacks")
+            set_attributes(failed_model=profile["model"])
+            response = self._generate_agent_response(agent, messages, profile["fallback_model"], profile, stream)
+        return response
+    
+    def _generate_agent_response(
+        self,
+        agent: str,
+        messages: List[Dict[str, str]],
+        model: Optional[str],
+        profile: Dict[str, Any],
+        stream: bool,
+    ):
+        """
+        Faz uma chamada do agente com o modelo informado.
+        
+        Em streaming com modelo de fallback, o primeiro chunk é lido aqui: erros do
+        modelo (não instalado, falha no início da geração) surgem ao iterar e, sem a
+        leitura antecipada, chegariam ao consumidor sem passar pelo fallback.
+        """
+        self._start_agent_call(agent, model)
+        with agent_scope(agent):
+            response = self.llm_handler.generate_response(
+                messages=messages,
+                model=model,
+                temperature=profile["temperature"],
+                stream=stream,
+                **profile["params"],
+            )
+            if stream and profile["fallback_model"] and response is not None and not isinstance(response, str):
+                iterator = iter(response)
+                try:
+                    first_chunk = next(iterator)
+                except StopIteration:
+                    return iter(())
+                response = _prepend_chunk(first_chunk, iterator)
+        return response
+    
+    def _start_agent_call(self, agent: str, model: Optional[str]):
+        """Marca o início de uma chamada do agente nesta thread (concluída em _capture_usage)."""
+        self._agent_call_state.call = {"agent": agent, "model": model, "start": time.perf_counter()}
+        set_attributes(model=model)
+    
+    def _increment_agent_stat(self, agent: str, field: str):
+        """Incrementa um contador das estatísticas do agente."""
+        self._increment_stat(self.agent_stats[agent], field)
+    
+    def _increment_stat(self, stats: Dict[str, Any], field: str, amount: int = 1):
+        """Incrementa um contador de estatísticas sob o lock compartilhado (threads do modo concorrente e do lote)."""
+        with self._agent_stats_lock:
+            stats[field] += amount
+    
+    def _record_agent_call(self, call: Dict[str, Any], usage: Optional[Dict[str, Any]]):
+        """
+        Registra latência, tokens e custo estimado de uma chamada de agente.
+        
+        Args:
+            call: Dados da chamada (agente, modelo e instante de início)
+            usage: Uso de tokens reportado pelo provedor (None se indisponível)
+        """
+        _, pricing = self._get_agent_config()
+        elapsed = time.perf_counter() - call["start"]
+        prompt_tokens = (usage or {}).get("prompt_tokens") or 0
+        # Streaming encerrado antes do fim não reporta uso: chunks recebidos como estimativa
+        completion_tokens = (usage or {}).get("completion_tokens") or call.get("chunks") or 0
+        price = pricing.get(call["model"] or "")
+        if price is None and call["model"]:
+            # Versões datadas (ex: gpt-4o-mini-2024-07-18) usam o preço do modelo base
+            matches = [name for name in pricing if call["model"].startswith(name)]
+            price = pricing[max(matches, key=len)] if matches else None
+        cost = 0.0
+        if price:
+            cost = (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+        
+        with self._agent_stats_lock:
+            stats = self.agent_stats[call["agent"]]
+            stats["calls"] += 1
+            stats["seconds"].append(elapsed)
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost_usd"] += cost
+            model_name = call["model"] or "padrão"
+            stats["models"][model_name] = stats["models"].get(model_name, 0) + 1
+    
+    def get_agent_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna latência e custo acumulados por agente.
+        
+        Returns:
+            Dicionário {agente: {"calls", "fallbacks", "mean_seconds", "p95_seconds",
+            "prompt_tokens", "completion_tokens", "cost_usd", "models"}}
+        """
+        summary = {}
+        with self._agent_stats_lock:
+            for agent, stats in self.agent_stats.items():
+                values = sorted(stats["seconds"])
+                summary[agent] = {
+                    "calls": stats["calls"],
+                    "fallbacks": stats["fallbacks"],
+                    "mean_seconds": sum(values) / len(values) if values else 0.0,
+                    "p95_seconds": values[int(0.95 * (len(values) - 1))] if values else 0.0,
+                    "prompt_tokens": stats["prompt_tokens"],
+                    "completion_tokens": stats["completion_tokens"],
+                    "cost_usd": stats["cost_usd"],
+                    "models": dict(stats["models"]),
+                }
+        return summary
+    
+    def get_prompt_cache_stats(self) -> Dict[str, Any]:
+        """
+        Retorna os tokens de prompt acumulados e a fração servida do cache do provedor.
+        
+        Returns:
+            Dicionário com "calls", "prompt_tokens", "cached_tokens" e "cache_hit_rate"
+        """
+        with self._agent_stats_lock:
+            stats = dict(self.prompt_cache_stats)
+        stats["cache_hit_rate"] = (
+            stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        )
+        return stats
+    
+    def get_coalescing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna as contagens de requisições idênticas agrupadas (todo o processo).
+        
+        Returns:
+            Dicionário {"orchestrator": {...}, "llm": {...}} com "calls",
+            "upstream_calls", "coalesced" e "in_flight"
+        """
+        return {
+            "orchestrator": get_single_flight("orchestrator").get_stats(),
+            "llm": get_single_flight("llm").get_stats(),
+        }
+    
+    def _record_latency(self, mode: str, start_time: float) -> float:
+        """
+        Registra a latência ponta a ponta de uma consulta.
+        
+        Args:
+            mode: Modo de execução usado
+            start_time: Instante de início (time.perf_counter)
+            
+        Returns:
+            Latência em segundos
+        """
+        elapsed = time.perf_counter() - start_time
+        with self._agent_stats_lock:
+            self.latency_stats[mode].append(elapsed)
+        return elapsed
+    
+    def get_latency_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Retorna estatísticas de latência ponta a ponta por modo de execução.
+        
+        Returns:
+            Dicionário {modo: {"count", "mean", "p50", "p95"}} (segundos)
+        """
+        with self._agent_stats_lock:
+            latency_samples = {mode: list(samples) for mode, samples in self.latency_stats.items()}
+            speculative = dict(self.speculative_stats)
+            local_answers = dict(self.local_answer_stats)
+        summary = {}
+        for mode, samples in latency_samples.items():
+            values = sorted(samples)
+            if not values:
+                summary[mode] = {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0}
+                continue
+            summary[mode] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": values[int(0.50 * (len(values) - 1))],
+                "p95": values[int(0.95 * (len(values) - 1))],
             }
+        summary["speculative"] = speculative
+        summary["local_answers"] = local_answers
+        return summary
     
     def _parse_chart_decision(
         self,
-        chart_decision: str,
+        chart_decision: Union[str, Dict[str, Any]],
         user_input: str,
         df: Optional[pd.DataFrame] = None
     ) -> Optional[Dict[str, Any]]:
@@ -379,7 +1642,7 @@ Retorne APENAS um JSON válido com a configuração. NÃO adicione texto antes o
         Extrai configuração do gráfico da decisão do Agente de Gráficos.
         
         Args:
-            chart_decision: Resposta do Agente de Gráficos
+            chart_decision: Decisão estruturada já lida ou texto do Agente de Gráficos
             user_input: Pergunta original do usuário
             df: DataFrame com os dados
             
@@ -387,30 +1650,39 @@ Retorne APENAS um JSON válido com a configuração. NÃO adicione texto antes o
             Dicionário com configuração do gráfico ou None
         """
         try:
-            import json
-            import re
-            
             # Tentar extrair JSON da resposta - múltiplas estratégias
             config = None
             
-            # Estratégia 1: Procurar por bloco JSON completo
-            json_patterns = [
-                r'\{[^{}]*"should_generate_chart"[^{}]*\}',  # JSON simples
-                r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*"should_generate_chart"[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',  # JSON aninhado
-                r'```json\s*(\{.*?\})\s*```',  # JSON em bloco de código
-                r'```\s*(\{.*?\})\s*```',  # JSON em bloco genérico
-            ]
-            
-            for pattern in json_patterns:
-                json_match = re.search(pattern, chart_decision, re.DOTALL | re.IGNORECASE)
-                if json_match:
-                    json_str = json_match.group(1) if json_match.lastindex else json_match.group(0)
-                    try:
-                        config = json.loads(json_str)
-                        logger.info(f"JSON extraído com sucesso usando padrão: {pattern[:50]}...")
-                        break
-                    except json.JSONDecodeError:
-                        continue
+            if isinstance(chart_decision, dict):
+                # Saída estruturada já lida do streaming: campos nulos do schema são descartados
+                config = {key: value for key, value in chart_decision.items() if value is not None}
+            else:
+                try:
+                    config = json.loads(chart_decision.strip())
+                except json.JSONDecodeError:
+                    config = None
+                if not isinstance(config, dict):
+                    config = None
+            
+            if config is None:
+                # Estratégia 1: Procurar por bloco JSON completo
+                json_patterns = [
+                    r'\{[^{}]*"should_generate_chart"[^{}]*\}',  # JSON simples
+                    r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*"should_generate_chart"[^{}]*(?:\{[^{}]*\}[^{}]*)*\}',  # JSON aninhado
+                    r'```json\s*(\{.*?\})\s*```',  # JSON em bloco de código
+                    r'```\s*(\{.*?\})\s*```',  # JSON em bloco genérico
+                ]
+            
+                for pattern in json_patterns:
+                    json_match = re.search(pattern, chart_decision, re.DOTALL | re.IGNORECASE)
+                    if json_match:
+                        json_str = json_match.group(1) if json_match.lastindex else json_match.group(0)
+                        try:
+                            config = json.loads(json_str)
+                            logger.info(f"JSON extraído com sucesso usando padrão: {pattern[:50]}...")
+                            break
+                        except json.JSONDecodeError:
+                            continue
             
             # Estratégia 2: Tentar encontrar JSON começando com {
             if not config:
@@ -434,55 +1706,30 @@ Retorne APENAS um JSON válido com a configuração. NÃO adicione texto antes o
                 
                 # Validar colunas se DataFrame disponível
                 if df is not None:
-                    x_col = config.get("x_column")
-                    y_col = config.get("y_column")
-                    cat_col = config.get("category_column")
-                    
-                    # Verificar se as colunas existem no DataFrame
-                    available_cols = list(df.columns)
-                    
-                    if x_col and x_col not in available_cols:
-                        logger.warning(f"Coluna x_column '{x_col}' não encontrada. Tentando encontrar similar...")
-                        # Tentar encontrar coluna similar (case-insensitive)
-                        x_col_lower = x_col.lower()
-                        for col in available_cols:
-                            if col.lower() == x_col_lower or x_col_lower in col.lower():
-                                config["x_column"] = col
-                                logger.info(f"Coluna x_column corrigida: '{x_col}' -> '{col}'")
-                                break
-                        else:
-                            config["x_column"] = None
-                    
-                    if y_col and y_col not in available_cols:
-                        logger.warning(f"Coluna y_column '{y_col}' não encontrada. Tentando encontrar similar...")
-                        y_col_lower = y_col.lower()
-                        for col in available_cols:
-                            if col.lower() == y_col_lower or y_col_lower in col.lower():
-                                config["y_column"] = col
-                                logger.info(f"Coluna y_column corrigida: '{y_col}' -> '{col}'")
-                                break
-                        else:
-                            config["y_column"] = None
-                    
-                    if cat_col and cat_col not in available_cols:
-                        logger.warning(f"Coluna category_column '{cat_col}' não encontrada. Tentando encontrar similar...")
-                        cat_col_lower = cat_col.lower()
-                        for col in available_cols:
-                            if col.lower() == cat_col_lower or cat_col_lower in col.lower():
-                                config["category_column"] = col
-                                logger.info(f"Coluna category_column corrigida: '{cat_col}' -> '{col}'")
-                                break
+                    # Corrigir nomes de colunas pelo índice do schema (variações, sinônimos, aproximado)
+                    column_index = get_column_index(df.columns)
+                    for key in ("x_column", "y_column", "category_column"):
+                        name = config.get(key)
+                        if not name or name in column_index.columns:
+                            continue
+                        resolved = column_index.resolve(name)
+                        if resolved:
+                            logger.info(f"Coluna {key} corrigida: '{name}' -> '{resolved}'")
                         else:
-                            config["category_column"] = None
+                            logger.warning(f"Coluna {key} '{name}' não encontrada no dataset")
+                        config[key] = resolved
                 
                 # Se não há colunas especificadas, tentar inferir da pergunta original
                 if not config.get("x_column") and not config.get("y_column") and not config.get("category_column"):
                     logger.info("Nenhuma coluna especificada, tentando inferir da pergunta original...")
-                    from src.core.chart_analyzer import detect_chart_request
+                    from src.core.chart_analyzer import detect_chart_request, extract_columns
                     detected = detect_chart_request(user_input)
                     if detected:
                         config["chart_type"] = detected.get("chart_type", chart_type)
-                        config["columns"] = detected.get("columns", [])
+                        config["columns"] = (
+                            extract_columns(user_input, columns=df.columns)
+                            if df is not None else detected.get("columns", [])
+                        )
                 
                 logger.info(f"Configuração do gráfico extraída e validada: {config}")
                 return config
@@ -495,12 +1742,7 @@ Retorne APENAS um JSON válido com a configuração. NÃO adicione texto antes o
             # Só retornar true se detectou claramente uma solicitação de gráfico
             if detected:
                 # Verificar se há palavras-chave explícitas de solicitação
-                user_input_lower = user_input.lower()
-                explicit_keywords = [
-                    'gráfico', 'grafico', 'chart', 'visualização', 'visualizacao',
-                    'plot', 'mostre', 'exiba', 'crie', 'gere'
-                ]
-                has_explicit_request = any(keyword in user_input_lower for keyword in explicit_keywords)
+                has_explicit_request = match_intents(user_input)["explicit_chart_keyword"]
                 
                 if has_explicit_request:
                     return {
@@ -528,12 +1770,7 @@ Retorne APENAS um JSON válido com a configuração. NÃO adicione texto antes o
             
             if detected:
                 # Verificar se há palavras-chave explícitas de solicitação
-                user_input_lower = user_input.lower()
-                explicit_keywords = [
-                    'gráfico', 'grafico', 'chart', 'visualização', 'visualizacao',
-                    'plot', 'mostre', 'exiba', 'crie', 'gere'
-                ]
-                has_explicit_request = any(keyword in user_input_lower for keyword in explicit_keywords)
+                has_explicit_request = match_intents(user_input)["explicit_chart_keyword"]
                 
                 if has_explicit_request:
                     return {
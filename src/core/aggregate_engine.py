@@ -0,0 +1,435 @@
+"""
+Motor local de perguntas de agregação
+
+Responde perguntas simples de agregação ("quantos veículos ativos em Recife?",
+"custo total de manutenção da Ford", "média de km_mes por cidade") diretamente
+com pandas, sem chamar o LLM. A pergunta é interpretada por regras usando
+extract_columns/detect_aggregation do chart_analyzer e os valores categóricos
+do próprio dataset. Quando a confiança da interpretação é baixa, retorna None
+e o fluxo normal com LLM é usado.
+"""
+
+import re
+import logging
+import unicodedata
+from typing import Optional, Dict, Any, List, Tuple
+import pandas as pd
+
+from src.core.chart_analyzer import extract_columns, detect_aggregation
+
+logger = logging.getLogger(__name__)
+
+# Confiança mínima padrão para responder sem o LLM
+DEFAULT_MIN_CONFIDENCE = 0.75
+
+# Colunas categóricas com mais valores únicos que isso não entram no índice de valores
+MAX_CATEGORICAL_VALUES = 200
+
+# Termos que indicam pedidos que exigem raciocínio do LLM (não são agregações simples)
+LLM_REQUIRED_TERMS = [
+    "por que", "porque", "explique", "explica", "analise", "análise", "compare",
+    "comparação", "comparacao", "tendência", "tendencia", "correlação", "correlacao",
+    "relação", "relacao", "insight", "recomend", "sugest", "devo", "como ",
+    "gráfico", "grafico", "chart", "visualização", "visualizacao", "plot", "dashboard",
+    "acima", "abaixo", "mais de", "menos de", "entre", "maior que", "menor que",
+]
+
+# Palavras inteiras (sem acento) que o motor local não sabe tratar: negação/exclusão
+# (o filtro seria aplicado ao contrário), valores distintos, perguntas sobre qual
+# registro atinge o valor e recência. Comparadas por fronteira de palavra
+# ("sem" não casa com "semana")
+LLM_REQUIRED_WORDS = [
+    "nao", "nem", "exceto", "excluindo", "sem", "fora", "menos o", "menos a", "menos os", "menos as",
+    "diferentes", "diferente", "distintos", "distintas", "unicos", "unicas",
+    "qual veiculo", "quais veiculos", "que veiculo", "qual carro", "quais carros",
+    "qual placa", "qual modelo", "quais modelos",
+    "ultimo", "ultima", "ultimos", "ultimas", "recente", "recentes",
+]
+
+_LLM_REQUIRED_WORDS_PATTERN = re.compile(
+    r"(?<![a-z0-9])(?:" + "|".join(re.escape(word) for word in LLM_REQUIRED_WORDS) + r")(?![a-z0-9])"
+)
+
+# Substantivos que tornam uma pergunta de contagem inequívoca
+COUNT_NOUNS = ["veiculo", "carro", "registro", "frota", "unidade"]
+
+# Termo após preposição ("da Tesla", "em Fortaleza"): se não for valor do dataset,
+# coluna ou palavra genérica, o filtro pedido não existe e a resposta local seria
+# calculada sobre todas as linhas
+_ENTITY_PATTERN = re.compile(r"(?<![a-z0-9])(?:da|do|das|dos|de|em|na|no|nas|nos)\s+([a-z_]+)")
+
+# Palavras aceitas após preposição que não são valores do dataset
+GENERIC_WORDS = {
+    "a", "o", "as", "os", "um", "uma", "todo", "toda", "todos", "todas", "cada", "geral",
+    "frota", "veiculo", "veiculos", "carro", "carros", "registro", "registros", "unidade", "unidades",
+    "dados", "base", "tabela", "total", "media", "soma", "quantidade", "numero", "valor", "valores",
+}
+
+AGGREGATION_LABELS = {
+    "sum": "Total",
+    "mean": "Média",
+    "count": "Quantidade",
+    "max": "Máximo",
+    "min": "Mínimo",
+}
+
+# Cache do índice de valores categóricos por DataFrame
+_value_index_cache: Dict[Tuple[int, int, Tuple[str, ...]], List[Tuple[str, str, str]]] = {}
+
+
+def _normalize(text: str) -> str:
+    """Converte para minúsculas e remove acentos."""
+    text = unicodedata.normalize("NFKD", str(text).lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def build_value_index(df: pd.DataFrame) -> List[Tuple[str, str, str]]:
+    """
+    Constrói o índice de valores categóricos do dataset.
+
+    Args:
+        df: DataFrame do pandas
+
+    Returns:
+        Lista de tuplas (valor normalizado, coluna, valor original), valores mais longos primeiro
+    """
+    cache_key = (id(df), len(df), tuple(df.columns))
+    cached = _value_index_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    entries = []
+    for col in df.select_dtypes(include=["object"]).columns:
+        unique_values = df[col].dropna().unique()
+        # Colunas identificadoras (um valor por linha) não servem como filtro textual
+        if len(unique_values) > MAX_CATEGORICAL_VALUES or len(unique_values) == len(df):
+            continue
+        for value in unique_values:
+            normalized = _normalize(value).strip()
+            if len(normalized) >= 2:
+                entries.append((normalized, col, value))
+
+    entries.sort(key=lambda entry: len(entry[0]), reverse=True)
+    _value_index_cache.clear()
+    _value_index_cache[cache_key] = entries
+    return entries
+
+
+def _find_metric_columns(user_input: str, df: pd.DataFrame) -> List[str]:
+    """Retorna colunas numéricas mencionadas na pergunta, na ordem de detecção."""
+    numeric_cols = list(df.select_dtypes(include=["int64", "float64"]).columns)
+    # Índice do schema: vale também para datasets diferentes do de veículos
+    return [col for col in extract_columns(user_input, columns=df.columns) if col in numeric_cols]
+
+
+def _find_group_by(normalized: str, df: pd.DataFrame) -> Optional[str]:
+    """Detecta agrupamento no formato "por <coluna>"."""
+    categorical_cols = list(df.select_dtypes(include=["object"]).columns) + (
+        ["ano"] if "ano" in df.columns else []
+    )
+    for match in re.finditer(r"\bpor\s+([a-z_ ]+)", normalized):
+        target = match.group(1).strip()
+        for col in categorical_cols:
+            col_normalized = _normalize(col)
+            for variant in (col_normalized, col_normalized.replace("_", " ")):
+                if target.startswith(variant):
+                    return col
+    return None
+
+
+def _find_filters(
+    normalized: str,
+    df: pd.DataFrame,
+    metric_columns: List[str],
+    group_by: Optional[str],
+) -> Tuple[Dict[str, List[Any]], str]:
+    """
+    Detecta filtros comparando a pergunta com os valores categóricos do dataset.
+
+    Returns:
+        Tupla (filtros por coluna, pergunta com os trechos dos filtros apagados)
+    """
+    metric_words = set()
+    for col in metric_columns:
+        metric_words.update(_normalize(col).split("_"))
+
+    filters: Dict[str, List[Any]] = {}
+    consumed = normalized
+    for value_normalized, col, original in build_value_index(df):
+        if col == group_by:
+            continue
+        pattern = r"(?<![a-z0-9])(em\s+)?" + re.escape(value_normalized) + r"s?(?![a-z0-9])"
+        match = re.search(pattern, consumed)
+        if not match:
+            continue
+        # Valor que coincide com o nome da métrica (ex: status "manutencao" vs
+        # custo_manutencao) só conta como filtro se vier precedido de "em"
+        if set(value_normalized.split()) <= metric_words and not match.group(1):
+            continue
+        filters.setdefault(col, []).append(original)
+        # Evitar que valores menores reutilizem o mesmo trecho
+        consumed = consumed[:match.start()] + " " * (match.end() - match.start()) + consumed[match.end():]
+    return filters, consumed
+
+
+def _find_unknown_entities(user_input: str, remaining: str, df: pd.DataFrame) -> List[str]:
+    """
+    Lista termos que parecem valores de filtro mas não existem no dataset.
+
+    Considera o termo após "da/do/de/em/na/no..." e as palavras com inicial maiúscula
+    fora do início da frase, ignorando trechos já usados como filtro, colunas
+    (nomes e apelidos do índice do schema) e palavras genéricas.
+
+    Args:
+        user_input: Pergunta original (para as iniciais maiúsculas)
+        remaining: Pergunta normalizada sem os trechos dos filtros encontrados
+        df: DataFrame com os dados
+
+    Returns:
+        Termos normalizados sem correspondência (vazia se todos forem conhecidos)
+    """
+    candidates = [match.group(1) for match in _ENTITY_PATTERN.finditer(remaining)]
+    words = re.findall(r"[^\W\d_]+", user_input)
+    remaining_words = set(re.findall(r"[a-z0-9_]+", remaining))
+    candidates += [
+        _normalize(word) for word in words[1:]
+        if word[0].isupper() and _normalize(word) in remaining_words
+    ]
+
+    unknown = []
+    for term in candidates:
+        if term in GENERIC_WORDS or term.rstrip("s") in GENERIC_WORDS:
+            continue
+        if extract_columns(term, columns=df.columns):
+            continue
+        unknown.append(term)
+    return unknown
+
+
+def _drop_metrics_claimed_by_filters(
+    normalized: str,
+    metric_columns: List[str],
+    filters: Dict[str, List[Any]],
+) -> List[str]:
+    """
+    Remove métricas detectadas apenas por causa de um valor usado como filtro.
+
+    Ex: em "quantos veículos em manutenção?" o termo "manutenção" é o status,
+    não a coluna custo_manutencao.
+    """
+    filter_words = set()
+    for values in filters.values():
+        for value in values:
+            filter_words.update(_normalize(value).split())
+
+    kept = []
+    for col in metric_columns:
+        col_words = set(_normalize(col).split("_"))
+        other_words = col_words - filter_words
+        if col_words & filter_words and not any(word in normalized for word in other_words):
+            continue
+        kept.append(col)
+    return kept
+
+
+def parse_aggregate_question(user_input: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """
+    Interpreta uma pergunta de agregação.
+
+    Args:
+        user_input: Pergunta do usuário
+        df: DataFrame com os dados
+
+    Returns:
+        Dicionário com "aggregation", "metric", "filters", "group_by" e "confidence",
+        ou None se a pergunta não for uma agregação
+    """
+    if df is None or df.empty or not user_input:
+        return None
+
+    aggregation = detect_aggregation(user_input)
+    if aggregation is None:
+        return None
+
+    normalized = _normalize(user_input)
+    metric_columns = _find_metric_columns(user_input, df)
+    group_by = _find_group_by(normalized, df)
+    filters, remaining = _find_filters(normalized, df, metric_columns, group_by)
+    metric_columns = _drop_metrics_claimed_by_filters(normalized, metric_columns, filters)
+    metric = metric_columns[0] if metric_columns else None
+
+    confidence = 0.4
+    if aggregation == "count":
+        if metric is None and (any(noun in normalized for noun in COUNT_NOUNS) or filters or group_by):
+            confidence += 0.35
+        elif metric is not None:
+            # "quantos veículos com custo..." implica uma condição sobre a métrica
+            confidence += 0.1
+    elif metric is not None:
+        confidence += 0.35
+
+    if filters or group_by:
+        confidence += 0.15
+    if len(user_input.split()) <= 12:
+        confidence += 0.1
+
+    # Máximo/mínimo por grupo é ambíguo ("qual cidade tem o maior custo?")
+    if aggregation in ("max", "min") and group_by:
+        confidence = min(confidence, 0.6)
+
+    if any(term in normalized for term in (_normalize(t) for t in LLM_REQUIRED_TERMS)):
+        confidence = min(confidence, 0.3)
+    if _LLM_REQUIRED_WORDS_PATTERN.search(normalized):
+        confidence = min(confidence, 0.3)
+
+    # Filtro citado que não existe no dataset ("da Tesla"): o LLM responde
+    unknown_entities = _find_unknown_entities(user_input, remaining, df)
+    if unknown_entities:
+        logger.debug(f"Termos sem correspondência no dataset: {unknown_entities}")
+        confidence = min(confidence, 0.3)
+
+    # Números na pergunta (fora dos nomes das colunas) indicam condições não suportadas
+    without_columns = normalized
+    for col in df.columns:
+        without_columns = without_columns.replace(_normalize(col), " ")
+    if re.search(r"\d", without_columns):
+        confidence = min(confidence, 0.3)
+
+    return {
+        "aggregation": aggregation,
+        "metric": metric,
+        "filters": filters,
+        "group_by": group_by,
+        "confidence": round(min(confidence, 1.0), 2),
+    }
+
+
+def execute_aggregate_query(df: pd.DataFrame, query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executa uma consulta de agregação com pandas.
+
+    Args:
+        df: DataFrame com os dados
+        query: Consulta retornada por parse_aggregate_question
+
+    Returns:
+        Dicionário com "value" (escalar) ou "groups" (lista de (grupo, valor)) e "row_count"
+    """
+    filtered = df
+    for col, values in query.get("filters", {}).items():
+        filtered = filtered[filtered[col].isin(values)]
+
+    aggregation = query["aggregation"]
+    metric = query.get("metric")
+    group_by = query.get("group_by")
+
+    if group_by:
+        grouped = filtered.groupby(group_by)
+        if aggregation == "count" or metric is None:
+            series = grouped.size()
+        else:
+            series = grouped[metric].agg(aggregation)
+        series = series.sort_values(ascending=(aggregation == "min"))
+        return {
+            "groups": [(group, value) for group, value in series.items()],
+            "row_count": len(filtered),
+        }
+
+    if aggregation == "count" or metric is None:
+        value = len(filtered)
+    else:
+        value = filtered[metric].agg(aggregation) if len(filtered) else None
+    return {"value": value, "row_count": len(filtered)}
+
+
+def _format_number(value: Any) -> str:
+    """Formata número no padrão brasileiro (1.234,56)."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return "sem dados"
+    number = float(value)
+    if number.is_integer():
+        formatted = f"{int(number):,}"
+    else:
+        formatted = f"{number:,.2f}"
+    return formatted.replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _describe_filters(filters: Dict[str, List[Any]]) -> str:
+    """Descreve os filtros aplicados em português."""
+    if not filters:
+        return ""
+    parts = [
+        f"{col.replace('_', ' ')} **{' / '.join(str(v) for v in values)}**"
+        for col, values in filters.items()
+    ]
+    return " com " + " e ".join(parts)
+
+
+def format_aggregate_answer(query: Dict[str, Any], result: Dict[str, Any]) -> str:
+    """
+    Gera a resposta em português para o resultado de uma agregação.
+
+    Args:
+        query: Consulta interpretada
+        result: Resultado de execute_aggregate_query
+
+    Returns:
+        Resposta formatada em Markdown
+    """
+    aggregation = query["aggregation"]
+    metric = query.get("metric")
+    filters_text = _describe_filters(query.get("filters", {}))
+    label = AGGREGATION_LABELS.get(aggregation, aggregation)
+
+    if aggregation == "count" or metric is None:
+        subject = "Quantidade de veículos"
+    else:
+        subject = f"{label} de {metric.replace('_', ' ')}"
+
+    if "groups" in result:
+        group_label = query["group_by"].replace("_", " ")
+        lines = [f"📊 **{subject} por {group_label}**{filters_text}:", ""]
+        for group, value in result["groups"][:15]:
+            lines.append(f"- {group}: **{_format_number(value)}**")
+        if len(result["groups"]) > 15:
+            lines.append(f"- ... e mais {len(result['groups']) - 15} grupos")
+        body = "\n".join(lines)
+    elif aggregation == "count" or metric is None:
+        body = f"🔢 Há **{_format_number(result['value'])}** veículos{filters_text}."
+    else:
+        body = f"📊 **{subject}**{filters_text}: **{_format_number(result['value'])}**"
+
+    return f"{body}\n\n_Calculado diretamente sobre {result['row_count']} registros._"
+
+
+def answer_aggregate_question(
+    user_input: str,
+    df: pd.DataFrame,
+    min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+) -> Optional[Dict[str, Any]]:
+    """
+    Tenta responder localmente uma pergunta de agregação.
+
+    Args:
+        user_input: Pergunta do usuário
+        df: DataFrame com os dados
+        min_confidence: Confiança mínima para responder sem o LLM
+
+    Returns:
+        Dicionário com "text_response", "query" e "result", ou None se o LLM deve ser usado
+    """
+    try:
+        query = parse_aggregate_question(user_input, df)
+        if not query or query["confidence"] < min_confidence:
+            if query:
+                logger.debug(f"Agregação com baixa confiança ({query['confidence']}), usando LLM: {query}")
+            return None
+
+        result = execute_aggregate_query(df, query)
+        text_response = format_aggregate_answer(query, result)
+        logger.info(f"Pergunta respondida localmente: {query}")
+        return {"text_response": text_response, "query": query, "result": result}
+
+    except Exception as e:
+        logger.warning(f"Erro no motor local de agregações, usando LLM: {str(e)}")
+        return None
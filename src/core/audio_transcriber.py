@@ -4,10 +4,13 @@ Módulo para transcrição de áudio usando Whisper ou APIs alternativas
 import os
 import tempfile
 import logging
+import time
 import warnings
 from typing import Optional
 from contextlib import contextmanager
 
+from src.core.metrics import TRANSCRIPTION_SECONDS
+
 # Suprimir aviso do Whisper sobre FP16 não suportado em CPU (é apenas informativo)
 # O Whisper automaticamente usa FP32 em CPU, então este aviso não é necessário
 warnings.filterwarnings("ignore", message=".*FP16 is not supported on CPU.*", category=UserWarning)
@@ -167,6 +170,8 @@ def transcribe_audio(audio_file, method: str = "whisper") -> Optional[str]:
     Returns:
         Texto transcrito ou None em caso de erro
     """
+    start = time.perf_counter()
+    status = "error"
     try:
         logger.info(f"Iniciando transcrição com método: {method}")
         
@@ -192,15 +197,19 @@ def transcribe_audio(audio_file, method: str = "whisper") -> Optional[str]:
         if method == "whisper":
             result = _transcribe_with_whisper(audio_file)
             if result:
+                status = "ok"
                 logger.info(f"Transcrição bem-sucedida: {len(result)} caracteres")
             else:
+                status = "empty"
                 logger.warning("Transcrição retornou None")
             return result
         elif method == "openai":
             result = _transcribe_with_openai(audio_file)
             if result:
+                status = "ok"
                 logger.info(f"Transcrição bem-sucedida: {len(result)} caracteres")
             else:
+                status = "empty"
                 logger.warning("Transcrição retornou None")
             return result
         else:
@@ -213,6 +222,8 @@ def transcribe_audio(audio_file, method: str = "whisper") -> Optional[str]:
     except Exception as e:
         logger.error(f"Erro na transcrição: {str(e)}", exc_info=True)
         raise Exception(f"Erro ao transcrever áudio: {str(e)}") from e
+    finally:
+        TRANSCRIPTION_SECONDS.labels(method, status).observe(time.perf_counter() - start)
 
 
 def _transcribe_with_whisper(audio_file) -> Optional[str]:
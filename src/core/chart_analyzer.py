@@ -4,9 +4,12 @@ Módulo para analisar requisições do usuário e gerar gráficos automaticament
 
 import re
 import logging
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Iterable
 import pandas as pd
 
+from src.core.column_index import get_column_index
+from src.core.intent_matcher import match_intents
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,6 +18,7 @@ def detect_chart_request(user_input: str) -> Optional[Dict[str, Any]]:
     Detecta se o usuário está pedindo um gráfico e extrai informações.
     
     IMPORTANTE: Só detecta se houver solicitação EXPLÍCITA de gráfico/visualização.
+    As palavras-chave ficam em intent_matcher (uma passada para todas as intenções).
 
     Args:
         user_input: Texto da mensagem do usuário
@@ -22,141 +26,39 @@ def detect_chart_request(user_input: str) -> Optional[Dict[str, Any]]:
     Returns:
         Dicionário com informações do gráfico ou None
     """
-    user_input_lower = user_input.lower()
-
-    # Palavras-chave EXPLÍCITAS para detectar solicitação de gráfico
-    # Removidas palavras genéricas como "análise", "estatística" que não indicam gráfico
-    explicit_chart_keywords = [
-        "gráfico", "grafico", "chart", "visualização", "visualizacao",
-        "plot", "gráfico de", "chart de", "visualização de",
-        "mostre um gráfico", "exiba um gráfico", "crie um gráfico", "gere um gráfico",
-        "mostre gráfico", "exiba gráfico", "crie gráfico", "gere gráfico",
-        "mostre chart", "exiba chart", "crie chart", "gere chart",
-        "mostre visualização", "exiba visualização", "crie visualização", "gere visualização",
-        "dashboard"  # Dashboard geralmente implica visualização
-    ]
-    
-    # Palavras que indicam ação de visualização quando combinadas
-    action_keywords = ["mostre", "exiba", "crie", "gere", "faça", "construa"]
-    visualization_keywords = ["gráfico", "grafico", "chart", "visualização", "visualizacao", "plot"]
-
-    # Verificar se contém palavras-chave explícitas
-    has_explicit_keyword = any(keyword in user_input_lower for keyword in explicit_chart_keywords)
-    
-    # Verificar combinação de ação + visualização (ex: "mostre um gráfico")
-    has_action_visualization = False
-    for action in action_keywords:
-        for viz in visualization_keywords:
-            if action in user_input_lower and viz in user_input_lower:
-                has_action_visualization = True
-                break
-        if has_action_visualization:
-            break
+    intents = match_intents(user_input)
 
     # Só retornar se houver solicitação EXPLÍCITA
-    if not (has_explicit_keyword or has_action_visualization):
+    if not intents["chart_request"]:
         return None
 
-    # Detectar tipo de gráfico
-    chart_type = None
-    chart_type_keywords = {
-        "bar": ["barra", "barras", "bar chart", "coluna", "colunas"],
-        "line": ["linha", "linhas", "line chart", "tendência", "tendencia"],
-        "pie": ["pizza", "pie chart", "torta", "distribuição", "distribuicao"],
-        "scatter": ["dispersão", "dispersao", "scatter", "correlação", "correlacao"],
-        "histogram": ["histograma", "histogram", "distribuição", "distribuicao"],
-        "box": ["box", "boxplot", "quartis", "quartiles"],
-        "heatmap": ["heatmap", "mapa de calor", "correlação", "correlacao"],
-        "area": ["área", "area", "area chart", "área preenchida"],
-        "violin": ["violino", "violin", "violin plot", "densidade"],
-    }
-
-    for chart, keywords in chart_type_keywords.items():
-        if any(keyword in user_input_lower for keyword in keywords):
-            chart_type = chart
-            break
-
-    # Se não detectou tipo específico, usar bar como padrão
-    if chart_type is None:
-        chart_type = "bar"
-
-    # Extrair colunas mencionadas
-    columns = extract_columns(user_input)
-
     return {
-        "chart_type": chart_type,
-        "columns": columns,
+        # Se não detectou tipo específico, usar bar como padrão
+        "chart_type": intents["chart_type"] or "bar",
+        "columns": intents["columns"],
         "user_input": user_input,
     }
 
 
-def extract_columns(user_input: str) -> List[str]:
+def extract_columns(user_input: str, columns: Optional[Iterable[str]] = None) -> List[str]:
     """
     Extrai nomes de colunas mencionadas no texto.
 
+    Termos mais específicos (mais longos) vêm primeiro, depois os nomes das colunas
+    e suas variações. Sem columns, usa as colunas conhecidas do dataset de veículos
+    (COLUMN_TERMS e KNOWN_COLUMNS em intent_matcher); com columns, usa o índice do
+    schema informado (column_index).
+
     Args:
         user_input: Texto da mensagem
+        columns: Colunas do dataset carregado (ex: df.columns)
 
     Returns:
         Lista de nomes de colunas encontradas
     """
-    # Colunas conhecidas do dataset de veículos
-    known_columns = [
-        "marca", "modelo", "ano", "status", "cidade",
-        "km_mes", "velocidade_media", "alertas",
-        "consumo_combustivel", "dias_operacionais", "custo_manutencao"
-    ]
-    
-    # Mapeamento expandido de termos comuns para colunas
-    term_mapping = {
-        "quilometragem": "km_mes",
-        "km": "km_mes",
-        "quilometragem mensal": "km_mes",
-        "quilometragem por mês": "km_mes",
-        "velocidade": "velocidade_media",
-        "velocidade média": "velocidade_media",
-        "consumo": "consumo_combustivel",
-        "combustível": "consumo_combustivel",
-        "combustivel": "consumo_combustivel",
-        "consumo de combustível": "consumo_combustivel",
-        "consumo de combustivel": "consumo_combustivel",
-        "custo": "custo_manutencao",
-        "manutenção": "custo_manutencao",
-        "manutencao": "custo_manutencao",
-        "custo de manutenção": "custo_manutencao",
-        "custo de manutencao": "custo_manutencao",
-        "dias": "dias_operacionais",
-        "operacionais": "dias_operacionais",
-        "dias operacionais": "dias_operacionais",
-    }
-
-    user_input_lower = user_input.lower()
-    found_columns = []
-
-    # Primeiro, verificar mapeamentos de termos (ordem por tamanho para pegar termos mais específicos primeiro)
-    sorted_mapping = sorted(term_mapping.items(), key=lambda x: len(x[0]), reverse=True)
-    for term, col in sorted_mapping:
-        if term in user_input_lower and col not in found_columns:
-            found_columns.append(col)
-
-    # Depois, buscar colunas diretamente
-    for col in known_columns:
-        if col in found_columns:
-            continue
-            
-        # Buscar variações do nome da coluna
-        patterns = [
-            col,
-            col.replace("_", " "),
-            col.replace("_", ""),
-        ]
-
-        for pattern in patterns:
-            if pattern in user_input_lower:
-                found_columns.append(col)
-                break
-
-    return found_columns
+    if columns is not None:
+        return get_column_index(columns).find_in_text(user_input)
+    return match_intents(user_input)["columns"]
 
 
 def detect_aggregation(user_input: str) -> Optional[str]:
@@ -169,22 +71,7 @@ def detect_aggregation(user_input: str) -> Optional[str]:
     Returns:
         Tipo de agregação ('sum', 'mean', 'count', 'max', 'min') ou None
     """
-    user_input_lower = user_input.lower()
-    
-    aggregation_keywords = {
-        'sum': ['soma', 'total', 'somado', 'somar', 'soma de', 'total de'],
-        'mean': ['média', 'media', 'médio', 'medio', 'média de', 'media de', 'médio de', 'medio de', 'average', 'avg'],
-        'count': ['contar', 'quantidade', 'número', 'numero', 'qtd', 'qtde', 'count', 'quantos', 'quantas'],
-        'max': ['máximo', 'maximo', 'maior', 'mais alto', 'peak', 'pico', 'max'],
-        'min': ['mínimo', 'minimo', 'menor', 'mais baixo', 'min'],
-    }
-    
-    # Verificar cada tipo de agregação
-    for agg_type, keywords in aggregation_keywords.items():
-        if any(keyword in user_input_lower for keyword in keywords):
-            return agg_type
-    
-    return None
+    return match_intents(user_input)["aggregation"]
 
 
 def validate_data_for_chart(df: pd.DataFrame, required_cols: List[str]) -> Tuple[bool, Optional[str]]:
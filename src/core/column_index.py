@@ -0,0 +1,247 @@
+"""
+Índice de resolução de nomes de colunas derivado do schema do dataset
+
+Construído uma vez por schema (no carregamento do CSV) e compartilhado pelo
+AgentOrchestrator (correção das colunas escolhidas pelo Agente de Gráficos) e pelo
+chart_analyzer/aggregate_engine (colunas mencionadas na pergunta). Resolve, nesta
+ordem:
+
+1. Nome exato da coluna
+2. Variações normalizadas (minúsculas, sem acentos, "_"/espaço/hífen equivalentes)
+   e sinônimos (COLUMN_TERMS do intent_matcher e COLUMN_SYNONYMS), via dicionário
+3. Nome contido no nome da coluna (ex: "velocidade" -> "velocidade_media"), com
+   candidatos obtidos pelo índice de trigramas
+4. Busca aproximada (erros de digitação): similaridade de trigramas seguida de
+   confirmação por difflib
+
+Funciona para qualquer dataset: sinônimos só valem quando a coluna alvo existe.
+"""
+
+import difflib
+import logging
+import re
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Optional, Dict, List, Set, Tuple, Iterable
+
+from src.core.intent_matcher import COLUMN_TERMS, KeywordMatcher, fold_text
+from src.core.metrics import cache_lookup
+
+logger = logging.getLogger(__name__)
+
+# Índices mantidos em memória (um por schema)
+MAX_CACHED_INDEXES = 8
+
+# Similaridade mínima (difflib) para aceitar uma correspondência aproximada
+FUZZY_CUTOFF = 0.8
+
+# Candidatos (por trigramas em comum) confirmados com difflib
+FUZZY_CANDIDATES = 5
+
+# Variações do nome da coluna mais curtas que isso não são procuradas em texto livre
+MIN_TEXT_MATCH_LENGTH = 3
+
+# Sinônimos usados na resolução de nomes escolhidos pelo LLM (ex: nomes em inglês)
+COLUMN_SYNONYMS = {
+    "brand": "marca",
+    "make": "marca",
+    "model": "modelo",
+    "year": "ano",
+    "city": "cidade",
+    "alerts": "alertas",
+    "mileage": "km_mes",
+    "monthly_km": "km_mes",
+    "km_per_month": "km_mes",
+    "average_speed": "velocidade_media",
+    "avg_speed": "velocidade_media",
+    "speed": "velocidade_media",
+    "fuel_consumption": "consumo_combustivel",
+    "fuel": "consumo_combustivel",
+    "operating_days": "dias_operacionais",
+    "maintenance_cost": "custo_manutencao",
+    "cost": "custo_manutencao",
+    "vehicle_id": "id_veiculo",
+    "id": "id_veiculo",
+}
+
+_SEPARATORS = re.compile(r"[\s_\-]+")
+
+
+def normalize_column_name(name: str) -> str:
+    """
+    Normaliza um nome de coluna: minúsculas, sem acentos, separadores como "_".
+
+    Args:
+        name: Nome original
+
+    Returns:
+        Nome normalizado (ex: "Velocidade Média" -> "velocidade_media")
+    """
+    return _SEPARATORS.sub("_", fold_text(name)).strip("_")
+
+
+def _trigrams(key: str) -> Set[str]:
+    """Trigramas de uma chave normalizada (com bordas, para chaves curtas)."""
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ColumnIndex:
+    """Resolve nomes de colunas (do LLM ou do texto do usuário) para as colunas do dataset"""
+
+    def __init__(self, columns: Iterable[str]):
+        """
+        Constrói o índice.
+
+        Args:
+            columns: Colunas do dataset, na ordem do schema
+        """
+        self.columns: List[str] = [str(col) for col in columns]
+        self._keys: Dict[str, str] = {col: normalize_column_name(col) for col in self.columns}
+        self._aliases: Dict[str, str] = {}
+        self._exact = set(self.columns)
+
+        for col in self.columns:
+            key = self._keys[col]
+            for variant in (key, key.replace("_", "")):
+                self._aliases.setdefault(variant, col)
+
+        # Sinônimos só valem para colunas presentes neste schema
+        synonyms = list(COLUMN_TERMS.items()) + list(COLUMN_SYNONYMS.items())
+        for synonym, target in synonyms:
+            if target in self._exact:
+                self._aliases.setdefault(normalize_column_name(synonym), target)
+
+        # Trigramas dos nomes das colunas (nome contido) e de todas as chaves (aproximado)
+        self._column_trigrams: Dict[str, Set[str]] = {}
+        for col in self.columns:
+            for trigram in _trigrams(self._keys[col]):
+                self._column_trigrams.setdefault(trigram, set()).add(col)
+        self._alias_trigrams: Dict[str, Set[str]] = {}
+        for alias in self._aliases:
+            for trigram in _trigrams(alias):
+                self._alias_trigrams.setdefault(trigram, set()).add(alias)
+
+        self._text_terms = self._build_text_terms()
+        self._text_matcher = KeywordMatcher(term for term, _ in self._text_terms)
+
+    def _build_text_terms(self) -> List[Tuple[str, str]]:
+        """Termos procurados em texto livre, na ordem de prioridade de extract_columns."""
+        terms = [
+            (fold_text(term), column)
+            for term, column in sorted(COLUMN_TERMS.items(), key=lambda item: len(item[0]), reverse=True)
+            if column in self._exact
+        ]
+        for col in self.columns:
+            folded = fold_text(col)
+            for variant in (folded, folded.replace("_", " "), folded.replace("_", "")):
+                if len(variant) >= MIN_TEXT_MATCH_LENGTH:
+                    terms.append((variant, col))
+        return terms
+
+    def resolve(self, name: Optional[str]) -> Optional[str]:
+        """
+        Resolve um nome de coluna para uma coluna existente.
+
+        Args:
+            name: Nome sugerido (ex: escolhido pelo Agente de Gráficos)
+
+        Returns:
+            Nome da coluna no dataset ou None se não houver correspondência
+        """
+        if not name:
+            return None
+        name = str(name)
+        if name in self._exact:
+            return name
+
+        key = normalize_column_name(name)
+        if not key:
+            return None
+        column = self._aliases.get(key) or self._aliases.get(key.replace("_", ""))
+        if column:
+            return column
+
+        return self._resolve_contained(key) or self._resolve_fuzzy(key)
+
+    def _resolve_contained(self, key: str) -> Optional[str]:
+        """Primeira coluna (ordem do schema) cujo nome contém a chave."""
+        # Trigramas internos da chave: todos precisam ocorrer no nome da coluna
+        inner = {key[i:i + 3] for i in range(len(key) - 2)}
+        candidates = None
+        for trigram in inner:
+            columns = self._column_trigrams.get(trigram)
+            if not columns:
+                return None
+            candidates = set(columns) if candidates is None else candidates & columns
+            if not candidates:
+                return None
+        pool = self.columns if candidates is None else [col for col in self.columns if col in candidates]
+        for col in pool:
+            if key in self._keys[col]:
+                return col
+        return None
+
+    def _resolve_fuzzy(self, key: str) -> Optional[str]:
+        """Correspondência aproximada entre as chaves (nomes normalizados e sinônimos)."""
+        shared = Counter()
+        for trigram in _trigrams(key):
+            for alias in self._alias_trigrams.get(trigram, ()):
+                shared[alias] += 1
+        best_alias, best_ratio = None, FUZZY_CUTOFF
+        for alias, _ in shared.most_common(FUZZY_CANDIDATES):
+            ratio = difflib.SequenceMatcher(None, key, alias).ratio()
+            if ratio >= best_ratio:
+                best_alias, best_ratio = alias, ratio
+        if best_alias is None:
+            return None
+        return self._aliases[best_alias]
+
+    def find_in_text(self, text: str) -> List[str]:
+        """
+        Retorna as colunas mencionadas em um texto livre.
+
+        Args:
+            text: Pergunta do usuário ou resposta do Agente de Análise
+
+        Returns:
+            Colunas encontradas, termos mais específicos primeiro e depois a ordem do schema
+        """
+        found = self._text_matcher.find_all(fold_text(text))
+        columns: List[str] = []
+        for term, column in self._text_terms:
+            if term in found and column not in columns:
+                columns.append(column)
+        return columns
+
+
+_indexes: "OrderedDict[Tuple[str, ...], ColumnIndex]" = OrderedDict()
+_indexes_lock = Lock()
+
+
+def get_column_index(columns: Iterable[str]) -> ColumnIndex:
+    """
+    Retorna o índice do schema (construído na primeira chamada e reutilizado).
+
+    Args:
+        columns: Colunas do dataset (ex: df.columns)
+
+    Returns:
+        ColumnIndex do schema
+    """
+    schema = tuple(str(col) for col in columns)
+    with _indexes_lock:
+        index = _indexes.get(schema)
+        if index is not None:
+            _indexes.move_to_end(schema)
+    cache_lookup("column_index", index is not None)
+    if index is not None:
+        return index
+
+    index = ColumnIndex(schema)
+    with _indexes_lock:
+        _indexes[schema] = index
+        if len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    logger.debug(f"Índice de colunas construído para {len(schema)} colunas")
+    return index
@@ -0,0 +1,272 @@
+"""
+Gerenciador da janela de contexto da conversa
+
+Estima os tokens de cada mensagem e monta a lista enviada ao modelo dentro do
+orçamento do contexto: system prompt e contexto de dados fixados no início,
+pergunta atual no fim e o máximo de turnos recentes que couber entre eles.
+Turnos mais antigos são descartados e substituídos por um resumo curto.
+"""
+
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken  # Instalado junto com openai-whisper
+
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Heurística calibrada para texto em português (caracteres por token)
+# Ollama (llama/mistral, SentencePiece) quebra palavras em português em mais tokens
+CHARS_PER_TOKEN = {
+    "openai": 3.8,
+    "ollama": 3.0,
+}
+
+# Tokens extras por mensagem (marcadores de papel/separadores do template de chat)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Fração do contexto reservada para a resposta do modelo
+RESPONSE_RESERVE_RATIO = 0.25
+
+# Orçamento máximo do resumo dos turnos descartados
+SUMMARY_MAX_TOKENS = 150
+
+# Encoders do tiktoken já carregados, por modelo
+_encoders: Dict[str, Any] = {}
+
+
+def _get_encoder(model: Optional[str]):
+    """Retorna o encoder do tiktoken para o modelo (ou None se indisponível)."""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    key = model or ""
+    if key not in _encoders:
+        try:
+            _encoders[key] = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            try:
+                _encoders[key] = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                _encoders[key] = None
+    return _encoders[key]
+
+
+def estimate_tokens(text: str, provider: str = "ollama", model: Optional[str] = None) -> int:
+    """
+    Estima o número de tokens de um texto.
+
+    Usa o tokenizer real (tiktoken) para a OpenAI quando disponível e a heurística
+    calibrada por provedor nos demais casos.
+
+    Args:
+        text: Texto a estimar
+        provider: "openai" ou "ollama"
+        model: Nome do modelo (seleciona o tokenizer da OpenAI)
+
+    Returns:
+        Número estimado de tokens
+    """
+    if not text:
+        return 0
+    if provider == "openai":
+        encoder = _get_encoder(model)
+        if encoder is not None:
+            return len(encoder.encode(text))
+    chars_per_token = CHARS_PER_TOKEN.get(provider, CHARS_PER_TOKEN["ollama"])
+    return int(len(text) / chars_per_token) + 1
+
+
+def estimate_message_tokens(
+    messages: List[Dict[str, Any]],
+    provider: str = "ollama",
+    model: Optional[str] = None,
+) -> int:
+    """
+    Estima o total de tokens de uma lista de mensagens.
+
+    Args:
+        messages: Mensagens no formato da API de chat
+        provider: "openai" ou "ollama"
+        model: Nome do modelo
+
+    Returns:
+        Número estimado de tokens
+    """
+    return sum(
+        estimate_tokens(str(msg.get("content") or ""), provider, model) + MESSAGE_OVERHEAD_TOKENS
+        for msg in messages
+    )
+
+
+def get_context_budget(provider: str = "ollama", model: Optional[str] = None) -> int:
+    """
+    Retorna o orçamento de tokens do prompt para o provedor/modelo.
+
+    Args:
+        provider: "openai" ou "ollama"
+        model: Nome do modelo
+
+    Returns:
+        Tokens disponíveis para o prompt (contexto menos a reserva da resposta)
+    """
+    if provider == "openai":
+        from src.config.openai_model_config import MODEL_RULES, MODEL_SPECIFIC_CONFIG
+
+        context_length = MODEL_SPECIFIC_CONFIG.get(model, {}).get(
+            "context_length", MODEL_RULES.get("max_context_length", 16385)
+        )
+    else:
+        from src.config.model_config import MODEL_RULES
+
+        context_length = MODEL_RULES.get("max_context_length", 4096)
+
+    max_response = MODEL_RULES.get("max_response_length", 2048)
+    reserve = min(max_response, int(context_length * RESPONSE_RESERVE_RATIO))
+    return context_length - reserve
+
+
+def _summarize_dropped(dropped: List[Dict[str, Any]], provider: str, model: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Gera um resumo extrativo (perguntas do usuário) dos turnos descartados.
+
+    Args:
+        dropped: Mensagens descartadas, da mais antiga para a mais recente
+        provider: "openai" ou "ollama"
+        model: Nome do modelo
+
+    Returns:
+        Mensagem de sistema com o resumo ou None se não houver perguntas
+    """
+    questions = [msg["content"].strip().replace("\n", " ") for msg in dropped if msg.get("role") == "user"]
+    if not questions:
+        return None
+
+    header = f"Resumo de {len(dropped)} mensagens anteriores omitidas. O usuário perguntou:"
+    lines = [header]
+    for question in reversed(questions):
+        line = f"- {question[:120]}"
+        if estimate_tokens("\n".join(lines + [line]), provider, model) > SUMMARY_MAX_TOKENS:
+            break
+        lines.insert(1, line)
+    return {"role": "system", "content": "\n".join(lines)}
+
+
+def fit_messages(
+    messages: List[Dict[str, Any]],
+    provider: str = "ollama",
+    model: Optional[str] = None,
+    budget: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Ajusta as mensagens ao orçamento de tokens do contexto.
+
+    As mensagens de sistema iniciais (system prompt e contexto de dados) e a última
+    mensagem (pergunta atual) são sempre mantidas. Do histórico entre elas são mantidos
+    os turnos mais recentes que couberem; os mais antigos viram um resumo curto.
+
+    Args:
+        messages: Mensagens na ordem system → contexto → histórico → pergunta
+        provider: "openai" ou "ollama"
+        model: Nome do modelo
+        budget: Orçamento de tokens (usa get_context_budget se None)
+
+    Returns:
+        Tupla (mensagens ajustadas, informações com "budget", "estimated_tokens",
+        "dropped_messages" e "over_budget")
+    """
+    if budget is None:
+        budget = get_context_budget(provider, model)
+
+    pinned_count = 0
+    while pinned_count < len(messages) - 1 and messages[pinned_count].get("role") == "system":
+        pinned_count += 1
+
+    pinned = messages[:pinned_count]
+    history = messages[pinned_count:-1]
+    question = messages[-1:]
+
+    fixed_tokens = estimate_message_tokens(pinned + question, provider, model)
+    available = budget - fixed_tokens - (SUMMARY_MAX_TOKENS if history else 0)
+
+    kept: List[Dict[str, Any]] = []
+    used = 0
+    for msg in reversed(history):
+        msg_tokens = estimate_message_tokens([msg], provider, model)
+        if used + msg_tokens > available:
+            break
+        kept.insert(0, msg)
+        used += msg_tokens
+
+    # Não começar o histórico por uma resposta sem a pergunta correspondente
+    while kept and kept[0].get("role") == "assistant" and len(kept) < len(history):
+        used -= estimate_message_tokens([kept.pop(0)], provider, model)
+
+    dropped = history[:len(history) - len(kept)]
+    summary = _summarize_dropped(dropped, provider, model) if dropped else None
+
+    fitted = pinned + ([summary] if summary else []) + kept + question
+    estimated = estimate_message_tokens(fitted, provider, model)
+    info = {
+        "budget": budget,
+        "estimated_tokens": estimated,
+        "dropped_messages": len(dropped),
+        "over_budget": estimated > budget,
+    }
+
+    if dropped:
+        logger.info(f"Janela de contexto: {len(dropped)} mensagens antigas omitidas ({estimated}/{budget} tokens)")
+    if info["over_budget"]:
+        logger.warning(
+            f"Prompt excede o orçamento do contexto mesmo sem histórico ({estimated}/{budget} tokens)"
+        )
+    return fitted, info
+
+
+def choose_num_ctx(
+    messages: List[Dict[str, Any]],
+    num_predict: Optional[int] = None,
+    config: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Escolhe o num_ctx de uma requisição ao Ollama a partir do tamanho do prompt.
+
+    O prompt medido, a resposta máxima (num_predict) e uma folga são arredondados para
+    cima até o próximo bucket de CONTEXT_SIZING_CONFIG. Prompts pequenos não alocam
+    KV cache desnecessário e prompts grandes não são truncados pela janela padrão.
+
+    Args:
+        messages: Mensagens enviadas ao modelo (incluindo system prompt)
+        num_predict: Máximo de tokens da resposta (None ou -1 = ilimitado)
+        config: Configuração (usa CONTEXT_SIZING_CONFIG se None)
+
+    Returns:
+        Dicionário com "num_ctx", "prompt_tokens", "response_tokens", "required_tokens"
+        e "truncated" (True se nem o maior bucket comporta prompt + resposta)
+    """
+    if config is None:
+        from src.config.model_config import CONTEXT_SIZING_CONFIG as config
+
+    prompt_tokens = estimate_message_tokens(messages, "ollama")
+    response_tokens = num_predict if num_predict and num_predict > 0 else config["default_response_tokens"]
+    required = prompt_tokens + response_tokens + config["safety_margin_tokens"]
+
+    buckets = sorted(config["buckets"])
+    num_ctx = next((bucket for bucket in buckets if bucket >= required), buckets[-1])
+    truncated = required > num_ctx
+
+    if truncated:
+        logger.warning(
+            f"Prompt de ~{prompt_tokens} tokens + resposta de {response_tokens} excede o maior "
+            f"num_ctx ({num_ctx}); o Ollama vai truncar o início do contexto"
+        )
+    return {
+        "num_ctx": num_ctx,
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "required_tokens": required,
+        "truncated": truncated,
+    }
@@ -2,17 +2,29 @@
 Módulo para carregar e processar dados de arquivos CSV
 """
 
+import hashlib
 import pandas as pd
 import logging
 from pathlib import Path
 from typing import Optional, Dict, Any, List
 
+from src.core.column_index import get_column_index
+from src.core.tracing import set_attributes
+from src.core.metrics import DATA_CONTEXT_BUILD_SECONDS, cache_lookup
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 
 # Caminho padrão para dados
 DEFAULT_DATA_DIR = Path(__file__).parent.parent.parent / "dados"
 
+# Cabeçalho do contexto versionado (mantido idêntico entre turnos para reuso de cache de prompt)
+DATA_CONTEXT_HEADER = "📊 CONTEXTO DOS DADOS DISPONÍVEIS"
+
+# Contextos já gerados, indexados pela versão do dataset
+MAX_CACHED_CONTEXTS = 4
+_data_context_cache: Dict[str, str] = {}
+
 
 def load_csv_data(filepath: Optional[str] = None) -> Optional[pd.DataFrame]:
     """
@@ -39,6 +51,8 @@ def load_csv_data(filepath: Optional[str] = None) -> Optional[pd.DataFrame]:
         df = pd.read_csv(filepath, encoding="utf-8")
 
         logger.info(f"Dados carregados: {len(df)} linhas, {len(df.columns)} colunas")
+        # Índice de resolução de colunas construído uma vez por schema
+        get_column_index(df.columns)
         return df
 
     except Exception as e:
@@ -332,3 +346,50 @@ def get_intelligent_data_context(df: pd.DataFrame) -> str:
         # Fallback para resumo básico
         return get_data_summary(df)
 
+
+def get_data_version(df: pd.DataFrame) -> str:
+    """
+    Calcula uma versão estável do dataset a partir das colunas e do conteúdo.
+
+    Args:
+        df: DataFrame do pandas
+
+    Returns:
+        Hash curto que só muda quando os dados mudam
+    """
+    hasher = hashlib.sha1()
+    hasher.update("|".join(str(col) for col in df.columns).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return hasher.hexdigest()[:12]
+
+
+def get_versioned_data_context(df: pd.DataFrame) -> str:
+    """
+    Retorna o contexto inteligente dos dados com cabeçalho de versão.
+
+    O texto é gerado uma vez por versão do dataset e reutilizado, de forma que o
+    prefixo do prompt fique byte a byte idêntico entre turnos e o cache de prompt
+    do provedor (KV cache do Ollama, prompt caching da OpenAI) possa ser aproveitado.
+
+    Args:
+        df: DataFrame do pandas
+
+    Returns:
+        String com o contexto versionado dos dados
+    """
+    if df is None or df.empty:
+        return "Nenhum dado disponível."
+
+    version = get_data_version(df)
+    context = _data_context_cache.get(version)
+    set_attributes(data_version=version, context_cache_hit=context is not None)
+    cache_lookup("data_context", context is not None)
+    if context is None:
+        with DATA_CONTEXT_BUILD_SECONDS.time():
+            context = f"{DATA_CONTEXT_HEADER} (versão {version}):\n\n{get_intelligent_data_context(df)}"
+        if len(_data_context_cache) >= MAX_CACHED_CONTEXTS:
+            _data_context_cache.pop(next(iter(_data_context_cache)))
+        _data_context_cache[version] = context
+        logger.info(f"Contexto dos dados gerado para a versão {version}")
+
+    return context
@@ -0,0 +1,420 @@
+"""
+Ferramentas de dados para o Agente de Análise (tool/function calling)
+
+Em vez de enviar o contexto completo dos dados em cada prompt, o modelo recebe
+apenas o esquema do dataset e chama estas ferramentas para obter números exatos:
+filtro, agregação por grupo, top-k, descrição de coluna e busca por id_veiculo.
+
+As definições seguem o formato de "tools" da OpenAI, que também é aceito pelo
+campo "tools" da API de chat do Ollama.
+"""
+
+import json
+import logging
+from typing import Optional, Dict, Any, List, Callable
+import pandas as pd
+
+from src.core.data_loader import filter_data
+from src.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Limite de linhas devolvidas por chamada (mantém o contexto pequeno)
+MAX_TOOL_ROWS = 20
+
+# Valores categóricos listados no esquema enviado ao modelo
+MAX_SCHEMA_VALUES = 10
+
+# Agregações aceitas por group_aggregate
+TOOL_AGGREGATIONS = ("count", "sum", "mean", "median", "min", "max")
+
+# Coluna usada como identificador do veículo
+VEHICLE_ID_COLUMN = "id_veiculo"
+
+_FILTERS_SCHEMA = {
+    "type": "object",
+    "description": "Filtros de igualdade {coluna: valor} ou {coluna: [valores]}",
+    "additionalProperties": True,
+}
+
+DATA_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "filter_rows",
+            "description": "Retorna as linhas que atendem aos filtros e o total de linhas encontradas.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "filters": _FILTERS_SCHEMA,
+                    "columns": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Colunas a retornar (todas se omitido)",
+                    },
+                    "limit": {"type": "integer", "description": f"Máximo de linhas (até {MAX_TOOL_ROWS})"},
+                },
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "group_aggregate",
+            "description": "Agrega uma métrica por grupo (ex: média de km_mes por cidade) ou no total.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "aggregation": {"type": "string", "enum": list(TOOL_AGGREGATIONS)},
+                    "metric": {"type": "string", "description": "Coluna numérica (opcional para count)"},
+                    "group_by": {"type": "string", "description": "Coluna de agrupamento (opcional)"},
+                    "filters": _FILTERS_SCHEMA,
+                },
+                "required": ["aggregation"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "top_k",
+            "description": "Retorna os k registros com maiores (ou menores) valores de uma coluna.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "column": {"type": "string"},
+                    "k": {"type": "integer"},
+                    "ascending": {"type": "boolean", "description": "True para os menores valores"},
+                    "filters": _FILTERS_SCHEMA,
+                    "columns": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["column"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "describe_column",
+            "description": "Estatísticas de uma coluna (numérica) ou contagem de valores (categórica).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "column": {"type": "string"},
+                    "filters": _FILTERS_SCHEMA,
+                },
+                "required": ["column"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "lookup_vehicle",
+            "description": "Busca todos os dados de um veículo pelo id_veiculo.",
+            "parameters": {
+                "type": "object",
+                "properties": {"id_veiculo": {"type": "string", "description": "Identificador, ex.: V001"}},
+                "required": ["id_veiculo"],
+            },
+        },
+    },
+]
+
+TOOL_MODE_PROMPT = """MODO FERRAMENTAS:
+Você NÃO recebe os dados completos. Use as ferramentas disponíveis (filter_rows, group_aggregate,
+top_k, describe_column, lookup_vehicle) para obter números exatos antes de responder.
+- Chame quantas ferramentas forem necessárias e responda somente com base nos resultados
+- Use exatamente os nomes de colunas e valores do esquema abaixo
+- Na resposta final, apresente os números obtidos em texto (sem código e sem JSON)"""
+
+
+def _to_native(value: Any) -> Any:
+    """Converte escalares numpy/pandas em tipos nativos serializáveis em JSON."""
+    if hasattr(value, "item"):
+        try:
+            return value.item()
+        except (ValueError, AttributeError):
+            pass
+    if isinstance(value, float) and value != value:  # NaN
+        return None
+    return value
+
+
+def _records(df: pd.DataFrame, columns: Optional[List[str]] = None, limit: int = MAX_TOOL_ROWS) -> List[Dict[str, Any]]:
+    """Converte as primeiras linhas do DataFrame em lista de dicionários nativos."""
+    if columns:
+        valid = [col for col in columns if col in df.columns]
+        if valid:
+            df = df[valid]
+    limit = max(1, min(int(limit or MAX_TOOL_ROWS), MAX_TOOL_ROWS))
+    return [
+        {key: _to_native(value) for key, value in row.items()}
+        for row in df.head(limit).to_dict(orient="records")
+    ]
+
+
+def _apply_filters(df: pd.DataFrame, filters: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Aplica filtros validando os nomes das colunas."""
+    if not filters:
+        return df
+    unknown = [col for col in filters if col not in df.columns]
+    if unknown:
+        raise ValueError(f"Colunas inexistentes nos filtros: {', '.join(unknown)}")
+    return filter_data(df, filters)
+
+
+def _require_column(df: pd.DataFrame, column: Optional[str]) -> str:
+    """Valida que a coluna existe no DataFrame."""
+    if not column or column not in df.columns:
+        raise ValueError(f"Coluna inexistente: {column}. Colunas válidas: {', '.join(df.columns)}")
+    return column
+
+
+def filter_rows(
+    df: pd.DataFrame,
+    filters: Optional[Dict[str, Any]] = None,
+    columns: Optional[List[str]] = None,
+    limit: int = MAX_TOOL_ROWS,
+) -> Dict[str, Any]:
+    """
+    Filtra linhas do DataFrame.
+
+    Args:
+        df: DataFrame com os dados
+        filters: Filtros {coluna: valor} ou {coluna: [valores]}
+        columns: Colunas a retornar
+        limit: Máximo de linhas retornadas
+
+    Returns:
+        Dicionário com "row_count" e "rows"
+    """
+    filtered = _apply_filters(df, filters)
+    return {"row_count": int(len(filtered)), "rows": _records(filtered, columns, limit)}
+
+
+def group_aggregate(
+    df: pd.DataFrame,
+    aggregation: str,
+    metric: Optional[str] = None,
+    group_by: Optional[str] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Agrega uma métrica no total ou por grupo.
+
+    Args:
+        df: DataFrame com os dados
+        aggregation: Uma de TOOL_AGGREGATIONS
+        metric: Coluna numérica (opcional para count)
+        group_by: Coluna de agrupamento (opcional)
+        filters: Filtros aplicados antes da agregação
+
+    Returns:
+        Dicionário com "value" (sem grupo) ou "groups" (lista ordenada)
+    """
+    if aggregation not in TOOL_AGGREGATIONS:
+        raise ValueError(f"Agregação inválida: {aggregation}. Use: {', '.join(TOOL_AGGREGATIONS)}")
+    if aggregation != "count" or metric:
+        metric = _require_column(df, metric)
+    if group_by:
+        group_by = _require_column(df, group_by)
+
+    filtered = _apply_filters(df, filters)
+    result: Dict[str, Any] = {"aggregation": aggregation, "metric": metric, "row_count": int(len(filtered))}
+
+    if group_by:
+        grouped = filtered.groupby(group_by)
+        series = grouped.size() if aggregation == "count" and not metric else grouped[metric].agg(aggregation)
+        series = series.sort_values(ascending=False)
+        result["group_by"] = group_by
+        result["groups"] = [
+            {group_by: _to_native(key), "value": _to_native(value)} for key, value in series.items()
+        ]
+    elif aggregation == "count" and not metric:
+        result["value"] = int(len(filtered))
+    else:
+        result["value"] = _to_native(filtered[metric].agg(aggregation))
+
+    return result
+
+
+def top_k(
+    df: pd.DataFrame,
+    column: str,
+    k: int = 5,
+    ascending: bool = False,
+    filters: Optional[Dict[str, Any]] = None,
+    columns: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    Retorna os k registros com maiores (ou menores) valores de uma coluna.
+
+    Args:
+        df: DataFrame com os dados
+        column: Coluna de ordenação
+        k: Quantidade de registros
+        ascending: True para os menores valores
+        filters: Filtros aplicados antes da ordenação
+        columns: Colunas a retornar
+
+    Returns:
+        Dicionário com "column" e "rows"
+    """
+    column = _require_column(df, column)
+    filtered = _apply_filters(df, filters)
+    ordered = filtered.sort_values(column, ascending=bool(ascending))
+    if columns and column not in columns:
+        columns = [column] + list(columns)
+    return {"column": column, "rows": _records(ordered, columns, k)}
+
+
+def describe_column(
+    df: pd.DataFrame,
+    column: str,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Descreve uma coluna do dataset.
+
+    Args:
+        df: DataFrame com os dados
+        column: Nome da coluna
+        filters: Filtros aplicados antes da descrição
+
+    Returns:
+        Estatísticas (numérica) ou contagem de valores (categórica)
+    """
+    column = _require_column(df, column)
+    series = _apply_filters(df, filters)[column]
+
+    if pd.api.types.is_numeric_dtype(series):
+        stats = series.describe()
+        return {
+            "column": column,
+            "type": "numeric",
+            "count": int(stats.get("count", 0)),
+            "sum": _to_native(series.sum()),
+            "mean": _to_native(stats.get("mean")),
+            "std": _to_native(stats.get("std")),
+            "min": _to_native(stats.get("min")),
+            "median": _to_native(series.median()),
+            "max": _to_native(stats.get("max")),
+        }
+
+    counts = series.value_counts()
+    return {
+        "column": column,
+        "type": "categorical",
+        "count": int(series.count()),
+        "unique": int(counts.size),
+        "value_counts": {str(key): int(value) for key, value in counts.head(MAX_TOOL_ROWS).items()},
+    }
+
+
+def lookup_vehicle(df: pd.DataFrame, id_veiculo: Any) -> Dict[str, Any]:
+    """
+    Busca um veículo pelo identificador.
+
+    Args:
+        df: DataFrame com os dados
+        id_veiculo: Identificador do veículo
+
+    Returns:
+        Dicionário com "found" e "vehicle"
+    """
+    _require_column(df, VEHICLE_ID_COLUMN)
+    ids = df[VEHICLE_ID_COLUMN]
+    if pd.api.types.is_numeric_dtype(ids):
+        try:
+            id_veiculo = int(id_veiculo)
+        except (TypeError, ValueError):
+            return {"found": False, "id_veiculo": id_veiculo}
+        matches = df[ids == id_veiculo]
+    else:
+        # Ids textuais (ex.: "V001"): compara sem diferenciar maiúsculas e espaços
+        id_veiculo = str(id_veiculo).strip()
+        matches = df[ids.astype(str).str.strip().str.upper() == id_veiculo.upper()]
+    if matches.empty:
+        return {"found": False, "id_veiculo": _to_native(id_veiculo)}
+    return {"found": True, "vehicle": _records(matches, limit=1)[0]}
+
+
+TOOL_FUNCTIONS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "filter_rows": filter_rows,
+    "group_aggregate": group_aggregate,
+    "top_k": top_k,
+    "describe_column": describe_column,
+    "lookup_vehicle": lookup_vehicle,
+}
+
+
+def execute_tool_call(df: pd.DataFrame, name: str, arguments: Any) -> str:
+    """
+    Executa uma chamada de ferramenta feita pelo modelo.
+
+    Args:
+        df: DataFrame com os dados
+        name: Nome da ferramenta
+        arguments: Argumentos (dict ou string JSON, conforme o provedor)
+
+    Returns:
+        Resultado serializado em JSON (erros também são devolvidos ao modelo)
+    """
+    try:
+        if isinstance(arguments, str):
+            arguments = json.loads(arguments) if arguments.strip() else {}
+        arguments = arguments or {}
+
+        function = TOOL_FUNCTIONS.get(name)
+        if function is None:
+            raise ValueError(f"Ferramenta desconhecida: {name}")
+
+        result = function(df, **arguments)
+        logger.info(f"Ferramenta {name} executada: {arguments}")
+    except Exception as e:
+        logger.warning(f"Erro na ferramenta {name}({arguments}): {str(e)}")
+        result = {"error": str(e)}
+
+    return json.dumps(result, ensure_ascii=False, default=str)
+
+
+def create_tool_executor(df: pd.DataFrame) -> Callable[[str, Any], str]:
+    """
+    Cria um executor de ferramentas ligado ao DataFrame carregado.
+
+    Args:
+        df: DataFrame com os dados
+
+    Returns:
+        Função (nome, argumentos) -> resultado JSON
+    """
+    def executor(name: str, arguments: Any) -> str:
+        with span("tool.call", tool=name):
+            return execute_tool_call(df, name, arguments)
+
+    return executor
+
+
+def get_tool_schema_context(df: pd.DataFrame) -> str:
+    """
+    Gera o esquema compacto do dataset enviado no modo ferramentas.
+
+    Args:
+        df: DataFrame com os dados
+
+    Returns:
+        Texto com total de linhas, colunas, tipos e valores categóricos
+    """
+    lines = [f"Total de registros: {len(df)}", "Colunas:"]
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            lines.append(f"- {column} (numérica, {_to_native(series.min())} a {_to_native(series.max())})")
+        else:
+            values = series.dropna().unique()
+            if len(values) <= MAX_SCHEMA_VALUES:
+                lines.append(f"- {column} (categórica: {', '.join(str(v) for v in values)})")
+            else:
+                lines.append(f"- {column} (categórica, {len(values)} valores distintos)")
+    return "\n".join(lines)
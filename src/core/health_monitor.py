@@ -0,0 +1,143 @@
+"""
+Monitor de saúde dos provedores LLM com cache em memória
+
+Verifica a conexão e a lista de modelos em segundo plano, em intervalos fixos, e
+guarda o resultado com TTL. is_configured(), get_connection_status() e
+list_available_models() dos handlers passam a ser servidos da memória, sem
+requisição HTTP a cada rerun do Streamlit ou envio de mensagem. Erros de conexão
+durante o uso invalidam o cache imediatamente.
+"""
+
+import logging
+import threading
+import time
+import weakref
+from typing import Optional, Dict, Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def _refresh_loop(monitor_ref: "weakref.ref", stop_event: threading.Event, interval: float):
+    """Atualiza o monitor periodicamente enquanto ele existir (encerra junto com o handler)."""
+    while not stop_event.wait(interval):
+        monitor = monitor_ref()
+        if monitor is None:
+            return
+        try:
+            monitor.refresh()
+        except Exception as e:
+            logger.debug(f"Erro na verificação periódica de saúde: {str(e)}")
+        del monitor
+
+
+class HealthMonitor:
+    """Cache com TTL do status de conexão, atualizado em segundo plano"""
+
+    def __init__(
+        self,
+        probe: Callable[[], Dict[str, Any]],
+        name: str = "llm",
+        refresh_interval: Optional[float] = None,
+        ttl: Optional[float] = None,
+        start: bool = True,
+    ):
+        """
+        Inicializa o monitor.
+
+        Args:
+            probe: Função que consulta o provedor e retorna o status
+                (dicionário com "connected" e, opcionalmente, "available_models")
+            name: Nome usado nos logs
+            refresh_interval: Intervalo da verificação em segundo plano (usa HEALTH_CONFIG se None)
+            ttl: Validade do status conectado (usa HEALTH_CONFIG se None)
+            start: Inicia a verificação em segundo plano
+        """
+        from src.config.model_config import HEALTH_CONFIG
+
+        self.probe = probe
+        self.name = name
+        self.refresh_interval = refresh_interval or HEALTH_CONFIG["refresh_interval_seconds"]
+        self.ttl = ttl or HEALTH_CONFIG["ttl_seconds"]
+        # Status desconectado expira rápido para detectar a volta do servidor
+        self.disconnected_ttl = min(self.ttl, HEALTH_CONFIG["disconnected_ttl_seconds"])
+        self._status: Optional[Dict[str, Any]] = None
+        self._updated_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.stats = {"probes": 0, "cache_hits": 0, "invalidations": 0}
+
+        if start:
+            threading.Thread(
+                target=_refresh_loop,
+                args=(weakref.ref(self), self._stop_event, self.refresh_interval),
+                name=f"health-{name}",
+                daemon=True,
+            ).start()
+
+    def __del__(self):
+        self._stop_event.set()
+
+    def refresh(self) -> Dict[str, Any]:
+        """
+        Consulta o provedor e atualiza o cache.
+
+        Chamadas simultâneas aguardam a mesma verificação em vez de repeti-la.
+
+        Returns:
+            Status atualizado
+        """
+        requested_at = time.monotonic()
+        with self._refresh_lock:
+            with self._lock:
+                if self._status is not None and self._updated_at >= requested_at:
+                    return self._status
+            try:
+                status = self.probe()
+            except Exception as e:
+                status = {"connected": False, "message": "❌ Erro ao conectar", "error": str(e)}
+            with self._lock:
+                was_connected = (self._status or {}).get("connected")
+                self._status = status
+                self._updated_at = time.monotonic()
+                self.stats["probes"] += 1
+            if was_connected is not None and was_connected != status.get("connected"):
+                logger.info(
+                    f"Status de {self.name} mudou: {'conectado' if status.get('connected') else 'desconectado'}"
+                )
+            return status
+
+    def get_status(self) -> Dict[str, Any]:
+        """
+        Retorna o status em cache (ou consulta o provedor se expirado/invalidado).
+
+        Returns:
+            Dicionário de status (não deve ser modificado)
+        """
+        with self._lock:
+            status = self._status
+            age = time.monotonic() - self._updated_at
+            if status is not None:
+                ttl = self.ttl if status.get("connected") else self.disconnected_ttl
+                if age <= ttl:
+                    self.stats["cache_hits"] += 1
+                    return status
+        return self.refresh()
+
+    def invalidate(self, reason: Optional[str] = None):
+        """
+        Descarta o status em cache (ex: erro de conexão durante uma requisição).
+
+        Args:
+            reason: Motivo registrado no log
+        """
+        with self._lock:
+            if self._status is None:
+                return
+            self._status = None
+            self.stats["invalidations"] += 1
+        logger.info(f"Cache de saúde de {self.name} invalidado{f': {reason}' if reason else ''}")
+
+    def stop(self):
+        """Interrompe a verificação em segundo plano."""
+        self._stop_event.set()
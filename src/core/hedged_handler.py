@@ -0,0 +1,397 @@
+"""
+Handler composto com failover e requisições "hedged" entre provedores
+
+Envolve dois handlers (ex: OllamaLLMHandler local como primário e OpenAILLMHandler
+como secundário) com a mesma interface dos handlers simples. A requisição vai para o
+primário; se o primeiro token (ou a resposta, sem streaming) demorar mais que o
+limite da política, uma segunda requisição é enviada ao secundário e vence quem
+responder primeiro. O perdedor é cancelado (o streaming é encerrado assim que ele
+produzir o próximo chunk; sem streaming, a requisição do perdedor vai até o fim e
+o resultado é descartado). Erros do primário caem direto no secundário.
+
+As latências (tempo até o primeiro token e total) são acompanhadas por provedor e
+o limite de hedge se adapta ao p50/p95 observado do primário.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Callable
+
+from src.core.tracing import bind_context
+from src.core.usage_tracker import is_error_response
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """Percentil simples de uma lista (0.0 se vazia)."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+
+class HedgedLLMHandler:
+    """Handler que combina um provedor primário e um secundário com hedge por latência"""
+
+    def __init__(self, primary, secondary, policy: Optional[str] = None):
+        """
+        Inicializa o handler composto.
+
+        Args:
+            primary: Handler preferido (ex: OllamaLLMHandler)
+            secondary: Handler usado em hedge/failover (ex: OpenAILLMHandler)
+            policy: Política padrão ("cost", "balanced" ou "latency"; usa HEDGING_CONFIG se None)
+        """
+        from src.config.model_config import HEDGING_CONFIG
+
+        self.config = HEDGING_CONFIG
+        self.primary = primary
+        self.secondary = secondary
+        self.policy = policy or HEDGING_CONFIG["default_policy"]
+        # Mesmo provedor do primário (modo de ferramentas, compactação, etc.)
+        self.provider = getattr(primary, "provider", "ollama")
+        self.base_url = getattr(primary, "base_url", None)
+        self._usage_state = threading.local()
+        self._stats_lock = threading.Lock()
+        window = HEDGING_CONFIG["latency_window"]
+        self.latency_stats = {
+            name: {
+                "ttft": deque(maxlen=window),
+                "total": deque(maxlen=window),
+                "requests": 0,
+                "wins": 0,
+                "errors": 0,
+                "cancelled": 0,
+            }
+            for name in ("primary", "secondary")
+        }
+        self.hedge_stats = {"requests": 0, "hedged": 0, "failovers": 0}
+
+    @property
+    def last_usage(self) -> Optional[Dict[str, Any]]:
+        """Uso de tokens da última chamada feita na thread atual (do provedor vencedor)."""
+        return getattr(self._usage_state, "usage", None)
+
+    def get_system_prompt(self, context: str = "general") -> str:
+        """Retorna o system prompt do handler primário."""
+        return self.primary.get_system_prompt(context)
+
+    # ------------------------------------------------------------------
+    # Política e estatísticas
+    # ------------------------------------------------------------------
+
+    def _get_policy(self, name: Optional[str]) -> Dict[str, Any]:
+        """Retorna a configuração da política (padrão do handler se name for None)."""
+        policies = self.config["policies"]
+        name = name or self.policy
+        if name not in policies:
+            logger.warning(f"Política de hedge inválida '{name}', usando '{self.config['default_policy']}'")
+            name = self.config["default_policy"]
+        return policies[name]
+
+    def get_hedge_delay(self, policy_name: Optional[str] = None) -> Optional[float]:
+        """
+        Calcula após quantos segundos sem primeiro token o secundário é acionado.
+
+        Args:
+            policy_name: Política da consulta (None usa a padrão)
+
+        Returns:
+            Segundos até o hedge ou None se a política não faz hedge
+        """
+        policy = self._get_policy(policy_name)
+        if not policy.get("hedge"):
+            return None
+        with self._stats_lock:
+            samples = list(self.latency_stats["primary"]["ttft"])
+        if len(samples) < self.config["min_samples"]:
+            return max(policy["min_hedge_seconds"], self.config["initial_hedge_seconds"])
+        return max(policy["min_hedge_seconds"], _percentile(samples, policy["ttft_percentile"]))
+
+    def _record(self, name: str, field: str, value: Optional[float] = None):
+        """Registra uma latência (value) ou incrementa um contador do provedor."""
+        with self._stats_lock:
+            if value is None:
+                self.latency_stats[name][field] += 1
+            else:
+                self.latency_stats[name][field].append(value)
+
+    def get_latency_stats(self) -> Dict[str, Any]:
+        """
+        Retorna latências e contadores por provedor.
+
+        Returns:
+            Dicionário {"primary"/"secondary": {"provider", "ttft_p50", "ttft_p95",
+            "total_p50", "total_p95", "requests", "wins", "errors", "cancelled"},
+            "hedge": {"requests", "hedged", "failovers"}}
+        """
+        handlers = {"primary": self.primary, "secondary": self.secondary}
+        with self._stats_lock:
+            stats = {}
+            for name, data in self.latency_stats.items():
+                ttft = list(data["ttft"])
+                total = list(data["total"])
+                stats[name] = {
+                    "provider": getattr(handlers[name], "provider", name),
+                    "ttft_p50": _percentile(ttft, 0.50),
+                    "ttft_p95": _percentile(ttft, 0.95),
+                    "total_p50": _percentile(total, 0.50),
+                    "total_p95": _percentile(total, 0.95),
+                    "requests": data["requests"],
+                    "wins": data["wins"],
+                    "errors": data["errors"],
+                    "cancelled": data["cancelled"],
+                }
+            stats["hedge"] = dict(self.hedge_stats)
+        return stats
+
+    # ------------------------------------------------------------------
+    # Execução com hedge
+    # ------------------------------------------------------------------
+
+    def _start_attempt(
+        self,
+        name: str,
+        call_kwargs: Dict[str, Any],
+        stream: bool,
+        events: "queue.Queue",
+        cancel: threading.Event,
+    ):
+        """
+        Inicia a requisição de um provedor em uma thread.
+
+        Eventos publicados na fila: (name, "first", dado), (name, "chunk", chunk),
+        (name, "done", uso) e (name, "error", mensagem).
+        """
+        handler = self.primary if name == "primary" else self.secondary
+        kwargs = dict(call_kwargs)
+        if name == "secondary":
+            kwargs["model"] = self.config["secondary_models"].get(
+                getattr(handler, "provider", ""), kwargs.get("model")
+            )
+        self._record(name, "requests")
+
+        def run():
+            start = time.perf_counter()
+            try:
+                response = handler.generate_response(stream=stream, **kwargs)
+                if is_error_response(response) or response is None:
+                    events.put((name, "error", response or "Erro: resposta vazia"))
+                    return
+                if not stream:
+                    self._record(name, "ttft", time.perf_counter() - start)
+                    self._record(name, "total", time.perf_counter() - start)
+                    if cancel.is_set():
+                        # Perdedor sem streaming: a requisição HTTP bloqueante não pode ser
+                        # interrompida e vai até o fim; o resultado é descartado
+                        return
+                    events.put((name, "first", response))
+                    events.put((name, "done", handler.last_usage))
+                    return
+
+                try:
+                    first = True
+                    for chunk in response:
+                        if cancel.is_set():
+                            return
+                        if first:
+                            self._record(name, "ttft", time.perf_counter() - start)
+                            events.put((name, "first", chunk))
+                            first = False
+                        else:
+                            events.put((name, "chunk", chunk))
+                    if first:
+                        events.put((name, "first", ""))
+                    self._record(name, "total", time.perf_counter() - start)
+                    events.put((name, "done", handler.last_usage))
+                finally:
+                    # Encerra o streaming do provedor (fecha a resposta HTTP) ao cancelar ou falhar
+                    close = getattr(response, "close", None)
+                    if close:
+                        close()
+            except Exception as e:
+                events.put((name, "error", f"Erro: {str(e)}"))
+
+        # bind_context: o agente e a sessão (métricas e uso de tokens) seguem para a thread
+        threading.Thread(target=bind_context(run), name=f"hedge-{name}", daemon=True).start()
+
+    def _race(self, call_kwargs: Dict[str, Any], stream: bool, policy_name: Optional[str]):
+        """
+        Executa a requisição no primário, acionando o secundário por hedge ou failover.
+
+        Returns:
+            Tupla (vencedor, primeiro dado, fila de eventos, eventos de cancelamento)
+            ou (None, mensagem de erro, None, None) se ambos falharem
+        """
+        policy = self._get_policy(policy_name)
+        hedge_delay = self.get_hedge_delay(policy_name)
+        events: "queue.Queue" = queue.Queue()
+        cancels = {"primary": threading.Event(), "secondary": threading.Event()}
+        with self._stats_lock:
+            self.hedge_stats["requests"] += 1
+
+        started = ["primary"]
+        self._start_attempt("primary", call_kwargs, stream, events, cancels["primary"])
+        failed: Dict[str, str] = {}
+
+        while True:
+            timeout = hedge_delay if (hedge_delay is not None and "secondary" not in started) else None
+            try:
+                name, kind, data = events.get(timeout=timeout)
+            except queue.Empty:
+                logger.info(f"Primário sem primeiro token após {hedge_delay:.1f}s: enviando requisição ao secundário")
+                with self._stats_lock:
+                    self.hedge_stats["hedged"] += 1
+                started.append("secondary")
+                self._start_attempt("secondary", call_kwargs, stream, events, cancels["secondary"])
+                continue
+
+            if kind == "error":
+                failed[name] = data
+                self._record(name, "errors")
+                if "secondary" not in started and policy.get("failover", True):
+                    logger.warning(f"Falha no provedor primário, usando o secundário: {str(data)[:200]}")
+                    with self._stats_lock:
+                        self.hedge_stats["failovers"] += 1
+                    started.append("secondary")
+                    self._start_attempt("secondary", call_kwargs, stream, events, cancels["secondary"])
+                if len(failed) == len(started):
+                    return None, failed.get("primary") or data, None, None
+                continue
+
+            if kind == "first" and name not in failed:
+                self._record(name, "wins")
+                for other in started:
+                    if other != name and other not in failed:
+                        cancels[other].set()
+                        self._record(other, "cancelled")
+                return name, data, events, cancels
+
+    def generate_response(
+        self,
+        messages: Optional[List[Dict[str, str]]] = None,
+        user_input: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        context: str = "general",
+        stream: bool = False,
+        hedge_policy: Optional[str] = None,
+        **kwargs,
+    ):
+        """
+        Gera uma resposta com hedge/failover entre os provedores.
+
+        Args:
+            messages: Lista de mensagens (formato chat)
+            user_input: Input do usuário (alternativa a messages)
+            model: Modelo do primário (o secundário usa HEDGING_CONFIG["secondary_models"])
+            temperature: Temperatura para geração
+            context: Contexto do system prompt
+            stream: Se True, retorna um gerador do provedor vencedor
+            hedge_policy: Política desta consulta ("cost", "balanced", "latency")
+            **kwargs: Parâmetros adicionais repassados aos handlers
+
+        Returns:
+            Resposta do provedor vencedor (ou gerador em streaming); mensagem de erro
+            se ambos falharem
+        """
+        self._usage_state.usage = None
+        call_kwargs = dict(
+            kwargs, messages=messages, user_input=user_input, model=model,
+            temperature=temperature, context=context,
+        )
+        winner, first, events, cancels = self._race(call_kwargs, stream, hedge_policy)
+        if winner is None:
+            return first
+
+        if not stream:
+            # Sem streaming o evento "done" do vencedor segue o "first" com o uso de tokens
+            while True:
+                name, kind, usage = events.get()
+                if name == winner:
+                    self._usage_state.usage = usage if kind == "done" else None
+                    return first
+
+        return self._stream_winner(winner, first, events, cancels[winner])
+
+    def _stream_winner(self, winner: str, first: Any, events: "queue.Queue", cancel: threading.Event):
+        """
+        Gerador com os chunks do provedor vencedor (ignora eventos do perdedor).
+
+        Se o consumidor parar antes do fim (close() ou descarte do gerador), o
+        vencedor também é cancelado: a thread para de ler e fecha o streaming.
+        """
+        try:
+            if first:
+                yield first
+            while True:
+                name, kind, data = events.get()
+                if name != winner:
+                    continue
+                if kind == "chunk":
+                    yield data
+                elif kind == "done":
+                    self._usage_state.usage = data
+                    return
+                elif kind == "error":
+                    raise Exception(data)
+        finally:
+            cancel.set()
+
+    def generate_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        tool_executor: Callable[[str, Any], str],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_rounds: int = 5,
+        **kwargs,
+    ) -> str:
+        """
+        Gera uma resposta com ferramentas no primário, com failover para o secundário.
+
+        Sem hedge: as ferramentas são executadas localmente a cada rodada.
+        """
+        kwargs.pop("hedge_policy", None)
+        try:
+            response = self.primary.generate_with_tools(
+                messages, tools, tool_executor, model=model, temperature=temperature,
+                max_rounds=max_rounds, **kwargs
+            )
+            self._usage_state.usage = self.primary.last_usage
+            return response
+        except Exception as e:
+            logger.warning(f"Falha no modo ferramentas do primário, usando o secundário: {str(e)}")
+            self._record("primary", "errors")
+            with self._stats_lock:
+                self.hedge_stats["failovers"] += 1
+            secondary_model = self.config["secondary_models"].get(getattr(self.secondary, "provider", ""), model)
+            response = self.secondary.generate_with_tools(
+                messages, tools, tool_executor, model=secondary_model, temperature=temperature,
+                max_rounds=max_rounds, **kwargs
+            )
+            self._usage_state.usage = self.secondary.last_usage
+            return response
+
+    # ------------------------------------------------------------------
+    # Status (delegado ao primário)
+    # ------------------------------------------------------------------
+
+    def is_configured(self) -> bool:
+        """Indica se algum dos provedores está disponível."""
+        return self.primary.is_configured() or self.secondary.is_configured()
+
+    def get_connection_status(self) -> dict:
+        """Status do primário acrescido das latências por provedor."""
+        status = self.primary.get_connection_status()
+        status["hedging"] = self.get_latency_stats()
+        return status
+
+    def list_available_models(self) -> List[str]:
+        """Modelos disponíveis no provedor primário."""
+        return self.primary.list_available_models()
@@ -0,0 +1,201 @@
+"""
+Compactação do histórico de conversas longas
+
+Quando o histórico passa de um limite, os turnos mais antigos são resumidos por um
+modelo pequeno e rápido em uma mensagem de memória. O resumo fica salvo por sessão
+(history_manager) e é reutilizado até acumularem mais turnos; então é atualizado de
+forma incremental (resumo anterior + novos turnos antigos).
+
+O limite de compactação avança em passos fixos, de forma que o tamanho do prompt
+fica aproximadamente constante ao longo do dia.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Optional, Dict, Any, List
+
+from src.core.history_manager import load_summary, save_summary
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """Você resume conversas entre um usuário e um assistente de análise de frotas.
+
+Escreva um resumo compacto em português que permita responder perguntas de acompanhamento:
+- Perguntas feitas pelo usuário e as conclusões principais
+- Números, filtros, colunas, cidades, marcas e veículos citados
+- Preferências do usuário e pendências em aberto
+
+Não invente informações. Não use blocos de código. Máximo de {max_words} palavras."""
+
+MEMORY_HEADER = "MEMÓRIA DA CONVERSA (resumo de {count} mensagens anteriores):"
+
+# Limites da transcrição enviada ao modelo de resumo (validação aceita até 10000 caracteres)
+MAX_TRANSCRIPT_MESSAGE_CHARS = 800
+MAX_TRANSCRIPT_CHARS = 8000
+
+
+def get_compaction_config(provider: str = "ollama") -> Dict[str, Any]:
+    """
+    Retorna a configuração de compactação do provedor.
+
+    Args:
+        provider: "openai" ou "ollama"
+
+    Returns:
+        Dicionário de configuração (COMPACTION_CONFIG do provedor)
+    """
+    if provider == "openai":
+        from src.config.openai_model_config import COMPACTION_CONFIG
+
+        env_model = os.getenv("OPENAI_SUMMARY_MODEL")
+    else:
+        from src.config.model_config import COMPACTION_CONFIG
+
+        env_model = os.getenv("OLLAMA_SUMMARY_MODEL")
+
+    config = dict(COMPACTION_CONFIG)
+    if env_model:
+        config["summary_model"] = env_model
+    return config
+
+
+def _fingerprint(messages: List[Dict[str, Any]]) -> str:
+    """Hash das mensagens resumidas (detecta histórico limpo ou trocado)."""
+    hasher = hashlib.sha1()
+    for msg in messages:
+        hasher.update(f"{msg.get('role')}:{msg.get('content')}\n".encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def _format_transcript(messages: List[Dict[str, Any]]) -> str:
+    """Formata mensagens como transcrição para o modelo de resumo."""
+    labels = {"user": "Usuário", "assistant": "Assistente"}
+    transcript = "\n\n".join(
+        f"{labels.get(msg.get('role'), msg.get('role'))}: {msg.get('content', '')[:MAX_TRANSCRIPT_MESSAGE_CHARS]}"
+        for msg in messages
+    )
+    # Manter o trecho mais recente se a transcrição for longa demais
+    return transcript[-MAX_TRANSCRIPT_CHARS:]
+
+
+def summarize_messages(
+    messages: List[Dict[str, Any]],
+    llm_handler,
+    model: Optional[str],
+    previous_summary: Optional[str] = None,
+    max_words: int = 200,
+) -> Optional[str]:
+    """
+    Resume mensagens (opcionalmente estendendo um resumo anterior).
+
+    Args:
+        messages: Mensagens a resumir
+        llm_handler: Handler LLM (OllamaLLMHandler ou OpenAILLMHandler)
+        model: Modelo usado no resumo
+        previous_summary: Resumo já existente das mensagens anteriores a estas
+        max_words: Tamanho máximo do resumo
+
+    Returns:
+        Texto do resumo ou None em caso de erro
+    """
+    content = ""
+    if previous_summary:
+        content += f"RESUMO ANTERIOR:\n{previous_summary}\n\nNOVAS MENSAGENS:\n"
+    content += _format_transcript(messages)
+    content += "\n\nAtualize o resumo incluindo as novas mensagens." if previous_summary else "\n\nResuma a conversa acima."
+
+    try:
+        summary = llm_handler.generate_response(
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT.format(max_words=max_words)},
+                {"role": "user", "content": content},
+            ],
+            model=model,
+            temperature=0.2,
+            stream=False,
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao resumir histórico: {str(e)}")
+        return None
+
+    # Handlers retornam mensagens de erro como texto
+    if not isinstance(summary, str) or not summary.strip() or summary.startswith(("Erro", "❌")):
+        logger.warning(f"Resumo do histórico inválido: {str(summary)[:100]}")
+        return None
+    return summary.strip()
+
+
+def compact_history(
+    history: List[Dict[str, Any]],
+    llm_handler,
+    session_id: str = "current",
+    provider: str = "ollama",
+    model: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Compacta o histórico da conversa em memória resumida + turnos recentes.
+
+    Args:
+        history: Mensagens anteriores (sem a pergunta atual)
+        llm_handler: Handler LLM usado para gerar o resumo
+        session_id: ID da sessão (chave do resumo salvo)
+        provider: "openai" ou "ollama"
+        model: Modelo selecionado (usado se não houver summary_model configurado)
+
+    Returns:
+        Lista com a mensagem de memória (se houver) seguida dos turnos recentes.
+        Em caso de falha no resumo, retorna o histórico original
+    """
+    history = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in history
+        if msg.get("role") in ("user", "assistant") and isinstance(msg.get("content"), str)
+    ]
+    config = get_compaction_config(provider)
+    if len(history) <= config["threshold_messages"]:
+        return history
+
+    # Limite de compactação em passos fixos: o resumo é reutilizado entre os passos
+    step = max(1, config["step_messages"])
+    boundary = ((len(history) - config["keep_recent_messages"]) // step) * step
+    if boundary <= 0:
+        return history
+
+    older = history[:boundary]
+    recent = history[boundary:]
+    fingerprint = _fingerprint(older)
+    summary_model = config.get("summary_model") or model
+
+    cached = load_summary(session_id)
+    if cached and cached.get("fingerprint") == fingerprint:
+        summary = cached.get("summary")
+        logger.debug(f"Resumo da sessão reutilizado ({boundary} mensagens)")
+    else:
+        previous_summary = None
+        to_summarize = older
+        # Atualização incremental: o resumo salvo cobre um prefixo do histórico atual
+        if cached and 0 < cached.get("summarized_count", 0) < boundary:
+            count = cached["summarized_count"]
+            if _fingerprint(history[:count]) == cached.get("fingerprint"):
+                previous_summary = cached.get("summary")
+                to_summarize = older[count:]
+
+        logger.info(
+            f"Compactando histórico: {len(to_summarize)} mensagens "
+            f"({'incremental' if previous_summary else 'completo'}, modelo={summary_model})"
+        )
+        summary = summarize_messages(
+            to_summarize, llm_handler, summary_model, previous_summary, config["summary_max_words"]
+        )
+        if summary is None:
+            return history
+        save_summary(session_id, {
+            "summary": summary,
+            "summarized_count": boundary,
+            "fingerprint": fingerprint,
+            "model": summary_model,
+        })
+
+    memory = {"role": "system", "content": f"{MEMORY_HEADER.format(count=boundary)}\n{summary}"}
+    return [memory] + recent
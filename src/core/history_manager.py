@@ -16,6 +16,12 @@ logger = logging.getLogger(__name__)
 HISTORY_DIR = Path("data/chat_history")
 HISTORY_DIR.mkdir(parents=True, exist_ok=True)
 
+# Resumos de compactação das sessões (subdiretório, fora da listagem de sessões)
+SUMMARY_DIR = HISTORY_DIR / "summaries"
+
+# Uso de tokens das sessões (ver usage_tracker.py), ao lado dos resumos
+USAGE_DIR = HISTORY_DIR / "usage"
+
 
 def save_history(messages: List[Dict[str, str]], session_id: Optional[str] = None) -> str:
     """
@@ -180,3 +186,107 @@ def auto_save_history(messages: List[Dict[str, str]], session_id: str = "current
         # Não falhar silenciosamente, mas logar o erro
         logger.warning(f"Erro no auto-save: {str(e)}")
 
+
+def save_summary(session_id: str, summary: Dict[str, Any]) -> Optional[str]:
+    """
+    Salva o resumo de compactação de uma sessão.
+    
+    Args:
+        session_id: ID da sessão
+        summary: Dicionário com "summary", "summarized_count" e "fingerprint"
+        
+    Returns:
+        Caminho do arquivo salvo ou None em caso de erro
+    """
+    try:
+        SUMMARY_DIR.mkdir(parents=True, exist_ok=True)
+        filepath = SUMMARY_DIR / f"{session_id}.json"
+        
+        summary_data = dict(summary)
+        summary_data["session_id"] = session_id
+        summary_data["updated_at"] = datetime.now().isoformat()
+        
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(summary_data, f, ensure_ascii=False, indent=2)
+        
+        logger.info(f"Resumo da sessão salvo: {filepath} ({summary_data.get('summarized_count', 0)} mensagens)")
+        return str(filepath)
+        
+    except Exception as e:
+        logger.warning(f"Erro ao salvar resumo da sessão: {str(e)}")
+        return None
+
+
+def load_summary(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Carrega o resumo de compactação de uma sessão.
+    
+    Args:
+        session_id: ID da sessão
+        
+    Returns:
+        Dicionário do resumo ou None se não existir
+    """
+    try:
+        filepath = SUMMARY_DIR / f"{session_id}.json"
+        if not filepath.exists():
+            return None
+        
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+        
+    except Exception as e:
+        logger.warning(f"Erro ao carregar resumo da sessão: {str(e)}")
+        return None
+
+
+def save_usage(session_id: str, usage: Dict[str, Any]) -> Optional[str]:
+    """
+    Salva o uso de tokens agregado de uma sessão.
+    
+    Args:
+        session_id: ID da sessão
+        usage: Resumo do UsageTracker (totais, por modelo, por agente e prompts mais caros)
+        
+    Returns:
+        Caminho do arquivo salvo ou None em caso de erro
+    """
+    try:
+        USAGE_DIR.mkdir(parents=True, exist_ok=True)
+        filepath = USAGE_DIR / f"{session_id}.json"
+        
+        usage_data = dict(usage)
+        usage_data["session_id"] = session_id
+        
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(usage_data, f, ensure_ascii=False, indent=2)
+        
+        logger.debug(f"Uso de tokens da sessão salvo: {filepath}")
+        return str(filepath)
+        
+    except Exception as e:
+        logger.warning(f"Erro ao salvar uso de tokens da sessão: {str(e)}")
+        return None
+
+
+def load_usage(session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Carrega o uso de tokens agregado de uma sessão.
+    
+    Args:
+        session_id: ID da sessão
+        
+    Returns:
+        Dicionário do uso ou None se não existir
+    """
+    try:
+        filepath = USAGE_DIR / f"{session_id}.json"
+        if not filepath.exists():
+            return None
+        
+        with open(filepath, "r", encoding="utf-8") as f:
+            return json.load(f)
+        
+    except Exception as e:
+        logger.warning(f"Erro ao carregar uso de tokens da sessão: {str(e)}")
+        return None
@@ -93,8 +93,9 @@ def validate_model_name(model_name: str) -> Tuple[bool, Optional[str]]:
     if not model_name or not model_name.strip():
         return False, "Nome do modelo não pode estar vazio"
     
-    # Validar formato básico (pode conter letras, números, dois pontos, hífen, underscore)
-    if not re.match(r'^[a-zA-Z0-9:_\-]+$', model_name):
+    # Validar formato básico (letras, números, dois pontos, hífen, underscore, ponto e barra;
+    # ex: "llama3.2:3b", "hf.co/usuario/modelo")
+    if not re.match(r'^[a-zA-Z0-9:_\-./]+$', model_name):
         return False, "Nome do modelo contém caracteres inválidos"
     
     if len(model_name) > 100:
@@ -0,0 +1,333 @@
+"""
+Detecção de intenções por palavras-chave em uma única passada
+
+Reúne as listas de palavras-chave usadas para detectar pedido de gráfico, tipo de
+gráfico, colunas, agregação, cumprimento e pergunta sobre dados. As palavras são
+normalizadas (minúsculas, sem acentos) e compiladas uma vez, na importação, em uma
+única expressão regular em forma de trie. O texto é dividido em palavras uma vez e
+cada palavra distinta é varrida em uma única chamada ao regex; o resultado tem a
+mesma semântica de substring das verificações "palavra in texto" que substitui,
+inclusive para ocorrências sobrepostas. O resultado fica em cache por texto,
+já que a mesma mensagem é analisada por vários pontos do fluxo.
+
+detect_chart_request, extract_columns e detect_aggregation (chart_analyzer), o
+pré-filtro de gráficos e a detecção de cumprimentos do AgentOrchestrator e a
+verificação de pergunta sobre dados do app usam match_intents.
+"""
+
+import re
+import unicodedata
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Any, FrozenSet, Iterable, List, Tuple
+
+from src.core.metrics import CACHE_REQUESTS
+
+# Resultados mantidos em memória (o mesmo texto é analisado por vários pontos do fluxo)
+MATCH_CACHE_SIZE = 256
+
+# Pedido explícito de gráfico/visualização (detect_chart_request)
+CHART_REQUEST_KEYWORDS = [
+    "gráfico", "grafico", "chart", "visualização", "visualizacao",
+    "plot", "gráfico de", "chart de", "visualização de",
+    "mostre um gráfico", "exiba um gráfico", "crie um gráfico", "gere um gráfico",
+    "mostre gráfico", "exiba gráfico", "crie gráfico", "gere gráfico",
+    "mostre chart", "exiba chart", "crie chart", "gere chart",
+    "mostre visualização", "exiba visualização", "crie visualização", "gere visualização",
+    "dashboard",  # Dashboard geralmente implica visualização
+]
+
+# Ação + termo de visualização em qualquer posição (ex: "mostre ... em um gráfico")
+ACTION_KEYWORDS = ["mostre", "exiba", "crie", "gere", "faça", "construa"]
+VISUALIZATION_KEYWORDS = ["gráfico", "grafico", "chart", "visualização", "visualizacao", "plot"]
+
+# Palavras-chave usadas pelo pré-filtro do AgentOrchestrator
+EXPLICIT_CHART_KEYWORDS = [
+    'gráfico', 'grafico', 'chart', 'visualização', 'visualizacao',
+    'plot', 'mostre', 'exiba', 'crie', 'gere'
+]
+
+# Tipo de gráfico (o primeiro tipo com ocorrência vence)
+CHART_TYPE_KEYWORDS = {
+    "bar": ["barra", "barras", "bar chart", "coluna", "colunas"],
+    "line": ["linha", "linhas", "line chart", "tendência", "tendencia"],
+    "pie": ["pizza", "pie chart", "torta", "distribuição", "distribuicao"],
+    "scatter": ["dispersão", "dispersao", "scatter", "correlação", "correlacao"],
+    "histogram": ["histograma", "histogram", "distribuição", "distribuicao"],
+    "box": ["box", "boxplot", "quartis", "quartiles"],
+    "heatmap": ["heatmap", "mapa de calor", "correlação", "correlacao"],
+    "area": ["área", "area", "area chart", "área preenchida"],
+    "violin": ["violino", "violin", "violin plot", "densidade"],
+}
+
+# Colunas conhecidas do dataset de veículos
+KNOWN_COLUMNS = [
+    "marca", "modelo", "ano", "status", "cidade",
+    "km_mes", "velocidade_media", "alertas",
+    "consumo_combustivel", "dias_operacionais", "custo_manutencao"
+]
+
+# Termos comuns que apontam para uma coluna
+COLUMN_TERMS = {
+    "quilometragem": "km_mes",
+    "km": "km_mes",
+    "quilometragem mensal": "km_mes",
+    "quilometragem por mês": "km_mes",
+    "velocidade": "velocidade_media",
+    "velocidade média": "velocidade_media",
+    "consumo": "consumo_combustivel",
+    "combustível": "consumo_combustivel",
+    "combustivel": "consumo_combustivel",
+    "consumo de combustível": "consumo_combustivel",
+    "consumo de combustivel": "consumo_combustivel",
+    "custo": "custo_manutencao",
+    "manutenção": "custo_manutencao",
+    "manutencao": "custo_manutencao",
+    "custo de manutenção": "custo_manutencao",
+    "custo de manutencao": "custo_manutencao",
+    "dias": "dias_operacionais",
+    "operacionais": "dias_operacionais",
+    "dias operacionais": "dias_operacionais",
+}
+
+# Tipo de agregação (o primeiro tipo com ocorrência vence)
+AGGREGATION_KEYWORDS = {
+    'sum': ['soma', 'total', 'somado', 'somar', 'soma de', 'total de'],
+    'mean': ['média', 'media', 'médio', 'medio', 'média de', 'media de', 'médio de', 'medio de', 'average', 'avg'],
+    'count': ['contar', 'quantidade', 'número', 'numero', 'qtd', 'qtde', 'count', 'quantos', 'quantas'],
+    'max': ['máximo', 'maximo', 'maior', 'mais alto', 'peak', 'pico', 'max'],
+    'min': ['mínimo', 'minimo', 'menor', 'mais baixo', 'min'],
+}
+
+# Cumprimentos simples (mensagens de até GREETING_MAX_WORDS palavras)
+GREETINGS = ['bom dia', 'boa tarde', 'boa noite', 'olá', 'ola', 'oi', 'hey', 'e aí', 'e ai']
+GREETING_MAX_WORDS = 5
+
+# Palavras-chave que indicam pergunta sobre os dados carregados
+DATA_KEYWORDS = [
+    'dados', 'veículo', 'veiculo', 'frota', 'gráfico', 'grafico', 'chart',
+    'análise', 'analise', 'estatística', 'estatistica', 'status',
+    'cidade', 'consumo', 'custo', 'alerta', 'quilometragem', 'km',
+    'marca', 'modelo', 'ano', 'velocidade', 'manutenção', 'manutencao',
+    'visualização', 'visualizacao', 'plot', 'mostre', 'exiba', 'crie', 'gere'
+]
+
+_COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+
+
+def fold_text(text: str) -> str:
+    """
+    Normaliza o texto para comparação: minúsculas e sem acentos.
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Texto normalizado
+    """
+    return _COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", str(text).lower()))
+
+
+def _fold_all(keywords: Iterable[str]) -> FrozenSet[str]:
+    """Normaliza uma lista de palavras-chave."""
+    return frozenset(fold_text(keyword) for keyword in keywords)
+
+
+def _build_trie_pattern(words: Iterable[str]) -> str:
+    """
+    Monta uma alternação em forma de trie (prefixos comuns fatorados).
+
+    Os sufixos opcionais são gulosos: em cada posição vence a palavra mais longa.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: Dict[str, Any]) -> str:
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Encontra, em uma passada, todas as palavras-chave presentes em um texto"""
+
+    def __init__(self, keywords: Iterable[str]):
+        """
+        Compila o conjunto de palavras-chave.
+
+        Palavras sem espaço são procuradas dentro das palavras do texto; expressões com
+        espaço ("mapa de calor") só são conferidas no texto quando todas as suas partes
+        aparecem.
+
+        Args:
+            keywords: Palavras-chave (normalizadas com fold_text)
+        """
+        self.keywords = sorted({keyword for keyword in keywords if keyword})
+        self._words = frozenset(keyword for keyword in self.keywords if keyword.split() == [keyword])
+        pieces = set(self._words)
+        # Expressões indexadas pela sua parte mais longa (a mais seletiva)
+        self._phrases: Dict[str, List[Tuple[str, FrozenSet[str]]]] = {}
+        for keyword in self.keywords:
+            parts = frozenset(keyword.split())
+            if keyword in self._words or not parts:
+                continue
+            pieces.update(parts)
+            self._phrases.setdefault(max(sorted(parts), key=len), []).append((keyword, parts))
+        # Expressões só de espaços não têm parte a procurar: sempre conferidas no texto
+        self._blank_phrases = [keyword for keyword in self.keywords if not keyword.split()]
+        # Lookahead: findall testa todas as posições em uma chamada e captura a peça mais longa em cada uma
+        self._pattern = re.compile(f"(?=({_build_trie_pattern(sorted(pieces))}))") if pieces else None
+        # As peças contidas na capturada (prefixos e trechos internos) também ocorrem
+        self._contained = {
+            piece: frozenset(other for other in pieces if other in piece)
+            for piece in pieces
+        }
+
+    def find_all(self, folded_text: str) -> FrozenSet[str]:
+        """
+        Retorna todas as palavras-chave que ocorrem no texto (como substring).
+
+        O texto é dividido em palavras uma vez; cada palavra distinta é varrida uma
+        única vez, e as expressões com espaço só são conferidas se todas as suas
+        partes foram encontradas.
+
+        Args:
+            folded_text: Texto normalizado com fold_text
+
+        Returns:
+            Conjunto das palavras-chave encontradas
+        """
+        words = set(folded_text.split())
+        # Palavras iguais a uma peça saem direto do dicionário; só as demais são varridas
+        known = words.intersection(self._contained)
+        if self._pattern is not None and len(known) < len(words):
+            known.update(self._pattern.findall(" ".join(words.difference(known))))
+        pieces = frozenset().union(*map(self._contained.__getitem__, known))
+        found = set(pieces & self._words)
+        for piece in pieces.intersection(self._phrases):
+            for keyword, parts in self._phrases[piece]:
+                if parts <= pieces and keyword in folded_text:
+                    found.add(keyword)
+        found.update(keyword for keyword in self._blank_phrases if keyword in folded_text)
+        return frozenset(found)
+
+
+# Tabelas normalizadas, na ordem de prioridade das funções originais
+_CHART_REQUEST = _fold_all(CHART_REQUEST_KEYWORDS)
+_ACTIONS = _fold_all(ACTION_KEYWORDS)
+_VISUALIZATIONS = _fold_all(VISUALIZATION_KEYWORDS)
+_EXPLICIT_CHART = _fold_all(EXPLICIT_CHART_KEYWORDS)
+_CHART_TYPES = [(chart_type, _fold_all(keywords)) for chart_type, keywords in CHART_TYPE_KEYWORDS.items()]
+_AGGREGATIONS = [(aggregation, _fold_all(keywords)) for aggregation, keywords in AGGREGATION_KEYWORDS.items()]
+_GREETINGS = _fold_all(GREETINGS)
+_DATA = _fold_all(DATA_KEYWORDS)
+# Termos mais longos primeiro (mais específicos); depois o nome da coluna e suas variações
+_COLUMN_LOOKUP = [
+    (fold_text(term), column)
+    for term, column in sorted(COLUMN_TERMS.items(), key=lambda item: len(item[0]), reverse=True)
+] + [
+    (variant, column)
+    for column in KNOWN_COLUMNS
+    for variant in (column, column.replace("_", " "), column.replace("_", ""))
+]
+
+# Termo -> (prioridade, coluna); em ordem reversa para que a primeira ocorrência do termo vença
+_COLUMN_PRIORITY: Dict[str, Tuple[int, str]] = {
+    term: (priority, column) for priority, (term, column) in reversed(list(enumerate(_COLUMN_LOOKUP)))
+}
+
+_MATCHER = KeywordMatcher(
+    set().union(
+        _CHART_REQUEST, _ACTIONS, _VISUALIZATIONS, _EXPLICIT_CHART, _GREETINGS, _DATA,
+        *(keywords for _, keywords in _CHART_TYPES),
+        *(keywords for _, keywords in _AGGREGATIONS),
+        (term for term, _ in _COLUMN_LOOKUP),
+    )
+)
+
+_cache: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+_cache_lock = Lock()
+
+# Séries do contador de acertos resolvidas uma vez (chamado a cada mensagem)
+_CACHE_HIT = CACHE_REQUESTS.labels("intent_matcher", "hit")
+_CACHE_MISS = CACHE_REQUESTS.labels("intent_matcher", "miss")
+
+
+def find_keywords(text: str) -> FrozenSet[str]:
+    """
+    Retorna as palavras-chave (normalizadas) presentes no texto, com cache.
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Conjunto das palavras-chave encontradas
+    """
+    with _cache_lock:
+        found = _cache.get(text)
+        if found is not None:
+            _cache.move_to_end(text)
+    (_CACHE_HIT if found is not None else _CACHE_MISS).inc()
+    if found is not None:
+        return found
+    found = _MATCHER.find_all(fold_text(text))
+    with _cache_lock:
+        _cache[text] = found
+        if len(_cache) > MATCH_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return found
+
+
+def match_intents(text: str) -> Dict[str, Any]:
+    """
+    Detecta todas as intenções do texto em uma passada.
+
+    Args:
+        text: Pergunta do usuário (ou resposta do Agente de Análise)
+
+    Returns:
+        Dicionário com:
+        - "chart_request": Pedido explícito de gráfico (palavra-chave ou ação + visualização)
+        - "explicit_chart_keyword": Alguma de EXPLICIT_CHART_KEYWORDS presente
+        - "chart_type": Tipo de gráfico mencionado (None se nenhum)
+        - "columns": Colunas mencionadas, na ordem de prioridade
+        - "aggregation": 'sum', 'mean', 'count', 'max', 'min' ou None
+        - "greeting": Cumprimento simples (até GREETING_MAX_WORDS palavras)
+        - "data_question": Pergunta sobre os dados (e não cumprimento)
+    """
+    found = find_keywords(text)
+
+    columns: List[str] = []
+    for _, column in sorted(_COLUMN_PRIORITY[term] for term in found if term in _COLUMN_PRIORITY):
+        if column not in columns:
+            columns.append(column)
+
+    # maxsplit: basta saber se a mensagem passa de GREETING_MAX_WORDS palavras
+    greeting = (
+        not found.isdisjoint(_GREETINGS)
+        and len(str(text).split(None, GREETING_MAX_WORDS)) <= GREETING_MAX_WORDS
+    )
+    return {
+        "chart_request": (
+            not found.isdisjoint(_CHART_REQUEST)
+            or not (found.isdisjoint(_ACTIONS) or found.isdisjoint(_VISUALIZATIONS))
+        ),
+        "explicit_chart_keyword": not found.isdisjoint(_EXPLICIT_CHART),
+        "chart_type": next(
+            (chart_type for chart_type, keywords in _CHART_TYPES if not found.isdisjoint(keywords)), None
+        ),
+        "columns": columns,
+        "aggregation": next(
+            (aggregation for aggregation, keywords in _AGGREGATIONS if not found.isdisjoint(keywords)), None
+        ),
+        "greeting": greeting,
+        "data_question": not (found.isdisjoint(_DATA) or greeting),
+    }
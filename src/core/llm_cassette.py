@@ -0,0 +1,364 @@
+"""
+Gravação e reprodução (cassete) das chamadas de chat ao LLM
+
+Modo "record": OllamaService.chat e OpenAIService.chat gravam a requisição
+normalizada e a resposta completa em um arquivo JSONL (uma chamada por linha).
+Em streaming cada chunk é gravado com o instante de chegada desde o envio.
+
+Modo "replay": as mesmas chamadas são servidas do arquivo, sem servidor de
+modelos, com o tempo original multiplicado por timing_scale (0 = sem espera).
+Assim o desempenho do orquestrador, do parsing e da renderização pode ser
+comparado entre execuções de forma determinística (ver tests/benchmarks).
+
+Requisições idênticas gravadas várias vezes são servidas na ordem gravada (a
+última se repete depois). Uma requisição sem gravação correspondente gera
+CassetteMismatchError com o diff para a gravação mais parecida; os diffs também
+ficam em Cassette.mismatches, já que os handlers convertem erros em texto.
+"""
+
+import copy
+import difflib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+
+from src.config.logging_config import LLM_CASSETTE_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+
+# Campos que não mudam a resposta do modelo (fora da comparação das requisições)
+IGNORED_REQUEST_FIELDS = ("keep_alive", "stream_options")
+
+# Linhas de contexto nos diffs de requisições sem correspondência
+DIFF_CONTEXT_LINES = 2
+
+
+class CassetteMismatchError(Exception):
+    """Requisição sem gravação correspondente no cassete (diff em .diff)"""
+
+    def __init__(self, message: str, diff: str = ""):
+        super().__init__(f"{message}\n{diff}" if diff else message)
+        self.diff = diff
+
+
+def normalize_request(provider: str, request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normaliza a requisição para comparação (sem campos que não afetam a resposta).
+
+    Args:
+        provider: "ollama" ou "openai"
+        request: Payload enviado ao provedor
+
+    Returns:
+        Cópia JSON da requisição com "provider"
+    """
+    normalized = {key: value for key, value in request.items() if key not in IGNORED_REQUEST_FIELDS}
+    normalized["provider"] = provider
+    # Ida e volta pelo JSON: mesma forma da gravação (tuplas viram listas etc.)
+    return json.loads(json.dumps(normalized, ensure_ascii=False, default=str))
+
+
+def request_key(normalized: Dict[str, Any]) -> str:
+    """Chave estável da requisição normalizada (SHA-256 do JSON canônico)."""
+    canonical = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _describe_request(normalized: Dict[str, Any]) -> List[str]:
+    """Linhas legíveis da requisição para o diff (conteúdo das mensagens linha a linha)."""
+    lines = []
+    for key in sorted(normalized):
+        if key == "messages":
+            continue
+        lines.append(f"{key}: {json.dumps(normalized[key], ensure_ascii=False, sort_keys=True)}")
+    for index, message in enumerate(normalized.get("messages") or []):
+        extra = {key: value for key, value in message.items() if key not in ("role", "content")}
+        lines.append(f"messages[{index}].role: {message.get('role')}")
+        if extra:
+            lines.append(f"messages[{index}]: {json.dumps(extra, ensure_ascii=False, sort_keys=True)}")
+        for line in str(message.get("content") or "").splitlines() or [""]:
+            lines.append(f"messages[{index}].content| {line}")
+    return lines
+
+
+def diff_requests(recorded: Dict[str, Any], received: Dict[str, Any]) -> str:
+    """
+    Diff unificado entre uma requisição gravada e a recebida.
+
+    Args:
+        recorded: Requisição normalizada do cassete
+        received: Requisição normalizada atual
+
+    Returns:
+        Diff em texto ("" se iguais)
+    """
+    return "\n".join(difflib.unified_diff(
+        _describe_request(recorded),
+        _describe_request(received),
+        fromfile="gravada",
+        tofile="recebida",
+        n=DIFF_CONTEXT_LINES,
+        lineterm="",
+    ))
+
+
+class Cassette:
+    """Arquivo de chamadas gravadas: grava respostas reais ou as reproduz"""
+
+    def __init__(self, path: str, mode: str = "replay", timing_scale: float = 1.0):
+        """
+        Abre o cassete.
+
+        Args:
+            path: Arquivo JSONL
+            mode: "record" (recomeça o arquivo e grava cada chamada) ou "replay"
+            timing_scale: Fator sobre os tempos gravados no replay (0 = sem espera)
+
+        Raises:
+            ValueError: Se o modo for inválido
+            FileNotFoundError: Se o arquivo não existir no modo replay
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modo de cassete inválido: {mode} (use 'record' ou 'replay')")
+        self.path = Path(path)
+        self.mode = mode
+        self.timing_scale = max(0.0, float(timing_scale))
+        self.interactions: List[Dict[str, Any]] = []
+        self.mismatches: List[Dict[str, Any]] = []
+        self._by_key: Dict[str, List[Dict[str, Any]]] = {}
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("", encoding="utf-8")
+            logger.info(f"Gravando chamadas ao LLM em {self.path}")
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+            logger.info(f"Cassete carregado: {self.path} ({len(self.interactions)} chamadas)")
+
+    def _index(self, interaction: Dict[str, Any]):
+        self.interactions.append(interaction)
+        self._by_key.setdefault(interaction["key"], []).append(interaction)
+
+    # ------------------------------------------------------------------
+    # Gravação
+    # ------------------------------------------------------------------
+
+    def _append(self, interaction: Dict[str, Any]):
+        """Grava uma chamada no arquivo (uma linha JSON)."""
+        line = json.dumps(interaction, ensure_ascii=False, default=str)
+        with self._lock:
+            self._index(interaction)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def _new_interaction(self, provider: str, request: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        normalized = normalize_request(provider, request)
+        return {
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "provider": provider,
+            "key": request_key(normalized),
+            "stream": stream,
+            "request": normalized,
+        }
+
+    def record(self, provider: str, request: Dict[str, Any], response: Dict[str, Any], started: float):
+        """
+        Grava uma chamada sem streaming.
+
+        Args:
+            provider: "ollama" ou "openai"
+            request: Payload enviado
+            response: Resposta completa (dicionário devolvido pelo serviço)
+            started: time.perf_counter() no envio da requisição
+        """
+        interaction = self._new_interaction(provider, request, stream=False)
+        interaction["duration_seconds"] = time.perf_counter() - started
+        interaction["response"] = response
+        self._append(interaction)
+
+    def record_stream(
+        self, provider: str, request: Dict[str, Any], chunks: Iterator[Dict[str, Any]], started: float
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Repassa os chunks de um streaming gravando cada um com o instante de chegada.
+
+        Streams abandonados antes do fim são gravados até o último chunk lido
+        ("complete": False).
+
+        Args:
+            provider: "ollama" ou "openai"
+            request: Payload enviado
+            chunks: Gerador de chunks do serviço
+            started: time.perf_counter() no envio da requisição
+
+        Yields:
+            Os mesmos chunks
+        """
+        interaction = self._new_interaction(provider, request, stream=True)
+        recorded = interaction["chunks"] = []
+        interaction["complete"] = False
+        try:
+            for chunk in chunks:
+                recorded.append({"t": round(time.perf_counter() - started, 6), "data": copy.deepcopy(chunk)})
+                yield chunk
+            interaction["complete"] = True
+        finally:
+            close = getattr(chunks, "close", None)
+            if close:
+                close()
+            interaction["duration_seconds"] = time.perf_counter() - started
+            self._append(interaction)
+
+    # ------------------------------------------------------------------
+    # Reprodução
+    # ------------------------------------------------------------------
+
+    def _find(self, provider: str, request: Dict[str, Any], stream: bool) -> Dict[str, Any]:
+        """Gravação correspondente (em ordem; a última se repete) ou CassetteMismatchError."""
+        normalized = normalize_request(provider, request)
+        key = request_key(normalized)
+        with self._lock:
+            candidates = self._by_key.get(key)
+            if candidates:
+                index = self._served.get(key, 0)
+                self._served[key] = index + 1
+                return candidates[min(index, len(candidates) - 1)]
+
+            same_provider = [item for item in self.interactions if item["provider"] == provider]
+            received_lines = _describe_request(normalized)
+            closest = max(
+                same_provider,
+                key=lambda item: difflib.SequenceMatcher(
+                    None, _describe_request(item["request"]), received_lines, autojunk=False
+                ).ratio(),
+                default=None,
+            )
+            diff = diff_requests(closest["request"], normalized) if closest else ""
+            self.mismatches.append({"provider": provider, "model": request.get("model"), "stream": stream, "diff": diff})
+
+        message = (
+            f"Requisição sem gravação no cassete {self.path} "
+            f"(provedor={provider}, modelo={request.get('model')}, stream={stream})"
+        )
+        logger.error(f"{message}\n{diff or 'Nenhuma gravação deste provedor.'}")
+        raise CassetteMismatchError(message, diff)
+
+    def _sleep_until(self, started: float, offset: float):
+        if self.timing_scale:
+            remaining = started + offset * self.timing_scale - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def replay(self, provider: str, request: Dict[str, Any]):
+        """
+        Serve a resposta gravada de uma requisição.
+
+        Args:
+            provider: "ollama" ou "openai"
+            request: Payload que seria enviado (inclui "stream")
+
+        Returns:
+            Dicionário da resposta ou gerador de chunks (stream=True)
+
+        Raises:
+            CassetteMismatchError: Se não houver gravação correspondente
+        """
+        stream = bool(request.get("stream"))
+        started = time.perf_counter()
+        interaction = self._find(provider, request, stream)
+        if stream:
+            return self._replay_stream(interaction, started)
+        self._sleep_until(started, interaction.get("duration_seconds") or 0.0)
+        return copy.deepcopy(interaction["response"])
+
+    def _replay_stream(self, interaction: Dict[str, Any], started: float) -> Iterator[Dict[str, Any]]:
+        """Chunks gravados no ritmo original (escalado por timing_scale)."""
+        for chunk in interaction["chunks"]:
+            self._sleep_until(started, chunk["t"])
+            yield copy.deepcopy(chunk["data"])
+
+
+def get_cassette_config() -> Dict[str, Any]:
+    """
+    Retorna LLM_CASSETTE_CONFIG com as sobrescritas do ambiente
+    (LLM_CASSETTE_MODE, LLM_CASSETTE_FILE, LLM_CASSETTE_TIMING_SCALE).
+
+    Returns:
+        Configuração efetiva ("mode", "file", "timing_scale")
+    """
+    config = dict(LLM_CASSETTE_CONFIG)
+    if os.getenv("LLM_CASSETTE_MODE"):
+        config["mode"] = os.getenv("LLM_CASSETTE_MODE").lower()
+    if os.getenv("LLM_CASSETTE_FILE"):
+        config["file"] = os.getenv("LLM_CASSETTE_FILE")
+    if os.getenv("LLM_CASSETTE_TIMING_SCALE"):
+        config["timing_scale"] = float(os.getenv("LLM_CASSETTE_TIMING_SCALE"))
+    return config
+
+
+# Cassete ativado por use_cassette (tem precedência sobre a configuração)
+_override: Optional[Cassette] = None
+# Cassete aberto a partir da configuração, com a configuração que o gerou
+_configured: Optional[Cassette] = None
+_configured_key: Optional[tuple] = None
+_state_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Retorna o cassete ativo (use_cassette ou LLM_CASSETTE_CONFIG) ou None no modo "off".
+
+    Returns:
+        Cassette em modo "record" ou "replay", ou None
+    """
+    global _configured, _configured_key
+    if _override is not None:
+        return _override
+    config = get_cassette_config()
+    if config["mode"] == "off":
+        return None
+    if config["mode"] not in MODES:
+        logger.warning(f"LLM_CASSETTE_MODE inválido '{config['mode']}': cassete desativado")
+        return None
+    key = (config["mode"], config["file"], config["timing_scale"])
+    with _state_lock:
+        if _configured_key != key:
+            _configured = Cassette(config["file"], config["mode"], config["timing_scale"])
+            _configured_key = key
+        return _configured
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "replay", timing_scale: float = 1.0):
+    """
+    Ativa um cassete para todas as chamadas de chat do processo dentro do bloco.
+
+    Args:
+        path: Arquivo JSONL
+        mode: "record" ou "replay"
+        timing_scale: Fator sobre os tempos gravados no replay
+
+    Yields:
+        O Cassette ativo (mismatches acumula os diffs das requisições sem gravação)
+    """
+    global _override
+    cassette = Cassette(path, mode, timing_scale)
+    previous, _override = _override, cassette
+    try:
+        yield cassette
+    finally:
+        _override = previous
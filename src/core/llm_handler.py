@@ -3,12 +3,21 @@ Handler LLM que integra OllamaService com a interface esperada pelo app.py
 """
 
 import logging
-from typing import Optional, List, Dict, Any, Generator
+import threading
+from typing import Optional, List, Dict, Any, Generator, Callable, Union
 from src.core.ollama_service import OllamaService
+from src.core.ollama_pool import OllamaPool, parse_endpoints
+from src.core.single_flight import coalesced_chat
+from src.core.health_monitor import HealthMonitor
+from src.core.context_window import choose_num_ctx
+from src.core.tracing import set_attributes
+from src.core.metrics import LLMCallMetrics
+from src.core.usage_tracker import LLMResponse, combine_usage, record_llm_usage
 from src.config.model_config import (
     get_system_prompt,
     get_model_parameters,
     validate_temperature,
+    CONTEXT_SIZING_CONFIG,
     DEFAULT_TEMPERATURE,
     DEFAULT_MODEL,
     SYSTEM_MESSAGES,
@@ -28,12 +37,18 @@ logger = logging.getLogger(__name__)
 class OllamaLLMHandler:
     """Handler que adapta OllamaService para a interface do app.py"""
 
-    def __init__(self, base_url: str = "http://localhost:11434", timeout: int = None):
+    # Identificador do provedor (usado pelo orquestrador para escolher o modo de ferramentas)
+    provider = "ollama"
+
+    def __init__(
+        self, base_url: Union[str, List[str]] = "http://localhost:11434", timeout: int = None
+    ):
         """
         Inicializa o handler com OllamaService.
 
         Args:
-            base_url: URL base do servidor Ollama (padrão: localhost:11434)
+            base_url: URL base do servidor Ollama (padrão: localhost:11434). Uma lista
+                (ou URLs separadas por vírgula) distribui as requisições com OllamaPool
             timeout: Timeout para requisições em segundos (usa model_config se None)
         """
         # Usar timeout de model_config se não fornecido
@@ -44,9 +59,86 @@ class OllamaLLMHandler:
             except ImportError:
                 timeout = 60
         
-        self.ollama_service = OllamaService(base_url=base_url, timeout=timeout)
-        self.base_url = base_url
+        endpoints = parse_endpoints(base_url) or ["http://localhost:11434"]
+        if len(endpoints) > 1:
+            self.ollama_service = OllamaPool(endpoints, timeout=timeout)
+        else:
+            self.ollama_service = OllamaService(base_url=endpoints[0], timeout=timeout)
+        self.base_url = self.ollama_service.base_url
+        # Status e modelos servidos da memória (verificados em segundo plano)
+        self.health_monitor = HealthMonitor(self._probe_connection_status, name=f"Ollama ({self.base_url})")
         self.timeout = timeout
+        # Uso de tokens da última chamada, por thread (os agentes podem rodar em paralelo)
+        self._usage_state = threading.local()
+        # num_ctx escolhido por requisição (quantas vezes cada bucket foi usado)
+        self.context_stats = {"requests": 0, "truncated": 0, "num_ctx": {}}
+        self._context_stats_lock = threading.Lock()
+
+    @property
+    def last_usage(self) -> Optional[Dict[str, Any]]:
+        """
+        Uso de tokens da última chamada feita na thread atual.
+
+        No Ollama, prompt_tokens conta apenas os tokens do prompt que precisaram ser
+        avaliados: quando o prefixo é reaproveitado do KV cache o valor cai.
+        """
+        return getattr(self._usage_state, "usage", None)
+
+    def _size_context(self, messages: List[Dict[str, Any]], model_params: Dict[str, Any]):
+        """
+        Define num_ctx da requisição pelo tamanho do prompt (se não informado).
+
+        Args:
+            messages: Mensagens enviadas ao modelo
+            model_params: Parâmetros do modelo (alterados no lugar)
+        """
+        if "num_ctx" in model_params or not CONTEXT_SIZING_CONFIG.get("enabled", True):
+            return
+        sizing = choose_num_ctx(messages, model_params.get("num_predict"), CONTEXT_SIZING_CONFIG)
+        model_params["num_ctx"] = sizing["num_ctx"]
+        with self._context_stats_lock:
+            self.context_stats["requests"] += 1
+            self.context_stats["truncated"] += int(sizing["truncated"])
+            buckets = self.context_stats["num_ctx"]
+            buckets[sizing["num_ctx"]] = buckets.get(sizing["num_ctx"], 0) + 1
+        set_attributes(num_ctx=sizing["num_ctx"], context_truncated=sizing["truncated"] or None)
+        logger.debug(
+            f"num_ctx={sizing['num_ctx']} (prompt ~{sizing['prompt_tokens']} + "
+            f"resposta {sizing['response_tokens']} tokens)"
+        )
+
+    def get_system_prompt(self, context: str = "general") -> str:
+        """
+        Retorna o system prompt usado por generate_response para o contexto.
+
+        Args:
+            context: Contexto da conversa ("general", "data_analysis", etc.)
+
+        Returns:
+            Texto do system prompt
+        """
+        return get_system_prompt(context)
+
+    @staticmethod
+    def _extract_usage(response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Extrai as métricas de tokens de uma resposta (ou chunk final) do Ollama.
+
+        Args:
+            response: Resposta do endpoint /api/chat
+
+        Returns:
+            Dicionário de uso ou None se a resposta não traz métricas
+        """
+        if "prompt_eval_count" not in response and "eval_count" not in response:
+            return None
+        return {
+            "prompt_tokens": response.get("prompt_eval_count", 0),
+            "completion_tokens": response.get("eval_count", 0),
+            "cached_tokens": None,  # O Ollama não informa; ver prompt_eval_ms
+            "prompt_eval_ms": response.get("prompt_eval_duration", 0) / 1_000_000,
+            "eval_ms": response.get("eval_duration", 0) / 1_000_000,  # Geração (tokens/s)
+        }
 
     def generate_response(
         self,
@@ -56,6 +148,7 @@ class OllamaLLMHandler:
         temperature: Optional[float] = None,
         context: str = "general",
         stream: bool = False,
+        response_format: Optional[Dict[str, Any]] = None,
         **kwargs,
     ) -> str:
         """
@@ -68,11 +161,15 @@ class OllamaLLMHandler:
             temperature: Temperatura para geração (usa padrão se None)
             context: Contexto da conversa para system prompt ("dashboard", "data_analysis", etc.)
             stream: Se True, retorna um gerador para streaming
+            response_format: Saída estruturada {"name": ..., "schema": JSON schema},
+                enviada ao Ollama como "format"
             **kwargs: Parâmetros adicionais do modelo
 
         Returns:
-            String com a resposta gerada ou gerador se stream=True
+            LLMResponse (str com o uso de tokens em .usage) ou gerador se stream=True;
+            mensagens de erro são str simples
         """
+        self._usage_state.usage = None
         try:
             logger.info(f"Gerando resposta (stream={stream}, context={context})")
             
@@ -128,19 +225,33 @@ class OllamaLLMHandler:
 
             # Obter parâmetros do modelo
             model_params = get_model_parameters(temperature=temperature, **kwargs)
+            self._size_context(messages_with_system, model_params)
+            if response_format:
+                model_params["format"] = response_format["schema"]
 
-            # Chamar o método chat do OllamaService
-            response = self.ollama_service.chat(
-                model=model, messages=messages_with_system, stream=stream, **model_params
-            )
+            # Chamar o método chat do OllamaService (requisições idênticas simultâneas são agrupadas)
+            call_metrics = LLMCallMetrics(self.provider, model)
+            if not stream:
+                call_metrics.begin()
+            try:
+                response = coalesced_chat(
+                    self.ollama_service, self.provider, model, messages_with_system, stream, **model_params
+                )
+            except Exception:
+                call_metrics.finish(error=True)
+                raise
 
             # Se streaming, retornar gerador
             if stream:
                 logger.debug("Retornando resposta em streaming")
-                return self._handle_stream_response(response)
+                return self._handle_stream_response(response, call_metrics, messages_with_system)
+
+            usage = self._extract_usage(response) if isinstance(response, dict) else None
+            call_metrics.finish(usage, error=not isinstance(response, dict))
 
             # Extrair a resposta do formato do Ollama
             if isinstance(response, dict):
+                self._usage_state.usage = record_llm_usage(usage, call_metrics, messages_with_system)
                 # O Ollama pode retornar a resposta em diferentes estruturas
                 message = response.get("message", {})
                 content = ""
@@ -161,7 +272,7 @@ class OllamaLLMHandler:
                 
                 if content and len(str(content).strip()) > 0:
                     logger.info(f"Resposta gerada: {len(content)} caracteres")
-                    return str(content)
+                    return LLMResponse(str(content), self.last_usage, model, self.provider)
                 else:
                     logger.warning(f"Resposta vazia do modelo. Response structure: {list(response.keys())}")
                     return SYSTEM_MESSAGES.get(
@@ -175,21 +286,119 @@ class OllamaLLMHandler:
 
         except Exception as e:
             logger.error(f"Erro ao gerar resposta: {str(e)}", exc_info=True)
+            if isinstance(e, ConnectionError):
+                self.health_monitor.invalidate(str(e)[:100])
             error_msg = SYSTEM_MESSAGES.get("error", "Erro ao gerar resposta")
             return f"{error_msg}: {str(e)}"
     
-    def _handle_stream_response(self, response_generator: Generator) -> Generator[str, None, None]:
+    def generate_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        tool_executor: Callable[[str, Any], str],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_rounds: int = 5,
+        **kwargs,
+    ) -> str:
+        """
+        Gera uma resposta permitindo que o modelo chame ferramentas.
+
+        A cada rodada as chamadas de ferramenta retornadas pelo modelo são executadas
+        e os resultados são enviados de volta, até o modelo responder em texto.
+
+        Args:
+            messages: Lista de mensagens (deve incluir o system prompt)
+            tools: Definições das ferramentas (formato OpenAI, aceito pelo Ollama)
+            tool_executor: Função (nome, argumentos) -> resultado em texto
+            model: Nome do modelo Ollama (deve suportar ferramentas)
+            temperature: Temperatura para geração
+            max_rounds: Número máximo de rodadas de chamadas de ferramentas
+            **kwargs: Parâmetros adicionais do modelo
+
+        Returns:
+            Resposta textual final (LLMResponse com o uso somado das rodadas)
+
+        Raises:
+            Exception: Se o modelo não suportar ferramentas ou a comunicação falhar
+        """
+        self._usage_state.usage = None
+        model = model or DEFAULT_MODEL
+        temperature = validate_temperature(
+            temperature if temperature is not None else DEFAULT_TEMPERATURE
+        )
+        model_params = get_model_parameters(temperature=temperature, **kwargs)
+        conversation = list(messages)
+        round_usages = []
+
+        for round_number in range(max_rounds + 1):
+            # Na última rodada as ferramentas não são oferecidas, forçando a resposta final
+            round_tools = tools if round_number < max_rounds else None
+            # A conversa cresce a cada rodada: num_ctx é escolhido de novo
+            round_params = dict(model_params)
+            self._size_context(conversation, round_params)
+            call_metrics = LLMCallMetrics(self.provider, model)
+            call_metrics.begin()
+            try:
+                response = self.ollama_service.chat(
+                    model=model, messages=conversation, stream=False, tools=round_tools, **round_params
+                )
+            except Exception:
+                call_metrics.finish(error=True)
+                raise
+            usage = self._extract_usage(response) if isinstance(response, dict) else None
+            call_metrics.finish(usage)
+            round_usages.append(record_llm_usage(usage, call_metrics, conversation))
+            self._usage_state.usage = combine_usage(round_usages)
+            message = response.get("message", {}) if isinstance(response, dict) else {}
+            tool_calls = message.get("tool_calls") or []
+
+            if not tool_calls:
+                content = message.get("content", "")
+                logger.info(f"Resposta com ferramentas gerada em {round_number + 1} rodada(s)")
+                if not content:
+                    return SYSTEM_MESSAGES.get("no_response", "Erro: Resposta vazia do modelo.")
+                return LLMResponse(content, self.last_usage, model, self.provider)
+
+            conversation.append({
+                "role": "assistant",
+                "content": message.get("content", ""),
+                "tool_calls": tool_calls,
+            })
+            for tool_call in tool_calls:
+                function = tool_call.get("function", {})
+                name = function.get("name", "")
+                logger.debug(f"Modelo chamou ferramenta: {name}")
+                conversation.append({
+                    "role": "tool",
+                    "tool_name": name,
+                    "content": tool_executor(name, function.get("arguments", {})),
+                })
+
+        return SYSTEM_MESSAGES.get("no_response", "Erro: Resposta vazia do modelo.")
+
+    def _handle_stream_response(
+        self,
+        response_generator: Generator,
+        call_metrics: Optional[LLMCallMetrics] = None,
+        messages: Optional[List[Dict[str, Any]]] = None,
+    ) -> Generator[str, None, None]:
         """
         Processa resposta em streaming do Ollama.
         
         Args:
             response_generator: Gerador do OllamaService
+            call_metrics: Medição da chamada (primeiro token, duração e tokens/s)
+            messages: Mensagens enviadas (identificam o prompt na contabilização de uso)
             
         Yields:
             Chunks de texto da resposta
         """
         logger.debug("Processando resposta em streaming")
         full_response = ""
+        error = False
+        if call_metrics is not None:
+            call_metrics.begin()
         
         try:
             for chunk in response_generator:
@@ -199,41 +408,46 @@ class OllamaLLMHandler:
                     content = message.get("content", "")
                     
                     if content:
+                        if call_metrics is not None:
+                            call_metrics.first_token()
                         full_response += content
                         yield content
                     
                     # Verificar se é o último chunk
                     if chunk.get("done", False):
+                        self._usage_state.usage = self._extract_usage(chunk)
                         logger.debug(f"Streaming concluído: {len(full_response)} caracteres")
                         break
         except Exception as e:
+            error = True
             logger.error(f"Erro no streaming: {str(e)}", exc_info=True)
             raise
+        finally:
+            # Repassa o encerramento antecipado (ex: objeto JSON completo) ao serviço
+            close = getattr(response_generator, "close", None)
+            if close:
+                close()
+            if call_metrics is not None:
+                call_metrics.finish(self.last_usage, error=error)
+                self._usage_state.usage = record_llm_usage(self.last_usage, call_metrics, messages)
 
     def is_configured(self) -> bool:
         """
         Verifica se o handler está configurado e o Ollama está disponível.
 
+        O status vem do cache do monitor de saúde (sem requisição a cada chamada).
+
         Returns:
             True se o Ollama está acessível, False caso contrário
         """
-        try:
-            # Tentar listar modelos para verificar se o Ollama está rodando
-            self.ollama_service.list_models()
-            return True
-        except ConnectionError:
-            # ConnectionError indica que o Ollama não está rodando
-            return False
-        except Exception:
-            # Outros erros também indicam problema de configuração
-            return False
+        return bool(self.health_monitor.get_status().get("connected"))
 
-    def get_connection_status(self) -> dict:
+    def _probe_connection_status(self) -> dict:
         """
-        Retorna status detalhado da conexão com o Ollama.
+        Consulta o Ollama e monta o status de conexão (usado pelo monitor de saúde).
 
         Returns:
-            Dicionário com status, mensagem e detalhes
+            Dicionário com status, mensagem, detalhes e "available_models" (todos os nomes)
         """
         try:
             models = self.ollama_service.list_models()
@@ -246,6 +460,7 @@ class OllamaLLMHandler:
                 "models": [
                     m.get("name", "") for m in models[:5]
                 ],  # Primeiros 5 modelos
+                "available_models": [m.get("name", "") for m in models if m.get("name")],
             }
         except ConnectionError as e:
             return {
@@ -264,26 +479,39 @@ class OllamaLLMHandler:
                 "suggestion": "Verifique se o Ollama está rodando e a URL está correta",
             }
 
+    def get_connection_status(self) -> dict:
+        """
+        Retorna status detalhado da conexão com o Ollama (do cache do monitor de saúde).
+
+        Returns:
+            Dicionário com status, mensagem e detalhes
+        """
+        status = dict(self.health_monitor.get_status())
+        status.pop("available_models", None)
+        if status.get("connected") and isinstance(self.ollama_service, OllamaPool):
+            # Estado e latência de cada servidor do pool (já em memória)
+            status["endpoints"] = self.ollama_service.get_endpoint_stats()
+        return status
+
     def list_available_models(self) -> List[str]:
         """
-        Lista os modelos disponíveis no Ollama.
+        Lista os modelos disponíveis no Ollama (do cache do monitor de saúde).
 
         Returns:
             Lista de nomes de modelos disponíveis
         """
-        try:
-            models = self.ollama_service.list_models()
-            return [model.get("name", "") for model in models if model.get("name")]
-        except Exception as e:
-            return []
+        return list(self.health_monitor.get_status().get("available_models", []))
 
 
-def create_llm_handler(base_url: Optional[str] = None, timeout: Optional[int] = None) -> OllamaLLMHandler:
+def create_llm_handler(
+    base_url: Union[str, List[str], None] = None, timeout: Optional[int] = None
+) -> OllamaLLMHandler:
     """
     Factory function para criar um handler LLM.
 
     Args:
-        base_url: URL base do servidor Ollama (opcional)
+        base_url: URL base do servidor Ollama (opcional). Aceita uma lista de URLs
+            (ou separadas por vírgula) para balancear entre vários servidores
         timeout: Timeout para requisições em segundos (opcional, usa padrão se None)
 
     Returns:
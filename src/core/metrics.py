@@ -0,0 +1,643 @@
+"""
+Métricas operacionais no formato de texto do Prometheus
+
+Registro em memória, compartilhado pelo processo (todas as sessões do Streamlit),
+exposto por um endpoint HTTP local (/metrics) para ser coletado pelo Prometheus:
+
+- Latência até o primeiro token e latência total por provedor, modelo e agente
+- Tokens/s (eval_count/eval_duration do Ollama; usage e tempo de geração da OpenAI)
+- Acertos de cache (contexto dos dados, intent_matcher, índice de colunas, prompt)
+- Requisições em andamento e filas (limitador de taxa, lote, single-flight)
+- Tempo de construção do contexto dos dados e de transcrição de áudio
+
+No caminho crítico cada registro é uma busca em dicionário e um incremento sob
+lock; valores que já existem em outros módulos (estatísticas do single-flight e do
+limitador de taxa) são lidos apenas na coleta, por coletores registrados.
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable, Sequence
+
+from src.config.logging_config import METRICS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Content-Type do formato de texto do Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets (segundos) das latências de LLM
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Buckets de tokens gerados por segundo
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 40, 60, 80, 120, 160, 240, 320)
+
+# Buckets (segundos) de operações locais (contexto dos dados)
+LOCAL_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Buckets (segundos) da transcrição de áudio
+TRANSCRIPTION_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# Agente do orquestrador que originou as chamadas de LLM no contexto atual
+_current_agent: contextvars.ContextVar[str] = contextvars.ContextVar("metrics_agent", default="chat")
+
+
+def _format_value(value: float) -> str:
+    """Formata um valor de amostra (inteiros sem casa decimal, infinito como +Inf)."""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Escapa um valor de label."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Formata labels como {a="1",b="2"} (vazio sem labels)."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class _CounterChild:
+    """Série de um contador"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def get(self) -> float:
+        return self._value
+
+
+class _GaugeChild:
+    """Série de um gauge"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        self._value = float(value)
+
+    def get(self) -> float:
+        return self._value
+
+
+class _HistogramChild:
+    """Série de um histograma (contagens por bucket, soma e total)"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class Metric:
+    """Métrica com labels; cada combinação de valores é uma série (child)"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Cria a métrica.
+
+        Args:
+            name: Nome no formato do Prometheus (ex: omnilink_llm_request_seconds)
+            documentation: Texto do # HELP
+            labelnames: Nomes dos labels
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        """
+        Retorna a série dos valores de label (criada na primeira chamada).
+
+        Args:
+            *values: Valores na ordem de labelnames
+            **labels: Ou valores por nome
+
+        Returns:
+            Série com inc/dec/set/observe conforme o tipo da métrica
+        """
+        if labels:
+            values = tuple(str(labels[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(value) for value in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: esperados labels {self.labelnames}, recebidos {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _series(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+    def collect(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """Amostras (sufixo do nome, labels, valor) da métrica."""
+        return [("", labels, child.get()) for labels, child in self._series()]
+
+
+class Counter(Metric):
+    """Contador monotônico"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        """Incrementa a série sem labels."""
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """Valor que sobe e desce"""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        """Define a série sem labels."""
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """Distribuição em buckets cumulativos"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        """Registra um valor na série sem labels."""
+        self.labels().observe(value)
+
+    @contextmanager
+    def time(self, *values, **labels):
+        """Mede a duração do bloco (segundos) na série dos labels informados."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.labels(*values, **labels).observe(time.perf_counter() - start)
+
+    def collect(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for labels, child in self._series():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+# Coletor: função chamada na coleta que retorna [(nome, tipo, ajuda, [(labels, valor)])]
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """Conjunto de métricas e coletores exportados juntos"""
+
+    def __init__(self):
+        self._metrics: "OrderedDict[str, Metric]" = OrderedDict()
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Registra uma métrica (nomes duplicados retornam a métrica já registrada).
+
+        Args:
+            metric: Counter, Gauge ou Histogram
+
+        Returns:
+            Métrica registrada
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Collector):
+        """Registra uma função chamada a cada coleta (valores lidos de outros módulos)."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def get_metric(self, name: str) -> Optional[Metric]:
+        """Retorna uma métrica registrada pelo nome."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Gera o texto de exposição do Prometheus.
+
+        Returns:
+            Métricas no formato text/plain version 0.0.4
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.collect():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"Erro em coletor de métricas: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# ----------------------------------------------------------------------------
+# Métricas da aplicação
+# ----------------------------------------------------------------------------
+
+LLM_LABELS = ("provider", "model", "agent")
+
+LLM_TTFT_SECONDS = REGISTRY.histogram(
+    "omnilink_llm_time_to_first_token_seconds",
+    "Tempo até o primeiro trecho da resposta em streaming",
+    LLM_LABELS,
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "omnilink_llm_request_seconds",
+    "Latência total das chamadas ao LLM",
+    LLM_LABELS,
+)
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "omnilink_llm_tokens_per_second",
+    "Tokens gerados por segundo (eval_count/eval_duration no Ollama, usage/tempo de geração na OpenAI)",
+    LLM_LABELS,
+    TOKENS_PER_SECOND_BUCKETS,
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "omnilink_llm_requests_total",
+    "Chamadas ao LLM por resultado",
+    LLM_LABELS + ("status",),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "omnilink_llm_tokens_total",
+    "Tokens reportados pelo provedor (prompt, completion e prompt servido do cache)",
+    ("provider", "model", "kind"),
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "omnilink_llm_requests_in_flight",
+    "Chamadas ao LLM em andamento",
+    ("provider",),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "omnilink_cache_requests_total",
+    "Consultas aos caches locais por resultado (hit/miss)",
+    ("cache", "result"),
+)
+DATA_CONTEXT_BUILD_SECONDS = REGISTRY.histogram(
+    "omnilink_data_context_build_seconds",
+    "Tempo de construção do contexto dos dados (falhas do cache por versão)",
+    buckets=LOCAL_BUCKETS,
+)
+TRANSCRIPTION_SECONDS = REGISTRY.histogram(
+    "omnilink_transcription_seconds",
+    "Tempo de transcrição de áudio",
+    ("method", "status"),
+    TRANSCRIPTION_BUCKETS,
+)
+BATCH_QUEUE_DEPTH = REGISTRY.gauge(
+    "omnilink_batch_queue_depth",
+    "Perguntas do processamento em lote aguardando início",
+)
+
+
+def cache_lookup(cache: str, hit: bool):
+    """
+    Registra uma consulta a um cache local.
+
+    Args:
+        cache: Nome do cache (ex: "data_context")
+        hit: True se o valor veio do cache
+    """
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def agent_scope(agent: str):
+    """
+    Associa as chamadas de LLM feitas dentro do bloco a um agente do orquestrador.
+
+    Args:
+        agent: "analysis", "chart" ou "greeting"
+    """
+    token = _current_agent.set(agent)
+    try:
+        yield
+    finally:
+        _current_agent.reset(token)
+
+
+class LLMCallMetrics:
+    """Mede uma chamada ao LLM: primeiro token, duração total, tokens/s e requisições em andamento"""
+
+    def __init__(self, provider: str, model: Optional[str]):
+        """
+        Inicia a medição (o agente vem de agent_scope).
+
+        Args:
+            provider: "ollama" ou "openai"
+            model: Modelo chamado
+        """
+        self.provider = provider
+        self.labels = (provider, model or "padrão", _current_agent.get())
+        self._start = time.perf_counter()
+        self._first_token: Optional[float] = None
+        self._in_flight = False
+        self._finished = False
+        self.elapsed_seconds: Optional[float] = None  # Preenchido por finish()
+
+    @property
+    def agent(self) -> str:
+        """Agente associado à chamada (agent_scope)."""
+        return self.labels[2]
+
+    @property
+    def ttft_seconds(self) -> Optional[float]:
+        """Segundos até o primeiro token (None sem streaming)."""
+        if self._first_token is None:
+            return None
+        return self._first_token - self._start
+
+    def begin(self):
+        """Conta a chamada como em andamento (streams: ao iniciar a leitura)."""
+        if not self._in_flight and not self._finished:
+            self._in_flight = True
+            LLM_IN_FLIGHT.labels(self.provider).inc()
+
+    def first_token(self):
+        """Registra a chegada do primeiro trecho da resposta."""
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+            LLM_TTFT_SECONDS.labels(*self.labels).observe(self._first_token - self._start)
+
+    def finish(self, usage: Optional[Dict[str, Any]] = None, error: bool = False):
+        """
+        Encerra a medição (chamadas repetidas são ignoradas).
+
+        Args:
+            usage: Uso de tokens da resposta ("completion_tokens", "prompt_tokens",
+                "cached_tokens" e, no Ollama, "eval_ms")
+            error: True se a chamada falhou
+        """
+        if self._finished:
+            return
+        self._finished = True
+        elapsed = self.elapsed_seconds = time.perf_counter() - self._start
+        if self._in_flight:
+            LLM_IN_FLIGHT.labels(self.provider).dec()
+        LLM_REQUEST_SECONDS.labels(*self.labels).observe(elapsed)
+        LLM_REQUESTS.labels(*self.labels, "error" if error else "ok").inc()
+        if not isinstance(usage, dict):
+            return
+
+        provider, model, _ = self.labels
+        for kind in ("prompt", "completion", "cached"):
+            tokens = usage.get(f"{kind}_tokens")
+            if tokens:
+                LLM_TOKENS.labels(provider, model, kind).inc(tokens)
+
+        completion_tokens = usage.get("completion_tokens") or 0
+        # Ollama informa o tempo de geração; sem ele, tempo após o primeiro token (ou total)
+        generation_seconds = (usage.get("eval_ms") or 0) / 1000
+        if not generation_seconds:
+            generation_seconds = elapsed - (self.ttft_seconds or 0.0)
+        if completion_tokens and generation_seconds > 0:
+            LLM_TOKENS_PER_SECOND.labels(*self.labels).observe(completion_tokens / generation_seconds)
+
+
+def _cache_ratio_collector():
+    """Razão de acertos por cache (consultas e tokens de prompt servidos do cache)."""
+    totals: Dict[str, Dict[str, float]] = {}
+    for labels, value in ((labels, child.get()) for labels, child in CACHE_REQUESTS._series()):
+        totals.setdefault(labels["cache"], {"hit": 0.0, "miss": 0.0})[labels["result"]] += value
+    samples = [
+        ({"cache": cache}, counts["hit"] / (counts["hit"] + counts["miss"]))
+        for cache, counts in totals.items()
+        if counts["hit"] + counts["miss"]
+    ]
+    prompt = cached = 0.0
+    for labels, child in LLM_TOKENS._series():
+        if labels["kind"] == "prompt":
+            prompt += child.get()
+        elif labels["kind"] == "cached":
+            cached += child.get()
+    if prompt:
+        samples.append(({"cache": "prompt_tokens"}, cached / prompt))
+    yield ("omnilink_cache_hit_ratio", "gauge", "Razão de acertos acumulada por cache", samples)
+
+
+def _runtime_collector():
+    """Coalescência e filas lidas das estatísticas do single-flight e do limitador de taxa."""
+    from src.core.rate_limiter import get_all_rate_limiter_stats
+    from src.core.single_flight import get_coalescing_stats
+
+    groups = get_coalescing_stats()
+    yield (
+        "omnilink_single_flight_in_flight",
+        "gauge",
+        "Requisições distintas em andamento por grupo de coalescência",
+        [({"group": name}, stats["in_flight"]) for name, stats in groups.items()],
+    )
+    yield (
+        "omnilink_single_flight_coalesced_total",
+        "counter",
+        "Requisições atendidas por uma chamada idêntica já em andamento",
+        [({"group": name}, stats["coalesced"]) for name, stats in groups.items()],
+    )
+    limiters = get_all_rate_limiter_stats()
+    yield (
+        "omnilink_rate_limiter_queue_depth",
+        "gauge",
+        "Chamadas aguardando capacidade no limitador de taxa",
+        [({"provider": stats["provider"], "host": stats["host"]}, stats["waiting"]) for stats in limiters.values()],
+    )
+
+
+REGISTRY.register_collector(_cache_ratio_collector)
+REGISTRY.register_collector(_runtime_collector)
+
+
+# ----------------------------------------------------------------------------
+# Endpoint HTTP
+# ----------------------------------------------------------------------------
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Responde GET /metrics com o texto do registro"""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Métricas: {format % args}")
+
+
+_server: Optional[ThreadingHTTPServer] = None
+# Falha ao abrir a porta: não tentar de novo a cada rerun do Streamlit
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def get_metrics_config() -> Dict[str, Any]:
+    """
+    Retorna METRICS_CONFIG com as sobrescritas do ambiente (METRICS_ENABLED, METRICS_HOST, METRICS_PORT).
+
+    Returns:
+        Configuração efetiva ("enabled", "host", "port")
+    """
+    config = dict(METRICS_CONFIG)
+    if os.getenv("METRICS_ENABLED") is not None:
+        config["enabled"] = os.getenv("METRICS_ENABLED").lower() == "true"
+    if os.getenv("METRICS_HOST"):
+        config["host"] = os.getenv("METRICS_HOST")
+    if os.getenv("METRICS_PORT"):
+        config["port"] = int(os.getenv("METRICS_PORT"))
+    return config
+
+
+def start_metrics_server(host: Optional[str] = None, port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Inicia o endpoint /metrics em uma thread de fundo (uma vez por processo).
+
+    Args:
+        host: Endereço (padrão: METRICS_CONFIG["host"])
+        port: Porta (padrão: METRICS_CONFIG["port"]; 0 escolhe uma porta livre)
+
+    Returns:
+        Servidor em execução ou None se desativado ou se a porta estiver em uso
+        (a falha é registrada e as chamadas seguintes não tentam abrir a porta de novo)
+    """
+    global _server, _server_failed
+    config = get_metrics_config()
+    with _server_lock:
+        if _server is not None:
+            return _server
+        if not config["enabled"] or _server_failed:
+            return None
+        host = host or config["host"]
+        port = config["port"] if port is None else port
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+        except OSError as e:
+            _server_failed = True
+            logger.warning(f"Endpoint de métricas não iniciado em {host}:{port}: {str(e)}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+        _server = server
+    logger.info(f"Métricas disponíveis em http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def stop_metrics_server():
+    """Encerra o endpoint /metrics (usado em testes) e permite uma nova tentativa de início."""
+    global _server, _server_failed
+    with _server_lock:
+        server, _server = _server, None
+        _server_failed = False
+    if server is not None:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,360 @@
+"""
+Pool de servidores Ollama com balanceamento por menor número de requisições em andamento
+
+Distribui as chamadas entre vários hosts Ollama. Cada requisição vai para o servidor
+saudável com menos requisições em andamento, dando preferência aos que já têm o
+modelo carregado na memória (/api/ps) e, depois, aos que têm o modelo instalado
+(/api/tags). Servidores que falham são removidos do balanceamento por um período e
+testados novamente depois. Expõe a mesma interface usada do OllamaService.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Union
+
+import requests
+
+from src.core.ollama_residency import _normalize_model_name
+from src.core.ollama_service import OllamaService
+
+logger = logging.getLogger(__name__)
+
+
+def parse_endpoints(base_url: Union[str, List[str], None]) -> List[str]:
+    """
+    Normaliza a configuração de servidores Ollama em uma lista de URLs.
+
+    Args:
+        base_url: URL, lista de URLs ou URLs separadas por vírgula
+            (ex: "http://gpu1:11434,http://gpu2:11434")
+
+    Returns:
+        Lista de URLs sem duplicatas, na ordem informada
+    """
+    if not base_url:
+        return []
+    if isinstance(base_url, str):
+        base_url = base_url.split(",")
+    endpoints = []
+    for url in base_url:
+        url = url.strip().rstrip("/")
+        if url and url not in endpoints:
+            endpoints.append(url)
+    return endpoints
+
+
+class OllamaPool:
+    """Balanceador de requisições entre vários servidores Ollama"""
+
+    def __init__(
+        self,
+        base_urls: List[str],
+        timeout: Optional[int] = None,
+        keep_alive: Optional[Any] = None,
+        start_probing: bool = True,
+    ):
+        """
+        Inicializa o pool com um OllamaService por servidor.
+
+        Args:
+            base_urls: URLs dos servidores Ollama
+            timeout: Timeout para requisições em segundos (usa model_config se None)
+            keep_alive: Tempo que o modelo fica carregado (ver OllamaService)
+            start_probing: Inicia a verificação periódica em segundo plano
+        """
+        from src.config.model_config import POOL_CONFIG
+
+        if not base_urls:
+            raise ValueError("Informe ao menos uma URL de servidor Ollama")
+
+        self.config = dict(POOL_CONFIG)
+        self.endpoints: List[Dict[str, Any]] = []
+        for url in base_urls:
+            service = OllamaService(base_url=url, timeout=timeout, keep_alive=keep_alive)
+            self.endpoints.append({
+                "url": url,
+                "service": service,
+                "healthy": True,
+                "ejected_until": 0.0,
+                "consecutive_failures": 0,
+                "in_flight": 0,
+                "installed_models": set(),
+                "running_models": set(),
+                "last_probe": 0.0,
+                "requests": 0,
+                "errors": 0,
+                "latencies": deque(maxlen=self.config["latency_window"]),
+            })
+
+        first = self.endpoints[0]["service"]
+        self.base_url = ", ".join(base_urls)
+        self.timeout = first.timeout
+        self.keep_alive = first.keep_alive
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        if start_probing:
+            self.start_probing()
+
+    # ------------------------------------------------------------------
+    # Verificação de saúde
+    # ------------------------------------------------------------------
+
+    def _probe_endpoint(self, endpoint: Dict[str, Any]):
+        """
+        Consulta modelos instalados (/api/tags) e carregados (/api/ps) de um servidor.
+
+        Args:
+            endpoint: Estado do servidor no pool
+        """
+        probe_timeout = self.config["probe_timeout_seconds"]
+        try:
+            tags = requests.get(f"{endpoint['url']}/api/tags", timeout=probe_timeout)
+            tags.raise_for_status()
+            installed = {m.get("name") for m in tags.json().get("models", []) if m.get("name")}
+            running = set()
+            try:
+                ps = requests.get(f"{endpoint['url']}/api/ps", timeout=probe_timeout)
+                ps.raise_for_status()
+                running = {m.get("name") for m in ps.json().get("models", []) if m.get("name")}
+            except requests.exceptions.RequestException:
+                # Versões antigas do Ollama não têm /api/ps
+                pass
+        except Exception as e:
+            self._record_failure(endpoint, e, eject=True)
+            return
+
+        with self._lock:
+            if not endpoint["healthy"]:
+                logger.info(f"Servidor Ollama {endpoint['url']} voltou ao pool")
+            endpoint["healthy"] = True
+            endpoint["ejected_until"] = 0.0
+            endpoint["consecutive_failures"] = 0
+            endpoint["installed_models"] = installed
+            endpoint["running_models"] = running
+            endpoint["last_probe"] = time.monotonic()
+
+    def probe_all(self):
+        """Verifica todos os servidores (saúde e modelos disponíveis)."""
+        for endpoint in self.endpoints:
+            self._probe_endpoint(endpoint)
+
+    def start_probing(self):
+        """Inicia a verificação periódica dos servidores em segundo plano."""
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+
+        def probe_loop():
+            while not self._stop_event.is_set():
+                self.probe_all()
+                self._stop_event.wait(self.config["probe_interval_seconds"])
+
+        self._stop_event.clear()
+        self._probe_thread = threading.Thread(target=probe_loop, name="ollama-pool-probe", daemon=True)
+        self._probe_thread.start()
+
+    def stop_probing(self):
+        """Interrompe a verificação periódica."""
+        self._stop_event.set()
+
+    def _record_failure(self, endpoint: Dict[str, Any], error: Exception, eject: bool = False):
+        """
+        Registra uma falha e remove o servidor do balanceamento se necessário.
+
+        Args:
+            endpoint: Estado do servidor no pool
+            error: Erro ocorrido
+            eject: Remove imediatamente (servidor inacessível)
+        """
+        with self._lock:
+            endpoint["errors"] += 1
+            endpoint["consecutive_failures"] += 1
+            if eject or endpoint["consecutive_failures"] >= self.config["max_consecutive_failures"]:
+                if endpoint["healthy"]:
+                    logger.warning(
+                        f"Servidor Ollama {endpoint['url']} removido do pool por "
+                        f"{self.config['eject_seconds']}s: {str(error)[:200]}"
+                    )
+                endpoint["healthy"] = False
+                endpoint["ejected_until"] = time.monotonic() + self.config["eject_seconds"]
+
+    # ------------------------------------------------------------------
+    # Seleção de servidor
+    # ------------------------------------------------------------------
+
+    def _select_endpoint(self, model: Optional[str], exclude: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Escolhe o servidor para uma requisição e reserva uma vaga nele.
+
+        Ordem de preferência: saudável; modelo carregado; modelo instalado; menos
+        requisições em andamento; menor latência média.
+
+        Args:
+            model: Modelo da requisição
+            exclude: Servidores já tentados nesta requisição
+
+        Returns:
+            Estado do servidor escolhido ou None se nenhum estiver disponível
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [
+                endpoint for endpoint in self.endpoints
+                if endpoint not in exclude
+                and (endpoint["healthy"] or endpoint["ejected_until"] <= now)
+            ]
+            if not candidates:
+                return None
+
+            # /api/ps e /api/tags reportam "modelo:latest" quando a tag é omitida
+            wanted = _normalize_model_name(model)
+
+            def sort_key(endpoint):
+                latencies = endpoint["latencies"]
+                mean_latency = sum(latencies) / len(latencies) if latencies else 0.0
+                running = {_normalize_model_name(name) for name in endpoint["running_models"]}
+                installed = {_normalize_model_name(name) for name in endpoint["installed_models"]}
+                return (
+                    not endpoint["healthy"],
+                    wanted not in running,
+                    bool(installed) and wanted not in installed,
+                    endpoint["in_flight"],
+                    mean_latency,
+                )
+
+            endpoint = min(candidates, key=sort_key)
+            endpoint["in_flight"] += 1
+            endpoint["requests"] += 1
+            return endpoint
+
+    def _release(self, endpoint: Dict[str, Any], start_time: float, success: bool):
+        """Libera a vaga do servidor e registra a latência da requisição."""
+        with self._lock:
+            endpoint["in_flight"] -= 1
+            if success:
+                endpoint["latencies"].append(time.perf_counter() - start_time)
+                endpoint["consecutive_failures"] = 0
+                if not endpoint["healthy"]:
+                    logger.info(f"Servidor Ollama {endpoint['url']} voltou ao pool")
+                endpoint["healthy"] = True
+
+    def _release_stream(self, chunks, endpoint: Dict[str, Any], start_time: float):
+        """Repassa o streaming e libera o servidor quando a resposta termina."""
+        success = False
+        try:
+            for chunk in chunks:
+                yield chunk
+            success = True
+        finally:
+            self._release(endpoint, start_time, success)
+
+    def _route(self, method: str, model: Optional[str], stream: bool, call_kwargs: Dict[str, Any]):
+        """
+        Executa uma chamada do OllamaService no servidor escolhido.
+
+        Servidores inacessíveis são removidos do pool e a chamada é repetida
+        no próximo servidor disponível.
+
+        Args:
+            method: Método do OllamaService ("chat" ou "generate_response")
+            model: Modelo da requisição
+            stream: Se a resposta é em streaming
+            call_kwargs: Argumentos repassados ao método
+
+        Returns:
+            Resposta do servidor (ou gerador em streaming)
+        """
+        tried: List[Dict[str, Any]] = []
+        last_error: Optional[Exception] = None
+        while True:
+            endpoint = self._select_endpoint(model, tried)
+            if endpoint is None:
+                if last_error:
+                    raise last_error
+                raise ConnectionError("Nenhum servidor Ollama disponível no pool")
+            tried.append(endpoint)
+
+            start_time = time.perf_counter()
+            try:
+                result = getattr(endpoint["service"], method)(**call_kwargs)
+            except ConnectionError as e:
+                self._release(endpoint, start_time, success=False)
+                self._record_failure(endpoint, e, eject=True)
+                last_error = e
+                continue
+            except Exception as e:
+                self._release(endpoint, start_time, success=False)
+                self._record_failure(endpoint, e)
+                raise
+
+            if stream:
+                return self._release_stream(result, endpoint, start_time)
+            self._release(endpoint, start_time, success=True)
+            return result
+
+    # ------------------------------------------------------------------
+    # Interface do OllamaService
+    # ------------------------------------------------------------------
+
+    def list_models(self) -> list:
+        """
+        Lista os modelos instalados em qualquer servidor disponível do pool.
+
+        Returns:
+            Lista de modelos (sem duplicatas)
+
+        Raises:
+            ConnectionError: Se nenhum servidor responder
+        """
+        models: Dict[str, Dict[str, Any]] = {}
+        last_error: Optional[Exception] = None
+        for endpoint in self.endpoints:
+            if not endpoint["healthy"] and endpoint["ejected_until"] > time.monotonic():
+                continue
+            try:
+                for model in endpoint["service"].list_models():
+                    models.setdefault(model.get("name"), model)
+            except Exception as e:
+                self._record_failure(endpoint, e, eject=isinstance(e, ConnectionError))
+                last_error = e
+        if not models and last_error is not None:
+            raise ConnectionError(f"Nenhum servidor Ollama do pool respondeu: {str(last_error)}")
+        return list(models.values())
+
+    def chat(self, model: str, messages: list, stream: bool = False, tools: Optional[list] = None, **kwargs):
+        """Interface de chat (ver OllamaService.chat), roteada para um servidor do pool."""
+        call_kwargs = dict(kwargs, model=model, messages=messages, stream=stream, tools=tools)
+        return self._route("chat", model, stream, call_kwargs)
+
+    def generate_response(self, model: str, prompt: str, stream: bool = False, **kwargs):
+        """Geração simples (ver OllamaService.generate_response), roteada para um servidor do pool."""
+        call_kwargs = dict(kwargs, model=model, prompt=prompt, stream=stream)
+        return self._route("generate_response", model, stream, call_kwargs)
+
+    def get_endpoint_stats(self) -> List[Dict[str, Any]]:
+        """
+        Retorna o estado e as latências de cada servidor do pool.
+
+        Returns:
+            Lista de dicionários com "url", "healthy", "in_flight", "requests", "errors",
+            "running_models", "mean_latency", "p50_latency" e "p95_latency" (segundos)
+        """
+        stats = []
+        with self._lock:
+            for endpoint in self.endpoints:
+                values = sorted(endpoint["latencies"])
+                stats.append({
+                    "url": endpoint["url"],
+                    "healthy": endpoint["healthy"],
+                    "in_flight": endpoint["in_flight"],
+                    "requests": endpoint["requests"],
+                    "errors": endpoint["errors"],
+                    "running_models": sorted(endpoint["running_models"]),
+                    "mean_latency": sum(values) / len(values) if values else 0.0,
+                    "p50_latency": values[int(0.50 * (len(values) - 1))] if values else 0.0,
+                    "p95_latency": values[int(0.95 * (len(values) - 1))] if values else 0.0,
+                })
+        return stats
@@ -0,0 +1,415 @@
+"""
+Gerenciador de residência de modelos do Ollama
+
+Mantém os modelos usados pelo app carregados na memória do servidor Ollama:
+- Pré-carrega o modelo padrão e o selecionado ao iniciar o app
+- Consulta periodicamente os modelos em execução (/api/ps)
+- Descarrega modelos ociosos quando há pressão de memória (muitos modelos ou VRAM demais)
+
+Assim a primeira pergunta não paga o tempo de carga do modelo dentro do timeout da requisição.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+import requests
+
+from src.core.ollama_service import OllamaService
+
+logger = logging.getLogger(__name__)
+
+# Estados de prontidão de um modelo
+STATUS_READY = "ready"
+STATUS_LOADING = "loading"
+STATUS_COLD = "cold"
+STATUS_UNAVAILABLE = "unavailable"
+
+STATUS_LABELS = {
+    STATUS_READY: "✅ Carregado",
+    STATUS_LOADING: "⏳ Carregando",
+    STATUS_COLD: "❄️ Não carregado",
+    STATUS_UNAVAILABLE: "❌ Indisponível",
+}
+
+# Um gerenciador por servidor Ollama (compartilhado entre sessões do Streamlit)
+_managers: Dict[str, "OllamaResidencyManager"] = {}
+_managers_lock = threading.Lock()
+
+
+def _normalize_model_name(model: str) -> str:
+    """Normaliza o nome do modelo como o Ollama reporta (tag :latest implícita)."""
+    model = (model or "").strip()
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaResidencyManager:
+    """Controla quais modelos ficam carregados no servidor Ollama"""
+
+    def __init__(
+        self,
+        ollama_service: OllamaService,
+        keep_alive: Optional[Any] = None,
+        max_loaded_models: Optional[int] = None,
+        max_vram_gb: Optional[float] = None,
+        idle_unload_seconds: Optional[float] = None,
+        poll_interval_seconds: Optional[float] = None,
+    ):
+        """
+        Inicializa o gerenciador.
+
+        Args:
+            ollama_service: Serviço Ollama (define URL, timeout e keep_alive padrão)
+            keep_alive: keep_alive usado no pré-carregamento (usa o do serviço se None)
+            max_loaded_models: Máximo de modelos carregados simultaneamente
+            max_vram_gb: Máximo de memória de vídeo ocupada pelos modelos (None = sem limite)
+            idle_unload_seconds: Tempo mínimo sem uso para um modelo poder ser descarregado
+            poll_interval_seconds: Intervalo de consulta a /api/ps no monitor
+        """
+        try:
+            from src.config.model_config import RESIDENCY_CONFIG
+        except ImportError:
+            RESIDENCY_CONFIG = {}
+
+        self.ollama_service = ollama_service
+        self.keep_alive = keep_alive if keep_alive is not None else ollama_service.keep_alive
+        self.max_loaded_models = (
+            max_loaded_models if max_loaded_models is not None
+            else RESIDENCY_CONFIG.get("max_loaded_models", 2)
+        )
+        self.max_vram_gb = max_vram_gb if max_vram_gb is not None else RESIDENCY_CONFIG.get("max_vram_gb")
+        self.idle_unload_seconds = (
+            idle_unload_seconds if idle_unload_seconds is not None
+            else RESIDENCY_CONFIG.get("idle_unload_seconds", 600)
+        )
+        self.poll_interval_seconds = (
+            poll_interval_seconds if poll_interval_seconds is not None
+            else RESIDENCY_CONFIG.get("poll_interval_seconds", 30)
+        )
+
+        self._lock = threading.Lock()
+        self.running_models: Dict[str, Dict[str, Any]] = {}
+        self.loading: set = set()
+        self.unavailable: Dict[str, str] = {}
+        self.last_used: Dict[str, float] = {}
+        self.protected_models: set = set()
+        self.last_poll: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._expires_at: Dict[str, str] = {}
+        self._stop_event = threading.Event()
+        self._monitor_thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Consulta ao servidor
+    # ------------------------------------------------------------------
+
+    def list_running_models(self) -> List[Dict[str, Any]]:
+        """
+        Lista os modelos carregados no Ollama (/api/ps).
+
+        Returns:
+            Lista de modelos com name, size, size_vram e expires_at
+
+        Raises:
+            ConnectionError: Se não conseguir conectar ao Ollama
+        """
+        try:
+            response = requests.get(
+                f"{self.ollama_service.api_url}/ps", timeout=self.ollama_service.timeout
+            )
+            response.raise_for_status()
+            return response.json().get("models", [])
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(
+                f"Ollama não está acessível em {self.ollama_service.base_url}: {str(e)}"
+            ) from e
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Atualiza o estado dos modelos carregados.
+
+        Um modelo cujo expires_at avançou desde a última consulta foi usado nesse
+        intervalo (o Ollama renova o prazo a cada requisição).
+
+        Returns:
+            Dicionário {nome do modelo: informações do /api/ps}
+        """
+        try:
+            models = self.list_running_models()
+        except Exception as e:
+            with self._lock:
+                self.last_error = str(e)
+            logger.debug(f"Não foi possível consultar modelos carregados: {str(e)}")
+            return dict(self.running_models)
+
+        now = time.time()
+        with self._lock:
+            running = {}
+            for model in models:
+                name = model.get("name") or model.get("model", "")
+                running[name] = model
+                expires_at = model.get("expires_at", "")
+                if self._expires_at.get(name) != expires_at:
+                    self.last_used[name] = now
+                    self._expires_at[name] = expires_at
+            self.running_models = running
+            self.last_poll = now
+            self.last_error = None
+            return dict(running)
+
+    # ------------------------------------------------------------------
+    # Carga e descarga
+    # ------------------------------------------------------------------
+
+    def preload(self, model: str) -> bool:
+        """
+        Carrega um modelo na memória sem gerar texto.
+
+        Args:
+            model: Nome do modelo
+
+        Returns:
+            True se o modelo foi carregado
+        """
+        name = _normalize_model_name(model)
+        with self._lock:
+            self.loading.add(name)
+        try:
+            logger.info(f"Pré-carregando modelo {name} (keep_alive={self.keep_alive})")
+            start = time.perf_counter()
+            payload = {"model": model, "stream": False}
+            if self.keep_alive is not None:
+                payload["keep_alive"] = self.keep_alive
+            response = requests.post(
+                f"{self.ollama_service.api_url}/generate",
+                json=payload,
+                timeout=self.ollama_service.timeout * 2,
+            )
+            response.raise_for_status()
+            logger.info(f"Modelo {name} carregado em {time.perf_counter() - start:.1f}s")
+            with self._lock:
+                self.unavailable.pop(name, None)
+                self.last_used[name] = time.time()
+            self.refresh()
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao pré-carregar {name}: {str(e)}")
+            with self._lock:
+                self.unavailable[name] = str(e)
+            return False
+        finally:
+            with self._lock:
+                self.loading.discard(name)
+
+    def preload_async(self, models: List[str]) -> threading.Thread:
+        """
+        Pré-carrega modelos em segundo plano, um de cada vez.
+
+        Args:
+            models: Nomes dos modelos
+
+        Returns:
+            Thread iniciada
+        """
+        pending = []
+        with self._lock:
+            for model in models:
+                name = _normalize_model_name(model)
+                if model and name not in self.loading and name not in [_normalize_model_name(m) for m in pending]:
+                    self.loading.add(name)
+                    pending.append(model)
+
+        def worker():
+            for model in pending:
+                self.preload(model)
+
+        thread = threading.Thread(target=worker, name="ollama-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def ensure_loaded(self, models: List[str]) -> List[str]:
+        """
+        Garante que os modelos estejam carregados ou carregando (idempotente).
+
+        Args:
+            models: Nomes dos modelos necessários
+
+        Returns:
+            Modelos cujo pré-carregamento foi disparado
+        """
+        if self.last_poll is None:
+            self.refresh()
+        cold = [
+            model for model in dict.fromkeys(models)
+            if model and self.get_model_status(model) == STATUS_COLD
+        ]
+        if cold:
+            self.preload_async(cold)
+        return cold
+
+    def unload(self, model: str) -> bool:
+        """
+        Descarrega um modelo da memória (keep_alive=0).
+
+        Args:
+            model: Nome do modelo
+
+        Returns:
+            True se o pedido foi aceito
+        """
+        try:
+            response = requests.post(
+                f"{self.ollama_service.api_url}/generate",
+                json={"model": model, "keep_alive": 0},
+                timeout=self.ollama_service.timeout,
+            )
+            response.raise_for_status()
+            with self._lock:
+                self.running_models.pop(model, None)
+                self._expires_at.pop(model, None)
+            logger.info(f"Modelo {model} descarregado")
+            return True
+        except Exception as e:
+            logger.warning(f"Falha ao descarregar {model}: {str(e)}")
+            return False
+
+    def set_protected_models(self, models: List[str]):
+        """
+        Define os modelos que nunca são descarregados (padrão e selecionado).
+
+        Args:
+            models: Nomes dos modelos
+        """
+        with self._lock:
+            self.protected_models = {_normalize_model_name(m) for m in models if m}
+
+    def enforce_memory_limits(self) -> List[str]:
+        """
+        Descarrega modelos ociosos enquanto houver pressão de memória.
+
+        Há pressão quando o número de modelos carregados passa de max_loaded_models
+        ou a VRAM ocupada passa de max_vram_gb. Os modelos menos usados recentemente
+        saem primeiro; modelos protegidos ou usados há menos de idle_unload_seconds ficam.
+
+        Returns:
+            Modelos descarregados
+        """
+        now = time.time()
+        with self._lock:
+            running = dict(self.running_models)
+            candidates = sorted(
+                (
+                    name for name in running
+                    if name not in self.protected_models
+                    and now - self.last_used.get(name, 0) >= self.idle_unload_seconds
+                ),
+                key=lambda name: self.last_used.get(name, 0),
+            )
+
+        def under_pressure() -> bool:
+            if self.max_loaded_models and len(running) > self.max_loaded_models:
+                return True
+            if self.max_vram_gb:
+                vram = sum(m.get("size_vram", m.get("size", 0)) for m in running.values())
+                return vram > self.max_vram_gb * 1024 ** 3
+            return False
+
+        unloaded = []
+        for name in candidates:
+            if not under_pressure():
+                break
+            if self.unload(name):
+                running.pop(name, None)
+                unloaded.append(name)
+
+        if unloaded:
+            logger.info(f"Pressão de memória: modelos descarregados {unloaded}")
+        return unloaded
+
+    # ------------------------------------------------------------------
+    # Monitor e status
+    # ------------------------------------------------------------------
+
+    def start_monitor(self):
+        """Inicia (uma única vez) a thread que consulta /api/ps e aplica os limites de memória."""
+        if self._monitor_thread and self._monitor_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def monitor():
+            while not self._stop_event.is_set():
+                self.refresh()
+                if self.last_error is None:
+                    self.enforce_memory_limits()
+                self._stop_event.wait(self.poll_interval_seconds)
+
+        self._monitor_thread = threading.Thread(target=monitor, name="ollama-residency", daemon=True)
+        self._monitor_thread.start()
+        logger.info(f"Monitor de residência iniciado (intervalo={self.poll_interval_seconds}s)")
+
+    def stop_monitor(self):
+        """Para a thread de monitoramento."""
+        self._stop_event.set()
+
+    def get_model_status(self, model: str) -> str:
+        """
+        Retorna a prontidão de um modelo.
+
+        Args:
+            model: Nome do modelo
+
+        Returns:
+            "ready", "loading", "cold" ou "unavailable"
+        """
+        name = _normalize_model_name(model)
+        with self._lock:
+            if name in self.loading:
+                return STATUS_LOADING
+            if name in self.running_models:
+                return STATUS_READY
+            if name in self.unavailable:
+                return STATUS_UNAVAILABLE
+            return STATUS_COLD
+
+    def get_status(self, models: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Retorna o estado de residência para exibição.
+
+        Args:
+            models: Modelos cujo status deve ser informado
+
+        Returns:
+            Dicionário com "models" ({modelo: status}), "running", "vram_gb", "last_poll" e "error"
+        """
+        with self._lock:
+            running = dict(self.running_models)
+            last_poll = self.last_poll
+            error = self.last_error
+        return {
+            "models": {model: self.get_model_status(model) for model in (models or [])},
+            "running": list(running),
+            "vram_gb": sum(m.get("size_vram", 0) for m in running.values()) / 1024 ** 3,
+            "last_poll": last_poll,
+            "error": error,
+        }
+
+
+def get_residency_manager(base_url: str, timeout: Optional[int] = None) -> OllamaResidencyManager:
+    """
+    Retorna o gerenciador de residência do servidor (criado uma vez por URL).
+
+    Args:
+        base_url: URL base do servidor Ollama
+        timeout: Timeout das requisições em segundos
+
+    Returns:
+        Instância compartilhada de OllamaResidencyManager
+    """
+    with _managers_lock:
+        manager = _managers.get(base_url)
+        if manager is None:
+            manager = OllamaResidencyManager(OllamaService(base_url=base_url, timeout=timeout))
+            _managers[base_url] = manager
+        return manager
@@ -1,14 +1,24 @@
+import os
 import requests
 import json
 import logging
+import time
 from typing import Dict, Any, Optional
 
+from src.core.rate_limiter import get_rate_limiter, get_rate_limit_config, parse_retry_after
+from src.core.llm_cassette import get_cassette
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 
 
 class OllamaService:
-    def __init__(self, base_url: str = "http://localhost:11434", timeout: int = None):
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        timeout: int = None,
+        keep_alive: Optional[Any] = None,
+    ):
         """
         Inicializa o serviço Ollama.
 
@@ -16,6 +26,8 @@ class OllamaService:
             base_url: URL da API do Ollama (padrão: localhost:11434)
             timeout: Timeout para requisições em segundos (usa model_config se None)
                     Para geração de respostas, use um valor maior (60-120s)
+            keep_alive: Tempo que o modelo fica carregado após cada requisição
+                    (ex: "30m", -1). Usa RESIDENCY_CONFIG/OLLAMA_KEEP_ALIVE se None
         """
         # Usar timeout de model_config se não fornecido
         if timeout is None:
@@ -26,9 +38,21 @@ class OllamaService:
             except ImportError:
                 timeout = 60
 
+        if keep_alive is None:
+            try:
+                from src.config.model_config import RESIDENCY_CONFIG
+
+                keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", RESIDENCY_CONFIG.get("keep_alive"))
+            except ImportError:
+                keep_alive = os.getenv("OLLAMA_KEEP_ALIVE")
+
         self.base_url = base_url
         self.api_url = f"{base_url}/api"
         self.timeout = timeout
+        self.keep_alive = keep_alive
+        # Um limitador por servidor: um 429/503 de um host do pool não pausa os demais
+        self.rate_limiter = get_rate_limiter("ollama", host=base_url)
+        self.rate_limit_config = get_rate_limit_config("ollama")
 
     def list_models(self) -> list:
         """
@@ -97,6 +121,9 @@ class OllamaService:
         if system_prompt:
             payload["system"] = system_prompt
 
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+
         try:
             if stream:
                 logger.debug(f"Gerando resposta em streaming com modelo {model}")
@@ -130,17 +157,98 @@ class OllamaService:
     def _handle_stream_response(self, response):
         """Processa resposta em streaming."""
         logger.debug("Processando resposta em streaming")
-        for line in response.iter_lines():
-            if line:
-                try:
-                    data = json.loads(line.decode("utf-8"))
-                    yield data
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Erro ao decodificar JSON do stream: {e}")
-                    continue
+        try:
+            for line in response.iter_lines():
+                if line:
+                    try:
+                        data = json.loads(line.decode("utf-8"))
+                        yield data
+                    except json.JSONDecodeError as e:
+                        logger.warning(f"Erro ao decodificar JSON do stream: {e}")
+                        continue
+        finally:
+            # Fechar a conexão interrompe a geração no servidor se o streaming for abandonado
+            response.close()
+
+    def _post_with_rate_limit(
+        self,
+        url: str,
+        payload: Dict[str, Any],
+        stream: bool,
+        timeout: Optional[float],
+        messages: list,
+        options: Dict[str, Any],
+    ):
+        """
+        Envia a requisição passando pelo limitador de taxa compartilhado.
+
+        Respostas 429 ou 503 (fila do servidor cheia, OLLAMA_MAX_QUEUE) pausam o
+        limitador pelo retry-after e a chamada volta para a fila.
+
+        Args:
+            url: Endpoint da API
+            payload: Corpo da requisição
+            stream: Se a resposta é em streaming
+            timeout: Timeout da requisição
+            messages: Mensagens enviadas (estimativa de tokens)
+            options: Opções do modelo (num_predict estima a resposta)
+
+        Returns:
+            Tupla (resposta HTTP, reserva do limitador)
+        """
+        from src.core.context_window import estimate_message_tokens
+
+        estimated_tokens = estimate_message_tokens(messages, "ollama") + options.get(
+            "num_predict", self.rate_limit_config["default_completion_tokens"]
+        )
+        default_retry_after = self.rate_limit_config["default_retry_after"]
+        attempt = 0
+        while True:
+            reservation = self.rate_limiter.acquire(estimated_tokens)
+            try:
+                response = requests.post(url, json=payload, stream=stream, timeout=timeout)
+                response.raise_for_status()
+                return response, reservation
+            except requests.exceptions.HTTPError as e:
+                self.rate_limiter.reconcile(reservation, 0)
+                status_code = getattr(e.response, "status_code", None)
+                if status_code not in (429, 503) or attempt >= self.rate_limit_config["max_rate_limit_retries"]:
+                    raise
+                self.rate_limiter.pause(
+                    parse_retry_after(e.response.headers, default_retry_after * 2 ** attempt)
+                )
+            except BaseException:
+                # Conexão recusada, timeout etc.: a chamada não consumiu tokens
+                self.rate_limiter.reconcile(reservation, 0)
+                raise
+            attempt += 1
+
+    @staticmethod
+    def _reported_tokens(result: Dict[str, Any]) -> Optional[int]:
+        """Tokens reportados pelo Ollama (prompt + resposta) ou None se ausentes."""
+        if "prompt_eval_count" not in result and "eval_count" not in result:
+            return None
+        return result.get("prompt_eval_count", 0) + result.get("eval_count", 0)
+
+    def _reconcile_stream(self, chunks, reservation: Dict[str, Any]):
+        """Repassa os chunks do streaming e reconcilia o limitador no chunk final."""
+        reported = None
+        try:
+            for chunk in chunks:
+                if chunk.get("done"):
+                    reported = self._reported_tokens(chunk)
+                yield chunk
+        finally:
+            self.rate_limiter.reconcile(reservation, reported)
 
     def chat(
-        self, model: str, messages: list, stream: bool = False, **kwargs
+        self,
+        model: str,
+        messages: list,
+        stream: bool = False,
+        tools: Optional[list] = None,
+        format: Optional[Any] = None,
+        **kwargs,
     ) -> Dict[str, Any]:
         """
         Interface de chat com histórico de mensagens.
@@ -149,6 +257,9 @@ class OllamaService:
             model: Nome do modelo
             messages: Lista de mensagens no formato [{"role": "user", "content": "..."}]
             stream: Se True, streaming de resposta
+            tools: Definições de ferramentas (formato OpenAI) para tool calling.
+                   Requer um modelo com suporte a ferramentas
+            format: JSON schema (ou "json") que restringe a saída do modelo
             **kwargs: Parâmetros adicionais
         """
         payload = {
@@ -158,26 +269,43 @@ class OllamaService:
             "options": kwargs,
         }
 
+        if tools:
+            payload["tools"] = tools
+
+        if format is not None:
+            payload["format"] = format
+
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+
+        # Cassete (LLM_CASSETTE_MODE): replay responde sem servidor; record grava a resposta real
+        cassette = get_cassette()
+        if cassette is not None and cassette.mode == "replay":
+            return cassette.replay("ollama", payload)
+
         try:
             # Timeout mais longo para chat (geração de respostas pode demorar)
             chat_timeout = self.timeout * 2 if not stream else None
             logger.debug(
                 f"Iniciando chat com modelo {model}, streaming={stream}, timeout={chat_timeout}s"
             )
-            response = requests.post(
-                f"{self.api_url}/chat",
-                json=payload,
-                stream=stream,
-                timeout=chat_timeout,  # Timeout dobrado para chat (geração pode demorar)
+            started = time.perf_counter()
+            response, reservation = self._post_with_rate_limit(
+                f"{self.api_url}/chat", payload, stream, chat_timeout, messages, kwargs
             )
-            response.raise_for_status()
 
             if stream:
                 logger.debug("Retornando resposta em streaming")
-                return self._handle_stream_response(response)
+                chunks = self._reconcile_stream(self._handle_stream_response(response), reservation)
+                if cassette is not None:
+                    return cassette.record_stream("ollama", payload, chunks, started)
+                return chunks
             else:
                 result = response.json()
+                self.rate_limiter.reconcile(reservation, self._reported_tokens(result))
                 logger.debug("Resposta do chat recebida")
+                if cassette is not None:
+                    cassette.record("ollama", payload, result, started)
                 return result
 
         except requests.exceptions.ConnectionError as e:
@@ -3,8 +3,14 @@ Handler OpenAI que integra OpenAIService com a interface esperada pelo app.py
 """
 
 import logging
-from typing import Optional, List, Dict, Any, Generator
+import threading
+from typing import Optional, List, Dict, Any, Generator, Callable
 from src.core.openai_service import OpenAIService
+from src.core.single_flight import coalesced_chat
+from src.core.health_monitor import HealthMonitor
+from src.core.structured_output import to_openai_response_format
+from src.core.metrics import LLMCallMetrics
+from src.core.usage_tracker import LLMResponse, combine_usage, record_llm_usage
 from src.config.openai_model_config import (
     get_system_prompt,
     validate_temperature,
@@ -29,6 +35,9 @@ logger = logging.getLogger(__name__)
 class OpenAILLMHandler:
     """Handler que adapta OpenAIService para a interface do app.py"""
 
+    # Identificador do provedor (usado pelo orquestrador para escolher o modo de ferramentas)
+    provider = "openai"
+
     def __init__(self, api_key: Optional[str] = None, timeout: Optional[int] = None):
         """
         Inicializa o handler com OpenAIService.
@@ -47,6 +56,31 @@ class OpenAILLMHandler:
 
         self.openai_service = OpenAIService(api_key=api_key, timeout=timeout)
         self.timeout = timeout
+        # Status e modelos servidos da memória (verificados em segundo plano)
+        self.health_monitor = HealthMonitor(self._probe_connection_status, name="OpenAI")
+        # Uso de tokens da última chamada, por thread (os agentes podem rodar em paralelo)
+        self._usage_state = threading.local()
+
+    @property
+    def last_usage(self) -> Optional[Dict[str, Any]]:
+        """
+        Uso de tokens da última chamada feita na thread atual.
+
+        Inclui cached_tokens: tokens do prompt servidos pelo prompt caching da OpenAI.
+        """
+        return getattr(self._usage_state, "usage", None)
+
+    def get_system_prompt(self, context: str = "general") -> str:
+        """
+        Retorna o system prompt usado por generate_response para o contexto.
+
+        Args:
+            context: Contexto da conversa ("general", "data_analysis", etc.)
+
+        Returns:
+            Texto do system prompt
+        """
+        return get_system_prompt(context)
 
     def generate_response(
         self,
@@ -56,6 +90,7 @@ class OpenAILLMHandler:
         temperature: Optional[float] = None,
         context: str = "general",
         stream: bool = False,
+        response_format: Optional[Dict[str, Any]] = None,
         **kwargs,
     ) -> str:
         """
@@ -68,11 +103,15 @@ class OpenAILLMHandler:
             temperature: Temperatura para geração (usa padrão se None)
             context: Contexto da conversa para system prompt
             stream: Se True, retorna um gerador para streaming
+            response_format: Saída estruturada {"name": ..., "schema": JSON schema},
+                enviada como response_format do tipo json_schema
             **kwargs: Parâmetros adicionais do modelo
 
         Returns:
-            String com a resposta gerada ou gerador se stream=True
+            LLMResponse (str com o uso de tokens em .usage) ou gerador se stream=True;
+            mensagens de erro são str simples
         """
+        self._usage_state.usage = None
         try:
             logger.info(f"Gerando resposta (stream={stream}, context={context})")
 
@@ -127,19 +166,32 @@ class OpenAILLMHandler:
                 model=model,
                 **kwargs
             )
+            if response_format:
+                model_params["response_format"] = to_openai_response_format(response_format)
 
-            # Chamar o método chat do OpenAIService
-            response = self.openai_service.chat(
-                model=model, messages=messages_with_system, stream=stream, **model_params
-            )
+            # Chamar o método chat do OpenAIService (requisições idênticas simultâneas são agrupadas)
+            call_metrics = LLMCallMetrics(self.provider, model)
+            if not stream:
+                call_metrics.begin()
+            try:
+                response = coalesced_chat(
+                    self.openai_service, self.provider, model, messages_with_system, stream, **model_params
+                )
+            except Exception:
+                call_metrics.finish(error=True)
+                raise
 
             # Se streaming, retornar gerador
             if stream:
                 logger.debug("Retornando resposta em streaming")
-                return self._handle_stream_response(response)
+                return self._handle_stream_response(response, call_metrics, messages_with_system)
+
+            usage = response.get("usage") if isinstance(response, dict) else None
+            call_metrics.finish(usage, error=not isinstance(response, dict))
 
             # Extrair a resposta do formato da OpenAI
             if isinstance(response, dict):
+                self._usage_state.usage = record_llm_usage(usage, call_metrics, messages_with_system)
                 # Tentar extrair conteúdo de diferentes formas
                 message = response.get("message", {})
                 content = ""
@@ -155,7 +207,7 @@ class OpenAILLMHandler:
                 
                 if content and len(str(content).strip()) > 0:
                     logger.info(f"Resposta gerada: {len(content)} caracteres")
-                    return str(content)
+                    return LLMResponse(str(content), self.last_usage, model, self.provider)
                 else:
                     logger.warning(f"Resposta vazia do modelo. Response structure: {list(response.keys())}")
                     return SYSTEM_MESSAGES.get(
@@ -170,6 +222,9 @@ class OpenAILLMHandler:
         except Exception as e:
             logger.error(f"Erro ao gerar resposta: {str(e)}", exc_info=True)
             error_str = str(e)
+            if "401" in error_str or "Connection error" in error_str:
+                # Chave revogada ou sem conexão: o status em cache deixa de valer
+                self.health_monitor.invalidate(error_str[:100])
             
             # Detectar erros específicos de API key
             if "401" in error_str or "invalid_api_key" in error_str or "Incorrect API key" in error_str:
@@ -208,20 +263,111 @@ A chave de API configurada no arquivo `.env` não é válida.
             error_msg = SYSTEM_MESSAGES.get("error", "Erro ao gerar resposta")
             return f"{error_msg}: {error_str}"
 
+    def generate_with_tools(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        tool_executor: Callable[[str, Any], str],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_rounds: int = 5,
+        **kwargs,
+    ) -> str:
+        """
+        Gera uma resposta permitindo que o modelo chame ferramentas (function calling).
+
+        A cada rodada as chamadas de ferramenta retornadas pelo modelo são executadas
+        e os resultados são enviados de volta, até o modelo responder em texto.
+
+        Args:
+            messages: Lista de mensagens (deve incluir o system prompt)
+            tools: Definições das ferramentas no formato da OpenAI
+            tool_executor: Função (nome, argumentos) -> resultado em texto
+            model: Nome do modelo OpenAI
+            temperature: Temperatura para geração
+            max_rounds: Número máximo de rodadas de chamadas de ferramentas
+            **kwargs: Parâmetros adicionais do modelo
+
+        Returns:
+            Resposta textual final (LLMResponse com o uso somado das rodadas)
+
+        Raises:
+            Exception: Se a comunicação com a OpenAI falhar
+        """
+        self._usage_state.usage = None
+        model = model or DEFAULT_MODEL
+        temperature = validate_temperature(
+            temperature if temperature is not None else DEFAULT_TEMPERATURE
+        )
+        model_params = get_model_parameters(temperature=temperature, model=model, **kwargs)
+        conversation = list(messages)
+        round_usages = []
+
+        for round_number in range(max_rounds + 1):
+            # Na última rodada as ferramentas não são oferecidas, forçando a resposta final
+            round_tools = tools if round_number < max_rounds else None
+            call_metrics = LLMCallMetrics(self.provider, model)
+            call_metrics.begin()
+            try:
+                response = self.openai_service.chat(
+                    model=model, messages=conversation, stream=False, tools=round_tools, **model_params
+                )
+            except Exception:
+                call_metrics.finish(error=True)
+                raise
+            usage = response.get("usage") if isinstance(response, dict) else None
+            call_metrics.finish(usage)
+            round_usages.append(record_llm_usage(usage, call_metrics, conversation))
+            self._usage_state.usage = combine_usage(round_usages)
+            message = response.get("message", {}) if isinstance(response, dict) else {}
+            tool_calls = message.get("tool_calls") or []
+
+            if not tool_calls:
+                content = message.get("content") or ""
+                logger.info(f"Resposta com ferramentas gerada em {round_number + 1} rodada(s)")
+                if not content:
+                    return SYSTEM_MESSAGES.get("no_response", "Erro: Resposta vazia do modelo.")
+                return LLMResponse(content, self.last_usage, model, self.provider)
+
+            conversation.append({
+                "role": "assistant",
+                "content": message.get("content"),
+                "tool_calls": tool_calls,
+            })
+            for tool_call in tool_calls:
+                function = tool_call.get("function", {})
+                name = function.get("name", "")
+                logger.debug(f"Modelo chamou ferramenta: {name}")
+                conversation.append({
+                    "role": "tool",
+                    "tool_call_id": tool_call.get("id"),
+                    "content": tool_executor(name, function.get("arguments", "{}")),
+                })
+
+        return SYSTEM_MESSAGES.get("no_response", "Erro: Resposta vazia do modelo.")
+
     def _handle_stream_response(
-        self, response_generator: Generator
+        self,
+        response_generator: Generator,
+        call_metrics: Optional[LLMCallMetrics] = None,
+        messages: Optional[List[Dict[str, Any]]] = None,
     ) -> Generator[str, None, None]:
         """
         Processa resposta em streaming da OpenAI.
 
         Args:
             response_generator: Gerador do OpenAIService
+            call_metrics: Medição da chamada (primeiro token, duração e tokens/s)
+            messages: Mensagens enviadas (identificam o prompt na contabilização de uso)
 
         Yields:
             Chunks de texto da resposta
         """
         logger.debug("Processando resposta em streaming")
         full_response = ""
+        error = False
+        if call_metrics is not None:
+            call_metrics.begin()
 
         try:
             for chunk in response_generator:
@@ -231,37 +377,50 @@ A chave de API configurada no arquivo `.env` não é válida.
                     content = message.get("content", "")
 
                     if content:
+                        if call_metrics is not None:
+                            call_metrics.first_token()
                         full_response += content
                         yield content
 
                     # Verificar se é o último chunk
                     if chunk.get("done", False):
+                        self._usage_state.usage = chunk.get("usage")
                         logger.debug(f"Streaming concluído: {len(full_response)} caracteres")
                         break
         except Exception as e:
+            error = True
             logger.error(f"Erro no streaming: {str(e)}", exc_info=True)
             raise
+        finally:
+            # Repassa o encerramento antecipado (ex: objeto JSON completo) ao serviço
+            close = getattr(response_generator, "close", None)
+            if close:
+                close()
+            if call_metrics is not None:
+                call_metrics.finish(self.last_usage, error=error)
+                self._usage_state.usage = record_llm_usage(self.last_usage, call_metrics, messages)
 
     def is_configured(self) -> bool:
         """
         Verifica se o handler está configurado e a OpenAI está disponível.
 
+        O status vem do cache do monitor de saúde (sem verificação a cada chamada).
+
         Returns:
             True se a OpenAI está acessível, False caso contrário
         """
-        try:
-            return self.openai_service.is_configured()
-        except Exception:
-            return False
+        return bool(self.health_monitor.get_status().get("connected"))
 
-    def get_connection_status(self) -> dict:
+    def _probe_connection_status(self) -> dict:
         """
-        Retorna status detalhado da conexão com a OpenAI.
+        Consulta a OpenAI e monta o status de conexão (usado pelo monitor de saúde).
 
         Returns:
-            Dicionário com status, mensagem e detalhes
+            Dicionário com status, mensagem, detalhes e "available_models" (todos os nomes)
         """
         try:
+            if not self.openai_service.is_configured():
+                raise Exception("Serviço OpenAI não configurado")
             models = self.openai_service.list_models()
             model_count = len(models)
             return {
@@ -270,6 +429,7 @@ A chave de API configurada no arquivo `.env` não é válida.
                 "provider": "OpenAI",
                 "model_count": model_count,
                 "models": [m.get("name", "") for m in models[:5]],  # Primeiros 5 modelos
+                "available_models": [m.get("name", "") for m in models if m.get("name")],
             }
         except ValueError as e:
             return {
@@ -288,19 +448,25 @@ A chave de API configurada no arquivo `.env` não é válida.
                 "suggestion": "Verifique sua API key e conexão com a internet",
             }
 
+    def get_connection_status(self) -> dict:
+        """
+        Retorna status detalhado da conexão com a OpenAI (do cache do monitor de saúde).
+
+        Returns:
+            Dicionário com status, mensagem e detalhes
+        """
+        status = dict(self.health_monitor.get_status())
+        status.pop("available_models", None)
+        return status
+
     def list_available_models(self) -> List[str]:
         """
-        Lista os modelos disponíveis da OpenAI.
+        Lista os modelos disponíveis da OpenAI (do cache do monitor de saúde).
 
         Returns:
             Lista de nomes de modelos disponíveis
         """
-        try:
-            models = self.openai_service.list_models()
-            return [model.get("name", "") for model in models if model.get("name")]
-        except Exception as e:
-            logger.error(f"Erro ao listar modelos: {str(e)}")
-            return []
+        return list(self.health_monitor.get_status().get("available_models", []))
 
 
 def create_openai_handler(
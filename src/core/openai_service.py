@@ -3,8 +3,12 @@ Serviço para comunicação com a API da OpenAI
 """
 
 import logging
+import time
 from typing import Dict, Any, Optional, List, Generator
-from openai import OpenAI
+from openai import OpenAI, RateLimitError, APIConnectionError, InternalServerError
+
+from src.core.rate_limiter import get_rate_limiter, get_rate_limit_config, parse_retry_after
+from src.core.llm_cassette import CassetteMismatchError, get_cassette
 
 # Configurar logger
 logger = logging.getLogger(__name__)
@@ -24,13 +28,15 @@ class OpenAIService:
         "gpt-3.5-turbo-16k",
     ]
 
-    def __init__(self, api_key: Optional[str] = None, timeout: int = None):
+    def __init__(self, api_key: Optional[str] = None, timeout: int = None, base_url: Optional[str] = None):
         """
         Inicializa o serviço OpenAI.
 
         Args:
             api_key: Chave da API OpenAI (usa OPENAI_API_KEY do .env se None)
             timeout: Timeout para requisições em segundos (usa model_config se None)
+            base_url: URL da API compatível (usa OPENAI_BASE_URL do .env se None;
+                ex: servidor local simulado de scripts/mock_llm_server.py)
         """
         import os
         from dotenv import load_dotenv
@@ -73,8 +79,14 @@ class OpenAIService:
                 "   - Execute novamente: `streamlit run src/app.py`"
             )
 
-        self.client = OpenAI(api_key=self.api_key, timeout=timeout)
+        # Retentativas feitas aqui (429 coordenado pelo limitador compartilhado)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        if self.base_url:
+            logger.info(f"OpenAI apontando para {self.base_url}")
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=timeout, max_retries=0)
         self.timeout = timeout
+        self.rate_limiter = get_rate_limiter("openai")
+        self.rate_limit_config = get_rate_limit_config("openai")
 
     def list_models(self) -> List[Dict[str, Any]]:
         """
@@ -102,7 +114,12 @@ class OpenAIService:
             raise Exception(f"Erro ao listar modelos da OpenAI: {str(e)}") from e
 
     def chat(
-        self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        stream: bool = False,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        **kwargs,
     ) -> Dict[str, Any]:
         """
         Interface de chat com histórico de mensagens.
@@ -111,6 +128,7 @@ class OpenAIService:
             model: Nome do modelo (ex: "gpt-4o", "gpt-3.5-turbo")
             messages: Lista de mensagens no formato [{"role": "user", "content": "..."}]
             stream: Se True, streaming de resposta
+            tools: Definições de ferramentas para tool calling (opcional)
             **kwargs: Parâmetros adicionais (temperature, max_tokens, etc.)
 
         Returns:
@@ -131,45 +149,146 @@ class OpenAIService:
                 params["max_tokens"] = kwargs["max_tokens"]
             if "top_p" in kwargs:
                 params["top_p"] = kwargs["top_p"]
+            if "response_format" in kwargs:
+                params["response_format"] = kwargs["response_format"]
+            if tools:
+                params["tools"] = tools
+            if stream:
+                # Uso de tokens no último chunk (reconciliação do limitador)
+                params["stream_options"] = {"include_usage": True}
 
             logger.debug(
                 f"Iniciando chat com modelo {model}, streaming={stream}"
             )
 
+            # Cassete (LLM_CASSETTE_MODE): replay responde sem a API; record grava a resposta real
+            cassette = get_cassette()
+            if cassette is not None and cassette.mode == "replay":
+                return cassette.replay("openai", params)
+
+            started = time.perf_counter()
+            response, reservation = self._create_with_rate_limit(params, messages, model)
+
             if stream:
                 # Streaming
-                response = self.client.chat.completions.create(**params)
-                return self._handle_stream_response(response)
+                chunks = self._handle_stream_response(response, reservation)
+                if cassette is not None:
+                    return cassette.record_stream("openai", params, chunks, started)
+                return chunks
             else:
                 # Resposta completa
-                response = self.client.chat.completions.create(**params)
+                message = response.choices[0].message
+                usage = self._extract_usage(response.usage)
+                self.rate_limiter.reconcile(reservation, usage["total_tokens"] if usage else None)
                 result = {
                     "message": {
-                        "role": response.choices[0].message.role,
-                        "content": response.choices[0].message.content,
+                        "role": message.role,
+                        "content": message.content,
                     },
                     "model": response.model,
-                    "usage": {
-                        "prompt_tokens": response.usage.prompt_tokens,
-                        "completion_tokens": response.usage.completion_tokens,
-                        "total_tokens": response.usage.total_tokens,
-                    } if response.usage else None,
+                    "usage": usage,
                 }
+                if getattr(message, "tool_calls", None):
+                    result["message"]["tool_calls"] = [
+                        {
+                            "id": tool_call.id,
+                            "type": "function",
+                            "function": {
+                                "name": tool_call.function.name,
+                                "arguments": tool_call.function.arguments,
+                            },
+                        }
+                        for tool_call in message.tool_calls
+                    ]
                 logger.debug("Resposta do chat recebida")
+                if cassette is not None:
+                    cassette.record("openai", params, result, started)
                 return result
 
+        except CassetteMismatchError:
+            raise
         except Exception as e:
             logger.error(f"Erro no chat: {str(e)}", exc_info=True)
             raise Exception(f"Erro ao comunicar com OpenAI: {str(e)}") from e
 
+    def _create_with_rate_limit(
+        self, params: Dict[str, Any], messages: List[Dict[str, Any]], model: str
+    ):
+        """
+        Executa a chamada passando pelo limitador de taxa compartilhado.
+
+        Em 429 o limitador é pausado pelo retry-after e a chamada volta para a fila;
+        erros de conexão e 5xx são repetidos com o backoff de ADVANCED_CONFIG.
+
+        Args:
+            params: Parâmetros de chat.completions.create
+            messages: Mensagens enviadas (estimativa de tokens)
+            model: Nome do modelo
+
+        Returns:
+            Tupla (resposta da API, reserva do limitador)
+        """
+        from src.config.openai_model_config import ADVANCED_CONFIG
+        from src.core.context_window import estimate_message_tokens
+
+        estimated_tokens = estimate_message_tokens(messages, "openai", model) + params.get(
+            "max_tokens", self.rate_limit_config["default_completion_tokens"]
+        )
+        default_retry_after = self.rate_limit_config["default_retry_after"]
+        attempt = 0
+        while True:
+            reservation = self.rate_limiter.acquire(estimated_tokens)
+            try:
+                return self.client.chat.completions.create(**params), reservation
+            except RateLimitError as e:
+                # A chamada recusada não consumiu tokens
+                self.rate_limiter.reconcile(reservation, 0)
+                if attempt >= self.rate_limit_config["max_rate_limit_retries"]:
+                    raise
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                self.rate_limiter.pause(parse_retry_after(headers, default_retry_after * 2 ** attempt))
+            except (APIConnectionError, InternalServerError) as e:
+                self.rate_limiter.reconcile(reservation, 0)
+                if attempt >= ADVANCED_CONFIG["max_retries"]:
+                    raise
+                delay = ADVANCED_CONFIG["retry_delay"]
+                if ADVANCED_CONFIG.get("exponential_backoff"):
+                    delay *= 2 ** attempt
+                logger.warning(f"Falha temporária na OpenAI ({str(e)}), nova tentativa em {delay:.1f}s")
+                time.sleep(delay)
+            except BaseException:
+                # Demais erros (autenticação, requisição inválida, timeout...): sem consumo de tokens
+                self.rate_limiter.reconcile(reservation, 0)
+                raise
+            attempt += 1
+
+    @staticmethod
+    def _extract_usage(usage) -> Optional[Dict[str, Any]]:
+        """Converte o objeto de uso da API em dicionário (None se ausente)."""
+        if not usage:
+            return None
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens,
+            # Tokens do prompt servidos pelo prompt caching (prefixo repetido)
+            "cached_tokens": getattr(
+                getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0
+            ) or 0,
+        }
+
     def _handle_stream_response(
-        self, response: Generator
+        self, response: Generator, reservation: Optional[Dict[str, Any]] = None
     ) -> Generator[Dict[str, Any], None, None]:
         """Processa resposta em streaming da OpenAI."""
         logger.debug("Processando resposta em streaming")
+        usage = None
         try:
             for chunk in response:
-                if chunk.choices[0].delta.content is not None:
+                if getattr(chunk, "usage", None):
+                    usage = self._extract_usage(chunk.usage)
+                # O chunk final de uso não traz choices
+                if chunk.choices and chunk.choices[0].delta.content is not None:
                     yield {
                         "message": {
                             "role": "assistant",
@@ -178,10 +297,17 @@ class OpenAIService:
                         "done": False,
                     }
             # Último chunk
-            yield {"done": True}
+            yield {"done": True, "usage": usage}
         except Exception as e:
             logger.error(f"Erro no streaming: {str(e)}", exc_info=True)
             raise
+        finally:
+            # Streaming abandonado: fechar a conexão interrompe a geração
+            close = getattr(response, "close", None)
+            if close:
+                close()
+            if reservation is not None:
+                self.rate_limiter.reconcile(reservation, usage["total_tokens"] if usage else None)
 
     def is_configured(self) -> bool:
         """
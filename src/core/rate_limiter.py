@@ -0,0 +1,301 @@
+"""
+Limitador de taxa compartilhado pelas chamadas aos provedores LLM
+
+Um limitador por provedor, compartilhado por todo o processo (todas as sessões do
+Streamlit e threads do processamento em lote). Combina dois token buckets:
+requisições por minuto e tokens por minuto. O custo em tokens é estimado antes da
+chamada e corrigido com o uso reportado pelo provedor depois dela.
+
+Quando o provedor responde 429 (ou 503 no Ollama com fila cheia), o limitador é
+pausado pelo tempo de retry-after e as chamadas em espera são reagendadas, em vez
+de a requisição do usuário falhar.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, Mapping
+
+logger = logging.getLogger(__name__)
+
+# Limitadores por provedor (compartilhados pelo processo)
+_limiters: Dict[str, "RateLimiter"] = {}
+_limiter_labels: Dict[str, Dict[str, str]] = {}
+_limiters_lock = threading.Lock()
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]], default: float) -> float:
+    """
+    Extrai o tempo de espera (segundos) dos cabeçalhos de uma resposta 429.
+
+    Args:
+        headers: Cabeçalhos HTTP da resposta (retry-after-ms ou retry-after)
+        default: Espera usada quando não há cabeçalho válido
+
+    Returns:
+        Segundos a aguardar antes de tentar novamente
+    """
+    if headers:
+        try:
+            if headers.get("retry-after-ms"):
+                return max(0.0, float(headers["retry-after-ms"]) / 1000)
+            if headers.get("retry-after"):
+                return max(0.0, float(headers["retry-after"]))
+        except (TypeError, ValueError):
+            pass
+    return default
+
+
+class RateLimiter:
+    """Token buckets de requisições e tokens por minuto com pausa por retry-after"""
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_wait_seconds: float = 120.0,
+        name: str = "llm",
+    ):
+        """
+        Inicializa o limitador.
+
+        Args:
+            requests_per_minute: Limite de requisições por minuto (None = sem limite)
+            tokens_per_minute: Limite de tokens (prompt + resposta) por minuto (None = sem limite)
+            max_wait_seconds: Espera máxima de uma chamada na fila antes de desistir
+            name: Nome usado nos logs (provedor)
+        """
+        self.requests_per_minute = requests_per_minute or None
+        self.tokens_per_minute = tokens_per_minute or None
+        self.max_wait_seconds = max_wait_seconds
+        self.name = name
+        self._condition = threading.Condition()
+        # Buckets começam cheios; o de tokens pode ficar negativo após a reconciliação
+        self._available_requests = float(self.requests_per_minute or 0)
+        self._available_tokens = float(self.tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = 0  # Chamadas aguardando na fila
+        self.stats = {
+            "requests": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "rate_limited": 0,
+            "estimated_tokens": 0,
+            "reported_tokens": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        """Indica se algum limite por minuto está configurado."""
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+    def _refill(self, now: float):
+        """Reabastece os buckets proporcionalmente ao tempo decorrido."""
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._available_requests = min(
+                float(self.requests_per_minute),
+                self._available_requests + elapsed * self.requests_per_minute / 60,
+            )
+        if self.tokens_per_minute:
+            self._available_tokens = min(
+                float(self.tokens_per_minute),
+                self._available_tokens + elapsed * self.tokens_per_minute / 60,
+            )
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        """Calcula quanto tempo falta para a chamada poder começar."""
+        waits = [self._paused_until - now]
+        if self.requests_per_minute and self._available_requests < 1:
+            waits.append((1 - self._available_requests) * 60 / self.requests_per_minute)
+        if self.tokens_per_minute:
+            # Chamadas maiores que o bucket aguardam apenas o bucket cheio
+            needed = min(tokens, self.tokens_per_minute)
+            if self._available_tokens < needed:
+                waits.append((needed - self._available_tokens) * 60 / self.tokens_per_minute)
+        return max(waits)
+
+    def acquire(self, estimated_tokens: int = 0) -> Dict[str, Any]:
+        """
+        Aguarda capacidade nos buckets e reserva uma requisição.
+
+        Args:
+            estimated_tokens: Custo estimado da chamada (prompt + resposta)
+
+        Returns:
+            Reserva a ser passada para reconcile() com "estimated_tokens" e "waited_seconds"
+
+        Raises:
+            TimeoutError: Se a espera ultrapassar max_wait_seconds
+        """
+        start = time.monotonic()
+        with self._condition:
+            waiting = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_time(estimated_tokens, now)
+                    if wait <= 0:
+                        break
+                    if now - start + wait > self.max_wait_seconds:
+                        raise TimeoutError(
+                            f"Limite de taxa do {self.name}: espera de {wait:.1f}s excede "
+                            f"o máximo de {self.max_wait_seconds:.0f}s"
+                        )
+                    if not waiting:
+                        waiting = True
+                        self._waiting += 1
+                    self._condition.wait(wait)
+            finally:
+                if waiting:
+                    self._waiting -= 1
+
+            if self.requests_per_minute:
+                self._available_requests -= 1
+            if self.tokens_per_minute:
+                self._available_tokens -= estimated_tokens
+
+            waited = time.monotonic() - start
+            self.stats["requests"] += 1
+            self.stats["estimated_tokens"] += estimated_tokens
+            if waited > 0.01:
+                self.stats["waits"] += 1
+                self.stats["wait_seconds"] += waited
+                logger.debug(f"Limite de taxa do {self.name}: chamada aguardou {waited:.2f}s")
+
+        return {"estimated_tokens": estimated_tokens, "waited_seconds": waited}
+
+    def reconcile(self, reservation: Dict[str, Any], actual_tokens: Optional[int]):
+        """
+        Corrige o bucket de tokens com o uso reportado pelo provedor.
+
+        Args:
+            reservation: Reserva retornada por acquire()
+            actual_tokens: Tokens reportados (None mantém a estimativa)
+        """
+        if actual_tokens is None:
+            return
+        with self._condition:
+            self.stats["reported_tokens"] += actual_tokens
+            if self.tokens_per_minute:
+                difference = reservation["estimated_tokens"] - actual_tokens
+                self._available_tokens = min(
+                    float(self.tokens_per_minute), self._available_tokens + difference
+                )
+                if difference > 0:
+                    # Sobrou capacidade: chamadas em espera podem começar antes
+                    self._condition.notify_all()
+
+    def pause(self, seconds: float):
+        """
+        Pausa todas as chamadas do provedor (resposta 429 com retry-after).
+
+        Args:
+            seconds: Duração da pausa
+        """
+        with self._condition:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.stats["rate_limited"] += 1
+            self._condition.notify_all()
+        logger.warning(f"Limite de taxa do {self.name} atingido: chamadas pausadas por {seconds:.1f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna as estatísticas e a capacidade disponível do limitador.
+
+        Returns:
+            Dicionário com contadores, limites, capacidade atual e chamadas na fila ("waiting")
+        """
+        with self._condition:
+            self._refill(time.monotonic())
+            stats = dict(self.stats)
+            stats.update({
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "available_requests": self._available_requests if self.requests_per_minute else None,
+                "available_tokens": self._available_tokens if self.tokens_per_minute else None,
+                "paused_seconds": max(0.0, self._paused_until - time.monotonic()),
+                "waiting": self._waiting,
+            })
+        return stats
+
+
+def get_rate_limit_config(provider: str = "ollama") -> Dict[str, Any]:
+    """
+    Retorna a configuração de limite de taxa do provedor.
+
+    Args:
+        provider: "openai" ou "ollama"
+
+    Returns:
+        Dicionário de configuração (RATE_LIMIT_CONFIG do provedor com overrides do .env)
+    """
+    if provider == "openai":
+        from src.config.openai_model_config import RATE_LIMIT_CONFIG
+
+        prefix = "OPENAI"
+    else:
+        from src.config.model_config import RATE_LIMIT_CONFIG
+
+        prefix = "OLLAMA"
+
+    config = dict(RATE_LIMIT_CONFIG)
+    for key, env_name in (
+        ("requests_per_minute", f"{prefix}_REQUESTS_PER_MINUTE"),
+        ("tokens_per_minute", f"{prefix}_TOKENS_PER_MINUTE"),
+    ):
+        value = os.getenv(env_name)
+        if value:
+            try:
+                config[key] = int(value)
+            except ValueError:
+                logger.warning(f"Valor inválido para {env_name}: {value}")
+    return config
+
+
+def get_rate_limiter(provider: str = "ollama", host: Optional[str] = None) -> RateLimiter:
+    """
+    Retorna o limitador compartilhado do provedor (cria na primeira chamada).
+
+    Args:
+        provider: "openai" ou "ollama"
+        host: Servidor do provedor (ex: base_url de cada Ollama do pool); cada host tem
+            seu próprio limitador, para que um 429/503 de um servidor não pause os demais
+
+    Returns:
+        Instância de RateLimiter do provedor (e do host, se informado)
+    """
+    name = f"{provider}@{host}" if host else provider
+    with _limiters_lock:
+        if name not in _limiters:
+            config = get_rate_limit_config(provider)
+            _limiters[name] = RateLimiter(
+                requests_per_minute=config.get("requests_per_minute"),
+                tokens_per_minute=config.get("tokens_per_minute"),
+                max_wait_seconds=config.get("max_wait_seconds", 120.0),
+                name=name,
+            )
+            _limiter_labels[name] = {"provider": provider, "host": host or ""}
+            logger.info(
+                f"Limitador de taxa do {name}: "
+                f"{config.get('requests_per_minute') or 'sem limite'} req/min, "
+                f"{config.get('tokens_per_minute') or 'sem limite'} tokens/min"
+            )
+        return _limiters[name]
+
+
+def get_all_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna as estatísticas dos limitadores já criados.
+
+    Returns:
+        Dicionário {limitador: estatísticas de RateLimiter.get_stats() com "provider" e "host"}
+    """
+    with _limiters_lock:
+        limiters = dict(_limiters)
+        labels = dict(_limiter_labels)
+    return {name: dict(limiter.get_stats(), **labels[name]) for name, limiter in limiters.items()}
@@ -0,0 +1,326 @@
+"""
+Coalescência de requisições idênticas em andamento (single-flight)
+
+Quando várias sessões fazem a mesma pergunta ao mesmo tempo (ex: link de dashboard
+compartilhado), apenas a primeira chamada vai ao provedor; as demais com a mesma
+chave normalizada aguardam e recebem o mesmo resultado. Em streaming, os chunks são
+repassados a todos os participantes (fan-out), inclusive os que chegam no meio da
+resposta, que recebem os chunks já gerados e continuam acompanhando.
+
+Os grupos são compartilhados pelo processo inteiro, pois cada sessão do Streamlit
+tem seu próprio handler e orquestrador.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from typing import Optional, Dict, Any, Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Grupos de coalescência por nome (compartilhados pelo processo)
+_groups: Dict[str, "SingleFlight"] = {}
+_groups_lock = threading.Lock()
+
+
+def make_request_key(**parts) -> str:
+    """
+    Gera a chave normalizada de uma requisição.
+
+    Args:
+        **parts: Componentes da requisição (modelo, mensagens, parâmetros, versão dos dados...)
+
+    Returns:
+        Hash estável dos componentes
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """Chamada em andamento compartilhada pelos participantes"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamFlight:
+    """Streaming em andamento: chunks acumulados e repassados a todos os participantes"""
+
+    def __init__(self, upstream: Iterator[Any]):
+        self.upstream = upstream
+        self.chunks = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.pulling = False
+        self.subscribers = 0
+        # Encerrado porque todos desistiram: os chunks acumulados são uma resposta truncada
+        self.abandoned = False
+        self.condition = threading.Condition()
+
+
+class SingleFlight:
+    """Agrupa chamadas idênticas em andamento em uma única chamada ao provedor"""
+
+    def __init__(self, name: str = "llm"):
+        """
+        Inicializa o grupo.
+
+        Args:
+            name: Nome usado nos logs e estatísticas
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[str, Any] = {}
+        self.stats = {"calls": 0, "upstream_calls": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Executa fn uma vez por chave entre chamadas simultâneas.
+
+        Args:
+            key: Chave normalizada da requisição
+            fn: Função que faz a chamada real
+
+        Returns:
+            Resultado de fn (o mesmo objeto para todos os participantes)
+
+        Raises:
+            Exception: O mesmo erro da chamada real, para todos os participantes
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.stats["upstream_calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not is_leader:
+            logger.info(f"Requisição idêntica em andamento ({self.name}): aguardando o resultado compartilhado")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def do_stream(self, key: str, fn: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Executa fn (que retorna um iterador de chunks) uma vez por chave e repassa os
+        chunks a todos os participantes.
+
+        Args:
+            key: Chave normalizada da requisição
+            fn: Função que inicia o streaming real
+
+        Returns:
+            Iterador com todos os chunks da resposta compartilhada
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.stats["coalesced"] += 1
+                logger.info(f"Streaming idêntico em andamento ({self.name}): acompanhando a resposta compartilhada")
+                return self._subscribe(key, flight, fn)
+            self.stats["upstream_calls"] += 1
+            # Reserva a chave antes de iniciar para que chamadas simultâneas aguardem
+            pending = _Flight()
+            self._flights[key] = pending
+
+        try:
+            upstream = iter(fn())
+        except BaseException as e:
+            with self._lock:
+                self._flights.pop(key, None)
+            pending.error = e
+            pending.done.set()
+            raise
+
+        flight = _StreamFlight(upstream)
+        with self._lock:
+            self._flights[key] = flight
+        pending.result = flight
+        pending.done.set()
+        return self._subscribe(key, flight, fn)
+
+    def _subscribe(self, key: str, flight: Any, fn: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        """
+        Acompanha um streaming compartilhado desde o primeiro chunk.
+
+        Os participantes são contados quando começam a iterar (um gerador nunca
+        iterado não mantém o streaming vivo); quando todos desistem antes do fim, o
+        streaming real é encerrado. Quem começa a iterar um streaming já abandonado
+        inicia outra chamada em vez de receber a resposta truncada. O participante que
+        precisa do próximo chunk e encontra o upstream livre o busca e o disponibiliza
+        para os demais.
+        """
+        if isinstance(flight, _Flight):
+            # Streaming ainda sendo iniciado pelo líder
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            flight = flight.result
+
+        with flight.condition:
+            restart = flight.abandoned
+            if not restart:
+                flight.subscribers += 1
+        if restart:
+            logger.info(f"Streaming compartilhado ({self.name}) foi abandonado: iniciando nova chamada")
+            yield from self.do_stream(key, fn)
+            return
+
+        try:
+            yield from self._follow(key, flight)
+        finally:
+            # Remove o grupo e marca o fim sob o mesmo lock, nessa ordem: ninguém
+            # consegue entrar em um streaming abandonado e receber a resposta truncada
+            with self._lock:
+                with flight.condition:
+                    flight.subscribers -= 1
+                    abandoned = flight.subscribers == 0 and not flight.finished
+                    if abandoned:
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+                        flight.abandoned = True
+                        flight.finished = True
+            if abandoned:
+                # Todos os participantes desistiram: encerrar o streaming real
+                close = getattr(flight.upstream, "close", None)
+                if close:
+                    close()
+
+    def _follow(self, key: str, flight: _StreamFlight) -> Iterator[Any]:
+        """Percorre os chunks do streaming compartilhado, buscando novos quando necessário."""
+        index = 0
+        while True:
+            with flight.condition:
+                while index >= len(flight.chunks) and not flight.finished and flight.pulling:
+                    flight.condition.wait()
+                if index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                elif flight.finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    flight.pulling = True
+                    chunk = None
+
+            if chunk is not None:
+                yield chunk
+                continue
+
+            # Este participante busca o próximo chunk do upstream
+            try:
+                next_chunk = next(flight.upstream)
+                finished, error = False, None
+            except StopIteration:
+                next_chunk, finished, error = None, True, None
+            except BaseException as e:
+                next_chunk, finished, error = None, True, e
+
+            if finished:
+                # Novas requisições com a mesma chave passam a iniciar outra chamada
+                with self._lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+            with flight.condition:
+                if finished:
+                    flight.finished = True
+                    flight.error = error
+                else:
+                    flight.chunks.append(next_chunk)
+                flight.pulling = False
+                flight.condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna as contagens de coalescência.
+
+        Returns:
+            Dicionário com "calls", "upstream_calls", "coalesced" e "in_flight"
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._flights)
+        return stats
+
+
+def get_single_flight(name: str = "llm") -> SingleFlight:
+    """
+    Retorna o grupo de coalescência compartilhado com o nome informado.
+
+    Args:
+        name: "llm" (chamadas dos handlers) ou "orchestrator" (consultas completas)
+
+    Returns:
+        Instância compartilhada de SingleFlight
+    """
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def coalesced_chat(service, provider: str, model: str, messages: list, stream: bool = False, **params):
+    """
+    Chama service.chat agrupando requisições idênticas em andamento.
+
+    Args:
+        service: OllamaService, OllamaPool ou OpenAIService
+        provider: "ollama" ou "openai"
+        model: Nome do modelo
+        messages: Mensagens completas (com system prompt)
+        stream: Se True, retorna um iterador de chunks compartilhado
+        **params: Parâmetros do modelo repassados ao chat
+
+    Returns:
+        Resposta do chat (dicionário compartilhado) ou iterador de chunks
+    """
+    key = make_request_key(
+        provider=provider,
+        base_url=getattr(service, "base_url", None),
+        model=model,
+        messages=messages,
+        stream=stream,
+        params=params,
+    )
+    group = get_single_flight("llm")
+
+    def call():
+        return service.chat(model=model, messages=messages, stream=stream, **params)
+
+    if stream:
+        return group.do_stream(key, call)
+    return group.do(key, call)
+
+
+def get_coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna as contagens de coalescência de todos os grupos.
+
+    Returns:
+        Dicionário {nome do grupo: estatísticas}
+    """
+    with _groups_lock:
+        groups = dict(_groups)
+    return {name: group.get_stats() for name, group in groups.items()}
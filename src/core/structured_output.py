@@ -0,0 +1,158 @@
+"""
+Saída estruturada (JSON schema) e leitura incremental de objetos JSON em streaming
+
+Os handlers aceitam response_format={"name": ..., "schema": {...}} e o convertem para
+o formato do provedor (Ollama: "format" com o schema; OpenAI: response_format do tipo
+json_schema). A resposta é lida em streaming e a geração é interrompida assim que o
+objeto JSON fecha, sem esperar tokens finais do modelo.
+"""
+
+import json
+import logging
+import time
+from typing import Optional, Dict, Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+def to_openai_response_format(response_format: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Converte o response_format neutro para o formato da API da OpenAI.
+
+    Args:
+        response_format: {"name": nome do schema, "schema": JSON schema}
+
+    Returns:
+        Dicionário {"type": "json_schema", "json_schema": {...}} com strict=True
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": response_format.get("name", "response"),
+            "schema": response_format["schema"],
+            "strict": True,
+        },
+    }
+
+
+class JSONObjectStreamParser:
+    """Acompanha chunks de texto e detecta quando o primeiro objeto JSON completo fecha"""
+
+    def __init__(self):
+        self.text = ""
+        self.result: Optional[Dict[str, Any]] = None
+        self.complete = False
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._pos = 0
+
+    @property
+    def partial(self) -> str:
+        """Texto do objeto JSON ainda em formação (vazio antes da primeira chave)."""
+        return self.text[self._start:] if self._start is not None else ""
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Acrescenta um chunk e avança a leitura.
+
+        Chaves dentro de strings são ignoradas. Um trecho entre chaves que não é JSON
+        válido (ex: chaves no meio de texto livre) é descartado e a busca continua.
+
+        Args:
+            chunk: Trecho de texto recebido do modelo
+
+        Returns:
+            True quando um objeto JSON completo foi lido (disponível em result)
+        """
+        if self.complete:
+            return True
+        self.text += chunk
+        while self._pos < len(self.text):
+            char = self.text[self._pos]
+            self._pos += 1
+            if self._start is None:
+                if char == "{":
+                    self._start = self._pos - 1
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = self.text[self._start:self._pos]
+                    try:
+                        self.result = json.loads(candidate)
+                        self.complete = True
+                        return True
+                    except json.JSONDecodeError:
+                        self._start = None
+        return False
+
+
+def read_json_stream(
+    chunks: Iterable[str],
+    stop_when: Optional[Callable[[str], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Lê um streaming de texto até o primeiro objeto JSON completo e encerra a geração.
+
+    Args:
+        chunks: Iterador de trechos de texto (streaming do handler)
+        stop_when: Condição opcional avaliada sobre o objeto parcial; se verdadeira,
+            a geração é interrompida antes do objeto fechar
+
+    Returns:
+        Dicionário com:
+        - "object": Objeto JSON lido (None se não houve objeto completo)
+        - "text": Texto recebido até a parada
+        - "chunks": Número de chunks recebidos (aproximação dos tokens gerados)
+        - "stopped_early": True se o streaming foi encerrado antes do fim
+        - "stopped_by_condition": True se a parada veio de stop_when
+        - "parse_seconds": Tempo gasto na leitura (sem a espera pelo modelo)
+    """
+    parser = JSONObjectStreamParser()
+    iterator = iter(chunks)
+    count = 0
+    parse_seconds = 0.0
+    stopped_by_condition = False
+    finished = True
+
+    try:
+        for chunk in iterator:
+            count += 1
+            parse_start = time.perf_counter()
+            done = parser.feed(chunk)
+            if not done and stop_when is not None and parser.partial:
+                stopped_by_condition = stop_when(parser.partial)
+            parse_seconds += time.perf_counter() - parse_start
+            if done or stopped_by_condition:
+                finished = False
+                break
+    finally:
+        if not finished:
+            # Encerra o streaming: a conexão é fechada e o servidor interrompe a geração
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    if not finished:
+        logger.debug(f"Streaming JSON encerrado após {count} chunks ({len(parser.text)} caracteres)")
+    return {
+        "object": parser.result,
+        "text": parser.text,
+        "chunks": count,
+        "stopped_early": not finished,
+        "stopped_by_condition": stopped_by_condition,
+        "parse_seconds": parse_seconds,
+    }
@@ -0,0 +1,426 @@
+"""
+Spans de tempo por pergunta (tracing)
+
+Cada pergunta gera uma árvore de spans aninhados (contexto dos dados, chamadas dos
+agentes, parse do JSON, construção do gráfico, renderização no Streamlit, gravação
+do histórico), com atributos como modelo, tokens do prompt, versão dos dados e
+acertos de cache. O span atual é guardado em um ContextVar: funções chamadas dentro
+de um span criam filhos automaticamente, e bind_context leva o span atual para
+threads de um ThreadPoolExecutor.
+
+Quando o span raiz termina, a árvore é mantida em memória (painel de depuração da
+sidebar) e, se TRACE_FILE_ENABLED=true, gravada no arquivo configurado em
+TRACING_CONFIG, em JSONL (um span por
+linha) ou no formato JSON do OTLP (um ExportTraceServiceRequest por linha, o mesmo
+do file exporter do OpenTelemetry Collector).
+
+Uso:
+    with span("chart.render", chart_type="bar") as current:
+        ...
+        current.set_attribute("points", 42)
+"""
+
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Callable, Union
+
+from src.config.logging_config import TRACING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Árvores recentes mantidas em memória (consultadas pelo trace_id)
+MAX_RECENT_TRACES = 50
+
+# Códigos de status do OTLP
+_OTLP_STATUS_OK = 1
+_OTLP_STATUS_ERROR = 2
+
+# Span ativo no contexto atual (thread ou cópia de contexto)
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+_recent_traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_recent_lock = threading.Lock()
+_export_lock = threading.Lock()
+
+
+def get_tracing_config() -> Dict[str, Any]:
+    """
+    Retorna TRACING_CONFIG com as sobrescritas do ambiente.
+
+    Returns:
+        Configuração efetiva ("enabled", "file_enabled", "file", "format", "service_name",
+        "max_spans_per_trace")
+    """
+    config = dict(TRACING_CONFIG)
+    enabled = os.getenv("TRACING_ENABLED")
+    if enabled is not None:
+        config["enabled"] = enabled.lower() == "true"
+    file_enabled = os.getenv("TRACE_FILE_ENABLED")
+    if file_enabled is not None:
+        config["file_enabled"] = file_enabled.lower() == "true"
+    if os.getenv("TRACE_FILE") is not None:
+        config["file"] = os.getenv("TRACE_FILE")
+    if os.getenv("TRACE_FORMAT"):
+        config["format"] = os.getenv("TRACE_FORMAT").lower()
+    return config
+
+
+class _TraceBuffer:
+    """Spans concluídos de uma árvore, compartilhados pelas threads que participam dela"""
+
+    def __init__(self, trace_id: str, max_spans: int):
+        self.trace_id = trace_id
+        self.max_spans = max_spans
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, record: Dict[str, Any]):
+        with self.lock:
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append(record)
+
+
+class Span:
+    """Intervalo de tempo nomeado com atributos, filho do span ativo quando foi criado"""
+
+    def __init__(
+        self,
+        name: str,
+        buffer: Optional[_TraceBuffer],
+        parent_id: Optional[str] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+        is_local_root: bool = False,
+    ):
+        self.name = name
+        self.trace_id = buffer.trace_id if buffer else None
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_time = time.time()
+        self.duration_ms: Optional[float] = None
+        self.status = "ok"
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+        self._buffer = buffer
+        self._is_local_root = is_local_root
+        self._start = time.perf_counter()
+        self._token: Optional[contextvars.Token] = None
+
+    def set_attribute(self, key: str, value: Any):
+        """Define um atributo do span (valores None são ignorados)."""
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        """Define vários atributos do span (valores None são ignorados)."""
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def context(self) -> Dict[str, Optional[str]]:
+        """
+        Identificação do span para continuar a árvore depois (ex: na próxima execução do Streamlit).
+
+        Returns:
+            Dicionário com "trace_id" e "span_id"
+        """
+        return {"trace_id": self.trace_id, "span_id": self.span_id}
+
+    def end(self, error: Optional[BaseException] = None):
+        """
+        Encerra o span e o registra na árvore; o span raiz publica a árvore.
+
+        Args:
+            error: Exceção que encerrou o span (marca status="error")
+        """
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Encerrado em outro contexto: restaura o pai manualmente
+                _current_span.set(None)
+            self._token = None
+        if self._buffer is None:
+            return
+        self._buffer.add(self.to_dict())
+        if self._is_local_root:
+            _publish(self._buffer)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Representação do span gravada no arquivo e exibida no painel."""
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "thread": self.thread,
+            "attributes": dict(self.attributes),
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+def start_span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    parent: Optional[Union[Span, Dict[str, Optional[str]]]] = None,
+) -> Span:
+    """
+    Inicia um span e o torna o span ativo (encerrar com span.end()).
+
+    Args:
+        name: Nome do span (ex: "agent.analysis")
+        attributes: Atributos iniciais
+        parent: Span pai ou contexto de span.context() de uma árvore já publicada
+            (padrão: span ativo; sem span ativo, inicia uma nova árvore)
+
+    Returns:
+        Span iniciado
+    """
+    config = get_tracing_config()
+    if not config["enabled"]:
+        return Span(name, None, attributes=attributes)
+
+    if parent is None:
+        parent = _current_span.get()
+
+    if isinstance(parent, Span) and parent._buffer is not None:
+        current = Span(name, parent._buffer, parent.span_id, attributes)
+    else:
+        # Nova árvore, ou continuação de uma árvore já publicada (mesmo trace_id)
+        trace_id = (parent or {}).get("trace_id") if isinstance(parent, dict) else None
+        parent_id = (parent or {}).get("span_id") if isinstance(parent, dict) else None
+        buffer = _TraceBuffer(trace_id or secrets.token_hex(16), config["max_spans_per_trace"])
+        current = Span(name, buffer, parent_id, attributes, is_local_root=True)
+
+    current._token = _current_span.set(current)
+    return current
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Context manager que envolve um trecho em um span filho do span ativo.
+
+    Args:
+        name: Nome do span
+        **attributes: Atributos iniciais
+
+    Yields:
+        Span ativo (para set_attribute)
+    """
+    current = start_span(name, attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    current.end()
+
+
+def get_current_span() -> Optional[Span]:
+    """Retorna o span ativo no contexto atual (ou None)."""
+    return _current_span.get()
+
+
+def set_attributes(**attributes):
+    """Define atributos no span ativo (sem efeito fora de um span)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set_attributes(**attributes)
+
+
+def bind_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Liga uma função ao contexto atual, para que spans criados em outra thread
+    (ex: ThreadPoolExecutor.submit) sejam filhos do span ativo aqui.
+
+    Args:
+        fn: Função executada na outra thread
+
+    Returns:
+        Função que executa fn em uma cópia do contexto atual
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return run
+
+
+def _publish(buffer: _TraceBuffer):
+    """Mantém a árvore em memória e grava seus spans no arquivo configurado."""
+    with buffer.lock:
+        spans = sorted(buffer.spans, key=lambda record: record["start_time"])
+        buffer.spans = []
+        dropped, buffer.dropped = buffer.dropped, 0
+    if dropped:
+        logger.warning(f"Trace {buffer.trace_id}: {dropped} spans descartados (max_spans_per_trace)")
+
+    with _recent_lock:
+        # Continuações da mesma árvore (ex: renderização na execução seguinte) são acrescentadas
+        stored = _recent_traces.pop(buffer.trace_id, [])
+        _recent_traces[buffer.trace_id] = stored + spans
+        while len(_recent_traces) > MAX_RECENT_TRACES:
+            _recent_traces.popitem(last=False)
+
+    _export(spans)
+
+
+def _export(spans: List[Dict[str, Any]]):
+    """Acrescenta os spans ao arquivo de traces (erros de escrita são apenas registrados)."""
+    config = get_tracing_config()
+    path = config.get("file")
+    if not config.get("file_enabled") or not path or not spans:
+        return
+    if config.get("format") == "otlp":
+        lines = [json.dumps(to_otlp(spans, config.get("service_name")), ensure_ascii=False, default=str)]
+    else:
+        lines = [json.dumps(record, ensure_ascii=False, default=str) for record in spans]
+    try:
+        with _export_lock:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+    except OSError as e:
+        logger.warning(f"Erro ao gravar traces em {path}: {str(e)}")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """Converte um atributo para AnyValue do OTLP."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, str):
+        return {"stringValue": value}
+    return {"stringValue": json.dumps(value, ensure_ascii=False, default=str)}
+
+
+def to_otlp(spans: List[Dict[str, Any]], service_name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Converte spans para o JSON de um ExportTraceServiceRequest do OTLP.
+
+    Args:
+        spans: Spans no formato de Span.to_dict()
+        service_name: Valor do atributo de recurso service.name
+
+    Returns:
+        Dicionário com "resourceSpans"
+    """
+    otlp_spans = []
+    for record in spans:
+        start_ns = int(record["start_time"] * 1e9)
+        end_ns = start_ns + int((record["duration_ms"] or 0) * 1e6)
+        otlp_span = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in dict(record["attributes"], thread=record["thread"]).items()
+            ],
+            "status": {"code": _OTLP_STATUS_ERROR if record["status"] == "error" else _OTLP_STATUS_OK},
+        }
+        if record.get("parent_id"):
+            otlp_span["parentSpanId"] = record["parent_id"]
+        if record.get("error"):
+            otlp_span["status"]["message"] = record["error"]
+        otlp_spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {
+                "attributes": [{"key": "service.name", "value": {"stringValue": service_name or "omnilink-ai"}}],
+            },
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+        }]
+    }
+
+
+def get_trace(trace_id: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Retorna os spans de uma árvore recente.
+
+    Args:
+        trace_id: Identificador da árvore (Span.trace_id)
+
+    Returns:
+        Spans ordenados pelo início (lista vazia se a árvore não estiver em memória)
+    """
+    with _recent_lock:
+        spans = list(_recent_traces.get(trace_id) or [])
+    return sorted(spans, key=lambda record: record["start_time"])
+
+
+def get_last_trace() -> List[Dict[str, Any]]:
+    """Retorna os spans da árvore publicada mais recentemente (todas as sessões)."""
+    with _recent_lock:
+        trace_id = next(reversed(_recent_traces), None)
+    return get_trace(trace_id)
+
+
+def build_waterfall(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Organiza os spans de uma árvore para exibição em cascata.
+
+    Args:
+        spans: Spans de get_trace
+
+    Returns:
+        Linhas em ordem de árvore (pai antes dos filhos, irmãos pelo início), cada uma com
+        "name", "depth", "offset_ms" (desde o início da árvore), "duration_ms",
+        "status" e "attributes"
+    """
+    if not spans:
+        return []
+    trace_start = min(record["start_time"] for record in spans)
+    ids = {record["span_id"] for record in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for record in spans:
+        parent = record["parent_id"] if record["parent_id"] in ids else None
+        children.setdefault(parent, []).append(record)
+
+    rows: List[Dict[str, Any]] = []
+
+    def visit(parent_id: Optional[str], depth: int):
+        for record in sorted(children.get(parent_id, []), key=lambda item: item["start_time"]):
+            rows.append({
+                "name": record["name"],
+                "depth": depth,
+                "offset_ms": (record["start_time"] - trace_start) * 1000,
+                "duration_ms": record["duration_ms"] or 0.0,
+                "status": record["status"],
+                "attributes": record["attributes"],
+            })
+            visit(record["span_id"], depth + 1)
+
+    visit(None, 0)
+    return rows
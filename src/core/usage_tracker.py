@@ -0,0 +1,515 @@
+"""
+Contabilização de tokens e velocidade de geração das chamadas ao LLM
+
+Os handlers retornam LLMResponse, uma str com o uso de tokens da chamada em
+.usage (compatível com todo código que espera texto). Cada chamada também é
+somada ao UsageTracker do processo, por sessão, modelo e agente:
+
+- Tokens de prompt, resposta e servidos do cache
+- Velocidade de prefill (tokens do prompt/s) e de decode (tokens gerados/s):
+  prompt_eval_duration/eval_duration do Ollama; na OpenAI, tempo até o primeiro
+  token e tempo após ele (sem streaming, o tempo total entra como decode)
+- Os prompts mais caros (custo estimado por MODEL_PRICING, depois tokens)
+
+A sessão e a pergunta vêm de usage_scope (ContextVar, propaga para as threads
+do orquestrador via bind_context) e o agente de agent_scope (ver metrics.py).
+O resumo de uma sessão é salvo junto ao histórico (history_manager.save_usage).
+"""
+
+import contextvars
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from src.config.logging_config import USAGE_TRACKING_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Sessão usada quando a chamada não está dentro de usage_scope (mesma do auto-save do histórico)
+DEFAULT_SESSION = "current"
+
+# Campos somados em cada agrupamento (totais, por modelo e por agente)
+_SUM_FIELDS = (
+    "calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+    "prefill_tokens", "prefill_ms", "decode_tokens", "decode_ms", "total_ms", "cost_usd",
+)
+
+_current_session: contextvars.ContextVar[str] = contextvars.ContextVar("usage_session", default=DEFAULT_SESSION)
+_current_prompt: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("usage_prompt", default=None)
+
+
+class LLMResponse(str):
+    """Texto da resposta do LLM com o uso de tokens da chamada (compatível com str)"""
+
+    def __new__(cls, text: str, usage: Optional[Dict[str, Any]] = None,
+                model: Optional[str] = None, provider: Optional[str] = None):
+        """
+        Cria a resposta.
+
+        Args:
+            text: Conteúdo gerado
+            usage: Uso de tokens e tempos (ver with_timings)
+            model: Modelo que gerou a resposta
+            provider: "ollama" ou "openai"
+        """
+        response = super().__new__(cls, text)
+        response.usage = usage
+        response.model = model
+        response.provider = provider
+        return response
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Tokens do prompt (0 se o provedor não informou)."""
+        return (self.usage or {}).get("prompt_tokens") or 0
+
+    @property
+    def completion_tokens(self) -> int:
+        """Tokens gerados (0 se o provedor não informou)."""
+        return (self.usage or {}).get("completion_tokens") or 0
+
+    @property
+    def prefill_tokens_per_second(self) -> Optional[float]:
+        """Velocidade de processamento do prompt."""
+        return (self.usage or {}).get("prefill_tokens_per_second")
+
+    @property
+    def decode_tokens_per_second(self) -> Optional[float]:
+        """Velocidade de geração da resposta."""
+        return (self.usage or {}).get("decode_tokens_per_second")
+
+
+# Mensagens de SYSTEM_MESSAGES que não indicam erro
+_NON_ERROR_MESSAGES = ("welcome", "thinking")
+
+
+def _handler_error_messages() -> tuple:
+    """Mensagens de erro dos handlers (SYSTEM_MESSAGES do Ollama e da OpenAI)."""
+    from src.config.model_config import SYSTEM_MESSAGES as OLLAMA_MESSAGES
+    from src.config.openai_model_config import SYSTEM_MESSAGES as OPENAI_MESSAGES
+
+    return tuple(
+        message
+        for messages in (OLLAMA_MESSAGES, OPENAI_MESSAGES)
+        for key, message in messages.items()
+        if key not in _NON_ERROR_MESSAGES
+    )
+
+
+def is_error_response(response: Any) -> bool:
+    """
+    Indica se a resposta de um handler é uma mensagem de erro.
+
+    Os handlers devolvem erros como texto simples: "Erro...", "❌..." ou uma das
+    mensagens de SYSTEM_MESSAGES (ex: "no_response" em resposta vazia), às vezes
+    seguida de ": <detalhe>".
+
+    Args:
+        response: Resposta do handler (texto, LLMResponse ou iterador)
+
+    Returns:
+        True se for uma mensagem de erro
+    """
+    if not isinstance(response, str) or isinstance(response, LLMResponse):
+        return False
+    stripped = response.strip()
+    return stripped.startswith(("❌", "Erro")) or stripped.startswith(_handler_error_messages())
+
+
+def get_usage_config() -> Dict[str, Any]:
+    """
+    Retorna USAGE_TRACKING_CONFIG com a sobrescrita do ambiente (USAGE_TRACKING_ENABLED).
+
+    Returns:
+        Configuração efetiva
+    """
+    config = dict(USAGE_TRACKING_CONFIG)
+    if os.getenv("USAGE_TRACKING_ENABLED") is not None:
+        config["enabled"] = os.getenv("USAGE_TRACKING_ENABLED").lower() == "true"
+    return config
+
+
+@contextmanager
+def usage_scope(session_id: Optional[str] = None, prompt: Optional[str] = None):
+    """
+    Associa as chamadas de LLM feitas dentro do bloco a uma sessão e a uma pergunta.
+
+    Args:
+        session_id: Sessão do histórico (padrão: a atual)
+        prompt: Pergunta do usuário, usada para identificar os prompts mais caros
+            (sem ela, a última mensagem do usuário enviada ao modelo)
+    """
+    session_token = _current_session.set(session_id or _current_session.get())
+    prompt_token = _current_prompt.set(prompt if prompt is not None else _current_prompt.get())
+    try:
+        yield
+    finally:
+        _current_prompt.reset(prompt_token)
+        _current_session.reset(session_token)
+
+
+def with_timings(
+    usage: Optional[Dict[str, Any]],
+    ttft_seconds: Optional[float] = None,
+    elapsed_seconds: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Acrescenta ao uso de tokens os tempos da chamada e as velocidades de prefill e decode.
+
+    Args:
+        usage: Uso extraído da resposta ("prompt_tokens", "completion_tokens" e, no
+            Ollama, "prompt_eval_ms"/"eval_ms")
+        ttft_seconds: Segundos até o primeiro token (streaming)
+        elapsed_seconds: Duração total da chamada
+
+    Returns:
+        Cópia do uso com "total_ms", "ttft_ms", "prefill_ms", "decode_ms",
+        "prefill_tokens_per_second" e "decode_tokens_per_second" (None se usage for None)
+    """
+    if not isinstance(usage, dict):
+        return None
+    enriched = dict(usage)
+    total_ms = elapsed_seconds * 1000 if elapsed_seconds is not None else None
+    ttft_ms = ttft_seconds * 1000 if ttft_seconds is not None else None
+    enriched["total_ms"] = total_ms
+    enriched["ttft_ms"] = ttft_ms
+
+    # Ollama mede prefill e decode no servidor; sem isso, o primeiro token separa as fases
+    prefill_ms = usage.get("prompt_eval_ms") or ttft_ms
+    decode_ms = usage.get("eval_ms")
+    if not decode_ms and total_ms is not None:
+        decode_ms = total_ms - (ttft_ms or 0.0)
+    enriched["prefill_ms"] = prefill_ms or None
+    enriched["decode_ms"] = decode_ms or None
+
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    enriched["prefill_tokens_per_second"] = (
+        prompt_tokens * 1000 / prefill_ms if prompt_tokens and prefill_ms else None
+    )
+    enriched["decode_tokens_per_second"] = (
+        completion_tokens * 1000 / decode_ms if completion_tokens and decode_ms else None
+    )
+    return enriched
+
+
+def combine_usage(usages: List[Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """
+    Soma o uso de várias chamadas (rodadas do modo com ferramentas).
+
+    Args:
+        usages: Usos com tempos (ver with_timings); None é ignorado
+
+    Returns:
+        Uso somado com as velocidades recalculadas (None se nenhuma chamada informou uso)
+    """
+    usages = [usage for usage in usages if isinstance(usage, dict)]
+    if not usages:
+        return None
+    combined: Dict[str, Any] = {}
+    for field in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_ms", "prefill_ms", "decode_ms"):
+        values = [usage[field] for usage in usages if usage.get(field) is not None]
+        combined[field] = sum(values) if values else None
+    combined["rounds"] = len(usages)
+    combined["prefill_tokens_per_second"] = (
+        (combined["prompt_tokens"] or 0) * 1000 / combined["prefill_ms"] if combined["prefill_ms"] else None
+    )
+    combined["decode_tokens_per_second"] = (
+        (combined["completion_tokens"] or 0) * 1000 / combined["decode_ms"] if combined["decode_ms"] else None
+    )
+    return combined
+
+
+def prompt_preview(messages: Optional[List[Dict[str, Any]]], max_chars: Optional[int] = None) -> str:
+    """
+    Identifica o prompt de uma chamada: a pergunta de usage_scope ou a última mensagem do usuário.
+
+    Args:
+        messages: Mensagens enviadas ao modelo
+        max_chars: Tamanho máximo do trecho (padrão: USAGE_TRACKING_CONFIG)
+
+    Returns:
+        Trecho do prompt ("" se não houver mensagem do usuário)
+    """
+    max_chars = max_chars or USAGE_TRACKING_CONFIG["prompt_preview_chars"]
+    text = _current_prompt.get()
+    if text is None:
+        text = next(
+            (str(msg.get("content") or "") for msg in reversed(messages or []) if msg.get("role") == "user"),
+            "",
+        )
+    text = " ".join(text.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+def _estimate_cost(provider: Optional[str], model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """Custo estimado em US$ pelo MODEL_PRICING do provedor (0 para modelos locais)."""
+    if provider == "openai":
+        from src.config.openai_model_config import MODEL_PRICING
+    else:
+        from src.config.model_config import MODEL_PRICING
+    price = MODEL_PRICING.get(model or "")
+    if price is None and model:
+        # Versões datadas (ex: gpt-4o-mini-2024-07-18) usam o preço do modelo base
+        matches = [name for name in MODEL_PRICING if model.startswith(name)]
+        price = MODEL_PRICING[max(matches, key=len)] if matches else None
+    if not price:
+        return 0.0
+    return (prompt_tokens * price["input"] + completion_tokens * price["output"]) / 1_000_000
+
+
+def _empty_bucket() -> Dict[str, float]:
+    return {field: 0 for field in _SUM_FIELDS}
+
+
+def _summarize_bucket(bucket: Dict[str, float]) -> Dict[str, Any]:
+    """Cópia do agrupamento com totais e velocidades médias derivados."""
+    summary = dict(bucket)
+    summary["total_tokens"] = bucket["prompt_tokens"] + bucket["completion_tokens"]
+    summary["prefill_tokens_per_second"] = (
+        bucket["prefill_tokens"] * 1000 / bucket["prefill_ms"] if bucket["prefill_ms"] else None
+    )
+    summary["decode_tokens_per_second"] = (
+        bucket["decode_tokens"] * 1000 / bucket["decode_ms"] if bucket["decode_ms"] else None
+    )
+    summary["mean_ms"] = bucket["total_ms"] / bucket["calls"] if bucket["calls"] else 0.0
+    return summary
+
+
+class UsageTracker:
+    """Agrega o uso de tokens por sessão, modelo e agente"""
+
+    def __init__(self, max_expensive_prompts: Optional[int] = None):
+        """
+        Inicializa o agregador.
+
+        Args:
+            max_expensive_prompts: Prompts mais caros mantidos por sessão
+                (padrão: USAGE_TRACKING_CONFIG)
+        """
+        self.max_expensive_prompts = max_expensive_prompts or USAGE_TRACKING_CONFIG["max_expensive_prompts"]
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _get_session(self, session_id: str) -> Dict[str, Any]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            now = datetime.now().isoformat()
+            session = self._sessions[session_id] = {
+                "started_at": now,
+                "updated_at": now,
+                "totals": _empty_bucket(),
+                "by_model": {},
+                "by_agent": {},
+                "expensive_prompts": [],
+            }
+        return session
+
+    def record(
+        self,
+        usage: Dict[str, Any],
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        agent: str = "chat",
+        prompt: str = "",
+        session_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Soma o uso de uma chamada.
+
+        Args:
+            usage: Uso de tokens com tempos (ver with_timings)
+            provider: "ollama" ou "openai"
+            model: Modelo chamado
+            agent: Agente do orquestrador ("chat" fora dele)
+            prompt: Trecho que identifica o prompt
+            session_id: Sessão (padrão: a de usage_scope)
+
+        Returns:
+            Registro da chamada (o mesmo guardado entre os prompts mais caros)
+        """
+        session_id = session_id or _current_session.get()
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "prompt": prompt,
+            "provider": provider,
+            "model": model or "padrão",
+            "agent": agent,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cached_tokens": usage.get("cached_tokens") or 0,
+            "total_ms": usage.get("total_ms"),
+            "prefill_tokens_per_second": usage.get("prefill_tokens_per_second"),
+            "decode_tokens_per_second": usage.get("decode_tokens_per_second"),
+            "cost_usd": _estimate_cost(provider, model, prompt_tokens, completion_tokens),
+        }
+
+        with self._lock:
+            session = self._get_session(session_id)
+            session["updated_at"] = entry["timestamp"]
+            buckets = (
+                session["totals"],
+                session["by_model"].setdefault(entry["model"], _empty_bucket()),
+                session["by_agent"].setdefault(agent, _empty_bucket()),
+            )
+            for bucket in buckets:
+                bucket["calls"] += 1
+                bucket["prompt_tokens"] += prompt_tokens
+                bucket["completion_tokens"] += completion_tokens
+                bucket["cached_tokens"] += entry["cached_tokens"]
+                bucket["total_ms"] += usage.get("total_ms") or 0.0
+                bucket["cost_usd"] += entry["cost_usd"]
+                # Velocidades médias ponderadas: só chamadas com o tempo da fase medido
+                if prompt_tokens and usage.get("prefill_ms"):
+                    bucket["prefill_tokens"] += prompt_tokens
+                    bucket["prefill_ms"] += usage["prefill_ms"]
+                if completion_tokens and usage.get("decode_ms"):
+                    bucket["decode_tokens"] += completion_tokens
+                    bucket["decode_ms"] += usage["decode_ms"]
+
+            ranking = session["expensive_prompts"]
+            ranking.append(entry)
+            ranking.sort(key=lambda item: (item["cost_usd"], item["total_tokens"]), reverse=True)
+            del ranking[self.max_expensive_prompts:]
+        return entry
+
+    def get_summary(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retorna o uso agregado de uma sessão.
+
+        Args:
+            session_id: Sessão (padrão: a atual)
+
+        Returns:
+            Dicionário {"session_id", "started_at", "updated_at", "totals",
+            "by_model", "by_agent", "expensive_prompts"}; cada agrupamento com
+            tokens, "total_tokens", "cost_usd", "mean_ms" e as velocidades de
+            prefill/decode (tokens/s)
+        """
+        session_id = session_id or _current_session.get()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = {
+                    "started_at": None,
+                    "updated_at": None,
+                    "totals": _empty_bucket(),
+                    "by_model": {},
+                    "by_agent": {},
+                    "expensive_prompts": [],
+                }
+            return {
+                "session_id": session_id,
+                "started_at": session["started_at"],
+                "updated_at": session["updated_at"],
+                "totals": _summarize_bucket(session["totals"]),
+                "by_model": {name: _summarize_bucket(b) for name, b in session["by_model"].items()},
+                "by_agent": {name: _summarize_bucket(b) for name, b in session["by_agent"].items()},
+                "expensive_prompts": [dict(entry) for entry in session["expensive_prompts"]],
+            }
+
+    def get_session_ids(self) -> List[str]:
+        """Retorna as sessões com uso registrado."""
+        with self._lock:
+            return list(self._sessions)
+
+    def has_session(self, session_id: str) -> bool:
+        """True se a sessão já tem uso registrado ou restaurado."""
+        with self._lock:
+            return session_id in self._sessions
+
+    def restore_session(self, session_id: str, data: Optional[Dict[str, Any]]) -> bool:
+        """
+        Restaura uma sessão salva (get_summary gravado por history_manager.save_usage).
+
+        Args:
+            session_id: Sessão
+            data: Resumo salvo (None é ignorado)
+
+        Returns:
+            True se a sessão foi restaurada
+        """
+        if not data:
+            return False
+        try:
+            session = {
+                "started_at": data.get("started_at"),
+                "updated_at": data.get("updated_at"),
+                "totals": {field: data["totals"].get(field, 0) for field in _SUM_FIELDS},
+                "by_model": {
+                    name: {field: bucket.get(field, 0) for field in _SUM_FIELDS}
+                    for name, bucket in data.get("by_model", {}).items()
+                },
+                "by_agent": {
+                    name: {field: bucket.get(field, 0) for field in _SUM_FIELDS}
+                    for name, bucket in data.get("by_agent", {}).items()
+                },
+                "expensive_prompts": list(data.get("expensive_prompts", []))[:self.max_expensive_prompts],
+            }
+        except (AttributeError, KeyError, TypeError) as e:
+            logger.warning(f"Uso de tokens salvo inválido para a sessão {session_id}: {e}")
+            return False
+        with self._lock:
+            self._sessions[session_id] = session
+        logger.info(f"Uso de tokens restaurado: sessão {session_id} ({session['totals']['calls']} chamadas)")
+        return True
+
+    def reset(self, session_id: Optional[str] = None):
+        """
+        Descarta o uso registrado.
+
+        Args:
+            session_id: Sessão a descartar (None descarta todas)
+        """
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(session_id, None)
+
+
+# Agregador compartilhado pelo processo (todas as sessões do Streamlit e scripts)
+_tracker = UsageTracker()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """Retorna o agregador de uso do processo."""
+    return _tracker
+
+
+def record_llm_usage(
+    usage: Optional[Dict[str, Any]],
+    call_metrics: Any,
+    messages: Optional[List[Dict[str, Any]]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Completa o uso de uma chamada com os tempos medidos e o soma ao agregador.
+
+    Args:
+        usage: Uso extraído da resposta do provedor (None se indisponível)
+        call_metrics: LLMCallMetrics já encerrada (provedor, modelo, agente e tempos)
+        messages: Mensagens enviadas (identificam o prompt)
+
+    Returns:
+        Uso com tempos e velocidades (None se usage for None)
+    """
+    enriched = with_timings(usage, call_metrics.ttft_seconds, call_metrics.elapsed_seconds)
+    if enriched is None or not get_usage_config()["enabled"]:
+        return enriched
+    try:
+        _tracker.record(
+            enriched,
+            provider=call_metrics.provider,
+            model=call_metrics.labels[1],
+            agent=call_metrics.agent,
+            prompt=prompt_preview(messages),
+        )
+    except Exception as e:
+        logger.warning(f"Erro ao contabilizar uso de tokens: {e}")
+    return enriched
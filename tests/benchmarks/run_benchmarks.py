@@ -0,0 +1,411 @@
+"""
+Suíte de benchmarks de desempenho ponta a ponta
+
+Mede carregamento e contexto dos dados, filtros, gráficos, o AgentOrchestrator
+contra o servidor LLM simulado (scripts/mock_llm_server.py), histórico e preparação
+da transcrição, em datasets sintéticos de vários tamanhos. Os resultados são gravados
+em JSON (baseline) e podem ser comparados com um baseline anterior: medições mais
+lentas que o limite são marcadas como regressão (código de saída 1).
+
+Roda em uma máquina Linux comum, sem GPU nem servidor de modelos.
+
+Uso:
+    python tests/benchmarks/run_benchmarks.py --output tests/benchmarks/baseline.json
+    python tests/benchmarks/run_benchmarks.py --compare tests/benchmarks/baseline.json --threshold 0.25
+    python tests/benchmarks/run_benchmarks.py --sizes 300 --only chart
+
+Com --cassette o orquestrador roda sobre um cassete de chamadas ao LLM
+(src/core/llm_cassette.py): se o arquivo não existir ele é gravado contra o
+servidor simulado; se existir as respostas são reproduzidas sem servidor, com o
+ritmo gravado escalado por --cassette-timing (0 = sem espera).
+    python tests/benchmarks/run_benchmarks.py --only orchestrator --cassette data/cassettes/bench.jsonl
+"""
+
+import argparse
+import io
+import json
+import logging
+import platform
+import statistics
+import sys
+import os
+import tempfile
+import time
+import wave
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Callable
+from unittest.mock import patch
+
+# Adicionar diretório raiz ao path para imports
+ROOT_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, ROOT_DIR)
+
+import pandas as pd
+
+from tests.benchmarks.synthetic_data import generate_vehicle_data, write_vehicle_csv
+
+DEFAULT_SIZES = [300, 3000, 30000]
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25  # 25% mais lento que o baseline = regressão
+MIN_ABSOLUTE_REGRESSION_SECONDS = 0.002  # Diferenças menores são ruído de medição
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# Perguntas enviadas ao AgentOrchestrator (com e sem pedido de gráfico)
+ORCHESTRATOR_QUESTIONS = {
+    "chart": "Mostre um gráfico de barras da quilometragem por cidade",
+    "analysis": "Quais marcas têm maior custo de manutenção e por quê?",
+}
+
+# Decisão fixa do Agente de Gráficos no servidor simulado
+MOCK_CHART_DECISION = {
+    "should_generate_chart": True,
+    "chart_type": "bar",
+    "x_column": "cidade",
+    "y_column": "km_mes",
+}
+
+# Argumentos de cada create_*_chart
+CHART_CASES = {
+    "create_bar_chart": {"x": "cidade", "y": "km_mes"},
+    "create_line_chart": {"x": "ano", "y": "km_mes"},
+    "create_scatter_chart": {"x": "km_mes", "y": "consumo_combustivel"},
+    "create_pie_chart": {"values": "km_mes", "names": "cidade"},
+    "create_histogram": {"column": "km_mes"},
+    "create_box_plot": {"x": "marca", "y": "custo_manutencao"},
+    "create_heatmap": {},
+    "create_area_chart": {"x": "ano", "y": "km_mes"},
+    "create_violin_plot": {"x": "status", "y": "velocidade_media"},
+}
+
+HISTORY_SESSIONS = 100
+HISTORY_MESSAGES = 20
+AUDIO_SECONDS = 10
+
+
+def measure(fn: Callable[[], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Mede o tempo de uma função (mediana e mínimo de várias execuções).
+
+    Args:
+        fn: Função sem argumentos
+        repeat: Execuções medidas
+        warmup: Execuções descartadas antes da medição
+
+    Returns:
+        Dicionário com "median_seconds", "min_seconds" e "runs"
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_seconds": statistics.median(samples),
+        "min_seconds": min(samples),
+        "runs": repeat,
+    }
+
+
+def _silent_wav(seconds: int) -> io.BytesIO:
+    """Áudio WAV mono 16 kHz em silêncio (entrada da preparação da transcrição)."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b"\x00\x00" * 16000 * seconds)
+    buffer.seek(0)
+    return buffer
+
+
+def data_benchmarks(sizes: List[int], repeat: int, workdir: str) -> Dict[str, Dict[str, Any]]:
+    """Carregamento, contexto e filtros dos dados."""
+    from src.core.data_loader import load_csv_data, get_intelligent_data_context, filter_data
+
+    results = {}
+    for rows in sizes:
+        path = write_vehicle_csv(os.path.join(workdir, f"veiculos_{rows}.csv"), rows)
+        df = load_csv_data(path)
+        results[f"load_csv_data[rows={rows}]"] = measure(lambda: load_csv_data(path), repeat)
+        results[f"get_intelligent_data_context[rows={rows}]"] = measure(
+            lambda: get_intelligent_data_context(df), repeat
+        )
+        results[f"filter_data[rows={rows}]"] = measure(
+            lambda: filter_data(df, {"status": "ativo", "cidade": ["Recife", "Olinda", "Caruaru"]}), repeat
+        )
+    return results
+
+
+def chart_benchmarks(sizes: List[int], repeat: int) -> Dict[str, Dict[str, Any]]:
+    """create_smart_chart e cada create_*_chart."""
+    from src.core import chart_generator
+    from src.core.chart_analyzer import create_smart_chart
+
+    results = {}
+    for rows in sizes:
+        df = generate_vehicle_data(rows)
+        results[f"create_smart_chart[rows={rows}]"] = measure(
+            lambda: create_smart_chart(df, "gráfico de barras da quilometragem por cidade"), repeat
+        )
+        for name, kwargs in CHART_CASES.items():
+            create = getattr(chart_generator, name)
+            results[f"{name}[rows={rows}]"] = measure(lambda: create(df, **kwargs), repeat)
+    return results
+
+
+def orchestrator_benchmarks(
+    sizes: List[int],
+    repeat: int,
+    cassette_path: Optional[str] = None,
+    timing_scale: float = 0.0,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    AgentOrchestrator.process_user_query contra o servidor LLM simulado (sem latência de modelo).
+
+    Com cassette_path as chamadas são gravadas (arquivo inexistente) ou reproduzidas
+    sem servidor (arquivo existente); requisições sem gravação interrompem a suíte.
+    """
+    from contextlib import nullcontext
+    from scripts.mock_llm_server import start_in_background
+    from src.core.agent_orchestrator import AgentOrchestrator
+    from src.core.data_loader import get_versioned_data_context
+    from src.core.llm_cassette import CassetteMismatchError, use_cassette
+    from src.core.llm_handler import OllamaLLMHandler
+
+    replay = bool(cassette_path) and os.path.exists(cassette_path)
+    server = None
+    if replay:
+        url = "http://cassette.invalid:11434"  # Nunca contatado no replay
+    else:
+        server, url = start_in_background({
+            "ttft_seconds": 0.0,
+            "tokens_per_second": 0,
+            "mode": "canned",
+            "response": "A cidade com maior quilometragem média é Caruaru. " * 20,
+            "schema_overrides": MOCK_CHART_DECISION,
+        })
+    cassette_context = (
+        use_cassette(cassette_path, "replay" if replay else "record", timing_scale)
+        if cassette_path else nullcontext()
+    )
+    results = {}
+    try:
+        with cassette_context as cassette:
+            handler = OllamaLLMHandler(base_url=url)
+            handler.health_monitor.stop()
+            orchestrator = AgentOrchestrator(handler)
+            for rows in sizes:
+                df = generate_vehicle_data(rows)
+                data_context = get_versioned_data_context(df)
+                for name, question in ORCHESTRATOR_QUESTIONS.items():
+                    results[f"process_user_query[{name},rows={rows}]"] = measure(
+                        lambda: orchestrator.process_user_query(
+                            question, data_context=data_context, df=df, model="llama2"
+                        ),
+                        repeat,
+                    )
+            # Os handlers convertem erros em texto: as divergências são verificadas aqui
+            if cassette is not None and cassette.mismatches:
+                raise CassetteMismatchError(
+                    f"{len(cassette.mismatches)} requisição(ões) sem gravação no cassete {cassette_path}",
+                    cassette.mismatches[0]["diff"],
+                )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return results
+
+
+def history_benchmarks(repeat: int, workdir: str) -> Dict[str, Dict[str, Any]]:
+    """auto_save_history e list_history_sessions em um diretório temporário."""
+    from src.core import history_manager
+
+    history_dir = Path(workdir) / "chat_history"
+    history_dir.mkdir(exist_ok=True)
+    messages = [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"mensagem {i} " + "x" * 400}
+        for i in range(HISTORY_MESSAGES)
+    ]
+
+    results = {}
+    with patch.object(history_manager, "HISTORY_DIR", history_dir):
+        for i in range(HISTORY_SESSIONS):
+            history_manager.save_history(messages, f"sessao_{i}")
+        results[f"auto_save_history[messages={HISTORY_MESSAGES}]"] = measure(
+            lambda: history_manager.auto_save_history(messages, "current"), repeat
+        )
+        results[f"list_history_sessions[sessions={HISTORY_SESSIONS}]"] = measure(
+            history_manager.list_history_sessions, repeat
+        )
+    return results
+
+
+def transcription_benchmarks(repeat: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Preparação da transcrição: validação e arquivo temporário do áudio.
+
+    A inferência do Whisper/OpenAI não é medida (depende de modelo ou rede); o
+    carregamento do modelo Whisper só é medido se o pacote estiver instalado.
+    """
+    from src.core import audio_transcriber
+
+    audio = _silent_wav(AUDIO_SECONDS)
+
+    def prepare():
+        with audio_transcriber._temp_audio_file(audio, suffix=".wav"):
+            pass
+
+    results = {f"transcribe_audio_setup[seconds={AUDIO_SECONDS}]": measure(prepare, repeat)}
+    try:
+        import whisper  # noqa: F401
+    except ImportError:
+        logging.getLogger(__name__).info("Whisper não instalado: carregamento do modelo não medido")
+        return results
+    results["whisper_load_model[tiny]"] = measure(lambda: whisper.load_model("tiny"), max(1, repeat // 5))
+    return results
+
+
+SUITES = {
+    "data": lambda args, workdir: data_benchmarks(args.sizes, args.repeat, workdir),
+    "chart": lambda args, workdir: chart_benchmarks(args.sizes, args.repeat),
+    "orchestrator": lambda args, workdir: orchestrator_benchmarks(
+        args.sizes, args.repeat, args.cassette, args.cassette_timing
+    ),
+    "history": lambda args, workdir: history_benchmarks(args.repeat, workdir),
+    "transcription": lambda args, workdir: transcription_benchmarks(args.repeat),
+}
+
+
+def run_suites(args) -> Dict[str, Any]:
+    """
+    Executa as suítes selecionadas.
+
+    Args:
+        args: Argumentos da linha de comando (sizes, repeat, only)
+
+    Returns:
+        Relatório com "metadata" e "results"
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory(prefix="iag-bench-") as workdir:
+        for name, suite in SUITES.items():
+            if args.only and name not in args.only:
+                continue
+            print(f"▶ {name}...", flush=True)
+            results.update(suite(args, workdir))
+    return {
+        "metadata": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare_results(
+    current: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    threshold: float = DEFAULT_THRESHOLD,
+    min_absolute: float = MIN_ABSOLUTE_REGRESSION_SECONDS,
+) -> List[Dict[str, Any]]:
+    """
+    Compara medições com o baseline (mediana).
+
+    Args:
+        current: Resultados atuais
+        baseline: Resultados do baseline
+        threshold: Aumento relativo tolerado (0.25 = 25%)
+        min_absolute: Aumento absoluto mínimo (segundos) para contar como regressão
+
+    Returns:
+        Lista de comparações com "name", "baseline", "current", "ratio" e "regression"
+    """
+    rows = []
+    for name, result in current.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        before, after = reference["median_seconds"], result["median_seconds"]
+        ratio = after / before if before > 0 else float("inf")
+        rows.append({
+            "name": name,
+            "baseline": before,
+            "current": after,
+            "ratio": ratio,
+            "regression": ratio > 1 + threshold and after - before > min_absolute,
+        })
+    return rows
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    """Imprime as medições."""
+    width = max(len(name) for name in results) if results else 10
+    for name, result in results.items():
+        print(f"  {name:<{width}} {result['median_seconds'] * 1000:>10.2f} ms (mín {result['min_seconds'] * 1000:.2f} ms)")
+
+
+def print_comparison(rows: List[Dict[str, Any]], threshold: float):
+    """Imprime a comparação com o baseline."""
+    width = max(len(row["name"]) for row in rows) if rows else 10
+    print(f"\nComparação com o baseline (limite: +{threshold:.0%}):")
+    for row in rows:
+        flag = "❌ REGRESSÃO" if row["regression"] else ""
+        print(
+            f"  {row['name']:<{width}} {row['baseline'] * 1000:>9.2f} ms -> {row['current'] * 1000:>9.2f} ms "
+            f"({row['ratio']:.2f}x) {flag}"
+        )
+
+
+def main():
+    """Função principal dos benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmarks de desempenho com baseline em JSON")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help=f"Tamanhos dos datasets sintéticos (padrão: {DEFAULT_SIZES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help=f"Execuções medidas por benchmark (padrão: {DEFAULT_REPEAT})")
+    parser.add_argument("--only", nargs="+", choices=list(SUITES), help="Executa apenas as suítes indicadas")
+    parser.add_argument("--output", help="Grava os resultados em JSON (novo baseline)")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE,
+                        help="Compara com um baseline (padrão: tests/benchmarks/baseline.json)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Aumento relativo tolerado na comparação (padrão: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--cassette",
+                        help="Cassete das chamadas ao LLM do orquestrador (grava se não existir, senão reproduz)")
+    parser.add_argument("--cassette-timing", type=float, default=0.0,
+                        help="Fator sobre os tempos gravados no replay (padrão: 0, sem espera)")
+    args = parser.parse_args()
+
+    # Logs dos módulos medidos não devem pesar nas medições
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+
+    report = run_suites(args)
+    print_results(report["results"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados gravados em {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare_results(report["results"], baseline.get("results", {}), args.threshold)
+        print_comparison(rows, args.threshold)
+        regressions = [row for row in rows if row["regression"]]
+        if regressions:
+            print(f"\n{len(regressions)} regressão(ões) acima de {args.threshold:.0%}")
+            sys.exit(1)
+        print("\nSem regressões")
+
+
+if __name__ == "__main__":
+    main()
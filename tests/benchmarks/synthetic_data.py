@@ -0,0 +1,95 @@
+"""
+Gerador de datasets sintéticos de veículos para os benchmarks
+
+Reproduz o schema e as distribuições de dados/dados_veiculos_300.csv (marcas e
+modelos, cidades, proporção de status, faixas numéricas e veículos parados com
+métricas zeradas) em qualquer número de linhas, de forma determinística pela semente.
+"""
+
+import numpy as np
+import pandas as pd
+
+MODELS_BY_BRAND = {
+    "Chevrolet": ["S10 LTZ", "Tracker LT", "S10 High Country"],
+    "Fiat": ["Strada Ranch", "Toro Volcano", "Toro Freedom"],
+    "Ford": ["Ranger Limited", "Ranger Storm", "Ranger XLS"],
+    "Hyundai": ["HR Baú", "HB20X", "Creta Action"],
+    "Mitsubishi": ["ASX Outdoor", "Pajero Sport", "L200 Triton"],
+    "Renault": ["Kangoo Express", "Duster Oroch", "Master Furgão"],
+    "Toyota": ["Hilux SRX", "Hilux Cabine Dupla", "Hilux SRV"],
+    "Volkswagen": ["Nivus Comfortline", "Amarok Highline", "Saveiro Cross"],
+}
+
+CITY_WEIGHTS = {
+    "Caruaru": 0.16,
+    "Paulista": 0.15,
+    "Petrolina": 0.14,
+    "Recife": 0.12,
+    "Garanhuns": 0.12,
+    "Cabo de Santo Agostinho": 0.12,
+    "Jaboatão": 0.11,
+    "Olinda": 0.08,
+}
+
+STATUS_WEIGHTS = {"ativo": 0.72, "inativo": 0.21, "manutencao": 0.07}
+
+
+def generate_vehicle_data(rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Gera um dataset de veículos com o schema de dados_veiculos_300.csv.
+
+    Args:
+        rows: Número de linhas
+        seed: Semente do gerador
+
+    Returns:
+        DataFrame com as mesmas colunas e tipos do dataset real
+    """
+    rng = np.random.default_rng(seed)
+
+    brands = rng.choice(list(MODELS_BY_BRAND), size=rows)
+    model_index = rng.integers(0, 3, size=rows)
+    models = [MODELS_BY_BRAND[brand][index] for brand, index in zip(brands, model_index)]
+    status = rng.choice(list(STATUS_WEIGHTS), size=rows, p=list(STATUS_WEIGHTS.values()))
+    cities = rng.choice(list(CITY_WEIGHTS), size=rows, p=list(CITY_WEIGHTS.values()))
+
+    # Veículos inativos não rodam: métricas de uso zeradas, como no dataset real
+    running = status != "inativo"
+    km_mes = np.where(running, rng.integers(800, 2500, size=rows), 0)
+    velocidade = np.where(running, rng.integers(35, 71, size=rows), 0)
+    consumo = np.where(running, rng.integers(60, 200, size=rows), 0)
+    dias = np.where(running, rng.integers(15, 31, size=rows), rng.integers(0, 5, size=rows))
+    custo = rng.integers(150, 500, size=rows)
+    custo = np.where(status == "manutencao", custo * rng.integers(2, 4, size=rows), custo)
+
+    width = max(3, len(str(rows)))
+    return pd.DataFrame({
+        "id_veiculo": [f"V{i:0{width}d}" for i in range(1, rows + 1)],
+        "marca": brands,
+        "modelo": models,
+        "ano": rng.integers(2015, 2025, size=rows),
+        "status": status,
+        "cidade": cities,
+        "km_mes": km_mes,
+        "velocidade_media": velocidade,
+        "alertas": rng.integers(0, 7, size=rows),
+        "consumo_combustivel": consumo,
+        "dias_operacionais": dias,
+        "custo_manutencao": custo,
+    })
+
+
+def write_vehicle_csv(path: str, rows: int, seed: int = 42) -> str:
+    """
+    Grava um dataset sintético em CSV (UTF-8, como o dataset real).
+
+    Args:
+        path: Caminho do arquivo
+        rows: Número de linhas
+        seed: Semente do gerador
+
+    Returns:
+        Caminho do arquivo gravado
+    """
+    generate_vehicle_data(rows, seed).to_csv(path, index=False, encoding="utf-8")
+    return path
@@ -0,0 +1,392 @@
+"""
+Testes unitários para AgentOrchestrator
+"""
+
+import unittest
+import sys
+import os
+import re
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import Mock, patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+
+from src.core.agent_orchestrator import AgentOrchestrator, CHART_AGENT_PROMPT
+from src.core.data_loader import get_versioned_data_context
+from src.core.llm_handler import OllamaLLMHandler
+
+
+class FakeLLMHandler:
+    """Handler falso que responde de acordo com o agente chamado"""
+
+    def __init__(self, analysis_text, chart_decision, delay=0.0, barrier=None):
+        self.analysis_text = analysis_text
+        self.chart_decision = chart_decision
+        self.delay = delay
+        # Com barrier, cada chamada só retorna quando barrier.parties chamadas estão em andamento
+        self.barrier = barrier
+        self.calls = []
+        self.models = []
+        self.sent_messages = []
+        self.active = 0
+        self.max_active = 0
+        self._active_lock = threading.Lock()
+        self.last_usage = {"prompt_tokens": 100, "completion_tokens": 10, "cached_tokens": 80}
+
+    def generate_response(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+        is_chart_agent = messages[0]["content"] == CHART_AGENT_PROMPT
+        self.calls.append("chart" if is_chart_agent else "analysis")
+        self.models.append(model)
+        self.sent_messages.append(messages)
+        with self._active_lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.barrier is not None:
+                # Chamadas em sequência nunca completam a barreira: BrokenBarrierError após o timeout
+                self.barrier.wait(timeout=5)
+            if self.delay:
+                time.sleep(self.delay)
+        finally:
+            with self._active_lock:
+                self.active -= 1
+        if is_chart_agent:
+            return self.chart_decision
+        if stream:
+            return iter(re.findall(r"\S+\s*", self.analysis_text))
+        return self.analysis_text
+
+
+class TestAgentOrchestrator(unittest.TestCase):
+    """Testes para a classe AgentOrchestrator"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        self.df = pd.DataFrame({
+            "cidade": ["Recife", "Natal"],
+            "km_mes": [1000, 2000],
+        })
+
+    def test_sequential_returns_timings(self):
+        """Testa que o modo sequencial mede as latências"""
+        handler = FakeLLMHandler("Resposta", '{"should_generate_chart": false}')
+        orchestrator = AgentOrchestrator(handler)
+
+        result = orchestrator.process_user_query("resuma os dados da frota", df=self.df)
+
+        self.assertEqual(result["text_response"], "Resposta")
+        self.assertEqual(result["timings"]["mode"], "sequential")
+        self.assertIn("total_seconds", result["timings"])
+        self.assertEqual(orchestrator.get_latency_summary()["sequential"]["count"], 1)
+
+    def test_chart_gate_skips_chart_agent(self):
+        """Testa que o pré-filtro evita a chamada ao Agente de Gráficos sem pedido de visualização"""
+        handler = FakeLLMHandler("Bom dia! Como posso ajudar?", '{"should_generate_chart": true}')
+        orchestrator = AgentOrchestrator(handler)
+
+        result = orchestrator.process_user_query("bom dia", df=self.df)
+
+        self.assertEqual(handler.calls, ["analysis"])
+        self.assertFalse(result["chart_config"]["should_generate_chart"])
+        self.assertTrue(result["chart_config"]["skipped_by_gate"])
+        self.assertEqual(orchestrator.get_chart_gate_stats()["skipped"], 1)
+
+    def test_chart_gate_keeps_explicit_requests(self):
+        """Testa que pedidos explícitos de gráfico ainda consultam o Agente de Gráficos"""
+        handler = FakeLLMHandler("Resposta", '{"should_generate_chart": false}')
+        orchestrator = AgentOrchestrator(handler)
+
+        orchestrator.process_user_query("gere um gráfico de barras por cidade", df=self.df)
+
+        self.assertEqual(handler.calls, ["analysis", "chart"])
+
+    def test_concurrent_runs_agents_in_parallel(self):
+        """Testa que o modo concorrente sobrepõe as duas chamadas"""
+        handler = FakeLLMHandler(
+            "km_mes por cidade", '{"should_generate_chart": false}', barrier=threading.Barrier(2)
+        )
+        orchestrator = AgentOrchestrator(handler, execution_mode="concurrent", speculative_wait_seconds=0.0)
+
+        result = orchestrator.process_user_query("mostre um gráfico de km por cidade", df=self.df)
+
+        self.assertEqual(result["text_response"], "km_mes por cidade")
+        self.assertTrue(result["timings"]["used_partial_analysis"])
+        self.assertEqual(sorted(handler.calls), ["analysis", "chart"])
+        self.assertEqual(handler.max_active, 2)
+
+    def test_speculative_chart_cancelled_when_analysis_contradicts(self):
+        """Testa cancelamento do gráfico especulativo quando a análise trata de outras colunas"""
+        orchestrator = AgentOrchestrator(FakeLLMHandler("", ""))
+
+        config = orchestrator._reconcile_speculative_chart(
+            {"should_generate_chart": True, "chart_type": "bar", "x_column": "cidade", "y_column": "km_mes"},
+            "O consumo de combustível médio é de 10 litros",
+        )
+
+        self.assertFalse(config["should_generate_chart"])
+        self.assertEqual(orchestrator.speculative_stats["cancelled"], 1)
+
+    def test_speculative_chart_kept_when_analysis_agrees(self):
+        """Testa que o gráfico especulativo é mantido quando a análise é compatível"""
+        orchestrator = AgentOrchestrator(FakeLLMHandler("", ""))
+        chart_config = {"should_generate_chart": True, "chart_type": "bar", "x_column": "cidade", "y_column": "km_mes"}
+
+        config = orchestrator._reconcile_speculative_chart(chart_config, "A quilometragem por cidade é ...")
+
+        self.assertTrue(config["should_generate_chart"])
+
+    def test_analysis_prefix_is_stable_across_turns(self):
+        """Testa que system prompt e contexto formam um prefixo idêntico entre turnos"""
+        handler = FakeLLMHandler("Resposta", "")
+        orchestrator = AgentOrchestrator(handler)
+        data_context = get_versioned_data_context(self.df)
+        history = [
+            {"role": "user", "content": "resuma os dados"},
+            {"role": "assistant", "content": "Resumo"},
+        ]
+
+        orchestrator.process_user_query("resuma os dados", data_context=data_context, df=self.df)
+        orchestrator.process_user_query(
+            "analise a frota", data_context=get_versioned_data_context(self.df.copy()), df=self.df, history=history
+        )
+
+        first, second = handler.sent_messages
+        self.assertEqual(first[:2], second[:2])
+        self.assertEqual(second[1], {"role": "system", "content": data_context})
+        self.assertEqual(second[2:4], history)
+        self.assertIn("analise a frota", second[-1]["content"])
+
+    def test_usage_is_reported(self):
+        """Testa que os tokens em cache reportados pelo provedor são expostos"""
+        handler = FakeLLMHandler("Resposta", "")
+        orchestrator = AgentOrchestrator(handler)
+
+        result = orchestrator.process_user_query("resuma os dados da frota", df=self.df)
+
+        self.assertEqual(result["timings"]["usage"]["analysis"]["cached_tokens"], 80)
+        self.assertAlmostEqual(orchestrator.get_prompt_cache_stats()["cache_hit_rate"], 0.8)
+
+    def test_process_batch_writes_jsonl_in_parallel(self):
+        """Testa que o lote roda em paralelo e grava um resultado JSONL por pergunta"""
+        handler = FakeLLMHandler("Resposta", "", barrier=threading.Barrier(4))
+        orchestrator = AgentOrchestrator(handler)
+        questions = [f"resuma os dados da frota {i}" for i in range(4)]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "resultados.jsonl")
+            results = orchestrator.process_batch(
+                questions, df=self.df, concurrency=4, output_path=output_path
+            )
+            with open(output_path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+
+        # As quatro consultas estiveram em andamento ao mesmo tempo
+        self.assertEqual(handler.max_active, 4)
+        self.assertEqual([r["question"] for r in results], questions)
+        self.assertEqual(sorted(r["index"] for r in records), [0, 1, 2, 3])
+        self.assertNotIn("chart", records[0])
+        self.assertIn("total_seconds", records[0]["timings"])
+        self.assertIsNone(results[0]["error"])
+
+    def test_stats_counted_once_per_query_in_batch(self):
+        """Testa que os contadores compartilhados não perdem incrementos no lote em paralelo"""
+        handler = FakeLLMHandler("Resposta", "")
+        orchestrator = AgentOrchestrator(handler)
+        questions = [f"resuma os dados da frota {i}" for i in range(40)]
+
+        orchestrator.process_batch(questions, df=self.df, concurrency=8)
+
+        self.assertEqual(orchestrator.get_chart_gate_stats()["evaluated"], 40)
+        self.assertEqual(orchestrator.get_prompt_cache_stats()["calls"], 40)
+        self.assertEqual(orchestrator.get_latency_summary()["sequential"]["count"], 40)
+
+    def test_process_batch_reports_handler_errors(self):
+        """Testa que as mensagens de erro reais dos handlers contam como falha no lote"""
+        timeout = "❌ Ocorreu um erro. Por favor, tente novamente.: Erro no chat: Timeout"
+        empty = "Não foi possível gerar uma resposta. Verifique sua conexão com o Ollama."
+        orchestrator = AgentOrchestrator(FakeLLMHandler(timeout, ""))
+        results = orchestrator.process_batch(["resuma a frota"], df=self.df)
+        self.assertEqual(results[0]["error"], timeout)
+
+        orchestrator = AgentOrchestrator(FakeLLMHandler(empty, ""))
+        results = orchestrator.process_batch(["resuma a frota"], df=self.df)
+        self.assertEqual(results[0]["error"], empty)
+
+    def test_process_batch_respects_rate_limit(self):
+        """Testa que o início das consultas é espaçado pelo limite por minuto"""
+        handler = FakeLLMHandler("Resposta", "")
+        orchestrator = AgentOrchestrator(handler)
+
+        start = time.perf_counter()
+        orchestrator.process_batch(
+            ["resuma a frota", "resuma as cidades", "resuma as marcas"],
+            df=self.df, concurrency=3, requests_per_minute=600,
+        )
+
+        # 600/min = uma consulta a cada 0,1s: a terceira começa após ~0,2s
+        self.assertGreaterEqual(time.perf_counter() - start, 0.19)
+
+    def test_identical_concurrent_queries_are_coalesced(self):
+        """Testa que consultas idênticas simultâneas executam os agentes uma única vez"""
+        handler = FakeLLMHandler("Resposta", "", delay=0.2)
+        orchestrator = AgentOrchestrator(handler)
+        results = []
+
+        def ask():
+            results.append(orchestrator.process_user_query("Resuma  os dados da frota", df=self.df))
+
+        threads = [threading.Thread(target=ask) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(handler.calls, ["analysis"])
+        self.assertEqual([r["text_response"] for r in results], ["Resposta"] * 3)
+        self.assertEqual(sum(1 for r in results if r["timings"].get("coalesced")), 2)
+        self.assertGreaterEqual(orchestrator.get_coalescing_stats()["orchestrator"]["coalesced"], 2)
+
+
+    def test_chart_agent_uses_small_model_profile(self):
+        """Testa que o Agente de Gráficos usa o modelo do seu perfil e o de Análise o selecionado"""
+        handler = FakeLLMHandler("Média de km_mes por cidade", '{"should_generate_chart": false}')
+        handler.provider = "openai"
+        orchestrator = AgentOrchestrator(handler)
+
+        result = orchestrator.process_user_query("mostre um gráfico de km por cidade", df=self.df, model="gpt-4.1")
+
+        self.assertEqual(handler.models, ["gpt-4.1", "gpt-4o-mini"])
+        self.assertEqual(result["timings"]["models"], {"analysis": "gpt-4.1", "chart": "gpt-4o-mini"})
+        stats = orchestrator.get_agent_stats()
+        self.assertEqual(stats["chart"]["models"], {"gpt-4o-mini": 1})
+        # 100 tokens de prompt e 10 de resposta com o preço do gpt-4o-mini
+        self.assertAlmostEqual(stats["chart"]["cost_usd"], (100 * 0.15 + 10 * 0.60) / 1_000_000)
+
+    def test_agent_profile_falls_back_to_selected_model(self):
+        """Testa o fallback quando o modelo do perfil não está instalado ou falha"""
+        handler = FakeLLMHandler("Resposta", '{"should_generate_chart": false}')
+        handler.list_available_models = lambda: ["llama2:latest"]
+        orchestrator = AgentOrchestrator(handler)
+
+        orchestrator.process_user_query("mostre um gráfico da frota", df=self.df, model="llama2:latest")
+        self.assertEqual(handler.models, ["llama2:latest", "llama2:latest"])
+
+        failing = FakeLLMHandler("❌ Modelo não encontrado", '{"should_generate_chart": false}')
+        orchestrator = AgentOrchestrator(failing, agent_profiles={"greeting": {"model": "pequeno"}})
+        result = orchestrator.process_user_query("bom dia", model="grande")
+        self.assertEqual(failing.models, ["pequeno", "grande"])
+        self.assertEqual(orchestrator.get_agent_stats()["greeting"]["fallbacks"], 1)
+        self.assertEqual(result["timings"]["models"]["analysis"], "grande")
+
+        empty = FakeLLMHandler(
+            "Não foi possível gerar uma resposta. Verifique sua conexão com o Ollama.",
+            '{"should_generate_chart": false}',
+        )
+        orchestrator = AgentOrchestrator(empty, agent_profiles={"greeting": {"model": "pequeno"}})
+        orchestrator.process_user_query("bom dia", model="grande")
+        self.assertEqual(empty.models, ["pequeno", "grande"])
+        self.assertEqual(orchestrator.get_agent_stats()["greeting"]["fallbacks"], 1)
+
+    def test_profile_model_passes_real_handler_validation(self):
+        """Testa que o modelo do perfil (com pontos na versão) passa pela validação do handler real"""
+        with patch("src.core.llm_handler.OllamaService"):
+            handler = OllamaLLMHandler(base_url="http://localhost:11434")
+        handler.ollama_service = Mock()
+        handler.ollama_service.chat.return_value = {"message": {"role": "assistant", "content": "Bom dia!"}}
+        handler.list_available_models = lambda: ["llama3.2:3b", "llama3.1:8b"]
+        orchestrator = AgentOrchestrator(handler)
+
+        result = orchestrator.process_user_query("bom dia", model="llama3.1:8b")
+
+        self.assertEqual(result["text_response"], "Bom dia!")
+        self.assertEqual(result["timings"]["models"], {"analysis": "llama3.2:3b"})
+        self.assertEqual(handler.ollama_service.chat.call_count, 1)
+        self.assertEqual(handler.ollama_service.chat.call_args.kwargs["model"], "llama3.2:3b")
+        self.assertEqual(orchestrator.get_agent_stats()["greeting"]["fallbacks"], 0)
+
+    def test_chart_stream_falls_back_when_profile_model_fails_while_iterating(self):
+        """Testa o fallback quando o modelo do perfil falha só ao iterar o streaming"""
+        class FailingStreamHandler(FakeLLMHandler):
+            def generate_response(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+                if messages[0]["content"] != CHART_AGENT_PROMPT:
+                    return super().generate_response(messages, model, temperature, stream, **kwargs)
+                self.models.append(model)
+
+                def chunks():
+                    if model == "pequeno":
+                        raise Exception("model 'pequeno' not found")
+                    yield '{"should_generate_chart": true, "chart_type": "bar", '
+                    yield '"x_column": "cidade", "y_column": "km_mes"}'
+
+                return chunks()
+
+        handler = FailingStreamHandler("Km médio por cidade", "")
+        orchestrator = AgentOrchestrator(handler, agent_profiles={"chart": {"model": "pequeno"}})
+
+        result = orchestrator.process_user_query("mostre um gráfico de km por cidade", df=self.df, model="grande")
+
+        self.assertEqual(handler.models, ["grande", "pequeno", "grande"])
+        self.assertEqual(result["chart_config"]["x_column"], "cidade")
+        self.assertEqual(orchestrator.get_agent_stats()["chart"]["fallbacks"], 1)
+
+    def test_chart_decision_is_structured_and_stopped_early(self):
+        """Testa que a decisão usa JSON schema e o streaming para quando o objeto fecha"""
+        closed = []
+
+        class StreamingHandler(FakeLLMHandler):
+            def generate_response(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+                if messages[0]["content"] != CHART_AGENT_PROMPT:
+                    return super().generate_response(messages, model, temperature, stream, **kwargs)
+                self.response_format = kwargs.get("response_format")
+
+                def chunks():
+                    try:
+                        yield '{"should_generate_chart": true, "chart_type": "bar", '
+                        yield '"x_column": "cidade", "y_column": "km_mes", "category_column": null, '
+                        yield '"title": "Km por cidade"}'
+                        yield "\n" * 50
+                    finally:
+                        closed.append(True)
+
+                return chunks()
+
+        handler = StreamingHandler("Km médio por cidade", "")
+        orchestrator = AgentOrchestrator(handler)
+
+        result = orchestrator.process_user_query("mostre um gráfico de km por cidade", df=self.df)
+
+        self.assertEqual(result["chart_config"]["x_column"], "cidade")
+        self.assertNotIn("category_column", result["chart_config"])
+        self.assertEqual(closed, [True])
+        schema = handler.response_format["schema"]
+        self.assertEqual(schema["properties"]["x_column"]["enum"], ["cidade", "km_mes", None])
+        stats = orchestrator.get_chart_decision_stats()
+        self.assertEqual(stats["early_stops"], 1)
+        self.assertEqual(stats["chunks"], 3)
+
+    def test_chart_columns_resolved_by_schema_index(self):
+        """Testa que nomes de colunas escolhidos pelo LLM são corrigidos pelo índice do schema"""
+        orchestrator = AgentOrchestrator(FakeLLMHandler("", ""))
+        decision = {
+            "should_generate_chart": True,
+            "chart_type": "bar",
+            "x_column": "Cidade",
+            "y_column": "quilometragem",
+            "category_column": "temperatura",
+        }
+
+        config = orchestrator._parse_chart_decision(decision, "gráfico de km por cidade", self.df)
+
+        self.assertEqual(config["x_column"], "cidade")
+        self.assertEqual(config["y_column"], "km_mes")
+        self.assertIsNone(config["category_column"])
+
+
+if __name__ == '__main__':
+    unittest.main()
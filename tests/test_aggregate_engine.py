@@ -0,0 +1,149 @@
+"""
+Testes unitários para o motor local de agregações
+"""
+
+import unittest
+import sys
+import os
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+
+from src.core.aggregate_engine import (
+    parse_aggregate_question,
+    execute_aggregate_query,
+    answer_aggregate_question,
+)
+from src.core.agent_orchestrator import AgentOrchestrator
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'dados', 'dados_veiculos_300.csv')
+
+
+def make_df():
+    return pd.DataFrame({
+        "id_veiculo": [1, 2, 3, 4, 5],
+        "marca": ["Ford", "Fiat", "Ford", "VW", "Fiat"],
+        "status": ["ativo", "ativo", "manutencao", "ativo", "inativo"],
+        "cidade": ["Recife", "Recife", "Olinda", "Olinda", "Recife"],
+        "km_mes": [1000, 2000, 3000, 4000, 5000],
+        "custo_manutencao": [100.0, 200.0, 300.0, 400.0, 500.0],
+    })
+
+
+class TestAggregateEngine(unittest.TestCase):
+    """Testes para parse, execução e resposta de agregações"""
+
+    def setUp(self):
+        self.df = make_df()
+
+    def test_count_with_filters(self):
+        """Testa contagem com filtros de valores categóricos"""
+        answer = answer_aggregate_question("quantos veículos ativos em Recife?", self.df)
+        self.assertIsNotNone(answer)
+        self.assertEqual(answer["result"]["value"], 2)
+        self.assertEqual(answer["query"]["filters"], {"status": ["ativo"], "cidade": ["Recife"]})
+
+    def test_sum_with_filter(self):
+        """Testa soma de métrica filtrada por marca"""
+        answer = answer_aggregate_question("custo total de manutenção da Ford", self.df)
+        self.assertIsNotNone(answer)
+        self.assertEqual(answer["query"]["aggregation"], "sum")
+        self.assertEqual(answer["result"]["value"], 400.0)
+        self.assertIn("400", answer["text_response"])
+
+    def test_mean_group_by(self):
+        """Testa média agrupada por coluna"""
+        query = parse_aggregate_question("média de km_mes por cidade", self.df)
+        self.assertEqual(query["group_by"], "cidade")
+        result = execute_aggregate_query(self.df, query)
+        groups = dict(result["groups"])
+        self.assertEqual(groups["Olinda"], 3500)
+        self.assertAlmostEqual(groups["Recife"], 8000 / 3)
+
+    def test_filter_value_does_not_become_metric(self):
+        """Testa que 'manutenção' como status não vira a métrica custo_manutencao"""
+        query = parse_aggregate_question("quantos veículos em manutenção?", self.df)
+        self.assertEqual(query["aggregation"], "count")
+        self.assertIsNone(query["metric"])
+
+    def test_low_confidence_falls_back_to_llm(self):
+        """Testa que perguntas analíticas ou de gráfico não são respondidas localmente"""
+        self.assertIsNone(answer_aggregate_question("por que os custos da Ford são altos?", self.df))
+        self.assertIsNone(answer_aggregate_question("gráfico da média de km_mes por cidade", self.df))
+
+    def test_negation_distinct_entity_and_recency_fall_back_to_llm(self):
+        """Testa que negações, valores distintos, 'qual veículo' e recência não são respondidos localmente"""
+        questions = [
+            "quantos veículos não estão ativos?",
+            "quantos veículos exceto os da Ford?",
+            "quantos veículos não são Fiat?",
+            "quantos veículos sem contar Recife?",
+            "quantos veículos fora de Recife?",
+            "quantos modelos diferentes?",
+            "quantas marcas distintas?",
+            "qual veículo tem o maior custo de manutenção?",
+            "qual o último custo de manutenção?",
+        ]
+        for question in questions:
+            self.assertIsNone(answer_aggregate_question(question, self.df), question)
+
+    def test_required_words_match_whole_words(self):
+        """Testa que as palavras de fallback não casam dentro de outras ('sem' em 'semana')"""
+        answer = answer_aggregate_question("quantos veículos em manutenção durante a semana?", self.df)
+        self.assertIsNotNone(answer)
+        self.assertEqual(answer["result"]["value"], 1)
+
+    def test_unknown_filter_values_fall_back_to_llm(self):
+        """Testa que filtros citados que não existem no CSV não viram respostas sobre todas as linhas"""
+        df = pd.read_csv(DATA_FILE)
+        for question in (
+            "quantos veículos da Tesla?",
+            "quantos veículos em Fortaleza?",
+            "média de consumo da BMW",
+            "total de alertas em São Paulo",
+        ):
+            self.assertIsNone(answer_aggregate_question(question, df), question)
+
+        answer = answer_aggregate_question("média de consumo da Fiat", df)
+        self.assertEqual(answer["query"]["filters"], {"marca": ["Fiat"]})
+        answer = answer_aggregate_question("quantos veículos em Cabo de Santo Agostinho?", df)
+        self.assertEqual(answer["query"]["filters"], {"cidade": ["Cabo de Santo Agostinho"]})
+
+    def test_orchestrator_answers_locally(self):
+        """Testa que o orquestrador não chama o LLM para agregações simples"""
+        class FailingHandler:
+            def generate_response(self, *args, **kwargs):
+                raise AssertionError("LLM não deveria ser chamado")
+
+        orchestrator = AgentOrchestrator(FailingHandler())
+        result = orchestrator.process_user_query("quantos veículos ativos em Recife?", df=self.df)
+        self.assertEqual(result["timings"]["mode"], "local")
+        self.assertIsNone(result["chart"])
+        self.assertEqual(orchestrator.local_answer_stats["answered"], 1)
+
+    def test_history_built_only_when_llm_is_used(self):
+        """Testa que o histórico (compactação via LLM) só é montado se a pergunta vai ao LLM"""
+        class Handler:
+            def generate_response(self, *args, **kwargs):
+                return "Resposta"
+
+        history_calls = []
+
+        def history():
+            history_calls.append(True)
+            return [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá!"}]
+
+        orchestrator = AgentOrchestrator(Handler())
+        result = orchestrator.process_user_query("quantos veículos ativos em Recife?", df=self.df, history=history)
+        self.assertEqual(result["timings"]["mode"], "local")
+        self.assertEqual(history_calls, [])
+
+        result = orchestrator.process_user_query("resuma a situação da frota", df=self.df, history=history)
+        self.assertEqual(result["text_response"], "Resposta")
+        self.assertEqual(history_calls, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+Testes do gerador sintético e da comparação de baselines dos benchmarks
+"""
+
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tests.benchmarks.synthetic_data import generate_vehicle_data
+from tests.benchmarks.run_benchmarks import compare_results, measure
+
+REAL_DATASET = os.path.join(os.path.dirname(__file__), '..', 'dados', 'dados_veiculos_300.csv')
+
+
+class TestSyntheticData(unittest.TestCase):
+    """Testes para o gerador de datasets sintéticos"""
+
+    def test_schema_matches_real_dataset(self):
+        """Testa que as colunas e tipos numéricos seguem o dataset real"""
+        real = pd.read_csv(REAL_DATASET)
+        synthetic = generate_vehicle_data(1000)
+
+        self.assertEqual(list(synthetic.columns), list(real.columns))
+        self.assertEqual(
+            list(synthetic.select_dtypes(include="number").columns),
+            list(real.select_dtypes(include="number").columns),
+        )
+        self.assertEqual(len(synthetic), 1000)
+        self.assertTrue(synthetic["id_veiculo"].is_unique)
+
+    def test_deterministic_by_seed(self):
+        """Testa que a mesma semente gera o mesmo dataset"""
+        pd.testing.assert_frame_equal(generate_vehicle_data(200, seed=7), generate_vehicle_data(200, seed=7))
+
+    def test_inactive_vehicles_have_no_usage(self):
+        """Testa que veículos inativos têm quilometragem zerada"""
+        df = generate_vehicle_data(500)
+
+        self.assertTrue((df.loc[df["status"] == "inativo", "km_mes"] == 0).all())
+
+
+class TestBaselineComparison(unittest.TestCase):
+    """Testes para a comparação com o baseline"""
+
+    def test_regression_flagged_above_threshold(self):
+        """Testa que só aumentos acima do limite relativo e absoluto são regressões"""
+        baseline = {
+            "lento": {"median_seconds": 0.100},
+            "estavel": {"median_seconds": 0.100},
+            "ruido": {"median_seconds": 0.0005},
+        }
+        current = {
+            "lento": {"median_seconds": 0.200},
+            "estavel": {"median_seconds": 0.110},
+            "ruido": {"median_seconds": 0.0010},
+            "novo": {"median_seconds": 1.0},
+        }
+
+        rows = {row["name"]: row for row in compare_results(current, baseline, threshold=0.25)}
+
+        self.assertTrue(rows["lento"]["regression"])
+        self.assertFalse(rows["estavel"]["regression"])
+        self.assertFalse(rows["ruido"]["regression"])
+        self.assertNotIn("novo", rows)
+
+    def test_measure_reports_runs(self):
+        """Testa o formato da medição"""
+        result = measure(lambda: None, repeat=3)
+
+        self.assertEqual(result["runs"], 3)
+        self.assertLessEqual(result["min_seconds"], result["median_seconds"])
+
+
+if __name__ == '__main__':
+    unittest.main()
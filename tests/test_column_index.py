@@ -0,0 +1,99 @@
+"""
+Testes unitários para o índice de resolução de colunas
+"""
+
+import unittest
+import sys
+import os
+
+import pandas as pd
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.column_index import ColumnIndex, get_column_index, normalize_column_name
+from src.core.chart_analyzer import extract_columns
+
+VEHICLE_COLUMNS = [
+    "id_veiculo", "marca", "modelo", "ano", "status", "cidade", "km_mes",
+    "velocidade_media", "alertas", "consumo_combustivel", "dias_operacionais", "custo_manutencao",
+]
+
+
+class TestColumnIndex(unittest.TestCase):
+    """Testes para ColumnIndex"""
+
+    def setUp(self):
+        self.index = ColumnIndex(VEHICLE_COLUMNS)
+
+    def test_normalize_column_name(self):
+        """Testa a normalização de acentos, maiúsculas e separadores"""
+        self.assertEqual(normalize_column_name(" Velocidade Média "), "velocidade_media")
+        self.assertEqual(normalize_column_name("custo-manutenção"), "custo_manutencao")
+
+    def test_exact_and_normalized_variants(self):
+        """Testa nome exato e variações de caixa, acento e separador"""
+        self.assertEqual(self.index.resolve("marca"), "marca")
+        self.assertEqual(self.index.resolve("MARCA"), "marca")
+        self.assertEqual(self.index.resolve("Velocidade Média"), "velocidade_media")
+        self.assertEqual(self.index.resolve("kmmes"), "km_mes")
+
+    def test_synonyms(self):
+        """Testa sinônimos em português e em inglês"""
+        self.assertEqual(self.index.resolve("quilometragem"), "km_mes")
+        self.assertEqual(self.index.resolve("fuel_consumption"), "consumo_combustivel")
+        self.assertEqual(self.index.resolve("brand"), "marca")
+
+    def test_contained_name(self):
+        """Testa nome contido no nome da coluna"""
+        self.assertEqual(self.index.resolve("velocidade"), "velocidade_media")
+        self.assertEqual(self.index.resolve("operacionais"), "dias_operacionais")
+
+    def test_fuzzy_match(self):
+        """Testa correção de erros de digitação"""
+        self.assertEqual(self.index.resolve("velocidad_media"), "velocidade_media")
+        self.assertEqual(self.index.resolve("cidde"), "cidade")
+        self.assertEqual(self.index.resolve("kilometragem"), "km_mes")
+
+    def test_unknown_column(self):
+        """Testa nome sem correspondência"""
+        self.assertIsNone(self.index.resolve("temperatura_motor"))
+        self.assertIsNone(self.index.resolve(""))
+
+    def test_synonyms_only_for_existing_columns(self):
+        """Testa que sinônimos não apontam para colunas ausentes do schema"""
+        index = ColumnIndex(["produto", "preco_unitario", "quantidade_vendida"])
+
+        self.assertIsNone(index.resolve("brand"))
+        self.assertEqual(index.resolve("Preço Unitário"), "preco_unitario")
+        self.assertEqual(index.resolve("quantidade"), "quantidade_vendida")
+
+    def test_find_in_text_any_dataset(self):
+        """Testa colunas mencionadas em texto para outro dataset"""
+        index = ColumnIndex(["produto", "preco_unitario", "quantidade_vendida"])
+
+        columns = index.find_in_text("Qual o preço unitário médio por produto?")
+
+        self.assertEqual(columns, ["produto", "preco_unitario"])
+
+    def test_index_is_memoized_by_schema(self):
+        """Testa que o índice é construído uma vez por schema"""
+        first = get_column_index(pd.Index(VEHICLE_COLUMNS))
+        second = get_column_index(list(VEHICLE_COLUMNS))
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, get_column_index(["outra", "coluna"]))
+
+
+class TestExtractColumnsWithSchema(unittest.TestCase):
+    """Testes para extract_columns com o schema do dataset"""
+
+    def test_vehicle_schema_matches_default(self):
+        """Testa que o schema de veículos produz o mesmo resultado do padrão"""
+        text = "Mostre a velocidade média e o custo de manutenção por cidade"
+
+        self.assertEqual(extract_columns(text, columns=VEHICLE_COLUMNS), extract_columns(text))
+
+
+if __name__ == '__main__':
+    unittest.main()
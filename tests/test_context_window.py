@@ -0,0 +1,133 @@
+"""
+Testes unitários para o gerenciador da janela de contexto
+"""
+
+import unittest
+import sys
+import os
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.context_window import estimate_tokens, estimate_message_tokens, fit_messages, choose_num_ctx
+
+
+def make_conversation(turns, size=400):
+    messages = [
+        {"role": "system", "content": "Você é um assistente."},
+        {"role": "system", "content": "CONTEXTO DOS DADOS"},
+    ]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"pergunta {i} " + "x" * size})
+        messages.append({"role": "assistant", "content": f"resposta {i} " + "y" * size})
+    messages.append({"role": "user", "content": "pergunta atual"})
+    return messages
+
+
+class TestContextWindow(unittest.TestCase):
+    """Testes para estimativa de tokens e ajuste de mensagens"""
+
+    def test_estimate_tokens_grows_with_text(self):
+        """Testa que a estimativa cresce com o tamanho do texto"""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertLess(estimate_tokens("abc"), estimate_tokens("abc " * 100))
+
+    def test_everything_kept_within_budget(self):
+        """Testa que nada é descartado quando a conversa cabe no orçamento"""
+        messages = make_conversation(2)
+        fitted, info = fit_messages(messages, budget=10000)
+        self.assertEqual(fitted, messages)
+        self.assertEqual(info["dropped_messages"], 0)
+
+    def test_old_turns_dropped_and_summarized(self):
+        """Testa que pinned e pergunta são mantidos e turnos antigos viram resumo"""
+        messages = make_conversation(10)
+        fitted, info = fit_messages(messages, budget=800)
+
+        self.assertEqual(fitted[:2], messages[:2])
+        self.assertEqual(fitted[-1], messages[-1])
+        self.assertGreater(info["dropped_messages"], 0)
+        self.assertIn("mensagens anteriores omitidas", fitted[2]["content"])
+        self.assertEqual(fitted[3]["role"], "user")
+        self.assertEqual(fitted[-2], messages[-2])
+        self.assertLessEqual(info["estimated_tokens"], 800)
+        self.assertFalse(info["over_budget"])
+
+    def test_over_budget_reported(self):
+        """Testa que o excesso é sinalizado quando nem o conteúdo fixo cabe"""
+        messages = make_conversation(1)
+        fitted, info = fit_messages(messages, budget=5)
+        self.assertTrue(info["over_budget"])
+        self.assertEqual(fitted[-1]["content"], "pergunta atual")
+        self.assertGreater(estimate_message_tokens(fitted), 5)
+
+
+class TestChooseNumCtx(unittest.TestCase):
+    """Testes para o dimensionamento de num_ctx"""
+
+    CONFIG = {
+        "buckets": [2048, 4096, 8192],
+        "safety_margin_tokens": 100,
+        "default_response_tokens": 1000,
+    }
+
+    def test_small_prompt_uses_smallest_bucket(self):
+        """Testa que prompts pequenos não alocam contexto grande"""
+        sizing = choose_num_ctx([{"role": "user", "content": "oi"}], num_predict=200, config=self.CONFIG)
+
+        self.assertEqual(sizing["num_ctx"], 2048)
+        self.assertFalse(sizing["truncated"])
+
+    def test_prompt_rounded_up_to_bucket(self):
+        """Testa o arredondamento para o próximo bucket"""
+        messages = make_conversation(4, size=1200)
+        prompt_tokens = estimate_message_tokens(messages)
+
+        sizing = choose_num_ctx(messages, num_predict=200, config=self.CONFIG)
+
+        self.assertEqual(sizing["prompt_tokens"], prompt_tokens)
+        self.assertGreaterEqual(sizing["num_ctx"], prompt_tokens + 200 + 100)
+        self.assertIn(sizing["num_ctx"], self.CONFIG["buckets"])
+
+    def test_unbounded_num_predict_reserves_default(self):
+        """Testa que num_predict=-1 reserva a resposta padrão"""
+        sizing = choose_num_ctx([{"role": "user", "content": "oi"}], num_predict=-1, config=self.CONFIG)
+
+        self.assertEqual(sizing["response_tokens"], 1000)
+
+    def test_truncation_reported(self):
+        """Testa que o excesso sobre o maior bucket é sinalizado"""
+        messages = make_conversation(20, size=2000)
+
+        with self.assertLogs("src.core.context_window", level="WARNING"):
+            sizing = choose_num_ctx(messages, num_predict=200, config=self.CONFIG)
+
+        self.assertEqual(sizing["num_ctx"], 8192)
+        self.assertTrue(sizing["truncated"])
+
+    def test_handler_sends_num_ctx_and_agent_cap(self):
+        """Testa que o handler do Ollama envia num_ctx dimensionado e o num_predict do agente"""
+        from src.core.llm_handler import OllamaLLMHandler
+
+        handler = OllamaLLMHandler(base_url="http://localhost:11434")
+        handler.health_monitor.stop()
+        sent = {}
+
+        def chat(model, messages, stream=False, **kwargs):
+            sent.update(kwargs)
+            return {"message": {"content": "ok"}}
+
+        handler.ollama_service.chat = chat
+
+        result = handler.generate_response(
+            messages=[{"role": "user", "content": "Quantos veículos?"}], model="llama2", num_predict=200
+        )
+
+        self.assertEqual(result, "ok")
+        self.assertEqual(sent["num_predict"], 200)
+        self.assertEqual(sent["num_ctx"], 2048)
+        self.assertEqual(handler.context_stats["num_ctx"], {2048: 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+"""
+Testes unitários para as ferramentas de dados do Agente de Análise
+"""
+
+import unittest
+import sys
+import os
+import json
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+
+from src.core.data_tools import (
+    DATA_TOOLS,
+    group_aggregate,
+    top_k,
+    describe_column,
+    lookup_vehicle,
+    execute_tool_call,
+    get_tool_schema_context,
+)
+from src.core.agent_orchestrator import AgentOrchestrator
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'dados', 'dados_veiculos_300.csv')
+
+
+def make_df():
+    return pd.DataFrame({
+        "id_veiculo": ["V001", "V002", "V003", "V004"],
+        "marca": ["Ford", "Fiat", "Ford", "VW"],
+        "cidade": ["Recife", "Recife", "Olinda", "Olinda"],
+        "km_mes": [1000, 2000, 3000, 4000],
+    })
+
+
+class TestDataTools(unittest.TestCase):
+    """Testes para as funções de ferramentas"""
+
+    def setUp(self):
+        self.df = make_df()
+
+    def test_group_aggregate_by_group(self):
+        """Testa agregação por grupo ordenada por valor"""
+        result = group_aggregate(self.df, "mean", metric="km_mes", group_by="cidade")
+        self.assertEqual(result["groups"][0], {"cidade": "Olinda", "value": 3500.0})
+
+    def test_group_aggregate_count_with_filter(self):
+        """Testa contagem total com filtro"""
+        result = group_aggregate(self.df, "count", filters={"marca": "Ford"})
+        self.assertEqual(result["value"], 2)
+
+    def test_top_k_and_describe(self):
+        """Testa top-k e descrição de colunas"""
+        rows = top_k(self.df, "km_mes", k=1)["rows"]
+        self.assertEqual(rows[0]["id_veiculo"], "V004")
+        self.assertEqual(describe_column(self.df, "km_mes")["max"], 4000)
+        self.assertEqual(describe_column(self.df, "marca")["value_counts"]["Ford"], 2)
+
+    def test_lookup_vehicle(self):
+        """Testa busca por id_veiculo no formato do CSV ("V001")"""
+        self.assertEqual(lookup_vehicle(self.df, "V003")["vehicle"]["marca"], "Ford")
+        self.assertEqual(lookup_vehicle(self.df, " v003 ")["vehicle"]["marca"], "Ford")
+        self.assertFalse(lookup_vehicle(self.df, "V099")["found"])
+
+        numeric = make_df().assign(id_veiculo=[1, 2, 3, 4])
+        self.assertEqual(lookup_vehicle(numeric, "3")["vehicle"]["marca"], "Ford")
+        self.assertFalse(lookup_vehicle(numeric, 99)["found"])
+
+    def test_lookup_vehicle_schema_matches_csv_ids(self):
+        """Testa que o esquema declara id_veiculo como texto, como no CSV"""
+        csv_ids = pd.read_csv(DATA_FILE, usecols=["id_veiculo"], nrows=3)["id_veiculo"]
+        tool = next(t for t in DATA_TOOLS if t["function"]["name"] == "lookup_vehicle")
+        self.assertEqual(tool["function"]["parameters"]["properties"]["id_veiculo"]["type"], "string")
+
+        csv_df = make_df().assign(id_veiculo=csv_ids.tolist() + ["V999"])
+        result = json.loads(execute_tool_call(csv_df, "lookup_vehicle", {"id_veiculo": csv_ids[1]}))
+        self.assertEqual(result["vehicle"]["marca"], "Fiat")
+
+    def test_execute_tool_call_reports_errors(self):
+        """Testa que erros são devolvidos ao modelo em JSON"""
+        result = json.loads(execute_tool_call(self.df, "top_k", '{"column": "inexistente"}'))
+        self.assertIn("error", result)
+        result = json.loads(execute_tool_call(self.df, "desconhecida", {}))
+        self.assertIn("error", result)
+
+    def test_schema_context_is_compact(self):
+        """Testa que o esquema lista colunas e valores categóricos"""
+        context = get_tool_schema_context(self.df)
+        self.assertIn("cidade (categórica: Recife, Olinda)", context)
+        self.assertIn("km_mes (numérica, 1000 a 4000)", context)
+
+
+class FakeToolHandler:
+    """Handler falso que chama uma ferramenta e responde com o resultado"""
+
+    provider = "openai"
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.tool_results = []
+        self.plain_calls = 0
+
+    def generate_with_tools(self, messages, tools, tool_executor, model=None, temperature=None, max_rounds=5):
+        if self.fail:
+            raise Exception("model does not support tools")
+        result = json.loads(tool_executor("group_aggregate", {"aggregation": "sum", "metric": "km_mes"}))
+        self.tool_results.append(result)
+        return f"Total: {result['value']}"
+
+    def generate_response(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+        self.plain_calls += 1
+        return "Resposta com contexto completo"
+
+
+class TestOrchestratorToolMode(unittest.TestCase):
+    """Testes para o modo ferramentas do orquestrador"""
+
+    def test_tool_mode_uses_tools(self):
+        """Testa que o modo ferramentas responde com dados exatos"""
+        handler = FakeToolHandler()
+        orchestrator = AgentOrchestrator(handler, tool_mode={"openai": True})
+        result = orchestrator.process_user_query("analise a quilometragem da frota", data_context="ctx", df=make_df())
+        self.assertEqual(result["text_response"], "Total: 10000")
+        self.assertEqual(handler.plain_calls, 0)
+
+    def test_tool_mode_is_per_provider(self):
+        """Testa que o modo só vale para o provedor configurado"""
+        handler = FakeToolHandler()
+        orchestrator = AgentOrchestrator(handler, tool_mode={"ollama": True})
+        self.assertFalse(orchestrator.is_tool_mode_enabled())
+        orchestrator.set_tool_mode("openai", True)
+        self.assertTrue(orchestrator.is_tool_mode_enabled())
+
+    def test_tool_mode_falls_back_on_error(self):
+        """Testa que falhas no modo ferramentas usam o contexto completo"""
+        handler = FakeToolHandler(fail=True)
+        orchestrator = AgentOrchestrator(handler, tool_mode={"openai": True})
+        result = orchestrator.process_user_query("analise a quilometragem da frota", data_context="ctx", df=make_df())
+        self.assertEqual(result["text_response"], "Resposta com contexto completo")
+        self.assertEqual(orchestrator.tool_stats["fallbacks"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Testes unitários para o monitor de saúde com cache
+"""
+
+import unittest
+import sys
+import os
+import time
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.health_monitor import HealthMonitor
+
+
+class FakeProbe:
+    """Verificação falsa que conta as chamadas"""
+
+    def __init__(self, connected=True):
+        self.connected = connected
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {"connected": self.connected, "available_models": ["llama2", "mistral"]}
+
+
+class TestHealthMonitor(unittest.TestCase):
+    """Testes para HealthMonitor"""
+
+    def test_status_served_from_cache(self):
+        """Testa que chamadas repetidas não repetem a verificação"""
+        probe = FakeProbe()
+        monitor = HealthMonitor(probe, ttl=60, start=False)
+
+        for _ in range(10):
+            self.assertTrue(monitor.get_status()["connected"])
+
+        self.assertEqual(probe.calls, 1)
+        self.assertEqual(monitor.stats["cache_hits"], 9)
+
+    def test_expired_status_is_refreshed(self):
+        """Testa que o status expirado é verificado novamente"""
+        probe = FakeProbe()
+        monitor = HealthMonitor(probe, ttl=0.05, start=False)
+
+        monitor.get_status()
+        time.sleep(0.1)
+        monitor.get_status()
+
+        self.assertEqual(probe.calls, 2)
+
+    def test_invalidate_forces_new_probe(self):
+        """Testa que a invalidação (erro de conexão) força nova verificação"""
+        probe = FakeProbe()
+        monitor = HealthMonitor(probe, ttl=60, start=False)
+        monitor.get_status()
+
+        probe.connected = False
+        monitor.invalidate("Connection refused")
+
+        self.assertFalse(monitor.get_status()["connected"])
+        self.assertEqual(probe.calls, 2)
+        self.assertEqual(monitor.stats["invalidations"], 1)
+
+    def test_disconnected_status_expires_quickly(self):
+        """Testa que o status desconectado usa validade curta"""
+        monitor = HealthMonitor(FakeProbe(connected=False), ttl=60, start=False)
+
+        self.assertLessEqual(monitor.disconnected_ttl, 5)
+
+    def test_probe_exception_becomes_disconnected(self):
+        """Testa que uma exceção na verificação vira status desconectado"""
+        def failing():
+            raise RuntimeError("falha")
+
+        monitor = HealthMonitor(failing, start=False)
+
+        status = monitor.get_status()
+        self.assertFalse(status["connected"])
+        self.assertIn("falha", status["error"])
+
+    def test_background_refresh(self):
+        """Testa que a verificação em segundo plano atualiza o cache"""
+        probe = FakeProbe()
+        monitor = HealthMonitor(probe, refresh_interval=0.05, ttl=60)
+        try:
+            time.sleep(0.3)
+            self.assertGreaterEqual(probe.calls, 2)
+            monitor.get_status()
+            self.assertGreaterEqual(monitor.stats["cache_hits"], 1)
+        finally:
+            monitor.stop()
+
+
+class TestHandlerHealthCache(unittest.TestCase):
+    """Testes para os handlers servidos pelo cache de saúde"""
+
+    def test_ollama_handler_uses_cached_models(self):
+        """Testa que is_configured e list_available_models não repetem requisições"""
+        from src.core.llm_handler import OllamaLLMHandler
+
+        handler = OllamaLLMHandler(base_url="http://localhost:11434")
+        handler.health_monitor.stop()
+        calls = []
+
+        def list_models():
+            calls.append(1)
+            return [{"name": "llama2"}, {"name": "mistral"}]
+
+        handler.ollama_service.list_models = list_models
+
+        self.assertTrue(handler.is_configured())
+        self.assertEqual(handler.list_available_models(), ["llama2", "mistral"])
+        status = handler.get_connection_status()
+        self.assertTrue(status["connected"])
+        self.assertNotIn("available_models", status)
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
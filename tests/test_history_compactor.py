@@ -0,0 +1,89 @@
+"""
+Testes unitários para a compactação do histórico
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.history_compactor import compact_history, MEMORY_HEADER
+
+
+class FakeSummaryHandler:
+    """Handler falso que devolve um resumo numerado"""
+
+    def __init__(self, response=None):
+        self.response = response
+        self.calls = []
+
+    def generate_response(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+        self.calls.append(messages[-1]["content"])
+        return self.response or f"resumo {len(self.calls)}"
+
+
+def make_history(count):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"mensagem {i}"}
+        for i in range(count)
+    ]
+
+
+class TestHistoryCompactor(unittest.TestCase):
+    """Testes para compact_history"""
+
+    def setUp(self):
+        """Salvar resumos em diretório temporário"""
+        self.temp_dir = tempfile.TemporaryDirectory()
+        patcher = patch('src.core.history_manager.SUMMARY_DIR', Path(self.temp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_short_history_untouched(self):
+        """Testa que históricos curtos não são compactados"""
+        handler = FakeSummaryHandler()
+        history = make_history(10)
+        self.assertEqual(compact_history(history, handler), history)
+        self.assertEqual(handler.calls, [])
+
+    def test_long_history_compacted(self):
+        """Testa que turnos antigos viram uma mensagem de memória"""
+        handler = FakeSummaryHandler()
+        history = make_history(20)
+
+        compacted = compact_history(history, handler)
+
+        self.assertEqual(compacted[0]["role"], "system")
+        self.assertTrue(compacted[0]["content"].startswith(MEMORY_HEADER.format(count=12)))
+        self.assertEqual(compacted[1:], history[12:])
+
+    def test_summary_reused_then_updated_incrementally(self):
+        """Testa que o resumo é reutilizado até acumularem mais turnos"""
+        handler = FakeSummaryHandler()
+        history = make_history(20)
+        compact_history(history, handler)
+        compact_history(history + make_history(2), handler)
+        self.assertEqual(len(handler.calls), 1)
+
+        compacted = compact_history(make_history(26), handler)
+
+        self.assertEqual(len(handler.calls), 2)
+        self.assertIn("RESUMO ANTERIOR:\nresumo 1", handler.calls[-1])
+        self.assertNotIn("mensagem 0", handler.calls[-1])
+        self.assertIn("resumo 2", compacted[0]["content"])
+
+    def test_failed_summary_keeps_history(self):
+        """Testa que falhas do modelo de resumo mantêm o histórico original"""
+        handler = FakeSummaryHandler(response="Erro ao gerar resposta: timeout")
+        history = make_history(20)
+        self.assertEqual(compact_history(history, handler), history)
+
+
+if __name__ == '__main__':
+    unittest.main()
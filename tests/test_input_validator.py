@@ -64,6 +64,11 @@ class TestInputValidator(unittest.TestCase):
         self.assertTrue(is_valid)
         self.assertIsNone(error)
     
+    def test_validate_model_name_with_version_dots(self):
+        """Testa nomes de modelo com ponto e namespace"""
+        self.assertTrue(validate_model_name("llama3.2:3b")[0])
+        self.assertTrue(validate_model_name("hf.co/usuario/modelo:Q4_K_M")[0])
+    
     def test_validate_model_name_invalid_chars(self):
         """Testa nome de modelo com caracteres inválidos"""
         is_valid, error = validate_model_name("model@name#")
@@ -0,0 +1,113 @@
+"""
+Testes unitários para a detecção de intenções por palavras-chave
+"""
+
+import unittest
+import sys
+import os
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core import intent_matcher
+from src.core.intent_matcher import KeywordMatcher, fold_text, find_keywords, match_intents
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    """Testes para KeywordMatcher"""
+
+    def test_fold_text_removes_accents(self):
+        """Testa a normalização de acentos e maiúsculas"""
+        self.assertEqual(fold_text("Gráfico de Manutenção"), "grafico de manutencao")
+
+    def test_overlapping_keywords(self):
+        """Testa que ocorrências sobrepostas e contidas são encontradas"""
+        matcher = KeywordMatcher(["custo", "custo de manutencao", "manutencao", "de m"])
+
+        found = matcher.find_all("o custo de manutencao subiu")
+
+        self.assertEqual(found, {"custo", "custo de manutencao", "manutencao", "de m"})
+
+    def test_substring_semantics(self):
+        """Testa a mesma semântica de "palavra in texto" (inclusive dentro de palavras)"""
+        matcher = KeywordMatcher(["oi", "km"])
+
+        self.assertEqual(matcher.find_all("boa noite"), {"oi"})
+        self.assertEqual(matcher.find_all("nada aqui"), frozenset())
+
+    def test_same_result_as_naive_scan(self):
+        """Testa a varredura por palavras distintas contra "palavra in texto" para cada palavra-chave"""
+        keywords = ["ab", "bc", "abc", "cd", "de m", "mapa de calor", " de ", "a  b"]
+        matcher = KeywordMatcher(keywords)
+        texts = [
+            "abcd", "xabcdx abc", "mapa de calor", "mapa  de calor", "mapa de\ncalor",
+            "cidade mais", "a  b", "a b", "bc bc bc ab", "",
+        ]
+
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertEqual(matcher.find_all(text), {keyword for keyword in keywords if keyword in text})
+
+
+class TestMatchIntents(unittest.TestCase):
+    """Testes para match_intents"""
+
+    def test_chart_request_with_type_and_columns(self):
+        """Testa pedido de gráfico com tipo, colunas e agregação"""
+        intents = match_intents("Mostre um gráfico de barras da velocidade média por cidade")
+
+        self.assertTrue(intents["chart_request"])
+        self.assertTrue(intents["explicit_chart_keyword"])
+        self.assertEqual(intents["chart_type"], "bar")
+        self.assertEqual(intents["columns"], ["velocidade_media", "cidade"])
+        self.assertEqual(intents["aggregation"], "mean")
+        self.assertTrue(intents["data_question"])
+
+    def test_action_and_visualization_anywhere(self):
+        """Testa ação e termo de visualização em posições distantes"""
+        intents = match_intents("Exiba a distribuição de status em uma visualizacao")
+
+        self.assertTrue(intents["chart_request"])
+        self.assertEqual(intents["chart_type"], "pie")
+
+    def test_greeting_word_limit(self):
+        """Testa que cumprimentos só valem para mensagens curtas"""
+        self.assertTrue(match_intents("Olá, bom dia!")["greeting"])
+        self.assertFalse(match_intents("Olá")["data_question"])
+
+        long_message = "Olá, qual o custo médio de manutenção da frota por marca?"
+        intents = match_intents(long_message)
+        self.assertFalse(intents["greeting"])
+        self.assertTrue(intents["data_question"])
+
+    def test_no_intent(self):
+        """Testa texto sem palavras-chave"""
+        intents = match_intents("qualquer coisa")
+
+        self.assertFalse(intents["chart_request"])
+        self.assertIsNone(intents["chart_type"])
+        self.assertEqual(intents["columns"], [])
+        self.assertIsNone(intents["aggregation"])
+
+    def test_results_are_cached(self):
+        """Testa que o mesmo texto é analisado uma única vez"""
+        text = "quantos veículos por cidade? (teste de cache)"
+        intent_matcher._cache.clear()
+
+        first = find_keywords(text)
+        second = find_keywords(text)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(intent_matcher._cache), 1)
+
+    def test_cache_is_bounded(self):
+        """Testa o limite do cache"""
+        intent_matcher._cache.clear()
+        for i in range(intent_matcher.MATCH_CACHE_SIZE + 10):
+            find_keywords(f"mensagem {i}")
+
+        self.assertEqual(len(intent_matcher._cache), intent_matcher.MATCH_CACHE_SIZE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+"""
+Testes unitários para a gravação e reprodução (cassete) das chamadas de chat
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.llm_cassette import (
+    Cassette,
+    CassetteMismatchError,
+    diff_requests,
+    get_cassette,
+    normalize_request,
+    use_cassette,
+)
+from src.core.ollama_service import OllamaService
+
+MESSAGES = [
+    {"role": "system", "content": "Você analisa dados de frota.\nResponda em português."},
+    {"role": "user", "content": "Qual cidade roda mais?"},
+]
+
+
+def http_response(payload):
+    """Resposta HTTP falsa do requests."""
+    response = MagicMock()
+    response.json.return_value = payload
+    response.raise_for_status.return_value = None
+    return response
+
+
+class TestCassetteRecordReplay(unittest.TestCase):
+    """Testes de gravação e reprodução pelo OllamaService"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "cassettes", "llm.jsonl")
+        self.service = OllamaService(base_url="http://localhost:11434", keep_alive="30m")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    @patch("src.core.ollama_service.requests.post")
+    def test_replay_serves_recording_without_server(self, mock_post):
+        """Testa que o replay devolve a resposta gravada sem requisição HTTP"""
+        recorded = {"message": {"role": "assistant", "content": "Caruaru."}, "done": True, "eval_count": 3}
+        mock_post.return_value = http_response(recorded)
+        with use_cassette(self.path, "record"):
+            self.assertEqual(self.service.chat("llama2", MESSAGES, temperature=0.2), recorded)
+
+        interaction = json.loads(open(self.path, encoding="utf-8").readline())
+        self.assertEqual(interaction["request"]["provider"], "ollama")
+        self.assertNotIn("keep_alive", interaction["request"])
+
+        mock_post.reset_mock()
+        mock_post.side_effect = AssertionError("sem servidor no replay")
+        service = OllamaService(base_url="http://localhost:11434", keep_alive="5m")
+        with use_cassette(self.path, "replay", timing_scale=0) as cassette:
+            replayed = service.chat("llama2", MESSAGES, temperature=0.2)
+            replayed["message"]["content"] = "alterado"
+            self.assertEqual(service.chat("llama2", MESSAGES, temperature=0.2), recorded)
+        mock_post.assert_not_called()
+        self.assertEqual(cassette.mismatches, [])
+        self.assertIsNone(get_cassette())
+
+    def test_stream_timing_original_and_scaled(self):
+        """Testa o ritmo dos chunks gravados: tempo original, escalado e sem espera"""
+        def chunks():
+            for index in range(3):
+                time.sleep(0.04)
+                yield {"message": {"content": f"t{index}"}, "done": index == 2}
+
+        request = {"model": "llama2", "messages": MESSAGES, "stream": True, "options": {}}
+        cassette = Cassette(self.path, "record")
+        start = time.perf_counter()
+        self.assertEqual(len(list(cassette.record_stream("ollama", request, chunks(), start))), 3)
+
+        for scale, minimum, maximum in ((1.0, 0.11, 0.5), (0.5, 0.055, 0.11), (0.0, 0.0, 0.03)):
+            replay = Cassette(self.path, "replay", timing_scale=scale)
+            start = time.perf_counter()
+            contents = [chunk["message"]["content"] for chunk in replay.replay("ollama", request)]
+            elapsed = time.perf_counter() - start
+            self.assertEqual(contents, ["t0", "t1", "t2"])
+            self.assertGreaterEqual(elapsed, minimum, scale)
+            self.assertLess(elapsed, maximum, scale)
+
+    def test_abandoned_stream_is_recorded_partially(self):
+        """Testa que um streaming interrompido é gravado até o último chunk lido"""
+        request = {"model": "llama2", "messages": MESSAGES, "stream": True}
+        cassette = Cassette(self.path, "record")
+        stream = cassette.record_stream(
+            "ollama", request, iter([{"message": {"content": "a"}}, {"message": {"content": "b"}}]),
+            time.perf_counter(),
+        )
+        next(stream)
+        stream.close()
+        self.assertFalse(cassette.interactions[0]["complete"])
+        self.assertEqual(len(cassette.interactions[0]["chunks"]), 1)
+
+    def test_identical_requests_served_in_order(self):
+        """Testa que gravações repetidas são servidas em ordem e a última se repete"""
+        request = {"model": "llama2", "messages": MESSAGES, "stream": False}
+        cassette = Cassette(self.path, "record")
+        for content in ("primeira", "segunda"):
+            cassette.record("ollama", request, {"message": {"content": content}}, time.perf_counter())
+
+        replay = Cassette(self.path, "replay", timing_scale=0)
+        served = [replay.replay("ollama", request)["message"]["content"] for _ in range(3)]
+        self.assertEqual(served, ["primeira", "segunda", "segunda"])
+
+
+class TestCassetteMismatch(unittest.TestCase):
+    """Testes das requisições sem gravação"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "llm.jsonl")
+        cassette = Cassette(self.path, "record")
+        for model in ("llama2", "gpt-4o-mini"):
+            cassette.record(
+                "ollama", {"model": model, "messages": MESSAGES, "stream": False},
+                {"message": {"content": "ok"}}, time.perf_counter(),
+            )
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_mismatch_reports_diff_to_closest_recording(self):
+        """Testa o diff para a gravação mais parecida e o registro em mismatches"""
+        changed = [dict(MESSAGES[0]), {"role": "user", "content": "Qual cidade roda menos?"}]
+        cassette = Cassette(self.path, "replay", timing_scale=0)
+
+        with self.assertLogs("src.core.llm_cassette", level="ERROR"):
+            with self.assertRaises(CassetteMismatchError) as context:
+                cassette.replay("ollama", {"model": "llama2", "messages": changed, "stream": False})
+
+        diff = context.exception.diff
+        self.assertIn("-messages[1].content| Qual cidade roda mais?", diff)
+        self.assertIn("+messages[1].content| Qual cidade roda menos?", diff)
+        self.assertNotIn("gpt-4o-mini", diff)
+        self.assertEqual(cassette.mismatches[0]["diff"], diff)
+
+    def test_openai_service_replays_and_reports_mismatch(self):
+        """Testa o replay no OpenAIService e que a divergência não é convertida em erro genérico"""
+        from src.core.openai_service import OpenAIService
+
+        service = OpenAIService(api_key="sk-" + "x" * 40, base_url="http://cassette.invalid/v1")
+        request = {"model": "gpt-4o-mini", "messages": MESSAGES, "stream": False, "temperature": 0.1}
+        recording = Cassette(self.path, "record")
+        recording.record("openai", request, {"message": {"content": "Recife."}, "usage": None}, time.perf_counter())
+
+        with use_cassette(self.path, "replay", timing_scale=0):
+            result = service.chat("gpt-4o-mini", MESSAGES, temperature=0.1)
+            self.assertEqual(result["message"]["content"], "Recife.")
+            with self.assertLogs("src.core.llm_cassette", level="ERROR"):
+                with self.assertRaises(CassetteMismatchError):
+                    service.chat("gpt-4o-mini", MESSAGES, temperature=0.9)
+
+    def test_diff_and_normalization(self):
+        """Testa que campos sem efeito na resposta não entram na comparação"""
+        first = normalize_request("ollama", {"model": "llama2", "keep_alive": "5m", "options": {"top_p": 0.9}})
+        second = normalize_request("ollama", {"model": "llama2", "keep_alive": -1, "options": {"top_p": 0.9}})
+        self.assertEqual(first, second)
+        self.assertEqual(diff_requests(first, second), "")
+
+
+class TestCassetteConfig(unittest.TestCase):
+    """Testes da ativação pelo ambiente"""
+
+    def test_env_selects_mode(self):
+        """Testa LLM_CASSETTE_MODE/LLM_CASSETTE_FILE e o modo desativado"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "env.jsonl")
+            with patch.dict(os.environ, {"LLM_CASSETTE_MODE": "record", "LLM_CASSETTE_FILE": path}):
+                cassette = get_cassette()
+                self.assertEqual((cassette.mode, str(cassette.path)), ("record", path))
+                self.assertIs(get_cassette(), cassette)
+            with patch.dict(os.environ, {"LLM_CASSETTE_MODE": "off"}):
+                self.assertIsNone(get_cassette())
+
+        with self.assertRaises(ValueError):
+            Cassette("qualquer.jsonl", "gravar")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+"""
+Testes unitários para o registro de métricas e o endpoint /metrics
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+import urllib.request
+from unittest.mock import patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core import metrics
+from src.core.metrics import (
+    LLMCallMetrics,
+    MetricsRegistry,
+    agent_scope,
+    start_metrics_server,
+    stop_metrics_server,
+)
+from src.core.rate_limiter import RateLimiter
+
+
+def sample_value(text, line_prefix):
+    """Retorna o valor da primeira amostra que começa com line_prefix."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Testes para o formato de exposição do registro"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_and_gauge_render(self):
+        """Testa HELP/TYPE, labels escapados e valores de contadores e gauges"""
+        counter = self.registry.counter("test_requests_total", "Requisições", ("status",))
+        counter.labels("ok").inc()
+        counter.labels(status="ok").inc(2)
+        counter.labels('er"ro').inc()
+        gauge = self.registry.gauge("test_in_flight", "Em andamento")
+        gauge.labels().inc()
+        gauge.labels().dec(0.5)
+
+        text = self.registry.render()
+        self.assertIn("# TYPE test_requests_total counter", text)
+        self.assertIn('test_requests_total{status="ok"} 3', text)
+        self.assertIn('test_requests_total{status="er\\"ro"} 1', text)
+        self.assertIn("test_in_flight 0.5", text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Testa buckets cumulativos, +Inf, soma e contagem"""
+        histogram = self.registry.histogram("test_seconds", "Latência", ("agent",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.labels("chart").observe(value)
+
+        text = self.registry.render()
+        self.assertIn('test_seconds_bucket{agent="chart",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{agent="chart",le="1"} 3', text)
+        self.assertIn('test_seconds_bucket{agent="chart",le="+Inf"} 4', text)
+        self.assertAlmostEqual(sample_value(text, 'test_seconds_sum{agent="chart"}'), 4.25)
+        self.assertIn('test_seconds_count{agent="chart"} 4', text)
+
+    def test_wrong_label_count_raises(self):
+        """Testa que valores de label incompatíveis geram erro"""
+        counter = self.registry.counter("test_total", "Teste", ("a", "b"))
+        with self.assertRaises(ValueError):
+            counter.labels("x")
+
+    def test_collectors_are_read_at_scrape(self):
+        """Testa que coletores entram na exposição e erros neles não interrompem a coleta"""
+        def broken():
+            raise RuntimeError("falhou")
+
+        def queue():
+            yield ("test_queue_depth", "gauge", "Fila", [({"provider": "openai"}, 2)])
+
+        self.registry.register_collector(broken)
+        self.registry.register_collector(queue)
+        with self.assertLogs("src.core.metrics", level="WARNING"):
+            text = self.registry.render()
+        self.assertIn('test_queue_depth{provider="openai"} 2', text)
+
+
+class TestLLMCallMetrics(unittest.TestCase):
+    """Testes das métricas das chamadas de LLM"""
+
+    def test_tokens_per_second_from_ollama_eval_duration(self):
+        """Testa tokens/s a partir de eval_count/eval_duration e os labels do agente"""
+        with agent_scope("chart"):
+            call = LLMCallMetrics("ollama", "metrics-test-model")
+        call.begin()
+        call.finish({"prompt_tokens": 50, "completion_tokens": 40, "eval_ms": 500.0})
+        call.finish()  # ignorado
+
+        text = metrics.REGISTRY.render()
+        labels = 'provider="ollama",model="metrics-test-model",agent="chart"'
+        self.assertIn(f'omnilink_llm_requests_total{{{labels},status="ok"}} 1', text)
+        self.assertEqual(sample_value(text, f"omnilink_llm_tokens_per_second_sum{{{labels}}}"), 80.0)
+        self.assertEqual(
+            sample_value(text, 'omnilink_llm_requests_in_flight{provider="ollama"}'), 0.0
+        )
+
+    def test_stream_records_first_token_and_usage(self):
+        """Testa o handler do Ollama em streaming: primeiro token, duração e tokens"""
+        from src.core.llm_handler import OllamaLLMHandler
+
+        handler = OllamaLLMHandler(base_url="http://localhost:11434")
+        handler.health_monitor.stop()
+
+        def chat(model, messages, stream=False, **kwargs):
+            def chunks():
+                time.sleep(0.01)
+                yield {"message": {"content": "Olá"}, "done": False}
+                yield {"message": {"content": ""}, "done": True, "prompt_eval_count": 10,
+                       "eval_count": 20, "eval_duration": 1_000_000_000}
+            return chunks()
+
+        handler.ollama_service.chat = chat
+        with agent_scope("analysis"):
+            stream = handler.generate_response(
+                messages=[{"role": "user", "content": "oi"}], model="metrics-stream-model", stream=True
+            )
+        self.assertEqual("".join(stream), "Olá")
+
+        text = metrics.REGISTRY.render()
+        labels = 'provider="ollama",model="metrics-stream-model",agent="analysis"'
+        self.assertEqual(sample_value(text, f"omnilink_llm_time_to_first_token_seconds_count{{{labels}}}"), 1)
+        self.assertGreaterEqual(sample_value(text, f"omnilink_llm_time_to_first_token_seconds_sum{{{labels}}}"), 0.01)
+        self.assertEqual(sample_value(text, f"omnilink_llm_tokens_per_second_sum{{{labels}}}"), 20.0)
+        self.assertEqual(
+            sample_value(text, 'omnilink_llm_tokens_total{provider="ollama",model="metrics-stream-model",kind="completion"}'),
+            20,
+        )
+
+    def test_cache_hit_ratio(self):
+        """Testa a razão de acertos derivada do contador de consultas ao cache"""
+        metrics.cache_lookup("metrics_test_cache", True)
+        metrics.cache_lookup("metrics_test_cache", True)
+        metrics.cache_lookup("metrics_test_cache", False)
+        text = metrics.REGISTRY.render()
+        self.assertAlmostEqual(
+            sample_value(text, 'omnilink_cache_hit_ratio{cache="metrics_test_cache"}'), 2 / 3
+        )
+
+
+class TestQueueDepthAndEndpoint(unittest.TestCase):
+    """Testes da fila do limitador de taxa e do endpoint HTTP"""
+
+    def test_rate_limiter_reports_waiting_calls(self):
+        """Testa que chamadas aguardando capacidade aparecem em get_stats()["waiting"]"""
+        limiter = RateLimiter(requests_per_minute=600, max_wait_seconds=5)
+        limiter._available_requests = 0
+        thread = threading.Thread(target=limiter.acquire)
+        thread.start()
+        time.sleep(0.03)
+        self.assertEqual(limiter.get_stats()["waiting"], 1)
+        thread.join()
+        self.assertEqual(limiter.get_stats()["waiting"], 0)
+
+    def test_metrics_endpoint(self):
+        """Testa o endpoint /metrics em uma porta livre"""
+        stop_metrics_server()
+        server = start_metrics_server(host="127.0.0.1", port=0)
+        self.addCleanup(stop_metrics_server)
+        self.assertIs(start_metrics_server(), server)
+
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            body = response.read().decode("utf-8")
+            content_type = response.headers["Content-Type"]
+
+        self.assertTrue(content_type.startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE omnilink_llm_request_seconds histogram", body)
+        self.assertIn("omnilink_rate_limiter_queue_depth", body)
+
+    def test_port_in_use_is_not_retried(self):
+        """Testa que, com a porta ocupada, as chamadas seguintes não tentam abrir a porta de novo"""
+        stop_metrics_server()
+        self.addCleanup(stop_metrics_server)
+        with socket.socket() as busy:
+            busy.bind(("127.0.0.1", 0))
+            busy.listen(1)
+            port = busy.getsockname()[1]
+            with self.assertLogs("src.core.metrics", level="WARNING"):
+                self.assertIsNone(start_metrics_server(host="127.0.0.1", port=port))
+
+            with patch("src.core.metrics.ThreadingHTTPServer", side_effect=AssertionError("nova tentativa")):
+                self.assertIsNone(start_metrics_server(host="127.0.0.1", port=port))
+
+
+if __name__ == '__main__':
+    unittest.main()
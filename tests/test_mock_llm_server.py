@@ -0,0 +1,132 @@
+"""
+Testes do servidor LLM local simulado (scripts/mock_llm_server.py)
+"""
+
+import unittest
+import sys
+import os
+import json
+import time
+from unittest.mock import patch
+
+import requests
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from scripts.mock_llm_server import start_in_background, sample_from_schema
+from src.core.ollama_service import OllamaService
+
+MOCK_API_KEY = "sk-mock-" + "0" * 40
+
+
+class TestMockLLMServer(unittest.TestCase):
+    """Testes dos endpoints simulados com os serviços reais do projeto"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.url = start_in_background({"ttft_seconds": 0.01, "tokens_per_second": 0})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_ollama_service_lists_models_and_chats(self):
+        """Testa /api/tags e /api/chat pelo OllamaService"""
+        service = OllamaService(base_url=self.url)
+
+        self.assertIn("llama2", [m["name"] for m in service.list_models()])
+        response = service.chat(model="llama2", messages=[{"role": "user", "content": "quantos veículos?"}])
+        self.assertEqual(response["message"]["content"], "Eco: quantos veículos?")
+        self.assertGreater(response["prompt_eval_count"], 0)
+
+    def test_ollama_streaming_ndjson(self):
+        """Testa o streaming em NDJSON e as métricas do chunk final"""
+        service = OllamaService(base_url=self.url)
+
+        chunks = list(service.chat(model="llama2", messages=[{"role": "user", "content": "a b c"}], stream=True))
+
+        text = "".join(chunk["message"]["content"] for chunk in chunks)
+        self.assertEqual(text, "Eco: a b c")
+        self.assertTrue(chunks[-1]["done"])
+        self.assertEqual(chunks[-1]["eval_count"], 4)
+
+    def test_ollama_format_schema_and_num_predict(self):
+        """Testa resposta válida para JSON schema e o limite num_predict"""
+        service = OllamaService(base_url=self.url)
+        schema = {"type": "object", "properties": {"ok": {"type": "boolean"}, "tipo": {"enum": [None, "bar"]}}}
+
+        response = service.chat(model="llama2", messages=[{"role": "user", "content": "x"}], format=schema)
+        self.assertEqual(json.loads(response["message"]["content"]), {"ok": False, "tipo": "bar"})
+
+        response = service.chat(
+            model="llama2", messages=[{"role": "user", "content": "um dois tres quatro"}], num_predict=2
+        )
+        self.assertEqual(response["eval_count"], 2)
+
+    def test_openai_service_via_base_url(self):
+        """Testa o OpenAIService apontado para o servidor só pelo OPENAI_BASE_URL"""
+        from src.core.openai_service import OpenAIService
+
+        with patch.dict(os.environ, {"OPENAI_BASE_URL": f"{self.url}/v1"}):
+            service = OpenAIService(api_key=MOCK_API_KEY)
+
+        response = service.chat(model="gpt-4o-mini", messages=[{"role": "user", "content": "olá"}])
+        self.assertEqual(response["message"]["content"], "Eco: olá")
+
+        chunks = list(service.chat(model="gpt-4o-mini", messages=[{"role": "user", "content": "olá"}], stream=True))
+        self.assertEqual("".join(c["message"]["content"] for c in chunks if not c["done"]), "Eco: olá")
+        self.assertEqual(chunks[-1]["usage"]["completion_tokens"], 2)
+
+    def test_cancelled_stream_is_counted(self):
+        """Testa que o encerramento antecipado do streaming interrompe a geração"""
+        service = OllamaService(base_url=self.url)
+        before = requests.get(f"{self.url}/mock/stats").json()["streams_cancelled"]
+        self.server.mock_state.config["tokens_per_second"] = 200
+
+        try:
+            stream = service.chat(model="llama2", messages=[{"role": "user", "content": "x " * 300}], stream=True)
+            next(stream)
+            stream.close()
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline:
+                if requests.get(f"{self.url}/mock/stats").json()["streams_cancelled"] > before:
+                    break
+                time.sleep(0.05)
+        finally:
+            self.server.mock_state.config["tokens_per_second"] = 0
+
+        self.assertGreater(requests.get(f"{self.url}/mock/stats").json()["streams_cancelled"], before)
+
+
+class TestMockErrorInjection(unittest.TestCase):
+    """Testes da injeção de erros"""
+
+    def test_injected_rate_limit(self):
+        """Testa erro 429 com Retry-After"""
+        server, url = start_in_background({"error_rate": 1.0, "error_status": 429})
+        try:
+            response = requests.post(f"{url}/api/chat", json={"model": "llama2", "messages": [], "stream": False})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+    def test_sample_from_schema(self):
+        """Testa o objeto mínimo montado a partir do schema"""
+        schema = {
+            "type": "object",
+            "properties": {
+                "n": {"type": ["integer", "null"]},
+                "s": {"type": "string"},
+                "lista": {"type": "array"},
+            },
+        }
+        self.assertEqual(sample_from_schema(schema), {"n": 0, "s": "", "lista": []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+Testes unitários para o pool de servidores Ollama
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+from unittest.mock import Mock, patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.ollama_pool import OllamaPool, parse_endpoints
+from src.core.llm_handler import OllamaLLMHandler
+
+
+class FakeService:
+    """OllamaService falso que registra as chamadas recebidas"""
+
+    def __init__(self, url, delay=0.0, fail=False):
+        self.base_url = url
+        self.timeout = 60
+        self.keep_alive = None
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def chat(self, model, messages, stream=False, tools=None, **kwargs):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.base_url} inacessível")
+        if self.delay:
+            time.sleep(self.delay)
+        if stream:
+            return iter([{"message": {"content": "ok"}, "done": True}])
+        return {"message": {"role": "assistant", "content": self.base_url}}
+
+    def list_models(self):
+        if self.fail:
+            raise ConnectionError(f"{self.base_url} inacessível")
+        return [{"name": "llama2"}]
+
+
+def create_pool(services):
+    """Cria um pool sem verificação periódica, com serviços falsos."""
+    pool = OllamaPool([service.base_url for service in services], start_probing=False)
+    for endpoint, service in zip(pool.endpoints, services):
+        endpoint["service"] = service
+    return pool
+
+
+class TestOllamaPool(unittest.TestCase):
+    """Testes para OllamaPool"""
+
+    def test_parse_endpoints(self):
+        """Testa a leitura de URLs separadas por vírgula"""
+        self.assertEqual(
+            parse_endpoints("http://a:11434/, http://b:11434,http://a:11434"),
+            ["http://a:11434", "http://b:11434"],
+        )
+        self.assertEqual(parse_endpoints(["http://a:11434"]), ["http://a:11434"])
+        self.assertEqual(parse_endpoints(""), [])
+
+    def test_prefers_endpoint_with_model_loaded(self):
+        """Testa que o servidor com o modelo já carregado é preferido"""
+        pool = create_pool([FakeService("http://a"), FakeService("http://b")])
+        pool.endpoints[1]["running_models"] = {"llama2"}
+
+        result = pool.chat("llama2", [{"role": "user", "content": "Olá"}])
+
+        self.assertEqual(result["message"]["content"], "http://b")
+
+    def test_model_names_match_with_implicit_latest_tag(self):
+        """Testa que "llama2" e "llama2:latest" são o mesmo modelo ao escolher o servidor"""
+        pool = create_pool([FakeService("http://a"), FakeService("http://b")])
+        pool.endpoints[0]["installed_models"] = {"mistral:latest"}
+        pool.endpoints[1]["installed_models"] = {"llama2:latest"}
+        pool.endpoints[1]["running_models"] = {"llama2:latest"}
+
+        result = pool.chat("llama2", [{"role": "user", "content": "Olá"}])
+        self.assertEqual(result["message"]["content"], "http://b")
+
+        pool.endpoints[1]["running_models"] = set()
+        pool.endpoints[0]["running_models"] = {"mistral"}
+        result = pool.chat("mistral:latest", [{"role": "user", "content": "Olá"}])
+        self.assertEqual(result["message"]["content"], "http://a")
+
+    def test_least_outstanding_requests(self):
+        """Testa que requisições simultâneas são distribuídas entre os servidores"""
+        services = [FakeService("http://a", delay=0.2), FakeService("http://b", delay=0.2)]
+        pool = create_pool(services)
+
+        threads = [
+            threading.Thread(target=pool.chat, args=("llama2", [{"role": "user", "content": "Olá"}]))
+            for _ in range(4)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([service.calls for service in services], [2, 2])
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertTrue(all(stats["in_flight"] == 0 for stats in pool.get_endpoint_stats()))
+
+    def test_failover_ejects_unreachable_endpoint(self):
+        """Testa que um servidor inacessível é removido e a requisição vai para outro"""
+        pool = create_pool([FakeService("http://a", fail=True), FakeService("http://b")])
+
+        result = pool.chat("llama2", [{"role": "user", "content": "Olá"}])
+        stats = pool.get_endpoint_stats()
+
+        self.assertEqual(result["message"]["content"], "http://b")
+        self.assertFalse(stats[0]["healthy"])
+        self.assertEqual(stats[0]["errors"], 1)
+        self.assertEqual(stats[1]["requests"], 1)
+
+    @patch('src.core.ollama_pool.requests.get')
+    def test_ejected_endpoint_returns_after_probe(self, mock_get):
+        """Testa que a verificação periódica devolve ao pool o servidor recuperado"""
+        services = [FakeService("http://a", fail=True), FakeService("http://b")]
+        pool = create_pool(services)
+        pool.chat("llama2", [{"role": "user", "content": "Olá"}])
+        self.assertFalse(pool.get_endpoint_stats()[0]["healthy"])
+
+        services[0].fail = False
+        mock_get.return_value = Mock(json=Mock(return_value={"models": [{"name": "llama2"}]}))
+        pool.probe_all()
+        pool.endpoints[1]["in_flight"] = 1
+        result = pool.chat("llama2", [{"role": "user", "content": "Olá"}])
+
+        self.assertEqual(result["message"]["content"], "http://a")
+        self.assertEqual(pool.get_endpoint_stats()[0]["running_models"], ["llama2"])
+
+    def test_all_endpoints_down_raises_connection_error(self):
+        """Testa que sem servidores disponíveis a chamada falha com ConnectionError"""
+        pool = create_pool([FakeService("http://a", fail=True), FakeService("http://b", fail=True)])
+
+        with self.assertRaises(ConnectionError):
+            pool.chat("llama2", [{"role": "user", "content": "Olá"}])
+
+    def test_stream_releases_endpoint_when_consumed(self):
+        """Testa que o streaming libera o servidor ao terminar"""
+        pool = create_pool([FakeService("http://a")])
+
+        chunks = pool.chat("llama2", [{"role": "user", "content": "Olá"}], stream=True)
+        self.assertEqual(pool.get_endpoint_stats()[0]["in_flight"], 1)
+        list(chunks)
+
+        self.assertEqual(pool.get_endpoint_stats()[0]["in_flight"], 0)
+
+    def test_handler_uses_pool_for_multiple_urls(self):
+        """Testa que o handler cria um pool quando recebe várias URLs"""
+        handler = OllamaLLMHandler(base_url="http://a:11434,http://b:11434")
+        handler.ollama_service.stop_probing()
+
+        self.assertIsInstance(handler.ollama_service, OllamaPool)
+        self.assertEqual(len(handler.ollama_service.endpoints), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Testes unitários para OllamaResidencyManager
+"""
+
+import unittest
+import sys
+import os
+import time
+from unittest.mock import Mock, patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.ollama_service import OllamaService
+from src.core.ollama_residency import (
+    OllamaResidencyManager,
+    STATUS_READY,
+    STATUS_COLD,
+    STATUS_UNAVAILABLE,
+)
+
+
+def ps_response(models):
+    response = Mock()
+    response.json.return_value = {"models": models}
+    response.raise_for_status = Mock()
+    return response
+
+
+class TestOllamaResidencyManager(unittest.TestCase):
+    """Testes para o gerenciador de residência de modelos"""
+
+    def setUp(self):
+        """Configuração inicial para cada teste"""
+        service = OllamaService(base_url="http://localhost:11434", timeout=5, keep_alive="30m")
+        self.manager = OllamaResidencyManager(
+            service, max_loaded_models=1, idle_unload_seconds=60, poll_interval_seconds=1
+        )
+
+    def test_keep_alive_sent_on_chat(self):
+        """Testa que o keep_alive configurado vai em todas as requisições de chat"""
+        with patch('src.core.ollama_service.requests.post') as mock_post:
+            mock_post.return_value = Mock(json=Mock(return_value={"message": {"content": "ok"}}))
+            self.manager.ollama_service.chat(model="llama2", messages=[])
+            self.assertEqual(mock_post.call_args.kwargs["json"]["keep_alive"], "30m")
+
+    @patch('src.core.ollama_residency.requests.get')
+    def test_refresh_reports_ready_models(self, mock_get):
+        """Testa que modelos em /api/ps aparecem como carregados"""
+        mock_get.return_value = ps_response([{"name": "llama2:latest", "expires_at": "t1"}])
+
+        self.manager.refresh()
+
+        self.assertEqual(self.manager.get_model_status("llama2"), STATUS_READY)
+        self.assertEqual(self.manager.get_model_status("mistral"), STATUS_COLD)
+
+    @patch('src.core.ollama_residency.requests.post')
+    @patch('src.core.ollama_residency.requests.get')
+    def test_preload_failure_marks_unavailable(self, mock_get, mock_post):
+        """Testa que um modelo que não carrega é marcado como indisponível"""
+        mock_get.return_value = ps_response([])
+        mock_post.side_effect = Exception("model not found")
+
+        self.assertFalse(self.manager.preload("inexistente"))
+        self.assertEqual(self.manager.get_model_status("inexistente"), STATUS_UNAVAILABLE)
+
+    @patch('src.core.ollama_residency.requests.post')
+    @patch('src.core.ollama_residency.requests.get')
+    def test_enforce_memory_limits_unloads_idle_models(self, mock_get, mock_post):
+        """Testa que, sob pressão, apenas modelos ociosos e não protegidos são descarregados"""
+        mock_get.return_value = ps_response([
+            {"name": "llama2:latest", "expires_at": "t1"},
+            {"name": "mistral:latest", "expires_at": "t1"},
+            {"name": "phi3:latest", "expires_at": "t1"},
+        ])
+        mock_post.return_value = Mock(raise_for_status=Mock())
+        self.manager.refresh()
+        self.manager.set_protected_models(["llama2"])
+        self.manager.last_used["mistral:latest"] = time.time() - 120
+        self.manager.last_used["phi3:latest"] = time.time()  # usado agora: não é ocioso
+
+        unloaded = self.manager.enforce_memory_limits()
+
+        self.assertEqual(unloaded, ["mistral:latest"])
+        self.assertEqual(mock_post.call_args.kwargs["json"], {"model": "mistral:latest", "keep_alive": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+Testes unitários para o limitador de taxa compartilhado
+"""
+
+import unittest
+import sys
+import os
+import time
+from unittest.mock import Mock, patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+
+from src.core.rate_limiter import RateLimiter, get_all_rate_limiter_stats, parse_retry_after
+from src.core.ollama_service import OllamaService
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Testes para RateLimiter"""
+
+    def test_disabled_limiter_does_not_wait(self):
+        """Testa que sem limites configurados as chamadas não aguardam"""
+        limiter = RateLimiter()
+
+        start = time.monotonic()
+        for _ in range(100):
+            limiter.acquire(1000)
+
+        self.assertFalse(limiter.enabled)
+        self.assertLess(time.monotonic() - start, 0.1)
+
+    def test_request_bucket_spaces_calls(self):
+        """Testa que o bucket de requisições espaça chamadas além da capacidade"""
+        limiter = RateLimiter(requests_per_minute=600)
+        limiter._available_requests = 1
+
+        start = time.monotonic()
+        limiter.acquire()
+        limiter.acquire()
+
+        # 600/min = uma requisição a cada 0,1s
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual(limiter.get_stats()["waits"], 1)
+
+    def test_reconcile_returns_unused_tokens(self):
+        """Testa que a reconciliação devolve tokens superestimados ao bucket"""
+        limiter = RateLimiter(tokens_per_minute=1000)
+
+        reservation = limiter.acquire(800)
+        self.assertLess(limiter.get_stats()["available_tokens"], 201)
+
+        limiter.reconcile(reservation, 100)
+        self.assertGreaterEqual(limiter.get_stats()["available_tokens"], 900)
+        self.assertEqual(limiter.get_stats()["reported_tokens"], 100)
+
+    def test_pause_delays_queued_calls(self):
+        """Testa que a pausa por 429 atrasa as chamadas seguintes"""
+        limiter = RateLimiter()
+        limiter.pause(0.2)
+
+        start = time.monotonic()
+        limiter.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+        self.assertEqual(limiter.get_stats()["rate_limited"], 1)
+
+    def test_wait_beyond_maximum_raises(self):
+        """Testa que esperas maiores que o máximo falham com TimeoutError"""
+        limiter = RateLimiter(requests_per_minute=1, max_wait_seconds=0.1)
+        limiter.acquire()
+
+        with self.assertRaises(TimeoutError):
+            limiter.acquire()
+
+    def test_parse_retry_after(self):
+        """Testa a leitura dos cabeçalhos de retry-after"""
+        self.assertEqual(parse_retry_after({"retry-after": "3"}, 1.0), 3.0)
+        self.assertEqual(parse_retry_after({"retry-after-ms": "500"}, 1.0), 0.5)
+        self.assertEqual(parse_retry_after({"retry-after": "invalido"}, 1.0), 1.0)
+        self.assertEqual(parse_retry_after(None, 2.0), 2.0)
+
+
+class TestOllamaServiceRateLimit(unittest.TestCase):
+    """Testes da integração do limitador com o OllamaService"""
+
+    @patch('src.core.ollama_service.requests.post')
+    def test_chat_retries_after_429(self, mock_post):
+        """Testa que um 429 pausa o limitador e a chamada é repetida"""
+        limited = Mock(status_code=429, headers={"retry-after": "0.1"})
+        limited.raise_for_status.side_effect = requests.exceptions.HTTPError(response=limited)
+        ok = Mock()
+        ok.json.return_value = {"message": {"content": "ok"}, "prompt_eval_count": 10, "eval_count": 5}
+        mock_post.side_effect = [limited, ok]
+
+        service = OllamaService(base_url="http://localhost:11434")
+        service.rate_limiter = RateLimiter(name="ollama")
+
+        start = time.monotonic()
+        result = service.chat(model="llama2", messages=[{"role": "user", "content": "Olá"}])
+
+        self.assertEqual(result["message"]["content"], "ok")
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual(service.rate_limiter.get_stats()["reported_tokens"], 15)
+
+    @patch('src.core.ollama_service.requests.post')
+    def test_connection_error_returns_reserved_tokens(self, mock_post):
+        """Testa que falhas de conexão/timeout devolvem os tokens reservados"""
+        mock_post.side_effect = requests.exceptions.Timeout("timeout")
+        service = OllamaService(base_url="http://localhost:11434")
+        service.rate_limiter = RateLimiter(tokens_per_minute=10000, name="ollama")
+
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                service.chat(model="llama2", messages=[{"role": "user", "content": "Olá"}], num_predict=1000)
+
+        self.assertGreater(service.rate_limiter.get_stats()["available_tokens"], 9900)
+
+    def test_limiter_is_per_host(self):
+        """Testa que cada servidor Ollama do pool tem seu próprio limitador"""
+        first = OllamaService(base_url="http://gpu-1:11434")
+        second = OllamaService(base_url="http://gpu-2:11434")
+
+        self.assertIsNot(first.rate_limiter, second.rate_limiter)
+        self.assertIs(first.rate_limiter, OllamaService(base_url="http://gpu-1:11434").rate_limiter)
+        first.rate_limiter.pause(5)
+        self.assertEqual(second.rate_limiter.get_stats()["paused_seconds"], 0.0)
+        self.assertEqual(get_all_rate_limiter_stats()["ollama@http://gpu-1:11434"]["host"], "http://gpu-1:11434")
+
+
+class TestOpenAIServiceRateLimit(unittest.TestCase):
+    """Testes da integração do limitador com o OpenAIService"""
+
+    def test_unexpected_error_returns_reserved_tokens(self):
+        """Testa que erros fora dos tratados com nova tentativa também devolvem a reserva"""
+        from src.core.openai_service import OpenAIService
+
+        service = OpenAIService(api_key="sk-" + "x" * 40, base_url="http://limiter.invalid/v1")
+        service.rate_limiter = RateLimiter(tokens_per_minute=10000, name="openai")
+        service.client = Mock()
+        service.client.chat.completions.create.side_effect = ValueError("requisição inválida")
+
+        with self.assertRaises(Exception):
+            service.chat("gpt-4o-mini", [{"role": "user", "content": "Olá"}], max_tokens=1000)
+
+        self.assertGreater(service.rate_limiter.get_stats()["available_tokens"], 9900)
+
+
+if __name__ == '__main__':
+    unittest.main()
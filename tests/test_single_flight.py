@@ -0,0 +1,167 @@
+"""
+Testes unitários para a coalescência de requisições idênticas (single-flight)
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.single_flight import SingleFlight, make_request_key
+
+
+def run_in_threads(count, target):
+    """Executa target em várias threads simultâneas e retorna os resultados."""
+    results = [None] * count
+
+    def worker(index):
+        results[index] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Testes para SingleFlight"""
+
+    def test_request_key_is_order_independent(self):
+        """Testa que a chave não depende da ordem dos parâmetros"""
+        self.assertEqual(
+            make_request_key(model="m", params={"a": 1, "b": 2}),
+            make_request_key(params={"b": 2, "a": 1}, model="m"),
+        )
+        self.assertNotEqual(make_request_key(model="m"), make_request_key(model="n"))
+
+    def test_concurrent_identical_calls_share_one_upstream_call(self):
+        """Testa que chamadas simultâneas idênticas fazem uma única chamada real"""
+        group = SingleFlight("teste")
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            time.sleep(0.2)
+            return {"content": "resposta"}
+
+        results = run_in_threads(5, lambda: group.do("chave", upstream))
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        stats = group.get_stats()
+        self.assertEqual(stats["upstream_calls"], 1)
+        self.assertEqual(stats["coalesced"], 4)
+        self.assertEqual(stats["in_flight"], 0)
+
+    def test_error_is_shared_and_key_released(self):
+        """Testa que o erro chega a todos e a chave é liberada para novas chamadas"""
+        group = SingleFlight("teste")
+
+        def failing():
+            time.sleep(0.1)
+            raise ValueError("falha")
+
+        def call():
+            try:
+                group.do("chave", failing)
+            except ValueError as e:
+                return str(e)
+
+        self.assertEqual(run_in_threads(3, call), ["falha"] * 3)
+        self.assertEqual(group.do("chave", lambda: "ok"), "ok")
+
+    def test_stream_fan_out(self):
+        """Testa que todos os participantes recebem todos os chunks do streaming"""
+        group = SingleFlight("teste")
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            for word in ["a", "b", "c"]:
+                time.sleep(0.05)
+                yield word
+
+        results = run_in_threads(4, lambda: list(group.do_stream("chave", upstream)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [["a", "b", "c"]] * 4)
+        self.assertEqual(group.get_stats()["in_flight"], 0)
+
+    def test_stream_late_joiner_receives_earlier_chunks(self):
+        """Testa que quem entra no meio do streaming recebe os chunks já gerados"""
+        group = SingleFlight("teste")
+
+        first = group.do_stream("chave", lambda: iter(["a", "b", "c"]))
+        self.assertEqual(next(first), "a")
+        second = group.do_stream("chave", lambda: iter(["x"]))
+
+        self.assertEqual(list(second), ["a", "b", "c"])
+        self.assertEqual(list(first), ["b", "c"])
+
+    def test_abandoned_stream_is_closed(self):
+        """Testa que o streaming real é encerrado quando todos desistem"""
+        group = SingleFlight("teste")
+        closed = []
+
+        def upstream():
+            try:
+                yield "a"
+                yield "b"
+            finally:
+                closed.append(True)
+
+        stream = group.do_stream("chave", upstream)
+        next(stream)
+        stream.close()
+
+        self.assertEqual(closed, [True])
+        self.assertEqual(group.get_stats()["in_flight"], 0)
+
+    def test_joiner_of_abandoned_stream_starts_new_call(self):
+        """Testa que quem começa a iterar após o abandono não recebe a resposta truncada"""
+        group = SingleFlight("teste")
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            yield from ["a", "b", "c"]
+
+        first = group.do_stream("chave", upstream)
+        next(first)
+        late = group.do_stream("chave", upstream)
+        first.close()
+
+        self.assertEqual(list(late), ["a", "b", "c"])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(group.get_stats()["in_flight"], 0)
+
+    def test_subscriber_counted_only_when_iterating(self):
+        """Testa que um participante que nunca itera não impede o encerramento do upstream"""
+        group = SingleFlight("teste")
+        closed = []
+
+        def upstream():
+            try:
+                yield "a"
+                yield "b"
+            finally:
+                closed.append(True)
+
+        idle = group.do_stream("chave", upstream)
+        active = group.do_stream("chave", upstream)
+        next(active)
+        active.close()
+
+        self.assertEqual(closed, [True])
+        self.assertEqual(group.get_stats()["in_flight"], 0)
+        idle.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
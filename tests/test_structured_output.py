@@ -0,0 +1,94 @@
+"""
+Testes unitários para a saída estruturada e a leitura incremental de JSON
+"""
+
+import unittest
+import sys
+import os
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.structured_output import (
+    JSONObjectStreamParser,
+    read_json_stream,
+    to_openai_response_format,
+)
+
+
+class TestJSONObjectStreamParser(unittest.TestCase):
+    """Testes para JSONObjectStreamParser"""
+
+    def test_object_split_across_chunks(self):
+        """Testa a leitura de um objeto dividido em vários chunks"""
+        parser = JSONObjectStreamParser()
+        chunks = ['{"should_', 'generate_chart": tr', 'ue, "title": "Km', ' por cidade"}']
+
+        results = [parser.feed(chunk) for chunk in chunks]
+
+        self.assertEqual(results, [False, False, False, True])
+        self.assertEqual(parser.result, {"should_generate_chart": True, "title": "Km por cidade"})
+
+    def test_braces_inside_strings_and_prose(self):
+        """Testa que chaves em strings e em texto livre não encerram a leitura"""
+        parser = JSONObjectStreamParser()
+
+        parser.feed('Use {colunas} assim: ```json\n{"title": "a } b \\" {", "n": {"x": 1}}')
+
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.result, {"title": 'a } b " {', "n": {"x": 1}})
+
+
+class TestReadJSONStream(unittest.TestCase):
+    """Testes para read_json_stream"""
+
+    def test_stream_closed_when_object_completes(self):
+        """Testa que o streaming é encerrado assim que o objeto fecha"""
+        closed = []
+
+        def stream():
+            try:
+                yield '{"a": '
+                yield '1}'
+                yield '\n\n\n'
+                yield 'texto extra'
+            finally:
+                closed.append(True)
+
+        result = read_json_stream(stream())
+
+        self.assertEqual(result["object"], {"a": 1})
+        self.assertEqual(result["chunks"], 2)
+        self.assertTrue(result["stopped_early"])
+        self.assertEqual(closed, [True])
+
+    def test_stop_condition_on_partial_object(self):
+        """Testa a parada antecipada pela condição sobre o objeto parcial"""
+        result = read_json_stream(
+            iter(['{"should_generate_chart": false', ', "title": null}']),
+            stop_when=lambda partial: '"should_generate_chart": false' in partial,
+        )
+
+        self.assertTrue(result["stopped_by_condition"])
+        self.assertIsNone(result["object"])
+        self.assertEqual(result["chunks"], 1)
+
+    def test_free_text_without_object(self):
+        """Testa que texto sem objeto JSON é devolvido inteiro"""
+        result = read_json_stream(iter(["sem ", "json"]))
+
+        self.assertIsNone(result["object"])
+        self.assertEqual(result["text"], "sem json")
+        self.assertFalse(result["stopped_early"])
+
+    def test_openai_response_format(self):
+        """Testa a conversão para o response_format da OpenAI"""
+        converted = to_openai_response_format({"name": "decisao", "schema": {"type": "object"}})
+
+        self.assertEqual(converted["type"], "json_schema")
+        self.assertEqual(converted["json_schema"]["name"], "decisao")
+        self.assertTrue(converted["json_schema"]["strict"])
+
+
+if __name__ == '__main__':
+    unittest.main()
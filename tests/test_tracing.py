@@ -0,0 +1,206 @@
+"""
+Testes unitários para os spans de tempo por pergunta (tracing)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core.tracing import (
+    bind_context,
+    build_waterfall,
+    get_current_span,
+    get_last_trace,
+    get_trace,
+    set_attributes,
+    span,
+    start_span,
+    to_otlp,
+)
+from src.core.agent_orchestrator import AgentOrchestrator, CHART_AGENT_PROMPT
+
+
+class TestTracing(unittest.TestCase):
+    """Testes para span, start_span e a publicação das árvores"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.trace_file = os.path.join(self.temp_dir.name, "traces.jsonl")
+        self.env = patch.dict(os.environ, {"TRACE_FILE_ENABLED": "true", "TRACE_FILE": self.trace_file, "TRACE_FORMAT": "jsonl"})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    def _read_lines(self):
+        with open(self.trace_file, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def test_nested_spans_share_trace(self):
+        """Testa que spans aninhados formam uma árvore publicada ao fim do span raiz"""
+        with span("root", question_chars=10) as root:
+            with span("child") as child:
+                set_attributes(model="llama3.2:3b", empty=None)
+                self.assertIs(get_current_span(), child)
+            self.assertIs(get_current_span(), root)
+        self.assertIsNone(get_current_span())
+
+        spans = get_trace(root.trace_id)
+        self.assertEqual([record["name"] for record in spans], ["root", "child"])
+        self.assertEqual(spans[1]["parent_id"], root.span_id)
+        self.assertEqual(spans[1]["attributes"], {"model": "llama3.2:3b"})
+        self.assertEqual(get_last_trace(), spans)
+        self.assertGreaterEqual(spans[0]["duration_ms"], spans[1]["duration_ms"])
+
+    def test_error_marks_span(self):
+        """Testa que exceções encerram o span com status de erro e são repropagadas"""
+        with self.assertRaises(ValueError):
+            with span("root") as root:
+                raise ValueError("falhou")
+        record = get_trace(root.trace_id)[0]
+        self.assertEqual(record["status"], "error")
+        self.assertIn("falhou", record["error"])
+
+    def test_bind_context_propagates_to_threads(self):
+        """Testa que spans criados em outra thread com bind_context são filhos do span atual"""
+        def work():
+            with span("worker"):
+                pass
+
+        with span("root") as root:
+            thread = threading.Thread(target=bind_context(work))
+            thread.start()
+            thread.join()
+            # Sem bind_context a thread inicia uma árvore própria
+            orphan = threading.Thread(target=work)
+            orphan.start()
+            orphan.join()
+
+        spans = get_trace(root.trace_id)
+        self.assertEqual([record["name"] for record in spans], ["root", "worker"])
+        self.assertEqual(spans[1]["parent_id"], root.span_id)
+
+    def test_continuation_appends_to_trace(self):
+        """Testa que um span iniciado com o contexto de uma árvore publicada é acrescentado a ela"""
+        root = start_span("process_user_message")
+        root.end()
+        render = start_span("ui.render", parent=root.context())
+        render.end()
+
+        spans = get_trace(root.trace_id)
+        self.assertEqual([record["name"] for record in spans], ["process_user_message", "ui.render"])
+        self.assertEqual(spans[1]["parent_id"], root.span_id)
+        self.assertEqual(len(self._read_lines()), 2)
+
+    def test_jsonl_and_otlp_export(self):
+        """Testa a gravação em JSONL (um span por linha) e em OTLP (uma árvore por linha)"""
+        with span("root", prompt_tokens=120, cache_hit=True):
+            with span("child", ratio=0.5):
+                pass
+        records = self._read_lines()
+        self.assertEqual([record["name"] for record in records], ["root", "child"])
+
+        with patch.dict(os.environ, {"TRACE_FORMAT": "otlp"}):
+            with span("otlp_root"):
+                pass
+        request = self._read_lines()[-1]
+        otlp_span = request["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+        self.assertEqual(otlp_span["name"], "otlp_root")
+        self.assertEqual(len(otlp_span["traceId"]), 32)
+
+        converted = to_otlp(records)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        attributes = {item["key"]: item["value"] for item in converted[0]["attributes"]}
+        self.assertEqual(attributes["prompt_tokens"], {"intValue": "120"})
+        self.assertEqual(attributes["cache_hit"], {"boolValue": True})
+        self.assertEqual(converted[1]["parentSpanId"], records[0]["span_id"])
+
+    def test_disabled_tracing_records_nothing(self):
+        """Testa que TRACING_ENABLED=false não mantém nem grava spans"""
+        with patch.dict(os.environ, {"TRACING_ENABLED": "false"}):
+            with span("root") as root:
+                set_attributes(model="x")
+        self.assertIsNone(root.trace_id)
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_file_sink_is_opt_in(self):
+        """Testa que, sem TRACE_FILE_ENABLED, a árvore fica só em memória"""
+        with patch.dict(os.environ, {"TRACE_FILE_ENABLED": ""}):
+            del os.environ["TRACE_FILE_ENABLED"]
+            with span("root") as root:
+                pass
+        self.assertIsNotNone(root.trace_id)
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_build_waterfall(self):
+        """Testa a ordem em árvore, a profundidade e os deslocamentos da cascata"""
+        spans = [
+            {"span_id": "a", "parent_id": None, "name": "root", "start_time": 100.0,
+             "duration_ms": 1000.0, "status": "ok", "attributes": {}},
+            {"span_id": "c", "parent_id": "a", "name": "second", "start_time": 100.5,
+             "duration_ms": 200.0, "status": "ok", "attributes": {}},
+            {"span_id": "b", "parent_id": "a", "name": "first", "start_time": 100.1,
+             "duration_ms": 300.0, "status": "error", "attributes": {}},
+            {"span_id": "d", "parent_id": "b", "name": "nested", "start_time": 100.2,
+             "duration_ms": 50.0, "status": "ok", "attributes": {}},
+        ]
+        rows = build_waterfall(spans)
+        self.assertEqual([row["name"] for row in rows], ["root", "first", "nested", "second"])
+        self.assertEqual([row["depth"] for row in rows], [0, 1, 2, 1])
+        self.assertAlmostEqual(rows[3]["offset_ms"], 500.0, places=3)
+
+
+class TestOrchestratorTracing(unittest.TestCase):
+    """Testes dos spans emitidos pelo AgentOrchestrator"""
+
+    class Handler:
+        """Handler falso com uso de tokens"""
+        last_usage = {"prompt_tokens": 100, "completion_tokens": 10, "cached_tokens": 80}
+
+        def generate_response(self, messages=None, model=None, temperature=None, stream=False, **kwargs):
+            if messages[0]["content"] == CHART_AGENT_PROMPT:
+                return '{"should_generate_chart": true, "chart_type": "bar", "x_column": "cidade", "y_column": "km_mes"}'
+            if stream:
+                return iter(["Recife ", "roda ", "menos."])
+            return "Recife roda menos."
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"TRACE_FILE_ENABLED": "true", "TRACE_FILE": os.path.join(self.temp_dir.name, "traces.jsonl")})
+        self.env.start()
+        self.df = pd.DataFrame({"cidade": ["Recife", "Natal"], "km_mes": [1000, 2000]})
+
+    def tearDown(self):
+        self.env.stop()
+        self.temp_dir.cleanup()
+
+    def test_concurrent_agents_nested_under_query(self):
+        """Testa que os agentes nas threads do executor ficam sob o span da consulta, com atributos"""
+        orchestrator = AgentOrchestrator(self.Handler(), execution_mode="concurrent", speculative_wait_seconds=0.0)
+
+        with span("process_user_message") as root:
+            orchestrator.process_user_query("mostre um gráfico de km por cidade", data_context="ctx", df=self.df)
+
+        spans = {record["name"]: record for record in get_trace(root.trace_id)}
+        query = spans["orchestrator.query"]
+        self.assertEqual(query["parent_id"], root.span_id)
+        self.assertIn("data_version", query["attributes"])
+        self.assertFalse(query["attributes"]["coalesced"])
+        for name in ("local_answer", "agent.analysis", "agent.chart", "chart.parse"):
+            self.assertEqual(spans[name]["parent_id"], query["span_id"], name)
+        self.assertEqual(spans["agent.analysis"]["attributes"]["prompt_tokens"], 100)
+        self.assertEqual(spans["agent.chart"]["attributes"]["model"], "llama3.2:3b")
+        self.assertTrue(spans["chart.parse"]["attributes"]["should_generate_chart"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+"""
+Testes unitários para a contabilização de tokens (LLMResponse e UsageTracker)
+"""
+
+import copy
+import json
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Adicionar diretório raiz ao path para imports
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.core import history_manager
+from src.core.metrics import agent_scope
+from src.core.usage_tracker import (
+    LLMResponse,
+    UsageTracker,
+    combine_usage,
+    get_usage_tracker,
+    prompt_preview,
+    usage_scope,
+    with_timings,
+)
+
+
+class TestLLMResponse(unittest.TestCase):
+    """Testes da compatibilidade de LLMResponse com str"""
+
+    def test_behaves_as_str(self):
+        """Testa igualdade, operações de texto, JSON, pickle e deepcopy mantendo o uso"""
+        usage = {"prompt_tokens": 120, "completion_tokens": 30, "decode_tokens_per_second": 42.0}
+        response = LLMResponse("Recife roda menos.", usage, "llama3.2:3b", "ollama")
+
+        self.assertIsInstance(response, str)
+        self.assertEqual(response, "Recife roda menos.")
+        self.assertEqual(response.strip().upper(), "RECIFE RODA MENOS.")
+        self.assertEqual(json.dumps({"r": response}), json.dumps({"r": "Recife roda menos."}))
+        self.assertEqual(response.prompt_tokens, 120)
+        self.assertEqual(response.decode_tokens_per_second, 42.0)
+        self.assertEqual(LLMResponse("x").completion_tokens, 0)
+
+        for clone in (pickle.loads(pickle.dumps(response)), copy.deepcopy(response)):
+            self.assertEqual(clone, response)
+            self.assertEqual(clone.usage, usage)
+            self.assertEqual(clone.model, "llama3.2:3b")
+
+
+class TestTimings(unittest.TestCase):
+    """Testes das velocidades de prefill e decode"""
+
+    def test_ollama_server_durations(self):
+        """Testa prefill/decode a partir de prompt_eval_duration e eval_duration do Ollama"""
+        usage = with_timings(
+            {"prompt_tokens": 400, "completion_tokens": 50, "prompt_eval_ms": 200.0, "eval_ms": 1000.0},
+            ttft_seconds=None,
+            elapsed_seconds=1.5,
+        )
+        self.assertEqual(usage["prefill_tokens_per_second"], 2000.0)
+        self.assertEqual(usage["decode_tokens_per_second"], 50.0)
+        self.assertEqual(usage["total_ms"], 1500.0)
+
+    def test_openai_first_token_splits_phases(self):
+        """Testa a separação pelo primeiro token em streaming e o tempo total sem streaming"""
+        streamed = with_timings({"prompt_tokens": 100, "completion_tokens": 30}, 0.5, 2.0)
+        self.assertEqual(streamed["prefill_tokens_per_second"], 200.0)
+        self.assertEqual(streamed["decode_tokens_per_second"], 20.0)
+
+        blocking = with_timings({"prompt_tokens": 100, "completion_tokens": 30}, None, 3.0)
+        self.assertIsNone(blocking["prefill_tokens_per_second"])
+        self.assertEqual(blocking["decode_tokens_per_second"], 10.0)
+        self.assertIsNone(with_timings(None, 0.1, 1.0))
+
+    def test_combine_rounds(self):
+        """Testa a soma das rodadas do modo com ferramentas"""
+        combined = combine_usage([
+            {"prompt_tokens": 100, "completion_tokens": 10, "decode_ms": 500.0, "prefill_ms": None},
+            None,
+            {"prompt_tokens": 150, "completion_tokens": 40, "decode_ms": 500.0, "prefill_ms": None},
+        ])
+        self.assertEqual(combined["prompt_tokens"], 250)
+        self.assertEqual(combined["rounds"], 2)
+        self.assertEqual(combined["decode_tokens_per_second"], 50.0)
+        self.assertIsNone(combine_usage([None]))
+
+
+class TestUsageTracker(unittest.TestCase):
+    """Testes da agregação por sessão, modelo e agente"""
+
+    def setUp(self):
+        self.tracker = UsageTracker(max_expensive_prompts=2)
+
+    def test_aggregates_by_session_model_and_agent(self):
+        """Testa totais, agrupamentos, velocidades ponderadas e o custo pelo MODEL_PRICING"""
+        self.tracker.record(
+            {"prompt_tokens": 1000, "completion_tokens": 100, "cached_tokens": 800,
+             "prefill_ms": 500.0, "decode_ms": 1000.0, "total_ms": 1500.0},
+            provider="openai", model="gpt-4o-mini-2024-07-18", agent="analysis",
+            prompt="qual cidade roda mais?", session_id="s1",
+        )
+        self.tracker.record(
+            {"prompt_tokens": 200, "completion_tokens": 20, "decode_ms": 1000.0, "total_ms": 1000.0},
+            provider="ollama", model="llama3.2:3b", agent="chart", prompt="gráfico", session_id="s1",
+        )
+        self.tracker.record({"prompt_tokens": 5, "completion_tokens": 5}, model="x", session_id="s2")
+
+        summary = self.tracker.get_summary("s1")
+        totals = summary["totals"]
+        self.assertEqual(totals["calls"], 2)
+        self.assertEqual(totals["prompt_tokens"], 1200)
+        self.assertEqual(totals["completion_tokens"], 120)
+        self.assertEqual(totals["cached_tokens"], 800)
+        # Prefill medido apenas na primeira chamada; decode ponderado pelas duas
+        self.assertEqual(totals["prefill_tokens_per_second"], 2000.0)
+        self.assertEqual(totals["decode_tokens_per_second"], 60.0)
+        self.assertEqual(totals["mean_ms"], 1250.0)
+        self.assertEqual(set(summary["by_model"]), {"gpt-4o-mini-2024-07-18", "llama3.2:3b"})
+        self.assertEqual(summary["by_agent"]["chart"]["prompt_tokens"], 200)
+        self.assertAlmostEqual(
+            summary["by_model"]["gpt-4o-mini-2024-07-18"]["cost_usd"], (1000 * 0.15 + 100 * 0.60) / 1_000_000
+        )
+        self.assertEqual(self.tracker.get_summary("s2")["totals"]["calls"], 1)
+        self.assertEqual(self.tracker.get_summary("vazia")["totals"]["calls"], 0)
+
+    def test_expensive_prompts_ranked_and_capped(self):
+        """Testa a ordem (custo, depois tokens) e o limite dos prompts mais caros"""
+        for prompt, tokens in (("pequeno", 10), ("grande", 5000), ("médio", 900)):
+            self.tracker.record(
+                {"prompt_tokens": tokens, "completion_tokens": 0}, provider="ollama",
+                model="llama3.2:3b", prompt=prompt, session_id="s1",
+            )
+        ranking = self.tracker.get_summary("s1")["expensive_prompts"]
+        self.assertEqual([entry["prompt"] for entry in ranking], ["grande", "médio"])
+
+    def test_persisted_alongside_history(self):
+        """Testa save_usage/load_usage no diretório do histórico e a restauração da sessão"""
+        self.tracker.record(
+            {"prompt_tokens": 300, "completion_tokens": 30, "decode_ms": 600.0},
+            provider="ollama", model="llama3.2:3b", agent="analysis", prompt="km por cidade", session_id="current",
+        )
+        with tempfile.TemporaryDirectory() as temp_dir, \
+                patch.object(history_manager, "USAGE_DIR", Path(temp_dir) / "usage"):
+            path = history_manager.save_usage("current", self.tracker.get_summary("current"))
+            self.assertTrue(path.endswith(os.path.join("usage", "current.json")))
+
+            restored = UsageTracker()
+            self.assertTrue(restored.restore_session("current", history_manager.load_usage("current")))
+            self.assertIsNone(history_manager.load_usage("outra"))
+
+        summary = restored.get_summary("current")
+        self.assertEqual(summary["by_agent"]["analysis"]["completion_tokens"], 30)
+        self.assertEqual(summary["expensive_prompts"][0]["prompt"], "km por cidade")
+        restored.record({"prompt_tokens": 10, "completion_tokens": 1}, session_id="current")
+        self.assertEqual(restored.get_summary("current")["totals"]["calls"], 2)
+        self.assertFalse(restored.restore_session("x", {"totals": None}))
+
+
+class TestHandlerUsage(unittest.TestCase):
+    """Testes do uso retornado e contabilizado pelo handler do Ollama"""
+
+    def setUp(self):
+        from src.core.llm_handler import OllamaLLMHandler
+
+        self.handler = OllamaLLMHandler(base_url="http://localhost:11434")
+        self.handler.health_monitor.stop()
+        get_usage_tracker().reset("usage-test")
+
+    def tearDown(self):
+        get_usage_tracker().reset("usage-test")
+
+    def test_generate_response_returns_usage(self):
+        """Testa LLMResponse com uso e a contabilização na sessão, agente e pergunta do escopo"""
+        self.handler.ollama_service.chat = lambda model, messages, stream=False, **kwargs: {
+            "message": {"content": "Natal lidera."}, "done": True,
+            "prompt_eval_count": 500, "prompt_eval_duration": 250_000_000,
+            "eval_count": 40, "eval_duration": 800_000_000,
+        }
+        with usage_scope("usage-test", "qual cidade lidera?"), agent_scope("analysis"):
+            response = self.handler.generate_response(
+                messages=[{"role": "user", "content": "contexto longo + qual cidade lidera?"}],
+                model="usage-test-model",
+            )
+
+        self.assertIsInstance(response, LLMResponse)
+        self.assertEqual(response, "Natal lidera.")
+        self.assertEqual(response.usage, self.handler.last_usage)
+        self.assertEqual(response.prefill_tokens_per_second, 2000.0)
+        self.assertEqual(response.decode_tokens_per_second, 50.0)
+
+        summary = get_usage_tracker().get_summary("usage-test")
+        self.assertEqual(summary["by_agent"]["analysis"]["prompt_tokens"], 500)
+        self.assertEqual(summary["by_model"]["usage-test-model"]["completion_tokens"], 40)
+        self.assertEqual(summary["expensive_prompts"][0]["prompt"], "qual cidade lidera?")
+
+    def test_stream_records_usage_when_consumed(self):
+        """Testa que o streaming contabiliza o uso do chunk final"""
+        def chat(model, messages, stream=False, **kwargs):
+            yield {"message": {"content": "Olá"}, "done": False}
+            yield {"message": {"content": ""}, "done": True, "prompt_eval_count": 10, "eval_count": 4,
+                   "eval_duration": 100_000_000}
+
+        self.handler.ollama_service.chat = chat
+        with usage_scope("usage-test"):
+            stream = self.handler.generate_response(
+                messages=[{"role": "user", "content": "oi"}], model="usage-test-model", stream=True
+            )
+            self.assertEqual("".join(stream), "Olá")
+
+        self.assertEqual(self.handler.last_usage["decode_tokens_per_second"], 40.0)
+        entry = get_usage_tracker().get_summary("usage-test")["expensive_prompts"][0]
+        self.assertEqual((entry["prompt"], entry["agent"], entry["total_tokens"]), ("oi", "chat", 14))
+
+    def test_prompt_preview_truncates(self):
+        """Testa o trecho do prompt (última mensagem do usuário, espaços normalizados)"""
+        messages = [{"role": "user", "content": "antiga"}, {"role": "user", "content": "a  b\n" + "x" * 50}]
+        preview = prompt_preview(messages, max_chars=10)
+        self.assertEqual(preview, "a b xxxxx…")
+
+
+if __name__ == '__main__':
+    unittest.main()